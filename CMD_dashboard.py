@@ -7,6 +7,8 @@ import threading
 import sys
 from datetime import datetime
 from CanDecoder import CanDecoder
+from CanIngest import open_ingest_bus
+from CanLogFormat import open_log_csv
 
 frequency = 1.0
 
@@ -27,7 +29,8 @@ class CanReceiver:
             self.load_csv_file()
         else:
             try:
-                self.bus = can.interface.Bus(channel='can0', interface='socketcan')
+                # 共用接收服務 (CanIngest.py) 執行中時不另開 socket
+                self.bus = open_ingest_bus(0) or can.interface.Bus(channel='can0', interface='socketcan')
             except Exception as e:
                 print(f"Failed to initialize CAN interface: {e}")
                 self.bus = None
@@ -36,6 +39,12 @@ class CanReceiver:
         self.decoder = CanDecoder()
         self.message_count = 0
         
+        # 儀表板在有新 frame 時重繪（沒有時仍每秒一次），且只重建有變動的群組
+        self.dashboard_view = self.decoder.data_store
+        self.drawn_generation = self.decoder.store.generation
+        self.drawn_count = None
+        self.drawn_time = 0.0  # 上次重繪的 time.monotonic()
+        
         # Threading for CAN receiving
         self.can_thread = None
         self.display_thread = None
@@ -54,8 +63,8 @@ class CanReceiver:
     def load_csv_file(self):
         """載入 CSV 檔案"""
         try:
-            with open(self.csv_file, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
+            with open_log_csv(self.csv_file) as lines:
+                reader = csv.DictReader(lines)
                 for row in reader:
                     # 解析 CSV 行
                     timestamp = int(row['Time Stamp'])
@@ -166,6 +175,18 @@ class CanReceiver:
 
     def update_dashboard(self):
         """更新儀表板顯示"""
+        # 先讀 frame 計數：解碼執行緒先計數再解碼，之後讀到的 generation 不會漏掉已計數的 frame
+        message_count = self.message_count
+        generation, changed_slots = self.decoder.store.changes_since(self.drawn_generation)
+        now = time.monotonic()
+        if (message_count == self.drawn_count and generation == self.drawn_generation
+                and now - self.drawn_time < 1.0):
+            return  # 沒有新的 frame；仍每秒重繪一次，讓 Elapsed 與 Last Update 持續更新
+        self.drawn_generation = generation
+        self.drawn_count = message_count
+        self.drawn_time = now
+        data_store = self.decoder.store.refresh(self.dashboard_view, changed_slots)
+        
         # Clear screen and move cursor to top
         print("\033[2J\033[H", end='')
         
@@ -175,24 +196,30 @@ class CanReceiver:
         print("=" * 90)
         
         # Timestamp Section (show decoded time from 0x100)
-        timestamp = self.decoder.data_store['timestamp']
+        timestamp = data_store['timestamp']
         if timestamp['time'] is not None:
             time_str = timestamp['time'].strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
             print(f"[Data Time]    {time_str}")
         else:
             print(f"[Data Time]    N/A")
 
-        canlogging = self.decoder.data_store['canlogging']
+        canlogging = data_store['canlogging']
         if canlogging['is_recording']:
             start_time = canlogging['start_time'].strftime('%Y-%m-%d %H:%M:%S')
             elapsed_time = time.time() - canlogging['start_timestamp']
             print(f"[CAN Logging]  Recording started at {start_time}, Elapsed: {elapsed_time:.2f} seconds")
         else:
             print(f"[CAN Logging]  Not recording")
+        health = canlogging['health']
+        if health is not None:
+            flag = "  ** INCOMPLETE LOG **" if canlogging['incomplete'] else ""
+            print(f"               FPS: {health['fps_can0']}/{health['fps_can1']} "
+                  f"RX overflow: {health['rx_overflow']} Queue drops: {health['queue_dropped']} "
+                  f"Write: {health['write_latency_ms']} ms Reconnects: {health['reconnects']}{flag}")
         print("-" * 90)
         
         # VCU Section
-        vcu = self.decoder.data_store['vcu']
+        vcu = data_store['vcu']
         print(f"[VCU]          Steer: {self.format_value(vcu['steer'], '{:>6}'):>8} "
               f"Accel: {self.format_value(vcu['accel'], '{:>6}'):>8} "
               f"Brake: {self.format_value(vcu['brake'], '{:>6}'):>8}")
@@ -202,7 +229,7 @@ class CanReceiver:
               f"BSE2: {self.format_value(vcu['bse2'], '{:.2f}'):>8}")
         print("-" * 90)
         # IMU Section
-        # imu = self.decoder.data_store['imu']
+        # imu = data_store['imu']
         # print(f"[IMU]          LSM6 Accel X: {self.format_value(imu['lsm6_accel']['x'], '{:.3f} m/s²'):>12} "
         #       f"Y: {self.format_value(imu['lsm6_accel']['y'], '{:.3f} m/s²'):>12} "
         #       f"Z: {self.format_value(imu['lsm6_accel']['z'], '{:.3f} m/s²'):>12}")
@@ -220,7 +247,7 @@ class CanReceiver:
         #       f"Z: {self.format_value(imu['magnetometer']['z'], '{:.1f} μT'):>10}")
 
         # IMU2 Section
-        imu2 = self.decoder.data_store['imu2']
+        imu2 = data_store['imu2']
         print(f"[IMU]          Acceleration X: {self.format_value(imu2['acceleration']['x'], '{:.4f} g'):>12} "
               f"Y: {self.format_value(imu2['acceleration']['y'], '{:.4f} g'):>12} "
               f"Z: {self.format_value(imu2['acceleration']['z'], '{:.4f} g'):>12}")
@@ -233,8 +260,8 @@ class CanReceiver:
               f"Z: {self.format_value(imu2['quaternion']['z'], '{:.4f}'):>10}")
         print("-" * 90)
         # GPS Section
-        gps = self.decoder.data_store['gps']
-        cov = self.decoder.data_store['covariance']
+        gps = data_store['gps']
+        cov = data_store['covariance']
         print(f"[GPS]          Lat: {self.format_value(gps['lat'], '{:.7f}'):>12} "
               f"Lon: {self.format_value(gps['lon'], '{:.7f}'):>12} "
               f"Alt: {self.format_value(gps['alt'], '{:.1f}m'):>8}")
@@ -242,7 +269,7 @@ class CanReceiver:
               f"Covariance Type: {cov['type_name']:>15}")
         print("-" * 90)
         # Velocity Section  
-        vel = self.decoder.data_store['velocity']
+        vel = data_store['velocity']
         print(f"[Velocity]     Linear X: {self.format_value(vel['linear_x'], '{:.3f} m/s'):>10} "
               f"Y: {self.format_value(vel['linear_y'], '{:.3f} m/s'):>10} "
               f"Z: {self.format_value(vel['linear_z'], '{:.3f} m/s'):>10}")
@@ -253,7 +280,7 @@ class CanReceiver:
               f"({self.format_value(vel['speed_kmh'], '{:.2f} km/h'):>10})")
         print("-" * 90)
         # Accumulator Section
-        acc = self.decoder.data_store['accumulator']
+        acc = data_store['accumulator']
         print(f"[Accumulator]  SOC: {self.format_value(acc['soc'], '{}%'):>5} "
               f"Voltage: {self.format_value(acc['voltage'], '{:.2f}V'):>8} "
               f"Current: {self.format_value(acc['current'], '{:.2f}A'):>8} "
@@ -263,7 +290,7 @@ class CanReceiver:
               f"Heartbeat: {self.format_value(acc['heartbeat'], lambda x: 'OK' if x else 'FAIL'):>4}")
         print("-" * 90)
         # Inverters Section
-        for inv_id, inv in self.decoder.data_store['inverters'].items():
+        for inv_id, inv in data_store['inverters'].items():
             # Calculate speed in km/h for inverters
             speed_kmh = None
             if inv['speed'] is not None:
@@ -290,7 +317,7 @@ class CanReceiver:
         # Footer
         print("=" * 90)
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
-        print(f"Last Update: {current_time}  Messages: {self.message_count}")
+        print(f"Last Update: {current_time}  Messages: {message_count}")
         
         # Flush output
         import sys
@@ -0,0 +1,273 @@
+"""
+批次解碼模組
+Vectorized decoding of recorded frames into per-signal time series.
+
+Replaying a log through process_can_message costs one Python call chain per
+frame. ``BatchDecoder`` instead takes the frames as one structured NumPy
+array (``FRAME_DTYPE``: timestamp, ID, DLC, 8-byte payload), groups them by
+ID and decodes every signal of a message for all of its frames at once: the
+payloads are viewed as little- and big-endian uint64 columns, and each
+signal is a shift, mask, sign extension and DBC scale/offset over the whole
+column.
+
+The signal definitions are the ones CanDecoderDBC loads, and the bit
+positions come from CanDbcCodegen.signal_shift(), so the values match
+``CanDecoderDBC.decode_message`` frame by frame. Choice signals come out as
+their numbers (cantools ``decode_choices=False``), scaled integer signals as
+int64 and everything else as float64. Frames of a multiplexed message with
+an unknown multiplexer value are skipped, as CanDecoderDBC fails on them.
+Messages that cannot be vectorized (several multiplexer levels, a scaled
+multiplexer, a float signal that is not 32 or 64 bits) are left out of the
+series, with a note, instead of failing the whole DBC.
+
+    decoder = BatchDecoder()                          # NTUR + Xsens DBC
+    series = decoder.decode(decoder.load_frames('LOGS/can_log_20250731_004455.canlog'))
+    series[0x193]['Speed'].timestamp, series[0x193]['Speed'].value
+    values_at(series, timestamp)                      # state after fast-forwarding to timestamp
+    DashboardDecoder.restore(values_at(...))          # ... written into a dashboard's store
+
+Needs the ``numpy`` package.
+"""
+
+from typing import Dict, NamedTuple
+
+from cantools.database.conversion import IdentityConversion, LinearIntegerConversion
+
+from CanDbcCodegen import DBC_FILES, signal_shift, unsupported_reason
+from CanDecoderDBC import CanDecoderDBC
+from WheelOdometry import select_frames
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PAYLOAD_BYTES = 8
+FRAME_DTYPE = None if np is None else np.dtype([('timestamp', '<u8'), ('can_id', '<u4'), ('dlc', 'u1'),
+                                                ('data', 'u1', (PAYLOAD_BYTES,))])
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Batch decoding needs the 'numpy' package (pip install numpy)")
+
+
+class SignalSeries(NamedTuple):
+    timestamp: 'np.ndarray'  # uint64 us, log order
+    value: 'np.ndarray'
+
+
+def frames_from_records(records):
+    """
+    FRAME_DTYPE array from (timestamp us, can_id, data) tuples, e.g. the rows a CSV replay holds.
+
+    Payloads are cut to 8 bytes and zero-padded.
+    """
+    _require_numpy()
+    records = list(records)
+    frames = np.zeros(len(records), FRAME_DTYPE)
+    if records:
+        timestamps, can_ids, payloads = zip(*records)
+        frames['timestamp'] = timestamps
+        frames['can_id'] = can_ids
+        frames['dlc'] = [min(len(data), PAYLOAD_BYTES) for data in payloads]
+        frames['data'] = np.frombuffer(b''.join(bytes(data[:PAYLOAD_BYTES]).ljust(PAYLOAD_BYTES, b'\0')
+                                                for data in payloads), np.uint8).reshape(-1, PAYLOAD_BYTES)
+    return frames
+
+
+class _SignalPlan:
+    """Precomputed extraction of one signal from the uint64 payload columns"""
+
+    __slots__ = ('name', 'source', 'shift', 'mask', 'length', 'signed', 'is_float', 'identity', 'integer',
+                 'scale', 'offset', 'multiplexer_ids')
+
+    def __init__(self, signal):
+        self.name = signal.name
+        # Payloads are always 8 bytes wide, zero past the message length
+        self.source, self.shift = signal_shift(signal, PAYLOAD_BYTES)
+        self.length = signal.length
+        self.mask = np.uint64((1 << signal.length) - 1)
+        self.signed = signal.is_signed
+        self.is_float = signal.is_float
+        if self.is_float and self.length not in (32, 64):
+            raise ValueError(f"Float signal {signal.name} must be 32 or 64 bits long")
+        # Same conversion cantools picks: identity, integer or float linear
+        conversion = signal.conversion
+        conversion = getattr(conversion, '_conversion', conversion)  # numbers behind the choices
+        self.identity = isinstance(conversion, IdentityConversion)
+        self.integer = isinstance(conversion, LinearIntegerConversion)
+        self.scale = conversion.scale
+        self.offset = conversion.offset
+        self.multiplexer_ids = signal.multiplexer_ids
+
+    def raw(self, column):
+        raw = column >> np.uint64(self.shift) if self.shift else column
+        if self.length < 64:
+            raw = raw & self.mask
+        if self.is_float:
+            bits = np.uint32 if self.length == 32 else np.uint64
+            return raw.astype(bits).view(np.float32 if self.length == 32 else np.float64).astype(np.float64)
+        if not self.signed:
+            return raw if self.length == 64 else raw.astype(np.int64)
+        raw = raw.astype(np.int64)
+        if self.length < 64:
+            sign = np.int64(1 << (self.length - 1))
+            raw = (raw ^ sign) - sign
+        return raw
+
+    def value(self, column):
+        raw = self.raw(column)
+        if self.identity:
+            return raw
+        if self.integer:
+            return raw * int(self.scale) + int(self.offset)
+        return raw.astype(np.float64) * self.scale + self.offset
+
+
+class _MessagePlan:
+    def __init__(self, message):
+        reason = unsupported_reason(message)
+        if reason is not None:
+            raise ValueError(f"{message.name}: {reason}")
+        self.name = message.name
+        self.signals = [_SignalPlan(signal) for signal in message.signals]
+        self.sources = {plan.source for plan in self.signals}
+        multiplexers = [plan for plan, signal in zip(self.signals, message.signals) if signal.is_multiplexer]
+        self.multiplexer = multiplexers[0] if multiplexers else None
+        self.multiplexer_ids = sorted({mux_id for signal in message.signals
+                                       for mux_id in (signal.multiplexer_ids or [])})
+
+    def decode(self, timestamps, data):
+        payload = np.ascontiguousarray(data)
+        columns = {}
+        if 'le' in self.sources:
+            columns['le'] = payload.view('<u8').ravel()
+        if 'be' in self.sources:
+            columns['be'] = payload.view('>u8').ravel().astype(np.uint64)
+
+        mux = None
+        if self.multiplexer is not None:
+            mux = self.multiplexer.raw(columns[self.multiplexer.source])
+            valid = np.isin(mux, self.multiplexer_ids)
+            if not valid.all():
+                timestamps, mux = timestamps[valid], mux[valid]
+                columns = {source: column[valid] for source, column in columns.items()}
+
+        series = {}
+        for plan in self.signals:
+            value = plan.value(columns[plan.source])
+            if plan.multiplexer_ids:
+                rows = np.isin(mux, plan.multiplexer_ids)
+                series[plan.name] = SignalSeries(timestamps[rows], value[rows])
+            else:
+                series[plan.name] = SignalSeries(timestamps, value)
+        return series
+
+
+class BatchDecoder:
+    def __init__(self, decoders=None):
+        """
+        Args:
+            decoders: CanDecoderDBC instances whose messages are decoded (first definition
+                of an ID wins); default one per DBC in CanDbcCodegen.DBC_FILES
+        """
+        _require_numpy()
+        if decoders is None:
+            decoders = [CanDecoderDBC(path) for path in DBC_FILES]
+        self.decoders = decoders
+        self.messages = {}
+        for decoder in decoders:
+            for message in decoder.db.messages:
+                if message.frame_id not in self.messages and message.length <= PAYLOAD_BYTES:
+                    self.messages[message.frame_id] = message
+        self.plans = {}
+        for frame_id, message in self.messages.items():
+            if not message.signals:
+                continue  # heartbeats have nothing to decode
+            try:
+                self.plans[frame_id] = _MessagePlan(message)
+            except ValueError as e:
+                print(f"[BatchDecode] 0x{frame_id:X} not decoded: {e}")
+
+    def message_name(self, can_id):
+        plan = self.plans.get(can_id)
+        return plan.name if plan else None
+
+    def load_frames(self, filename, bus=None):
+        """FRAME_DTYPE array of the frames of a recorded segment (any format) this decoder knows"""
+        timestamps, can_ids, dlcs, data = select_frames(filename, self.plans, bus)
+        frames = np.empty(len(timestamps), FRAME_DTYPE)
+        frames['timestamp'] = timestamps
+        frames['can_id'] = can_ids
+        frames['dlc'] = dlcs
+        frames['data'] = data
+        return frames
+
+    def decode(self, frames) -> Dict[int, Dict[str, SignalSeries]]:
+        """
+        Decode a FRAME_DTYPE array.
+
+        Returns:
+            {can_id: {signal name: SignalSeries}} for every known ID present in ``frames``,
+            each series in the order of ``frames``
+        """
+        can_ids = frames['can_id']
+        order = np.argsort(can_ids, kind='stable')
+        sorted_ids = can_ids[order]
+        bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+        decoded = {}
+        for rows in np.split(order, bounds):
+            if not len(rows):
+                continue
+            can_id = int(can_ids[rows[0]])
+            plan = self.plans.get(can_id)
+            if plan is not None:
+                decoded[can_id] = plan.decode(frames['timestamp'][rows], frames['data'][rows])
+        return decoded
+
+
+def values_at(decoded, timestamp, keys=None):
+    """
+    Last value of every signal at or before ``timestamp`` (us), the state a replay
+    reaches when it fast-forwards there. Signals without a frame yet are left out.
+    Assumes each series is in time order, as the logger writes it.
+
+    Args:
+        keys: {can_id: index signal} of messages that fill an array a few values at a time
+            (cell voltages); their state is the last frame of every index value
+
+    Returns:
+        {can_id: {signal name: value}}, for the IDs in ``keys`` a list of those in index order
+    """
+    keys = keys or {}
+    state = {}
+    for can_id, signals in decoded.items():
+        key = keys.get(can_id)
+        if key in signals:
+            end = np.searchsorted(signals[key].timestamp, timestamp, side='right')
+            # Last row of each index: first occurrence in the reversed rows
+            _, last = np.unique(signals[key].value[:end][::-1], return_index=True)
+            if len(last):
+                state[can_id] = [{name: series.value[row].item() for name, series in signals.items()}
+                                 for row in end - 1 - last]
+            continue
+        values = {}
+        for name, series in signals.items():
+            index = np.searchsorted(series.timestamp, timestamp, side='right') - 1
+            if index >= 0:
+                values[name] = series.value[index].item()
+        if values:
+            state[can_id] = values
+    return state
+
+
+def select_frames_by_length(frames, min_lengths):
+    """
+    The frames whose ID is in ``min_lengths`` and whose DLC reaches that ID's minimum:
+    a decoder that skips short frames (DashboardDecoder.min_lengths) sees the same
+    state in the series as when it decodes frame by frame.
+    """
+    can_ids, inverse = np.unique(frames['can_id'], return_inverse=True)
+    required = np.array([min_lengths.get(int(can_id), PAYLOAD_BYTES + 1) for can_id in can_ids], np.uint8)
+    return frames[frames['dlc'] >= required[inverse.ravel()]]
@@ -0,0 +1,384 @@
+"""
+儀表板解碼模組
+One DBC-driven decoder for the dashboards (GUIvehical-v5 / GUIvehical-v6_dev).
+
+The wire format of every frame the dashboards show is described once, in
+dbc/NTUR_dashboard.dbc (can0, plus the RTK and trip distance frames on
+can1) and the Xsens DBC. CanDbcCodegen compiles them into one decode
+function per message. What is left here is the mapping from DBC signals to
+the dashboard schema (DATA_SCHEMA): ROUTES lists, for each frame, the
+schema leaves its decoded values go to and, for the few frames that need
+it, a function turning the values into what the dashboard shows (a
+datetime, heartbeat flags, the sign of the reversed inverter, km/h).
+
+    store = SignalStore(SignalLayout(DATA_SCHEMA))
+    decoder = DashboardDecoder(store)
+    decoder.process(msg.arbitration_id, msg.data)     # False for a frame without a route
+
+Routes whose group is missing from the store's layout are left out, so an
+app with a smaller schema (no xsens group, fewer inverters) shares the same
+table. Frames shorter than their DBC length are ignored, as the
+hand-written decoders did; a route with a smaller min_length decodes the
+missing bytes as zeros.
+
+``restore()`` writes values decoded elsewhere through the same routes: a
+replay that jumps rebuilds the state at the target from
+CanBatchDecode.values_at() instead of waiting for every frame to come by.
+
+CanDecoder.py uses the same engine for the older frame generation, with its
+own DBC (dbc/NTUR_legacy.dbc), schema and routes.
+"""
+
+import os
+import time
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional
+
+from CanDbcCodegen import DBC_DIR, load_decoders
+from CanSignalStore import LAST_UPDATE, OBJECT
+
+DBC_FILES = [os.path.join(DBC_DIR, 'NTUR_dashboard.dbc'),
+             os.path.join(DBC_DIR, 'Xsens_MTi_600_series_reverse.dbc')]
+
+INVERTERS = {1: 'FL', 2: 'FR', 3: 'RL', 4: 'RR'}
+# 反向安裝的馬達：回授與目標扭矩變號
+REVERSED_INVERTER = 3
+
+# 0x100 的日期從 1984-01-01 起算 (Unix time)
+EPOCH_1984 = 441763200
+COVARIANCE_TYPES = {0: "UNKNOWN", 1: "APPROXIMATED", 2: "DIAGONAL_KNOWN", 3: "KNOWN"}
+BMS_ALIVE = 0x7F
+INVERTER_ALIVE = 0x05
+
+# data_store 的結構：float / int / object 為尚未收到的訊號，LAST_UPDATE 為該組最後更新時間
+DATA_SCHEMA = {
+    'timestamp': {'time': object, 'last_update': LAST_UPDATE},
+    'gps': {
+        'lat': float, 'lon': float, 'alt': float, 'status': int,
+        'last_update': LAST_UPDATE
+    },
+    'covariance': {
+        'values': [0.0] * 9, 'type': 0, 'type_name': 'UNKNOWN',
+        'last_update': LAST_UPDATE
+    },
+    'velocity': {
+        'linear_x': float, 'linear_y': float, 'linear_z': float,
+        'angular_x': float, 'angular_y': float, 'angular_z': float,
+        'magnitude': float, 'speed_kmh': float,
+        'last_update': LAST_UPDATE
+    },
+    'accumulator': {
+        'soc': int, 'voltage': float, 'current': float, 'temperature': float,
+        'status': int, 'heartbeat': object, 'capacity': float,
+        'cell_voltages': [float] * 105, 'cell_temperatures': [int] * 224,
+        'last_update': LAST_UPDATE
+    },
+    'inverters': {
+        inv_num: {'name': name, 'status': object, 'torque': float, 'speed': int,
+                  'control_word': int, 'target_torque': float,
+                  'dc_voltage': float, 'dc_current': float,
+                  'mos_temp': float, 'mcu_temp': float, 'motor_temp': float,
+                  'heartbeat': object, 'last_update': LAST_UPDATE}
+        for inv_num, name in INVERTERS.items()
+    },
+    'vcu': {
+        'steer': int, 'accel': int, 'apps1': int,
+        'apps2': int, 'brake': int, 'bse1': int, 'bse2': int,
+        'suspF': float, 'suspR': float,
+        'last_update': LAST_UPDATE},
+    'imu': {
+        'accel_km6': {'x': float, 'y': float, 'z': float},
+        'accel_km308': {'x': float, 'y': float, 'z': float},
+        'gyro': {'x': float, 'y': float, 'z': float},
+        'euler': {'roll': float, 'pitch': float, 'yaw': float},
+        'mag': {'x': float, 'y': float, 'z': float},
+        'last_update': LAST_UPDATE
+    },
+    'imu2': {
+        'accel': {'x': float, 'y': float, 'z': float},
+        'gyro': {'x': float, 'y': float, 'z': float},
+        'quaternion': {'w': float, 'x': float, 'y': float, 'z': float},
+        'last_update': LAST_UPDATE
+    },
+    'distance': {
+        'trip_distance_km': float,
+        'last_update': LAST_UPDATE
+    },
+    'xsens': {
+        'quaternion': {'q0': float, 'q1': float, 'q2': float, 'q3': float},
+        'delta_v': {'x': float, 'y': float, 'z': float, 'exponent': int},
+        'rate_of_turn': {'gyr_x': float, 'gyr_y': float, 'gyr_z': float},
+        'delta_q': {'dq0': float, 'dq1': float, 'dq2': float, 'dq3': float},
+        'acceleration': {'acc_x': float, 'acc_y': float, 'acc_z': float},
+        'magnetic_field': {'mag_x': float, 'mag_y': float, 'mag_z': float},
+        'gps': {'lat': float, 'lon': float, 'alt': float},
+        'velocity': {'vel_x': float, 'vel_y': float, 'vel_z': float},
+        'last_update': LAST_UPDATE
+    }
+}
+
+
+class Route(NamedTuple):
+    """The decoded values of ``frame_id`` go to the leaves ``names`` under ``group``"""
+    frame_id: int
+    group: tuple
+    names: tuple
+    convert: Optional[Callable] = None  # DBC values (signal order) -> values in ``names`` order
+    min_length: Optional[int] = None    # shortest frame decoded, default the DBC length
+
+
+class ArrayRoute(NamedTuple):
+    """Frames of an index followed by N values, written to the list ``group + (name,)`` from that index on"""
+    frame_id: int
+    group: tuple
+    name: str
+    label: str  # for the invalid index message
+
+
+def _timestamp(values):
+    ms_since_midnight, days_since_1984 = values
+    return (datetime.fromtimestamp(EPOCH_1984 + (days_since_1984 * 86400) + (ms_since_midnight / 1000.0)),)
+
+
+def _covariance_type(values):
+    covariance_type, = values
+    return covariance_type, COVARIANCE_TYPES.get(covariance_type, "UNKNOWN")
+
+
+def _speed(values):
+    magnitude, = values
+    return magnitude, magnitude * 3.6
+
+
+def _trip_distance(values):
+    distance_mm, = values
+    distance_km = distance_mm / 1000000.0
+    print(f"[DISTANCE] Received: {distance_mm} mm = {distance_km:.3f} km")
+    return distance_km,
+
+
+def _bms_heartbeat(values):
+    return values[0] == BMS_ALIVE,
+
+
+def _inverter_heartbeat(values):
+    return values[0] == INVERTER_ALIVE,
+
+
+def _inverter_status(values):
+    status_word1, status_word2, torque, speed = values
+    return (status_word1, status_word2), torque, speed
+
+
+def _reversed_inverter_status(values):
+    status_word1, status_word2, torque, speed = values
+    return (status_word1, status_word2), -torque, speed
+
+
+def _reversed_inverter_command(values):
+    control_word, target_torque = values
+    return control_word, -target_torque
+
+
+def _inverter_routes(inv_num, reversed_inverter=REVERSED_INVERTER):
+    group = ('inverters', inv_num)
+    reversed_ = inv_num == reversed_inverter
+    return [
+        Route(0x190 + inv_num, group, ('status', 'torque', 'speed'),
+              _reversed_inverter_status if reversed_ else _inverter_status),
+        Route(0x210 + inv_num, group, ('control_word', 'target_torque'),
+              _reversed_inverter_command if reversed_ else None),
+        Route(0x290 + inv_num, group, ('dc_voltage', 'dc_current')),
+        Route(0x390 + inv_num, group, ('mos_temp', 'mcu_temp', 'motor_temp')),
+        Route(0x710 + inv_num, group, ('heartbeat',), _inverter_heartbeat),
+    ]
+
+
+# CAN ID -> data_store；0x410-0x418 (位置共變異數) 在 DBC 中有定義，儀表板不顯示
+ROUTES = [
+    # Timestamp / VCU
+    Route(0x100, ('timestamp',), ('time',), _timestamp),
+    Route(0x181, ('vcu',), ('steer', 'accel', 'apps1', 'apps2', 'brake', 'bse1', 'bse2')),
+    Route(0x381, ('vcu',), ('suspF', 'suspR')),
+    # GPS (status byte optional)
+    Route(0x400, ('gps',), ('lat', 'lon')),
+    Route(0x401, ('gps',), ('alt', 'status'), min_length=2),
+    Route(0x419, ('covariance',), ('type', 'type_name'), _covariance_type),
+    # 速度 / 里程
+    *[Route(frame_id, ('velocity',), (name,)) for frame_id, name in zip(
+        range(0x402, 0x408), ('linear_x', 'linear_y', 'linear_z', 'angular_x', 'angular_y', 'angular_z'))],
+    Route(0x408, ('velocity',), ('magnitude', 'speed_kmh'), _speed),
+    Route(0x440, ('distance',), ('trip_distance_km',), _trip_distance),
+    # Accumulator
+    ArrayRoute(0x601, ('accumulator',), 'cell_voltages', 'cell voltage'),
+    ArrayRoute(0x651, ('accumulator',), 'cell_temperatures', 'temperature'),
+    Route(0x710, ('accumulator',), ('heartbeat',), _bms_heartbeat),
+    Route(0x501, ('accumulator',), ('status', 'temperature', 'voltage')),
+    Route(0x511, ('accumulator',), ('soc', 'current', 'capacity')),
+    # Inverter
+    *[route for inv_num in INVERTERS for route in _inverter_routes(inv_num)],
+    # IMU
+    Route(0x185, ('imu', 'accel_km6'), ('x', 'y', 'z')),
+    Route(0x426, ('imu', 'accel_km308'), ('x', 'y', 'z')),
+    Route(0x285, ('imu', 'gyro'), ('x', 'y', 'z')),
+    Route(0x385, ('imu', 'euler'), ('roll', 'pitch', 'yaw')),
+    Route(0x429, ('imu', 'mag'), ('x', 'y', 'z')),
+    # IMU2
+    Route(0x188, ('imu2', 'accel'), ('x', 'y', 'z')),
+    Route(0x288, ('imu2', 'gyro'), ('x', 'y', 'z')),
+    Route(0x488, ('imu2', 'quaternion'), ('w', 'x', 'y', 'z')),
+    # Xsens IMU (can1)
+    Route(0x021, ('xsens', 'quaternion'), ('q0', 'q1', 'q2', 'q3')),
+    Route(0x031, ('xsens', 'delta_v'), ('x', 'y', 'z', 'exponent')),
+    Route(0x032, ('xsens', 'rate_of_turn'), ('gyr_x', 'gyr_y', 'gyr_z')),
+    Route(0x033, ('xsens', 'delta_q'), ('dq0', 'dq1', 'dq2', 'dq3')),
+    Route(0x034, ('xsens', 'acceleration'), ('acc_x', 'acc_y', 'acc_z')),
+    Route(0x041, ('xsens', 'magnetic_field'), ('mag_x', 'mag_y', 'mag_z')),
+    Route(0x071, ('xsens', 'gps'), ('lat', 'lon')),
+    Route(0x072, ('xsens', 'gps'), ('alt',)),
+    Route(0x076, ('xsens', 'velocity'), ('vel_x', 'vel_y', 'vel_z')),
+]
+
+
+class DashboardDecoder:
+    def __init__(self, store, routes=ROUTES, dbc_files=DBC_FILES):
+        """
+        Args:
+            store: CanSignalStore.SignalStore the decoded values are written to
+            routes: Route / ArrayRoute table; routes to groups the store's layout lacks are skipped
+            dbc_files: DBC files describing the routed frames, first definition of an ID wins
+        """
+        self.store = store
+        self.dbc_files = dbc_files
+        self.values = load_decoders(dbc_files).VALUES
+        self.handlers = {}     # CAN ID -> handler(data, timestamp)
+        self.writers = {}      # CAN ID -> writer(DBC values in signal order, timestamp)
+        self.min_lengths = {}  # CAN ID -> shortest frame decoded
+        self.array_keys = {}   # CAN ID of an ArrayRoute -> its index signal
+        for route in routes:
+            try:
+                store.layout.leaves(*route.group)
+            except KeyError:
+                continue
+            if isinstance(route, ArrayRoute):
+                bind = self._bind_array
+                self.array_keys[route.frame_id] = self._message(route)[0][0]
+            else:
+                bind = self._bind
+            handler, writer, min_length = bind(route)
+            self.handlers[route.frame_id] = handler
+            self.writers[route.frame_id] = writer
+            self.min_lengths[route.frame_id] = min_length
+
+    def process(self, can_id, data, timestamp=None):
+        """
+        Decode one frame into the store.
+
+        Returns:
+            False when no route handles ``can_id``
+        """
+        handler = self.handlers.get(can_id)
+        if handler is None:
+            return False
+        handler(data, time.time() if timestamp is None else timestamp)
+        return True
+
+    def restore(self, state, timestamp=None):
+        """
+        Write already decoded values into the store through the routes, e.g. the state
+        CanBatchDecode.values_at(..., keys=decoder.array_keys) finds at a replay's seek target.
+
+        Args:
+            state: {can_id: {signal name: value}}, or a list of those per index for the
+                IDs in array_keys; IDs without a route and incomplete messages are skipped
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        for can_id, frames in state.items():
+            writer = self.writers.get(can_id)
+            if writer is None:
+                continue
+            names = self.values[can_id][0]
+            for values in frames if isinstance(frames, list) else (frames,):
+                if all(name in values for name in names):
+                    writer(tuple(values[name] for name in names), timestamp)
+
+    def _message(self, route):
+        """(signal names, DBC length, tuple decode function) of the routed frame"""
+        try:
+            return self.values[route.frame_id]
+        except KeyError:
+            sources = ', '.join(os.path.basename(path) for path in self.dbc_files)
+            raise ValueError(f"0x{route.frame_id:03X} is not a message without multiplexing in {sources}") from None
+
+    def _bind(self, route):
+        names, length, decode = self._message(route)
+        layout = self.store.layout
+        slots = [layout.slot(*route.group, name) for name in route.names]
+        convert = route.convert
+        if convert is None and len(names) != len(slots):
+            raise ValueError(f"0x{route.frame_id:03X} has {len(names)} signals, "
+                             f"the route maps {len(slots)}")
+        min_length = length if route.min_length is None else route.min_length
+        if min_length < length:
+            # 較短的 frame 補零到 DBC 長度，缺少的訊號解碼為 0
+            decode_full = decode
+
+            def decode(data):
+                if len(data) < length:
+                    data = bytes(data) + bytes(length - len(data))
+                return decode_full(data)
+
+        first = slots[0]
+        if slots == list(range(first, first + len(slots))) and OBJECT not in [layout.kinds[slot] for slot in slots]:
+            set_many = self.store.set_many
+            if convert is None:
+                def write(values, timestamp):
+                    set_many(first, values, timestamp)
+
+                def handler(data, timestamp):
+                    if len(data) >= min_length:
+                        set_many(first, decode(data), timestamp)
+            else:
+                def write(values, timestamp):
+                    set_many(first, convert(values), timestamp)
+
+                def handler(data, timestamp):
+                    if len(data) >= min_length:
+                        set_many(first, convert(decode(data)), timestamp)
+            return handler, write, min_length
+
+        setters = [(self.store.set_object if layout.kinds[slot] == OBJECT else self.store.set, slot)
+                   for slot in slots]
+
+        def write(values, timestamp):
+            if convert is not None:
+                values = convert(values)
+            for (setter, slot), value in zip(setters, values):
+                setter(slot, value, timestamp)
+
+        def handler(data, timestamp):
+            if len(data) >= min_length:
+                write(decode(data), timestamp)
+        return handler, write, min_length
+
+    def _bind_array(self, route):
+        names, length, decode = self._message(route)
+        layout = self.store.layout
+        first = layout.slot(*route.group, route.name)
+        stride = len(names) - 1
+        # 索引為 stride 的倍數，且整組數值不超出陣列
+        last_index = len(layout.leaves(*route.group, route.name)) - stride
+        set_many = self.store.set_many
+        label = f"[{route.group[0].upper()}] Invalid {route.label} index"
+
+        def write(values, timestamp):
+            index, *values = values
+            if index % stride != 0 or index > last_index:
+                print(f"{label}: {index}")
+                return
+            set_many(first + index, values, timestamp)
+
+        def handler(data, timestamp):
+            if len(data) >= length:
+                write(decode(data), timestamp)
+        return handler, write, length
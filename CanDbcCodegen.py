@@ -0,0 +1,364 @@
+"""
+DBC 解碼程式碼產生器
+Compiles DBC files into specialised Python decode functions.
+
+cantools decodes every frame generically: it walks the message's signal
+list, extracts each field through a bit-level codec and goes through a
+conversion object per signal. For a fixed DBC all of that is known in
+advance, so this module writes one function per message that reads the
+payload as one integer and extracts every signal with a precomputed shift,
+mask, sign extension and scale:
+
+    def decode_193_Status1(data):
+        le = int.from_bytes(data[:8], 'little')
+        return {
+            'Status_word1': le & 0xFF,
+            'Torque': ((((le >> 16) & 0xFFFF) ^ 0x8000) - 0x8000) * 0.025 + 0,
+            ...
+        }
+
+Motorola (big-endian) signals are read from the big-endian integer of the
+payload. Messages made only of whole, byte-aligned 8/16/32/64-bit fields
+in one byte order (most of the car's frames) skip the integer and read all
+fields with one precompiled ``struct.unpack_from()`` instead. The result
+is the dict cantools' ``message.decode(data)`` returns, including choice
+values (NamedSignalValue) and multiplexed messages; an unknown
+multiplexer value raises the same DecodeError.
+
+Messages the generator cannot compile (several multiplexer levels, or a
+scaled multiplexer) are left out and listed in ``UNSUPPORTED``; callers
+decode them with cantools, as CanDecoderDBC does.
+
+For messages without multiplexing a second function returns the same
+values as a tuple in signal order, without building a dict per frame, for
+callers that map signals by position (CanDashboardDecoder.py).
+
+The generated module is cached on disk under ``dbc/generated/``, keyed by
+the DBC contents, and regenerated only when a DBC changes:
+
+    from CanDbcCodegen import load_decoders
+    decoders = load_decoders()                  # NTUR + Xsens DBC
+    name, length, decode = decoders.DECODERS[0x193]
+    decode(data)                                # data at least ``length`` bytes
+    names, length, values = decoders.VALUES[0x193]
+    values(data)                                # (1, 2, 40.0, ...) in the order of ``names``
+
+    python3 CanDbcCodegen.py                    # (re)generate, print the module path
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import os
+import types
+
+import cantools
+from cantools.database.conversion import IdentityConversion, NamedSignalConversion
+from cantools.database.utils import format_or
+
+DBC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dbc')
+DBC_FILES = [os.path.join(DBC_DIR, 'NTUR_EP6_260122.dbc'),
+             os.path.join(DBC_DIR, 'Xsens_MTi_600_series_reverse.dbc')]
+CACHE_DIR = os.path.join(DBC_DIR, 'generated')
+# Bump when the generated code changes, so cached modules are regenerated
+CODEGEN_VERSION = 3
+
+
+def signal_shift(signal, length):
+    """
+    Where ``signal`` sits in a ``length``-byte payload read as one integer.
+
+    Returns:
+        ('le', shift) for Intel signals, counted in the little-endian integer;
+        ('be', shift) for Motorola signals, counted in the big-endian integer.
+        The raw value is ``(integer >> shift) & ((1 << signal.length) - 1)``.
+    """
+    total_bits = length * 8
+    if signal.byte_order == 'little_endian':
+        source, shift = 'le', signal.start
+    else:
+        # DBC Motorola start bit is the MSB in sawtooth numbering; count from
+        # the MSB of byte 0 in the big-endian integer instead
+        msb = (signal.start // 8) * 8 + (7 - signal.start % 8)
+        source, shift = 'be', total_bits - msb - signal.length
+    if shift < 0 or shift + signal.length > total_bits:
+        raise ValueError(f"Signal {signal.name} does not fit in {length} bytes")
+    return source, shift
+
+
+def _raw_expression(signal, length):
+    """Expression extracting the raw (unscaled) value of ``signal`` from ``le`` / ``be``"""
+    total_bits = length * 8
+    source, shift = signal_shift(signal, length)
+
+    expression = f"({source} >> {shift})" if shift else source
+    if shift + signal.length < total_bits:
+        expression = f"({expression} & 0x{(1 << signal.length) - 1:X})"
+
+    if signal.is_float:
+        if signal.length not in (32, 64):
+            raise ValueError(f"Float signal {signal.name} must be 32 or 64 bits long")
+        return f"_FLOAT{signal.length}.unpack(_UINT{signal.length}.pack({expression}))[0]"
+    if signal.is_signed:
+        sign = 1 << (signal.length - 1)
+        return f"(({expression} ^ 0x{sign:X}) - 0x{sign:X})"
+    return expression
+
+
+_STRUCT_CODES = {(8, False): 'B', (8, True): 'b', (16, False): 'H', (16, True): 'h',
+                 (32, False): 'I', (32, True): 'i', (64, False): 'Q', (64, True): 'q'}
+
+
+def _struct_fields(message):
+    """
+    struct format reading every signal of ``message`` with one unpack_from().
+
+    Returns:
+        (format, signal indexes in the order unpack_from returns them), or None
+        when a signal is not a whole byte-aligned field, signals overlap or
+        multi-byte signals mix byte orders
+    """
+    fields = []
+    orders = set()
+    for index, signal in enumerate(message.signals):
+        if signal.byte_order == 'little_endian':
+            aligned = signal.start % 8 == 0
+        else:
+            aligned = signal.start % 8 == 7  # Motorola start bit is the MSB of the first byte
+        if not aligned or signal.length not in (8, 16, 32, 64):
+            return None
+        if signal.is_float:
+            code = {32: 'f', 64: 'd'}.get(signal.length)
+            if code is None:
+                return None
+        else:
+            code = _STRUCT_CODES[signal.length, signal.is_signed]
+        if signal.length > 8:
+            orders.add(signal.byte_order)
+        fields.append((signal.start // 8, signal.length // 8, code, index))
+    if not fields or len(orders) > 1:
+        return None
+
+    fmt = '>' if orders == {'big_endian'} else '<'
+    position = 0
+    for first, size, code, _ in sorted(fields):
+        if first < position:
+            return None
+        if first > position:
+            fmt += f"{first - position}x"
+        fmt += code
+        position = first + size
+    if position > message.length:
+        return None
+    return fmt, [index for _, _, _, index in sorted(fields)]
+
+
+def _scaled_expression(conversion, raw):
+    """Same arithmetic as the cantools conversion, so results are bit-identical"""
+    if isinstance(conversion, IdentityConversion):
+        return raw
+    return f"{raw} * {conversion.scale!r} + {conversion.offset!r}"
+
+
+def _identifier(text):
+    return ''.join(char if char.isalnum() else '_' for char in text)
+
+
+def unsupported_reason(message):
+    """Why ``message`` cannot be compiled, None if it can"""
+    multiplexers = [signal for signal in message.signals if signal.is_multiplexer]
+    if len(multiplexers) > 1:
+        return "only one level of multiplexing is supported"
+    if multiplexers and not isinstance(multiplexers[0].conversion, IdentityConversion):
+        return f"scaled multiplexer {multiplexers[0].name}"
+    return None
+
+
+def _message_function(message, lines, constants, values_lines):
+    """
+    Append the decode function of ``message`` to ``lines`` and, when it is not
+    multiplexed, its tuple variant to ``values_lines``.
+
+    Returns:
+        (function name, tuple function name or None)
+    """
+    reason = unsupported_reason(message)
+    if reason is not None:
+        raise ValueError(f"{message.name}: {reason}")
+    suffix = f"{message.frame_id:X}_{_identifier(message.name)}"
+    function = f"decode_{suffix}"
+    length = message.length
+    signals = message.signals
+    uses = {('le' if signal.byte_order == 'little_endian' else 'be') for signal in signals}
+
+    body = []
+    struct_fields = _struct_fields(message)
+    if struct_fields is not None:
+        fmt, order = struct_fields
+        layout = f"_STRUCT_{message.frame_id:X}"
+        constants.append(f"{layout} = struct.Struct({fmt!r})")
+        targets = ', '.join(f"x{index}" for index in order)
+        body.append(f"    {targets}{',' if len(order) == 1 else ''} = {layout}.unpack_from(data)")
+    else:
+        if 'le' in uses:
+            body.append(f"    le = int.from_bytes(data[:{length}], 'little')")
+        if 'be' in uses:
+            body.append(f"    be = int.from_bytes(data[:{length}], 'big')")
+
+    values = {}
+    for index, signal in enumerate(signals):
+        raw = f"x{index}" if struct_fields is not None else _raw_expression(signal, length)
+        conversion = signal.conversion
+        if isinstance(conversion, NamedSignalConversion):
+            table = f"_CHOICES_{message.frame_id:X}_{index}"
+            constants.append(f"{table} = {{")
+            for value, choice in conversion.choices.items():
+                constants.append(f"    {int(value)}: NamedSignalValue({int(value)}, {str(choice)!r}, "
+                                 f"{getattr(choice, 'comments', None)!r}),")
+            constants.append("}")
+            body.append(f"    r{index} = {raw}")
+            body.append(f"    v{index} = {table}.get(r{index})")
+            body.append(f"    if v{index} is None:")
+            body.append(f"        v{index} = {_scaled_expression(conversion._conversion, f'r{index}')}")
+            values[signal.name] = f"v{index}"
+        else:
+            values[signal.name] = _scaled_expression(conversion, raw)
+
+    lines.append(f"def {function}(data):")
+    lines += body
+    multiplexers = [signal for signal in signals if signal.is_multiplexer]
+    if not multiplexers:
+        _append_return(lines, signals, values, '    ')
+        values_function = f"values_{suffix}"
+        values_lines.append(f"def {values_function}(data):")
+        values_lines += body
+        if signals:
+            values_lines.append("    return (")
+            values_lines += [f"        {values[signal.name]}," for signal in signals]
+            values_lines.append("    )")
+        else:
+            values_lines.append("    return ()")
+        values_lines += ["", ""]
+        return function, values_function
+    mux = multiplexers[0]
+    mux_raw = f"x{signals.index(mux)}" if struct_fields is not None else _raw_expression(mux, length)
+    lines.append(f"    mux = {mux_raw}")
+    values[mux.name] = 'mux'
+    mux_ids = sorted({mux_id for signal in signals for mux_id in (signal.multiplexer_ids or [])})
+    for mux_id in mux_ids:
+        # cantools order: signals outside the multiplexing first, then the selected group
+        active = ([signal for signal in signals if not signal.multiplexer_ids]
+                  + [signal for signal in signals if signal.multiplexer_ids and mux_id in signal.multiplexer_ids])
+        lines.append(f"    if mux == {mux_id}:")
+        _append_return(lines, active, values, '        ')
+    lines.append(f"    raise DecodeError(f'expected multiplexer id {format_or(mux_ids)}, but got {{mux}}')")
+    return function, None
+
+
+def _append_return(lines, signals, values, indent):
+    lines.append(f"{indent}return {{")
+    for signal in signals:
+        lines.append(f"{indent}    {signal.name!r}: {values[signal.name]},")
+    lines.append(f"{indent}}}")
+
+
+def _load_database(path):
+    return cantools.database.load_file(path)
+
+
+def generate_source(dbc_paths=DBC_FILES):
+    """
+    Python source of the decode functions of every message in ``dbc_paths``.
+
+    A frame ID defined in several files is taken from the first one.
+    The module defines ``DECODERS``: frame ID -> (message name, length, function),
+    ``VALUES``: frame ID -> (signal names, length, tuple function), the latter
+    for messages without multiplexing, and ``UNSUPPORTED``: frame ID ->
+    (message name, reason) for the messages left out.
+    """
+    header = ["# Generated by CanDbcCodegen.py, do not edit",
+              f"# Sources: {', '.join(os.path.basename(path) for path in dbc_paths)}",
+              "import struct", "",
+              "from cantools.database.errors import DecodeError"]
+    constants = []
+    functions = []
+    values_functions = []
+    decoders = []
+    values = []
+    unsupported = []
+    seen = set()
+    any_choices = False
+    for path in dbc_paths:
+        for message in _load_database(path).messages:
+            if message.frame_id in seen or message.is_container:
+                continue
+            seen.add(message.frame_id)
+            reason = unsupported_reason(message)
+            if reason is not None:
+                unsupported.append(f"    0x{message.frame_id:X}: ({message.name!r}, {reason!r}),")
+                continue
+            any_choices |= any(signal.choices for signal in message.signals)
+            function, values_function = _message_function(message, functions, constants, values_functions)
+            functions.append("")
+            functions.append("")
+            decoders.append(f"    0x{message.frame_id:X}: ({message.name!r}, {message.length}, {function}),")
+            if values_function is not None:
+                names = tuple(signal.name for signal in message.signals)
+                values.append(f"    0x{message.frame_id:X}: ({names!r}, {message.length}, {values_function}),")
+    if any_choices:
+        header.append("from cantools.database.namedsignalvalue import NamedSignalValue")
+    header += ["", "_FLOAT32 = struct.Struct('<f')", "_FLOAT64 = struct.Struct('<d')",
+               "_UINT32 = struct.Struct('<I')", "_UINT64 = struct.Struct('<Q')", ""]
+    return '\n'.join(header + constants + ["", ""] + functions + values_functions
+                     + ["DECODERS = {"] + decoders + ["}", "", "VALUES = {"] + values + ["}", "",
+                                                  "UNSUPPORTED = {"] + unsupported + ["}", ""])
+
+
+def cache_key(dbc_paths):
+    digest = hashlib.sha256(f"codegen {CODEGEN_VERSION}".encode())
+    for path in dbc_paths:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def load_decoders(dbc_paths=DBC_FILES, cache_dir=CACHE_DIR):
+    """
+    The generated decoder module for ``dbc_paths``, from the disk cache when up to date.
+
+    Falls back to compiling in memory when ``cache_dir`` is not writable.
+    """
+    module_name = f"dbc_decoders_{cache_key(dbc_paths)}"
+    path = os.path.join(cache_dir, module_name + '.py')
+    if not os.path.exists(path):
+        source = generate_source(dbc_paths)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(source)
+            os.replace(temp_path, path)  # concurrent generators never see a partial module
+        except OSError as e:
+            print(f"[DBC] Cannot cache generated decoders in {cache_dir}: {e}")
+            module = types.ModuleType(module_name)
+            exec(compile(source, module_name, 'exec'), module.__dict__)
+            return module
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the DBC decode functions and cache them")
+    parser.add_argument('dbc', nargs='*', default=DBC_FILES, help="DBC files, first definition of an ID wins")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    args = parser.parse_args()
+    module = load_decoders(args.dbc, args.cache_dir)
+    print(f"{len(module.DECODERS)} messages -> {module.__file__}")
+    for frame_id, (name, reason) in sorted(module.UNSUPPORTED.items()):
+        print(f"  0x{frame_id:X} {name} left to cantools: {reason}")
+
+
+if __name__ == "__main__":
+    main()
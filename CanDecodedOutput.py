@@ -0,0 +1,356 @@
+"""
+CAN 訊號解碼輸出模組
+Decoded-signal columnar output written next to the raw log segments.
+
+An optional decoder process decodes the logged frames with the DBC files in
+``dbc/`` and writes one columnar file per message and segment::
+
+    LOGS/can_log_20250731_004455.canlog
+    LOGS/can_log_20250731_004455.canlog.signals/
+        193_Status1.parquet        timestamp (us), bus, one column per signal
+        281_States.parquet
+        ...
+        manifest.json              frames, rows per file, dropped frames
+
+Rows are appended in chunks (a Parquet row group or an Arrow IPC record
+batch every ``chunk_rows`` rows of a message). ``parquet`` is what pandas
+and most tools open directly; ``arrow`` (IPC stream, ``.arrows``) stays
+readable up to the last chunk if the logger loses power, a Parquet file
+without its footer does not.
+
+The segment writer feeds a ``DecodedTap`` (see CanLogFormat.SegmentWriter),
+so the decoded output opens, rotates and closes exactly with the raw
+segment. Taps run on the log writer thread and hand each written batch to
+the decoder process through a bounded queue; when the decoder falls behind,
+batches are dropped from the decoded output (counted in the manifest), never
+from the raw log, and nothing ever waits on the decoder. A segment close that
+finds the queue full is counted in ``closes_dropped`` and sent again with the
+next batch, so the decoded files are still finalized, only later.
+
+``decode_segment()`` produces the same output for a recorded segment offline.
+Needs the ``pyarrow`` and ``cantools`` packages, imported only once decoded
+output is used.
+"""
+
+import json
+import multiprocessing
+import os
+import queue
+import signal
+
+from CanLogFormat import iter_log_records
+
+# Imported on first use by _require_packages(): pyarrow alone costs tens of MB
+# of memory in a logger running without decoded output
+cantools = None
+pa = None
+pq = None
+
+DBC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dbc')
+SIGNALS_SUFFIX = '.signals'
+MANIFEST_NAME = 'manifest.json'
+DECODED_FORMATS = ('parquet', 'arrow')
+DECODED_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrows'}
+CHUNK_ROWS = 10000
+
+
+def signals_path(segment):
+    return segment + SIGNALS_SUFFIX
+
+
+def _require_packages():
+    global cantools, pa, pq
+    if pa is not None:
+        return
+    try:
+        import cantools as cantools_module
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RuntimeError(f"Decoded output needs the 'pyarrow' and 'cantools' packages "
+                           f"(pip install pyarrow cantools): {e}")
+    cantools, pa, pq = cantools_module, pyarrow, pyarrow.parquet
+
+
+def load_messages(dbc_dir=DBC_DIR):
+    """Every message of the DBC files in ``dbc_dir`` by frame ID (files in name order, first one wins)"""
+    _require_packages()
+    messages = {}
+    for name in sorted(os.listdir(dbc_dir)):
+        if not name.endswith('.dbc'):
+            continue
+        for message in cantools.database.load_file(os.path.join(dbc_dir, name)).messages:
+            if message.signals:
+                messages.setdefault(message.frame_id, message)
+    return messages
+
+
+def _is_integer_signal(sig):
+    return (not sig.is_float and float(sig.scale).is_integer() and float(sig.offset).is_integer())
+
+
+class MessageColumns:
+    """Decoded rows of one message, buffered column by column"""
+
+    def __init__(self, message):
+        self.message = message
+        self.file_name = f"{message.frame_id:X}_{message.name}"
+        self.signal_names = [sig.name for sig in message.signals]
+        self.integer = [_is_integer_signal(sig) for sig in message.signals]
+        self.columns = {'timestamp': [], 'bus': []}
+        self.columns.update((name, []) for name in self.signal_names)
+        self.rows = 0  # rows buffered since the last chunk
+
+    def add(self, timestamp, bus_num, data):
+        """Decode one payload (padded to the DBC length), False if it does not decode"""
+        if len(data) < self.message.length:
+            data = bytes(data) + bytes(self.message.length - len(data))
+        try:
+            values = self.message.decode(data, decode_choices=False)
+        except Exception:
+            return False
+        self.columns['timestamp'].append(timestamp)
+        self.columns['bus'].append(bus_num)
+        for name, integer in zip(self.signal_names, self.integer):
+            value = values.get(name)  # absent in multiplexed messages
+            if value is not None:
+                value = int(value) if integer else float(value)
+            self.columns[name].append(value)
+        self.rows += 1
+        return True
+
+    def schema(self):
+        fields = [pa.field('timestamp', pa.int64()), pa.field('bus', pa.uint8())]
+        fields += [pa.field(name, pa.int64() if integer else pa.float64())
+                   for name, integer in zip(self.signal_names, self.integer)]
+        return pa.schema(fields)
+
+    def take_table(self):
+        """The buffered rows as a pyarrow Table, clearing the buffer"""
+        schema = self.schema()
+        table = pa.table({name: pa.array(values, type=schema.field(name).type)
+                          for name, values in self.columns.items()}, schema=schema)
+        for values in self.columns.values():
+            values.clear()
+        self.rows = 0
+        return table
+
+
+class SegmentSignals:
+    """Decoded output of one segment: a chunked file per message in ``<segment>.signals/``"""
+
+    def __init__(self, segment, messages, output_format='parquet', chunk_rows=CHUNK_ROWS):
+        _require_packages()
+        if output_format not in DECODED_FORMATS:
+            raise ValueError(f"Unknown decoded format '{output_format}', expected one of {DECODED_FORMATS}")
+        self.segment = segment
+        self.directory = signals_path(segment)
+        self.messages = messages
+        self.output_format = output_format
+        self.chunk_rows = chunk_rows
+        self.buffers = {}  # frame ID -> MessageColumns
+        self.writers = {}  # frame ID -> ParquetWriter / RecordBatchStreamWriter
+        self.rows = {}  # file name -> rows written
+        self.frames = 0
+        self.undecoded = 0
+
+    def add(self, records):
+        """Decode (timestamp, can_id, flags, bus, dlc, data) records"""
+        for timestamp, can_id, _, bus_num, _, data in records:
+            self.frames += 1
+            buffer = self.buffers.get(can_id)
+            if buffer is None:
+                message = self.messages.get(can_id)
+                if message is None:
+                    continue
+                buffer = self.buffers[can_id] = MessageColumns(message)
+            if not buffer.add(timestamp, bus_num, data):
+                self.undecoded += 1
+            elif buffer.rows >= self.chunk_rows:
+                self._write_chunk(can_id, buffer)
+
+    def _write_chunk(self, can_id, buffer):
+        table = buffer.take_table()
+        writer = self.writers.get(can_id)
+        if writer is None:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, buffer.file_name + DECODED_EXTENSIONS[self.output_format])
+            if self.output_format == 'parquet':
+                writer = pq.ParquetWriter(path, table.schema, compression='zstd')
+            else:
+                writer = pa.ipc.new_stream(path, table.schema)
+            self.writers[can_id] = writer
+        writer.write_table(table)
+        self.rows[buffer.file_name] = self.rows.get(buffer.file_name, 0) + table.num_rows
+
+    def close(self, dropped_frames=0):
+        """Write the remaining rows, close every file and write the manifest"""
+        for can_id, buffer in self.buffers.items():
+            if buffer.rows:
+                self._write_chunk(can_id, buffer)
+        for writer in self.writers.values():
+            writer.close()
+        if not self.writers and not dropped_frames:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        manifest = {
+            'segment': os.path.basename(self.segment),
+            'format': self.output_format,
+            'frames': self.frames,
+            'undecoded': self.undecoded,
+            'dropped_frames': dropped_frames,
+            'rows': self.rows,
+        }
+        with open(os.path.join(self.directory, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+
+
+def decode_segment(segment, dbc_dir=DBC_DIR, output_format='parquet', chunk_rows=CHUNK_ROWS, messages=None):
+    """Write the decoded output of a recorded segment (any format), returns the manifest rows"""
+    signals = SegmentSignals(segment, messages if messages is not None else load_messages(dbc_dir),
+                             output_format, chunk_rows)
+    batch = []
+    for record in iter_log_records(segment):
+        batch.append(record)
+        if len(batch) >= 4096:
+            signals.add(batch)
+            batch.clear()
+    signals.add(batch)
+    signals.close()
+    return signals.rows
+
+
+def read_signals(segment, message):
+    """
+    Decoded rows of one message of a segment as a pyarrow Table.
+
+    Args:
+        message: message name (e.g. 'States') or frame ID
+    """
+    _require_packages()
+    directory = signals_path(segment)
+    for name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(name)
+        if extension not in DECODED_EXTENSIONS.values():
+            continue
+        frame_id, message_name = stem.split('_', 1)
+        if (int(frame_id, 16) if isinstance(message, int) else message_name) != message:
+            continue
+        path = os.path.join(directory, name)
+        if extension == DECODED_EXTENSIONS['parquet']:
+            return pq.read_table(path)
+        with pa.ipc.open_stream(path) as reader:
+            batches = []
+            try:
+                for batch in reader:
+                    batches.append(batch)
+            except (OSError, ValueError):
+                pass  # cut off by a power loss after the last complete chunk
+            return pa.Table.from_batches(batches, reader.schema)
+    raise KeyError(f"No decoded output for message {message!r} in {directory}")
+
+
+def _decoder_main(work, dbc_dir, output_format, chunk_rows):
+    """Body of the decoder process"""
+    # Ctrl-C is handled by the logger, which stops this process through the queue
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    os.nice(10)
+    messages = load_messages(dbc_dir)
+    segments = {}
+    while True:
+        item = work.get()
+        if item is None:
+            break
+        kind, segment = item[0], item[1]
+        try:
+            if kind == 'frames':
+                if segment not in segments:
+                    segments[segment] = SegmentSignals(segment, messages, output_format, chunk_rows)
+                segments[segment].add(item[2])
+            elif kind == 'close':
+                signals = segments.pop(segment, None) or SegmentSignals(segment, messages, output_format,
+                                                                        chunk_rows)
+                signals.close(dropped_frames=item[2])
+        except Exception as e:
+            print(f"[decoder] {os.path.basename(segment)}: {e}")
+    for signals in segments.values():
+        signals.close()
+
+
+class DecodedTap:
+    """Collects the records of one segment on the log writer thread, see SegmentWriter"""
+
+    def __init__(self, output, segment):
+        self.output = output
+        self.segment = segment
+        self.records = []
+        self.dropped = 0  # frames the decoder queue had no room for
+
+    def add(self, timestamp, can_id, flags, bus_num, dlc, data):
+        self.records.append((timestamp, can_id, flags, bus_num, dlc, bytes(data)))
+
+    def flush(self):
+        if self.output.pending_closes:
+            self.output.put_pending_closes()
+        if self.records:
+            try:
+                self.output.work.put_nowait(('frames', self.segment, self.records))
+            except queue.Full:
+                self.dropped += len(self.records)
+            self.records = []
+
+    def close(self):
+        self.flush()
+        self.output.pending_closes.append(('close', self.segment, self.dropped))
+        if not self.output.put_pending_closes():
+            self.output.closes_dropped += 1
+            print(f"Decoder queue full, {os.path.basename(self.segment)} decoded output finalized later")
+
+
+class DecodedOutput:
+    """The decoder process and its work queue; ``tap()`` connects a segment writer to it"""
+
+    def __init__(self, dbc_dir=DBC_DIR, output_format='parquet', chunk_rows=CHUNK_ROWS, queue_batches=256):
+        """
+        Args:
+            queue_batches: written batches (up to a few thousand frames each) waiting for the decoder
+        """
+        _require_packages()
+        if output_format not in DECODED_FORMATS:
+            raise ValueError(f"Unknown decoded format '{output_format}', expected one of {DECODED_FORMATS}")
+        self.work = multiprocessing.Queue(queue_batches)
+        # Segment closes that found the queue full, retried with the next batch (log writer thread only)
+        self.pending_closes = []
+        self.closes_dropped = 0
+        self.process = multiprocessing.Process(target=_decoder_main,
+                                               args=(self.work, dbc_dir, output_format, chunk_rows),
+                                               name="can-decoder", daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def tap(self, segment):
+        return DecodedTap(self, segment)
+
+    def put_pending_closes(self):
+        """Queue the pending segment closes in order without waiting, True once none is left"""
+        while self.pending_closes:
+            try:
+                self.work.put_nowait(self.pending_closes[0])
+            except queue.Full:
+                return False
+            self.pending_closes.pop(0)
+        return True
+
+    def stop(self, timeout=30.0):
+        """Let the decoder finish the queued work and close its files"""
+        try:
+            for item in self.pending_closes:
+                self.work.put(item, timeout=timeout)
+            self.pending_closes = []
+            self.work.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
@@ -1,94 +1,157 @@
+"""
+CAN 解碼模組 (上一代車的 frame 格式)
+Decoder of the older frame generation, used by CMD_dashboard, app_usedecode,
+car_app_decoder and GUIlaptop.
+
+The frames are described in dbc/NTUR_legacy.dbc (cells at 0x190/0x390,
+accumulator at 0x290/0x490, IMU at 0x180-0x430) and decoded through
+CanDashboardDecoder.DashboardDecoder, with ROUTES mapping them to this
+generation's schema (DATA_SCHEMA). Left out of the table: the position
+covariance (0x410-0x418), kept in position_covariance outside the store,
+and the logger status / health frames (0x421, 0x422).
+
+    decoder = CanDecoder()
+    decoder.process_can_message(msg)
+    decoder.data_store['vcu']['steer']
+"""
 import can
-import struct
-from datetime import datetime
+import os
 import time
-
+from datetime import datetime
+from functools import partial
+
+from CanDashboardDecoder import DATA_SCHEMA as DASHBOARD_SCHEMA
+from CanDashboardDecoder import (INVERTERS, ArrayRoute, DashboardDecoder, Route, _bms_heartbeat,
+                                 _covariance_type, _inverter_routes, _speed, _timestamp)
+from CanDbcCodegen import DBC_DIR
+from CanHealth import HEALTH_STATUS_ID, unpack_status
+from CanSignalStore import LAST_UPDATE, SignalLayout, SignalStore
+
+DBC_FILES = [os.path.join(DBC_DIR, 'NTUR_legacy.dbc')]
+
+CONNECTED_INVERTERS = (3, 4)  # 1 FL / 2 FR 未接
+
+# 0x181 的方向盤原始值 x100，CanDecoder 再除以 10000 顯示
+STEER_DIVISOR = 10000
+COCKPIT = ('steer', 'accel', 'apps1', 'apps2', 'brake', 'bse1', 'bse2')
+COVARIANCE_IDS = range(0x410, 0x419)
+
+# data_store 的結構沿用 CanDashboardDecoder.DATA_SCHEMA，只換掉這一代不同的群組：
+# VCU 沒有懸吊、IMU / IMU2 的感測器不同，多了 CAN Logging 狀態，沒有里程與 Xsens
+DATA_SCHEMA = {
+    **{group: fields for group, fields in DASHBOARD_SCHEMA.items()
+       if group not in ('vcu', 'imu', 'imu2', 'distance', 'xsens')},
+    'vcu': {
+        'steer': float, 'accel': int, 'apps1': int,
+        'apps2': int, 'brake': int, 'bse1': int, 'bse2': int,
+        'last_update': LAST_UPDATE},
+    'canlogging': {
+        'is_recording': False, 'start_time': object, 'start_timestamp': object,
+        'last_update': float,
+        'health': object, 'incomplete': False, 'health_update': float
+    },
+    'imu': {
+        'lsm6_accel': {'x': float, 'y': float, 'z': float},
+        'lsm303_accel': {'x': float, 'y': float, 'z': float},
+        'gyro': {'x': float, 'y': float, 'z': float},
+        'euler_angles': {'roll': float, 'pitch': float, 'yaw': float},
+        'magnetometer': {'x': float, 'y': float, 'z': float},
+        'last_update': LAST_UPDATE
+    },
+    'imu2': {
+        'acceleration': {'x': float, 'y': float, 'z': float},
+        'gyration': {'x': float, 'y': float, 'z': float},
+        'quaternion': {'w': float, 'x': float, 'y': float, 'z': float},
+        'last_update': LAST_UPDATE
+    }
+}
+
+# CanDecoder 的 data_store：只有已接上的 inverter
+STORE_LAYOUT = SignalLayout(dict(DATA_SCHEMA, inverters={inv_num: DATA_SCHEMA['inverters'][inv_num]
+                                                         for inv_num in CONNECTED_INVERTERS}))
+
+
+def _steer(values):
+    steer, *pedals = values
+    return (steer / STEER_DIVISOR, *pedals)
+
+
+# CAN ID -> data_store
+ROUTES = [
+    # Timestamp / VCU
+    Route(0x100, ('timestamp',), ('time',), _timestamp),
+    Route(0x181, ('vcu',), COCKPIT, _steer),
+    # GPS (status byte optional)
+    Route(0x400, ('gps',), ('lat', 'lon')),
+    Route(0x401, ('gps',), ('alt', 'status'), min_length=2),
+    Route(0x419, ('covariance',), ('type', 'type_name'), _covariance_type),
+    # 速度
+    *[Route(frame_id, ('velocity',), (name,)) for frame_id, name in zip(
+        range(0x402, 0x408), ('linear_x', 'linear_y', 'linear_z', 'angular_x', 'angular_y', 'angular_z'))],
+    Route(0x408, ('velocity',), ('magnitude', 'speed_kmh'), _speed),
+    # Accumulator
+    ArrayRoute(0x190, ('accumulator',), 'cell_voltages', 'cell voltage'),
+    ArrayRoute(0x390, ('accumulator',), 'cell_temperatures', 'temperature'),
+    Route(0x710, ('accumulator',), ('heartbeat',), _bms_heartbeat),
+    Route(0x290, ('accumulator',), ('status', 'temperature', 'voltage')),
+    Route(0x490, ('accumulator',), ('soc', 'current', 'capacity')),
+    # Inverter
+    # 這一代沒有反向安裝的馬達
+    *[route for inv_num in INVERTERS for route in _inverter_routes(inv_num, reversed_inverter=None)],
+    # IMU
+    Route(0x180, ('imu', 'lsm6_accel'), ('x', 'y', 'z')),
+    Route(0x182, ('imu', 'lsm303_accel'), ('x', 'y', 'z')),
+    Route(0x280, ('imu', 'gyro'), ('x', 'y', 'z')),
+    Route(0x380, ('imu', 'euler_angles'), ('roll', 'pitch', 'yaw')),
+    Route(0x430, ('imu', 'magnetometer'), ('x', 'y', 'z')),
+    # IMU2
+    Route(0x188, ('imu2', 'acceleration'), ('x', 'y', 'z')),
+    Route(0x288, ('imu2', 'gyration'), ('x', 'y', 'z')),
+    Route(0x488, ('imu2', 'quaternion'), ('w', 'x', 'y', 'z')),
+]
 
 
 class CanDecoder:
-    def __init__(self):
-        # Data storage
-        self.data_store = {
-            'timestamp': {'time': None, 'last_update': None},
-            'gps': {
-                'lat': None, 'lon': None, 'alt': None, 'status': None,
-                'last_update': None
-            },
-            'covariance': {
-                'values': [0.0] * 9, 'type': 0, 'type_name': 'UNKNOWN',
-                'last_update': None
-            },
-            'velocity': {
-                'linear_x': None, 'linear_y': None, 'linear_z': None,
-                'angular_x': None, 'angular_y': None, 'angular_z': None,
-                'magnitude': None, 'speed_kmh': None,
-                'last_update': None
-            },
-            'accumulator': {
-                'soc': None, 'voltage': None, 'current': None, 'temperature': None,
-                'status': None, 'heartbeat': None, 'capacity': None,
-                'cell_voltages': [None] * 105, 'cell_temperatures': [None] * 224,
-                'last_update': None
-            },
-            'inverters': {
-                # 1: {'name': 'FL', 'status': None, 'torque': None, 'speed': None,
-                #     'control_word': None, 'target_torque': None,
-                #     'dc_voltage': None, 'dc_current': None,
-                #     'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                #     'heartbeat': None, 'last_update': None},
-                # 2: {'name': 'FR', 'status': None, 'torque': None, 'speed': None,
-                #     'control_word': None, 'target_torque': None,
-                #     'dc_voltage': None, 'dc_current': None,
-                #     'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                #     'heartbeat': None, 'last_update': None},
-                3: {'name': 'RL', 'status': None, 'torque': None, 'speed': None,
-                    'control_word': None, 'target_torque': None,
-                    'dc_voltage': None, 'dc_current': None,
-                    'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                    'heartbeat': None, 'last_update': None},
-                4: {'name': 'RR', 'status': None, 'torque': None, 'speed': None,
-                    'control_word': None, 'target_torque': None,
-                    'dc_voltage': None, 'dc_current': None,
-                    'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                    'heartbeat': None, 'last_update': None}
-            },
-            'vcu': {
-                'steer': None, 'accel': None, 'apps1': None,    
-                'apps2': None, 'brake': None, 'bse1': None, 'bse2': None,
-                'last_update': None},
-            'canlogging': {
-                'is_recording': False, 'start_time': None, 'start_timestamp': None,
-                'last_update': None
-            },
-            'imu': {
-                'lsm6_accel': {'x': None, 'y': None, 'z': None},
-                'lsm303_accel': {'x': None, 'y': None, 'z': None},
-                'gyro': {'x': None, 'y': None, 'z': None},
-                'euler_angles': {'roll': None, 'pitch': None, 'yaw': None},
-                'magnetometer': {'x': None, 'y': None, 'z': None},
-                'last_update': None
-            },
-            'imu2': {
-                'acceleration': {'x': None, 'y': None, 'z': None},
-                'gyration': {'x': None, 'y': None, 'z': None},
-                'quaternion': {'w': None, 'x': None, 'y': None, 'z': None},
-                'last_update': None
-            }
-        }
-        
+    def __init__(self, history=None, layout=STORE_LAYOUT, routes=ROUTES):
+        """
+        Args:
+            history: 選用的 CanSignalHistory.SignalHistory (以同一個 layout 建立)，保留所選訊號的近期數值
+            layout: data_store 的 SignalLayout，layout 沒有的群組不解碼 (GUIlaptop 沒有 IMU)
+            routes: Route / ArrayRoute 表，預設 ROUTES
+        """
+        # 所有訊號存放在預先配置的陣列中 (見 CanSignalStore)，data_store 為其 dict 檢視
+        self.store = SignalStore(layout, history=history)
+        self.history = history
+
         self.message_count = 0
         self.running = True
-        
-        # Legacy GPS數據暫存
-        self.gps_lat = None
-        self.gps_lon = None
-        self.gps_alt = None
-        
-        # Position covariance 暫存
+
+        # Position covariance 暫存 (不在 data_store 中)
         self.position_covariance = [0.0] * 9
-        self.position_covariance_type = 0
 
-   
+        self.dashboard = DashboardDecoder(self.store, routes, DBC_FILES)
+        self.handlers = self._build_handlers()
+
+    @property
+    def data_store(self):
+        """目前狀態的巢狀 dict（每次呼叫重新產生，寫入請經由 self.store）"""
+        return self.store.view()
+
+    def _build_handlers(self):
+        """CAN ID -> handler(data, timestamp)：ROUTES 之外再加上位置共變異數與 CAN Logging 狀態"""
+        handlers = dict(self.dashboard.handlers)
+        for can_id in COVARIANCE_IDS:
+            _, _, decode = self.dashboard.values[can_id]
+            handlers[can_id] = partial(self.decode_position_covariance, index=can_id - COVARIANCE_IDS.start,
+                                       decode=decode)
+        try:
+            self.canlogging_slots = {path[-1]: slot for path, slot, _ in self.store.layout.leaves('canlogging')}
+        except KeyError:
+            return handlers
+        handlers[0x421] = self.decode_canlogging_status
+        handlers[HEALTH_STATUS_ID] = self.decode_canlogging_health
+        return handlers
+
     def create_mock_can_message(self, can_id, data):
         """創建模擬的 CAN 訊息對象"""
         class MockCanMessage:
@@ -98,257 +161,40 @@ class CanDecoder:
         
         return MockCanMessage(can_id, data)
 
-    def process_can_message(self, msg: can.Message):
-        can_id = msg.arbitration_id
-        data = msg.data
-        
-        try:
-            # Timestamp 解碼
-            if can_id == 0x100:
-                self.decode_timestamp(data)
-            
-            elif can_id == 0x181:
-                self.decode_vcu_cockpit(data)
-            # GPS 解碼
-            elif can_id == 0x400:
-                self.decode_gps_basic(data)
-            elif can_id == 0x401:
-                self.decode_gps_extended(data)
-            elif 0x410 <= can_id <= 0x418:
-                self.decode_position_covariance(data, can_id - 0x410)
-            elif can_id == 0x419:
-                self.decode_position_covariance_type(data)
-
-            # IMU 數據解碼
-            elif can_id == 0x180:
-                self.decode_lsm6_accelerometer(data)
-            elif can_id == 0x182:
-                self.decode_lsm303_accelerometer(data)
-            elif can_id == 0x280:
-                self.decode_angular_velocity(data)
-            elif can_id == 0x380:
-                self.decode_euler_angles(data)
-            elif can_id == 0x430:
-                self.decode_magnetometer(data)
-            
-            # IMU2 數據解碼
-            elif can_id == 0x188:
-                self.decode_imu2_acceleration(data)
-            elif can_id == 0x288:
-                self.decode_imu2_gyration(data)
-            elif can_id == 0x488:
-                self.decode_imu2_quaternion(data)
+    def process(self, can_id, data, timestamp=None):
+        """
+        Decode one frame into the store.
 
-            # 速度資料解碼
-            elif can_id == 0x402:
-                self.decode_velocity_x(data)
-            elif can_id == 0x403:
-                self.decode_velocity_y(data)
-            elif can_id == 0x404:
-                self.decode_velocity_z(data)
-            elif can_id == 0x405:
-                self.decode_angular_x(data)
-            elif can_id == 0x406:
-                self.decode_angular_y(data)
-            elif can_id == 0x407:
-                self.decode_angular_z(data)
-            elif can_id == 0x408:
-                self.decode_velocity_magnitude(data)
-            
-            # Accumulator 解碼
-            elif can_id == 0x190:
-                self.decode_cell_voltage(data)
-            elif can_id == 0x390:
-                self.decode_accumulator_temperature(data)
-            elif can_id == 0x710:
-                self.decode_accumulator_heartbeat(data)
-            elif can_id == 0x290:
-                self.decode_accumulator_status(data)
-            elif can_id == 0x490:
-                self.decode_accumulator_state(data)
-            
-            # Inverter 解碼
-            elif 0x191 <= can_id <= 0x194:
-                inv_num = can_id - 0x190
-                self.decode_inverter_status(data, inv_num)
-            elif 0x291 <= can_id <= 0x294:
-                inv_num = can_id - 0x290
-                self.decode_inverter_state(data, inv_num)
-            elif 0x391 <= can_id <= 0x394:
-                inv_num = can_id - 0x390
-                self.decode_inverter_temperature(data, inv_num)
-            elif 0x711 <= can_id <= 0x714:
-                inv_num = can_id - 0x710
-                self.decode_inverter_heartbeat(data, inv_num)
-            elif 0x210 <= can_id <= 0x214:
-                inv_num = can_id - 0x210
-                self.decode_inverter_control(data, inv_num)
-            
-            # CAN Logging 狀態解碼
-            elif can_id == 0x421:
-                self.decode_canlogging_status(data)
-            
+        Returns:
+            False when no handler decodes ``can_id``
+        """
+        handler = self.handlers.get(can_id)
+        if handler is None:
+            return False
+        handler(data, time.time() if timestamp is None else timestamp)
+        return True
 
+    def process_can_message(self, msg: can.Message):
+        # One dict lookup per frame, decoded at the current time (same as process() without a timestamp)
+        handler = self.handlers.get(msg.arbitration_id)
+        if handler is None:
+            return
+        try:
+            handler(msg.data, time.time())
         except Exception as e:
-            print(f"Failed to decode CAN message ID 0x{can_id:03X}: {e}")
-    # IMU 解碼函數
-    def decode_lsm6_accelerometer(self, data):
-        """解碼 LSM6DSOX 加速度計數據 (0x180)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數
-            ax_raw, ay_raw, az_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 轉換回 m/s² (scale_factor = 1000 / 9.80665)
-            scale_factor = 1000
-            ax = ax_raw / scale_factor
-            ay = ay_raw / scale_factor
-            az = az_raw / scale_factor
-            
-            current_time = time.time()
-            self.data_store['imu']['lsm6_accel']['x'] = ax
-            self.data_store['imu']['lsm6_accel']['y'] = ay
-            self.data_store['imu']['lsm6_accel']['z'] = az
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_lsm303_accelerometer(self, data):
-        """解碼 LSM303AGR 加速度計數據 (0x181)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數
-            ax_raw, ay_raw, az_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 轉換回 mm/s² (scale_factor = 1000)
-            scale_factor = 1000
-            ax = ax_raw / scale_factor
-            ay = ay_raw / scale_factor
-            az = az_raw / scale_factor
-            
-            current_time = time.time()
-            self.data_store['imu']['lsm303_accel']['x'] = ax
-            self.data_store['imu']['lsm303_accel']['y'] = ay
-            self.data_store['imu']['lsm303_accel']['z'] = az
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_angular_velocity(self, data):
-        """解碼角速度數據 (0x280)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數
-            gx_raw, gy_raw, gz_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 轉換回 rad/s (scale_factor = 10 * 57.2958)
-            scale_factor = 10 * 57.2958
-            gx = gx_raw / scale_factor
-            gy = gy_raw / scale_factor
-            gz = gz_raw / scale_factor
-            
-            current_time = time.time()
-            self.data_store['imu']['gyro']['x'] = gx
-            self.data_store['imu']['gyro']['y'] = gy
-            self.data_store['imu']['gyro']['z'] = gz
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_euler_angles(self, data):
-        """解碼歐拉角數據 (0x380)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數
-            roll_raw, pitch_raw, yaw_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 轉換回度數 (scale_factor = 100)
-            roll = roll_raw / 100.0
-            pitch = pitch_raw / 100.0
-            yaw = yaw_raw / 100.0
-            
-            current_time = time.time()
-            self.data_store['imu']['euler_angles']['roll'] = roll
-            self.data_store['imu']['euler_angles']['pitch'] = pitch
-            self.data_store['imu']['euler_angles']['yaw'] = yaw
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_magnetometer(self, data):
-        """解碼磁力計數據 (0x430)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數
-            mx_raw, my_raw, mz_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 轉換回 μT (scale_factor = 10)
-            mx = mx_raw / 10.0
-            my = my_raw / 10.0
-            mz = mz_raw / 10.0
-            
-            current_time = time.time()
-            self.data_store['imu']['magnetometer']['x'] = mx
-            self.data_store['imu']['magnetometer']['y'] = my
-            self.data_store['imu']['magnetometer']['z'] = mz
-            self.data_store['imu']['last_update'] = current_time
-
-    # IMU2 解碼函數
-    def decode_imu2_acceleration(self, data):
-        """解碼 IMU2 加速度計數據 (0x188)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數 (little-endian)
-            ax_raw, ay_raw, az_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 根據圖片顯示，單位是 g/LSB (signed)
-            # 直接使用原始值，因為已經是以 g 為單位
-            ax = ax_raw * 0.001  # 將 LSB 轉換為 g
-            ay = ay_raw * 0.001
-            az = az_raw * 0.001
-            
-            current_time = time.time()
-            self.data_store['imu2']['acceleration']['x'] = ax
-            self.data_store['imu2']['acceleration']['y'] = ay
-            self.data_store['imu2']['acceleration']['z'] = az
-            self.data_store['imu2']['last_update'] = current_time
-
-    def decode_imu2_gyration(self, data):
-        """解碼 IMU2 陀螺儀數據 (0x288)"""
-        if len(data) >= 6:
-            # 解包 3 個 16-bit 有號整數 (little-endian)
-            gx_raw, gy_raw, gz_raw = struct.unpack('<hhh', data[0:6])
-            
-            # 根據圖片顯示，單位是 deg/s/LSB (signed)
-            # 直接使用原始值，因為已經是以 deg/s 為單位
-            gx = gx_raw * 0.1  # 將 LSB 轉換為 deg/s
-            gy = gy_raw * 0.1
-            gz = gz_raw * 0.1
-            
-            current_time = time.time()
-            self.data_store['imu2']['gyration']['x'] = gx
-            self.data_store['imu2']['gyration']['y'] = gy
-            self.data_store['imu2']['gyration']['z'] = gz
-            self.data_store['imu2']['last_update'] = current_time
-
-    def decode_imu2_quaternion(self, data):
-        """解碼 IMU2 四元數數據 (0x488)"""
-        if len(data) >= 8:
-            # 解包 4 個 16-bit 有號整數 (little-endian)
-            qw_raw, qx_raw, qy_raw, qz_raw = struct.unpack('<hhhh', data[0:8])
-            
-            # 四元數通常歸一化，範圍在 -1 到 1 之間
-            # 假設原始值需要除以某個縮放因子來歸一化
-            scale_factor = 16384.0  # 常見的四元數縮放因子 (2^14)
-            qw = qw_raw / scale_factor
-            qx = qx_raw / scale_factor
-            qy = qy_raw / scale_factor
-            qz = qz_raw / scale_factor
-            
-            current_time = time.time()
-            self.data_store['imu2']['quaternion']['w'] = qw
-            self.data_store['imu2']['quaternion']['x'] = qx
-            self.data_store['imu2']['quaternion']['y'] = qy
-            self.data_store['imu2']['quaternion']['z'] = qz
-            self.data_store['imu2']['last_update'] = current_time
+            print(f"Failed to decode CAN message ID 0x{msg.arbitration_id:03X}: {e}")
 
     def get_imu_data(self):
         """獲取所有 IMU 數據"""
-        return self.data_store['imu'].copy()
+        return self.store.view('imu')
 
     def get_imu2_data(self):
         """獲取 IMU2 數據"""
-        return self.data_store['imu2'].copy()
+        return self.store.view('imu2')
 
     def print_imu_data(self):
         """打印 IMU 數據（用於調試）"""
-        imu = self.data_store['imu']
+        imu = self.store.view('imu')
         if imu['last_update']:
             print(f"\n=== IMU Data (Last Update: {datetime.fromtimestamp(imu['last_update']).strftime('%H:%M:%S.%f')[:-3]}) ===")
             
@@ -379,7 +225,7 @@ class CanDecoder:
 
     def print_imu2_data(self):
         """打印 IMU2 數據（用於調試）"""
-        imu2 = self.data_store['imu2']
+        imu2 = self.store.view('imu2')
         if imu2['last_update']:
             print(f"\n=== IMU2 Data (Last Update: {datetime.fromtimestamp(imu2['last_update']).strftime('%H:%M:%S.%f')[:-3]}) ===")
             
@@ -397,334 +243,45 @@ class CanDecoder:
         else:
             print("No IMU2 data received yet")
 
-
-
-# define all decode functions
-    def decode_timestamp(self, data):
-        if len(data) >= 6:
-            ms_since_midnight = struct.unpack('<I', data[0:4])[0]
-            days_since_1984 = struct.unpack('<H', data[4:6])[0]
-            
-            base_timestamp = 441763200
-            total_seconds = base_timestamp + (days_since_1984 * 86400) + (ms_since_midnight / 1000.0)
-            decoded_time = datetime.fromtimestamp(total_seconds)
-            
-            current_time = time.time()
-            self.data_store['timestamp']['time'] = decoded_time
-            self.data_store['timestamp']['last_update'] = current_time
-
-    def decode_vcu_cockpit(self, data):
+    def decode_position_covariance(self, data, current_time, index, decode):
         if len(data) >= 8:
-            stear_raw = struct.unpack('<h', data[0:2])[0]
-            accel_raw = data[2] 
-            apps1_raw = data[3]
-            apps2_raw = data[4]
-            brake_raw = data[5]
-            bse1_raw = data[6]
-            bse2_raw = data[7]
-            stear_data = stear_raw *100
-            # 更新 VCU 數據
-            current_time = time.time()
-            self.data_store['vcu']['steer'] = stear_data / 10000
-            self.data_store['vcu']['accel'] = accel_raw
-            self.data_store['vcu']['apps1'] = apps1_raw
-            self.data_store['vcu']['apps2'] = apps2_raw
-            self.data_store['vcu']['brake'] = brake_raw
-            self.data_store['vcu']['bse1'] = bse1_raw
-            self.data_store['vcu']['bse2'] = bse2_raw
-            self.data_store['vcu']['last_update'] = current_time
+            self.position_covariance[index], = decode(data)
 
-    def decode_gps_basic(self, data):
-        if len(data) >= 8:
-            lat_raw = struct.unpack('<i', data[0:4])[0]
-            self.gps_lat = lat_raw / 10**7
-            
-            lon_raw = struct.unpack('<i', data[4:8])[0]
-            self.gps_lon = lon_raw / 10**7
-            
-            current_time = time.time()
-            self.data_store['gps']['lat'] = self.gps_lat
-            self.data_store['gps']['lon'] = self.gps_lon
-            self.data_store['gps']['last_update'] = current_time
-
-    def decode_gps_extended(self, data):
-        if len(data) >= 2:
-            alt_raw = struct.unpack('<h', data[0:2])[0]
-            status_byte = data[2] if len(data) > 2 else 0
-            self.gps_alt = float(alt_raw)
-            
-            current_time = time.time()
-            self.data_store['gps']['alt'] = self.gps_alt
-            self.data_store['gps']['status'] = status_byte
-            self.data_store['gps']['last_update'] = current_time
-
-    def decode_position_covariance(self, data, index):
-        if len(data) >= 8 and 0 <= index < 9:
-            covariance_value = struct.unpack('<d', data[0:8])[0]
-            self.position_covariance[index] = covariance_value
-
-    def decode_position_covariance_type(self, data):
-        if len(data) >= 1:
-            self.position_covariance_type = struct.unpack('<B', data[0:1])[0]
-            
-            covariance_types = {
-                0: "UNKNOWN",
-                1: "APPROXIMATED", 
-                2: "DIAGONAL_KNOWN",
-                3: "KNOWN"
-            }
-            type_name = covariance_types.get(self.position_covariance_type, "UNKNOWN")
-            
-            current_time = time.time()
-            self.data_store['covariance']['type'] = self.position_covariance_type
-            self.data_store['covariance']['type_name'] = type_name
-            self.data_store['covariance']['last_update'] = current_time
-
-    def decode_velocity_x(self, data):
-        if len(data) >= 4:
-            vx_raw = struct.unpack('<i', data[0:4])[0]
-            vx = vx_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['linear_x'] = vx
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_velocity_y(self, data):
-        if len(data) >= 4:
-            vy_raw = struct.unpack('<i', data[0:4])[0]
-            vy = vy_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['linear_y'] = vy
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_velocity_z(self, data):
-        if len(data) >= 4:
-            vz_raw = struct.unpack('<i', data[0:4])[0]
-            vz = vz_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['linear_z'] = vz
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_angular_x(self, data):
-        if len(data) >= 4:
-            wx_raw = struct.unpack('<i', data[0:4])[0]
-            wx = wx_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['angular_x'] = wx
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_angular_y(self, data):
-        if len(data) >= 4:
-            wy_raw = struct.unpack('<i', data[0:4])[0]
-            wy = wy_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['angular_y'] = wy
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_angular_z(self, data):
-        if len(data) >= 4:
-            wz_raw = struct.unpack('<i', data[0:4])[0]
-            wz = wz_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['angular_z'] = wz
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_velocity_magnitude(self, data):
-        if len(data) >= 4:
-            vmag_raw = struct.unpack('<i', data[0:4])[0]
-            vmag = vmag_raw / 1000.0
-            speed_kmh = vmag * 3.6
-            
-            current_time = time.time()
-            self.data_store['velocity']['magnitude'] = vmag
-            self.data_store['velocity']['speed_kmh'] = speed_kmh
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_cell_voltage(self, data):
-        if len(data) >= 8:
-            # 第一個位元組是 index (0, 7, 14, 21, ..., 98)
-            index = data[0]
-            
-            # 驗證 index 是否有效 (應該是 7 的倍數且 <= 98)
-            if index % 7 != 0 or index > 98:
-                print(f"[ACCUMULATOR] Invalid cell voltage index: {index}")
-                return
-            
-            # 接下來 7 個位元組是電壓數值
-            voltages = []
-            for i in range(1, min(8, len(data))):
-                voltage = data[i] * 0.02  # 20mV/LSB
-                voltages.append(voltage)
-            
-            # 更新一維陣列中對應位置的數值
-            current_time = time.time()
-            for i, voltage in enumerate(voltages):
-                array_index = index + i
-                if array_index < 105:  # 確保不超出陣列範圍
-                    self.data_store['accumulator']['cell_voltages'][array_index] = voltage
-            
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_temperature(self, data):
-        if len(data) >= 8:
-            # 第一個位元組是 index (0, 7, 14, 21, ..., 98)
-            index = data[0]
-            
-            # 驗證 index 是否有效 (應該是 7 的倍數且 <= 98)
-            if index % 7 != 0 or index > 217:
-                print(f"[ACCUMULATOR] Invalid temperature index: {index}")
-                return
-            
-            # 接下來 7 個位元組是溫度數值
-            temperatures = []
-            for i in range(1, min(8, len(data))):
-                temp = data[i] - 32  
-                temperatures.append(temp)
-            
-            current_time = time.time()
-            for i, temp in enumerate(temperatures):
-                array_index = index + i
-                if array_index < 224: 
-                    self.data_store['accumulator']['cell_temperatures'][array_index] = temp
-
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_heartbeat(self, data):
-        if len(data) >= 1:
-            heartbeat = data[0] == 0x7F
-            
-            current_time = time.time()
-            self.data_store['accumulator']['heartbeat'] = heartbeat
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_status(self, data):
-        if len(data) >= 7:
-            status = data[0]
-            temp_raw = struct.unpack('<h', data[1:3])[0]
-            voltage_raw = struct.unpack('<I', data[3:7])[0] if len(data) >= 7 else 0
-            
-            temperature = temp_raw * 0.125
-            voltage = voltage_raw / 1024.0
-            
-            current_time = time.time()
-            self.data_store['accumulator']['status'] = status
-            self.data_store['accumulator']['temperature'] = temperature
-            self.data_store['accumulator']['voltage'] = voltage
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_state(self, data):
-        if len(data) >= 5:
-            soc = data[0]
-            current_raw = struct.unpack('<h', data[1:3])[0]
-            capacity_raw = struct.unpack('<h', data[3:5])[0] if len(data) >= 5 else 0
-            
-            current = current_raw * 0.01
-            capacity = capacity_raw * 0.01
-            
-            current_time = time.time()
-            self.data_store['accumulator']['soc'] = soc
-            self.data_store['accumulator']['current'] = current
-            self.data_store['accumulator']['capacity'] = capacity
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_inverter_status(self, data, inv_num):
-        if len(data) >= 6:
-            status_word1 = data[0]
-            status_word2 = data[1]
-            feedback_torque_raw = struct.unpack('<h', data[2:4])[0]
-            speed_raw = struct.unpack('<h', data[4:6])[0]
-            feedback_torque = feedback_torque_raw / 1000.0 * 25
-            speed = speed_raw
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['status'] = (status_word1, status_word2) 
-                self.data_store['inverters'][inv_num]['torque'] = feedback_torque
-                self.data_store['inverters'][inv_num]['speed'] = speed
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_state(self, data, inv_num):
-        if len(data) >= 4:
-            dc_voltage_raw = struct.unpack('<H', data[0:2])[0]
-            dc_current_raw = struct.unpack('<H', data[2:4])[0]
-            
-            dc_voltage = dc_voltage_raw / 100.0
-            dc_current = dc_current_raw / 100.0
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['dc_voltage'] = dc_voltage
-                self.data_store['inverters'][inv_num]['dc_current'] = dc_current
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_temperature(self, data, inv_num):
-        if len(data) >= 6:
-            inv_mos_temp_raw = struct.unpack('<h', data[0:2])[0]
-            mcu_temp_raw = struct.unpack('<h', data[2:4])[0]
-            motor_temp_raw = struct.unpack('<h', data[4:6])[0]
-            
-            inv_mos_temp = inv_mos_temp_raw * 0.1
-            mcu_temp = mcu_temp_raw * 0.1
-            motor_temp = motor_temp_raw * 0.1
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['mos_temp'] = inv_mos_temp
-                self.data_store['inverters'][inv_num]['mcu_temp'] = mcu_temp
-                self.data_store['inverters'][inv_num]['motor_temp'] = motor_temp
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_heartbeat(self, data, inv_num):
-        if len(data) >= 1:
-            heartbeat = data[0] == 0x05
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['heartbeat'] = heartbeat
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_control(self, data, inv_num):
-        if len(data) >= 4:
-            control_word = struct.unpack('<H', data[0:2])[0]
-            target_torque_raw = struct.unpack('<h', data[2:4])[0]
-            target_torque = target_torque_raw / 1000.0 * 20
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['control_word'] = control_word
-                self.data_store['inverters'][inv_num]['target_torque'] = target_torque
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_canlogging_status(self, data):
+    def decode_canlogging_status(self, data, current_time):
         """解碼 CAN Logging 狀態 (0x421)"""
+        slots = self.canlogging_slots
         if len(data) >= 1:
             status_byte = data[0]
-            current_time = time.time()
             
             if status_byte == 0x01:
                 # 正在記錄，解析開始時間
                 if len(data) >= 5:
-                    # 從 bytes 1-4 重建 timestamp (little-endian)
-                    timestamp = (data[4] << 24) | (data[3] << 16) | (data[2] << 8) | data[1]
+                    # bytes 1-4: timestamp (little-endian)
+                    timestamp = int.from_bytes(data[1:5], 'little')
                     start_time = datetime.fromtimestamp(timestamp)
                     
-                    self.data_store['canlogging']['is_recording'] = True
-                    self.data_store['canlogging']['start_time'] = start_time
-                    self.data_store['canlogging']['start_timestamp'] = timestamp
+                    self.store.set_object(slots['is_recording'], True, current_time)
+                    self.store.set_object(slots['start_time'], start_time, current_time)
+                    self.store.set_object(slots['start_timestamp'], timestamp, current_time)
                 else:
                     # 沒有時間資訊，只設定狀態
-                    self.data_store['canlogging']['is_recording'] = True
+                    self.store.set_object(slots['is_recording'], True, current_time)
                     
             elif status_byte == 0x00:
                 # 未記錄
-                self.data_store['canlogging']['is_recording'] = False
-                self.data_store['canlogging']['start_time'] = None
-                self.data_store['canlogging']['start_timestamp'] = None
+                self.store.set_object(slots['is_recording'], False, current_time)
+                self.store.set_object(slots['start_time'], None, current_time)
+                self.store.set_object(slots['start_timestamp'], None, current_time)
             
-            self.data_store['canlogging']['last_update'] = current_time
+            self.store.set(slots['last_update'], current_time, current_time)
 
+    def decode_canlogging_health(self, data, current_time):
+        """解碼 CAN Logging 健康狀態 (0x422)：每秒 frame 數、丟包、寫入延遲、重連次數"""
+        if len(data) >= 8:
+            slots = self.canlogging_slots
+            health = unpack_status(data)
+            self.store.set_object(slots['health'], health, current_time)
+            # 目前記錄檔有遺失 frame 時標記為不完整
+            self.store.set_object(slots['incomplete'], (health['rx_overflow'] > 0
+                                                        or health['queue_dropped'] > 0), current_time)
+            self.store.set(slots['health_update'], current_time, current_time)
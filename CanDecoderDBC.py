@@ -9,15 +9,21 @@ import os
 
 
 class CanDecoderDBC:
-    def __init__(self, dbc_file_path: str):
+    def __init__(self, dbc_file_path: str, decoder: str = 'cantools'):
         """
         初始化 DBC 解碼器
         
         Args:
             dbc_file_path: DBC 檔案的路徑
+            decoder: 'cantools' 使用 cantools 通用解碼；
+                     'generated' 使用 CanDbcCodegen 產生的專用解碼函數（結果相同，較快）
         """
+        if decoder not in ('cantools', 'generated'):
+            raise ValueError(f"Unknown decoder: {decoder}")
         self.dbc_file_path = dbc_file_path
+        self.decoder = decoder
         self.db = None
+        self.decoders = None
         self.load_dbc()
         
     def load_dbc(self):
@@ -30,6 +36,12 @@ class CanDecoderDBC:
             print(f"[DBC] Successfully loaded DBC file: {self.dbc_file_path}")
             print(f"[DBC] Found {len(self.db.messages)} messages in DBC")
             
+            if self.decoder == 'generated':
+                # CAN ID -> (訊息名稱, 長度, 解碼函數)，產生的模組快取在 dbc/generated/；
+                # 產生器不支援的訊息（多層或縮放的多工器）不在其中，由 cantools 解碼
+                from CanDbcCodegen import load_decoders
+                self.decoders = load_decoders([self.dbc_file_path]).DECODERS
+            
         except Exception as e:
             print(f"[DBC] Error loading DBC file: {e}")
             raise
@@ -45,6 +57,8 @@ class CanDecoderDBC:
         Returns:
             解碼後的訊息字典，如果無法解碼則返回 None
         """
+        if self.decoders is not None and can_id in self.decoders:
+            return self._decode_generated(can_id, data)
         try:
             # 嘗試通過 CAN ID 獲取訊息定義
             message = self.db.get_message_by_frame_id(can_id)
@@ -71,6 +85,22 @@ class CanDecoderDBC:
             print(f"[DBC] Error decoding CAN ID 0x{can_id:03X}: {e}")
             return None
     
+    def _decode_generated(self, can_id: int, data: bytes) -> Optional[Dict[str, Any]]:
+        """以產生的解碼函數解碼，回傳格式與 decode_message 相同"""
+        name, length, decode = self.decoders[can_id]
+        if len(data) < length:
+            data = bytes(data) + b'\x00' * (length - len(data))
+        try:
+            signals = decode(data)
+        except Exception as e:
+            print(f"[DBC] Error decoding CAN ID 0x{can_id:03X}: {e}")
+            return None
+        return {
+            'message_name': name,
+            'can_id': can_id,
+            'signals': signals
+        }
+    
     def get_message_name(self, can_id: int) -> Optional[str]:
         """
         根據 CAN ID 獲取訊息名稱
@@ -0,0 +1,148 @@
+"""
+CAN 記錄器健康狀態模組
+Logger health and drop accounting.
+
+Counts everything that makes a log incomplete: frames the kernel dropped
+before the logger read them (RX overflow), frames dropped by a full write
+queue, reconnects after a socket error, and how long writes to the SD card
+stalled. The logger broadcasts the numbers at 1 Hz on HEALTH_STATUS_ID and
+writes the totals of each segment into its trailer and sidecar.
+
+RX overflow has two sources. The interface statistics in sysfs
+(``rx_dropped``, ``rx_over_errors``, ``rx_fifo_errors``) count what the
+controller and driver lost. A frame dropped because the logger's own socket
+receive queue was full is only counted on that socket (SO_RXQ_OVFL), which
+the capture reads through CanReception.SocketReader and reports as the
+receiver's ``drop_counts``; both are added per bus. With multi-process
+capture (CanMultiProcess) frames dropped by a full shared-memory ring are
+added to the same counter.
+
+A receiver without per-socket counters (no ``drop_counts``, or a bus that is
+not a SocketCAN socket) cannot rule out socket drops: its segments record
+``"drops_counted": false`` and are listed as incomplete.
+
+Status frame 0x422 (8 bytes, little-endian)::
+
+    fps_can0        u16  frames/s received on can0
+    fps_can1        u16  frames/s received on can1
+    rx_overflow     u8   frames dropped by the kernel during the current segment (saturates at 255)
+    queue_dropped   u8   frames dropped by the write queue during the current segment (saturates at 255)
+    write_latency   u8   longest write in the last second, in 10 ms (saturates at 2.55 s)
+    reconnects      u8   reconnects since the logger started (saturates at 255)
+"""
+
+import struct
+import time
+
+HEALTH_STATUS_ID = 0x422
+HEALTH_STRUCT = struct.Struct('<HHBBBB')
+
+SYSFS_DROP_COUNTERS = ('rx_dropped', 'rx_over_errors', 'rx_fifo_errors')
+
+
+def read_rx_drops(interface):
+    """Frames the kernel dropped on ``interface`` since it came up, None without sysfs statistics"""
+    total = 0
+    for counter in SYSFS_DROP_COUNTERS:
+        try:
+            with open(f"/sys/class/net/{interface}/statistics/{counter}") as f:
+                total += int(f.read())
+        except (OSError, ValueError):
+            return None
+    return total
+
+
+def pack_status(fps, rx_overflow, queue_dropped, write_latency_ms, reconnects):
+    """Payload of the 0x422 status frame, see the module docstring"""
+    return HEALTH_STRUCT.pack(min(fps[0], 0xFFFF), min(fps[1], 0xFFFF),
+                              min(rx_overflow, 0xFF), min(queue_dropped, 0xFF),
+                              min(int(write_latency_ms // 10), 0xFF), min(reconnects, 0xFF))
+
+
+def unpack_status(data):
+    """Decode a 0x422 payload into a dict"""
+    fps0, fps1, rx_overflow, queue_dropped, write_latency, reconnects = HEALTH_STRUCT.unpack(bytes(data[:8]))
+    return {
+        'fps_can0': fps0,
+        'fps_can1': fps1,
+        'rx_overflow': rx_overflow,
+        'queue_dropped': queue_dropped,
+        'write_latency_ms': write_latency * 10,
+        'reconnects': reconnects,
+    }
+
+
+class HealthMonitor:
+    def __init__(self, interfaces, receiver, log_queue):
+        """
+        Args:
+            interfaces: interface name per bus number, e.g. ['can0', 'can1']
+            receiver: MultiBusReceiver of the capture sockets or a ProcessCapture (frame_counts per bus,
+                optional drop_counts per bus for frames lost between socket and writer)
+            log_queue: CanLogQueue.LogWriterThread (drop counter, write stalls)
+        """
+        self.interfaces = interfaces
+        self.receiver = receiver
+        self.log_queue = log_queue
+        self.reconnects = 0  # incremented by the logger's error handler
+        self.segment_base = self.snapshot()
+        self.last_rate_time = time.monotonic()
+        self.last_frame_counts = list(self.segment_base['frames'])
+        self.payload = None
+
+    def snapshot(self):
+        """Cumulative counters since the logger started"""
+        drops = [read_rx_drops(interface) or 0 for interface in self.interfaces]
+        capture_drops = getattr(self.receiver, 'drop_counts', None)
+        if capture_drops is not None:
+            drops = [drop + capture_drop for drop, capture_drop in zip(drops, capture_drops)]
+        return {
+            'frames': list(self.receiver.frame_counts),
+            'rx_overflow': drops,
+            'drops_counted': getattr(self.receiver, 'drops_counted', capture_drops is not None),
+            'queue_dropped': self.log_queue.stats()['frames_dropped'],
+            'reconnects': self.reconnects,
+        }
+
+    def delta(self, base):
+        """Counters accumulated since the snapshot ``base``"""
+        now = self.snapshot()
+        return {
+            'frames': [count - start for count, start in zip(now['frames'], base['frames'])],
+            # Interface counters reset when the link is brought down and up again
+            'rx_overflow': [max(0, count - start) for count, start in zip(now['rx_overflow'], base['rx_overflow'])],
+            'drops_counted': now['drops_counted'] and base['drops_counted'],
+            'queue_dropped': now['queue_dropped'] - base['queue_dropped'],
+            'reconnects': now['reconnects'] - base['reconnects'],
+        }
+
+    def segment_trailer(self):
+        """
+        Mark the start of a new segment.
+
+        Returns:
+            callable for the segment writer, returning the segment's health counters when it closes
+        """
+        base = self.snapshot()
+        self.segment_base = base
+        return lambda: self.delta(base)
+
+    def status_payload(self, interval=1.0):
+        """
+        Payload of the 0x422 status frame, recomputed at most every ``interval`` seconds
+        (the frame rates cover that window), so it can serve as a CanPeriodic payload callback.
+        """
+        now = time.monotonic()
+        if self.payload is not None and now - self.last_rate_time < interval:
+            return self.payload
+        elapsed = max(now - self.last_rate_time, 1e-3)
+        counts = list(self.receiver.frame_counts)
+        fps = [int(round((count - last) / elapsed)) for count, last in zip(counts, self.last_frame_counts)]
+        self.last_rate_time = now
+        self.last_frame_counts = counts
+
+        segment = self.delta(self.segment_base)
+        self.payload = pack_status(fps + [0] * (2 - len(fps)), sum(segment['rx_overflow']),
+                                   segment['queue_dropped'], self.log_queue.pop_recent_max_stall() * 1000,
+                                   self.reconnects)
+        return self.payload
@@ -0,0 +1,432 @@
+"""
+CAN 共用接收服務模組
+Single ingest daemon owning the CAN buses, fanning frames out to local subscribers.
+
+Without it every program on the car Pi (logger, web GUI, CMD dashboard)
+opens its own sockets on can0/can1, so the kernel copies every frame once per
+socket and each program pays for python-can's per-frame parsing. The daemon
+reads each bus once (MultiBusReceiver on a CaptureThread), packs every batch
+once and sends the same bytes to each subscriber over a Unix socket:
+
+    python3 CanIngest.py                          # can0,can1 on /run/can_ingest/ingest.sock
+    python3 canlogging-v6.py --capture ingest
+    python3 GUIvehical-v6_dev.py                  # uses the daemon when it is running
+
+Protocol (``SOCK_SEQPACKET``, one message per packet): on connect the daemon
+sends a UTF-8 JSON hello ``{"version": 1, "channels": [...], "payload_size": 8}``,
+then data packets::
+
+    frames         u32
+    dropped        u32 per channel, frames this subscriber lost so far,
+                   including those the daemon's own sockets dropped since it connected
+    records        frames x CanLogFormat.record_struct(payload_size)
+
+A subscriber that does not keep up loses whole packets (its socket buffer
+is full, the daemon never waits) and sees the count in the next header.
+Local transmissions are looped back by SocketCAN and arrive flagged Tx.
+
+Receiving only: programs that send (the logger's heartbeats) keep a
+send-only socket, which costs nothing per received frame.
+
+The socket lives in a directory of its own under /run, readable only by the
+daemon's user and the ``can`` group (``--group``): anyone who can connect
+reads every frame on the car's buses. A stale socket left by a killed daemon
+is replaced, one that still accepts connections is not.
+
+``IngestClient`` offers ``poll()`` like MultiBusReceiver (and runs on a
+CaptureThread for the logger); ``open_ingest_bus()`` gives a ``recv()``-only
+stand-in for a python-can Bus, for receive loops written against one.
+"""
+
+import argparse
+import grp
+import json
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+import can
+
+from CanLogFormat import message_flags, record_struct
+from CanMultiProcess import RingFrame
+from CanReception import CaptureThread, MultiBusReceiver
+
+INGEST_SOCKET = '/run/can_ingest/ingest.sock'
+INGEST_GROUP = 'can'  # subscribers not running as the daemon's user must be members
+INGEST_VERSION = 1
+# Frames per packet, keeps a packet well below the socket buffer size
+PACKET_FRAMES = 512
+SOCKET_BUFFER = 4 * 1024 * 1024
+# Not exported by the socket module
+SO_SNDBUFFORCE = getattr(socket, 'SO_SNDBUFFORCE', 32)
+# Frames a recv() view holds per bus before the oldest are discarded
+PENDING_FRAMES = 65536
+
+
+def _header_struct(channels):
+    return struct.Struct(f'<I{len(channels)}I')
+
+
+class _Subscriber:
+    def __init__(self, sock, channels, source_drops):
+        self.sock = sock
+        self.dropped = [0] * len(channels)
+        self.source_base = source_drops  # daemon socket drops before this subscriber connected
+
+
+class IngestServer:
+    """Accepts subscribers on a Unix socket; ``publish()`` is the CaptureThread callback"""
+
+    def __init__(self, path=INGEST_SOCKET, channels=('can0', 'can1'), payload_size=8, source_drops=None,
+                 group=INGEST_GROUP):
+        """
+        Args:
+            group: group allowed to subscribe besides the daemon's user (None: the user only)
+            source_drops: returns the frames the daemon's own bus sockets dropped per
+                channel (MultiBusReceiver.drop_counts), reported to every subscriber
+        """
+        self.path = path
+        self.group = group
+        self.channels = list(channels)
+        self.payload_size = payload_size
+        self.record = record_struct(payload_size)
+        self.header = _header_struct(self.channels)
+        self.source_drops = source_drops or (lambda: [0] * len(self.channels))
+        self.subscribers = []
+        self.lock = threading.Lock()  # guards the subscriber list against the accept thread
+        self.sock = None
+        self.thread = None
+
+    def start(self):
+        self._remove_stale_socket()
+        gid = self._group_id()
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            # The directory is ours: nobody outside the group can even reach the socket
+            os.makedirs(directory)
+            os.chmod(directory, 0o750 if gid is not None else 0o700)
+            if gid is not None:
+                os.chown(directory, -1, gid)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.sock.bind(self.path)
+        os.chmod(self.path, 0o660 if gid is not None else 0o600)
+        if gid is not None:
+            os.chown(self.path, -1, gid)
+        self.sock.listen(8)
+        self.thread = threading.Thread(target=self._accept_loop, name="ingest-accept", daemon=True)
+        self.thread.start()
+
+    def _remove_stale_socket(self):
+        """Remove the socket of a daemon that was killed; refuse to take over one that still serves"""
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            probe.connect(self.path)
+        except FileNotFoundError:
+            return
+        except ConnectionRefusedError:
+            os.remove(self.path)  # nobody listens on it any more
+            return
+        finally:
+            probe.close()
+        raise RuntimeError(f"An ingest daemon is already serving {self.path}")
+
+    def _group_id(self):
+        if self.group is None:
+            return None
+        try:
+            return grp.getgrnam(self.group).gr_gid
+        except KeyError:
+            print(f"[ingest] group '{self.group}' does not exist, only this user can subscribe")
+            return None
+
+    def _accept_loop(self):
+        hello = json.dumps({'version': INGEST_VERSION, 'channels': self.channels,
+                            'payload_size': self.payload_size}).encode()
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # closed
+            try:
+                try:
+                    # Past net.core.wmem_max when running as root
+                    conn.setsockopt(socket.SOL_SOCKET, SO_SNDBUFFORCE, SOCKET_BUFFER)
+                except PermissionError:
+                    conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+                conn.send(hello)
+                conn.setblocking(False)
+            except OSError:
+                conn.close()
+                continue
+            with self.lock:
+                self.subscribers.append(_Subscriber(conn, self.channels, self.source_drops()))
+            print(f"[ingest] subscriber connected ({len(self.subscribers)} total)")
+
+    def publish(self, frames):
+        """Pack (bus_num, msg) frames once and send them to every subscriber without blocking"""
+        packets = []
+        pack = self.record.pack
+        for start in range(0, len(frames), PACKET_FRAMES):
+            chunk = frames[start:start + PACKET_FRAMES]
+            body = bytearray()
+            counts = [0] * len(self.channels)
+            for bus_num, msg in chunk:
+                body += pack(int(msg.timestamp * 1000000), msg.arbitration_id,
+                             message_flags(msg, 'Rx' if msg.is_rx else 'Tx'), bus_num, msg.dlc, bytes(msg.data))
+                counts[bus_num] += 1
+            packets.append((len(chunk), bytes(body), counts))
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+        source_drops = self.source_drops()
+        for subscriber in subscribers:
+            for count, body, counts in packets:
+                dropped = [(ours + source - base) & 0xFFFFFFFF for ours, source, base
+                           in zip(subscriber.dropped, source_drops, subscriber.source_base)]
+                try:
+                    subscriber.sock.sendmsg([self.header.pack(count, *dropped), body])
+                except BlockingIOError:
+                    for bus_num, bus_count in enumerate(counts):
+                        subscriber.dropped[bus_num] += bus_count
+                except OSError:
+                    self._remove(subscriber)
+                    break
+
+    def _remove(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.sock.close()
+        print(f"[ingest] subscriber disconnected ({len(self.subscribers)} left)")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.sock.close()
+            self.subscribers.clear()
+
+
+class IngestClient:
+    """
+    Subscription to the ingest daemon.
+
+    ``poll()``, ``replace_bus()``, ``frame_counts`` and ``drop_counts`` match
+    MultiBusReceiver/ProcessCapture, so the client can run on a CaptureThread
+    and feed HealthMonitor. ``recv(bus_num)`` serves per-bus receive loops.
+    """
+
+    def __init__(self, path=INGEST_SOCKET):
+        self.path = path
+        self.sock = None
+        self.closed = True
+        self.last_connect = 0.0
+        self._connect()
+        self.frame_counts = [0] * len(self.channels)
+        self.drop_counts = [0] * len(self.channels)  # frames the daemon or its sockets could not deliver to us
+        self.pending = [deque(maxlen=PENDING_FRAMES) for _ in self.channels]
+
+    def _connect(self):
+        self.last_connect = time.monotonic()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+            sock.settimeout(2.0)
+            sock.connect(self.path)
+            hello = json.loads(sock.recv(65536))
+        except (OSError, ValueError):
+            sock.close()
+            raise
+        if hello.get('version', 0) > INGEST_VERSION:
+            sock.close()
+            raise can.CanError(f"Unsupported ingest protocol version {hello.get('version')}")
+        sock.setblocking(False)
+        self.sock = sock
+        self.closed = False
+        self.channels = hello['channels']
+        self.payload_size = hello['payload_size']
+        self.record = record_struct(self.payload_size)
+        self.header = _header_struct(self.channels)
+        self.max_packet = self.header.size + PACKET_FRAMES * self.record.size
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def _read_packets(self, frames):
+        """Append every queued frame as (bus_num, RingFrame) to ``frames``"""
+        payload_size = self.payload_size
+        while True:
+            try:
+                packet = self.sock.recv(self.max_packet)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                self.closed = True
+                raise can.CanError(f"Ingest connection failed: {e}")
+            if not packet:
+                self.closed = True
+                raise can.CanError("Ingest daemon closed the connection")
+            header = self.header.unpack_from(packet)
+            self.drop_counts = list(header[1:])
+            for timestamp, can_id, flags, bus_num, dlc, data in self.record.iter_unpack(
+                    memoryview(packet)[self.header.size:]):
+                frames.append((bus_num, RingFrame(timestamp, can_id, flags, dlc, data[:min(dlc, payload_size)])))
+                self.frame_counts[bus_num] += 1
+
+    def poll(self, timeout=0.1):
+        """
+        Wait up to ``timeout`` seconds for frames on any bus.
+
+        Returns:
+            list of (bus_num, frame) in the order the daemon read them
+        """
+        if self.closed:
+            raise can.CanError("Ingest daemon not connected")
+        frames = []
+        if select.select([self.sock], [], [], timeout)[0]:
+            self._read_packets(frames)
+        return frames
+
+    def recv(self, bus_num, timeout=None):
+        """Next frame of one bus, None after ``timeout`` seconds"""
+        pending = self.pending[bus_num]
+        if not pending:
+            if self.closed:
+                raise can.CanError("Ingest daemon not connected")
+            frames = []
+            if select.select([self.sock], [], [], timeout)[0]:
+                self._read_packets(frames)
+            for frame_bus, frame in frames:
+                self.pending[frame_bus].append(frame)
+        return pending.popleft() if pending else None
+
+    def replace_bus(self, bus_num, bus):
+        """The daemon owns the buses: reconnect to it if the connection was lost (``bus`` is not used)"""
+        if not self.closed:
+            return
+        if time.monotonic() - self.last_connect < 1.0:
+            time.sleep(1.0)  # daemon restarting, do not spin
+        try:
+            self._connect()
+        except (OSError, ValueError) as e:
+            raise can.CanError(f"Ingest daemon not available: {e}")
+        print("[ingest] reconnected to the ingest daemon")
+
+    def close(self):
+        self.closed = True
+        if self.sock is not None:
+            self.sock.close()
+
+
+class IngestBus:
+    """``recv()``-only stand-in for a python-can Bus, one bus of a shared IngestClient"""
+
+    def __init__(self, client, bus_num):
+        self.client = client
+        self.bus_num = bus_num
+        self.channel_info = f"ingest:{client.channels[bus_num]}"
+
+    def recv(self, timeout=None):
+        if self.client.closed:
+            # Try to reattach at most once a second, receive loops call this in a tight loop
+            if time.monotonic() - self.client.last_connect < 1.0:
+                return None
+            try:
+                self.client._connect()
+            except (OSError, ValueError):
+                return None
+        return self.client.recv(self.bus_num, timeout)
+
+    def shutdown(self):
+        self.client.close()
+        _shared_clients.pop(self.client.path, None)
+
+
+_shared_clients = {}
+
+
+def ingest_available(path=INGEST_SOCKET):
+    """True if an ingest daemon is listening on ``path``"""
+    return os.path.exists(path)
+
+
+def open_ingest_bus(bus_num, path=INGEST_SOCKET):
+    """
+    ``recv()`` view of one bus through the ingest daemon, None if no daemon is running.
+
+    Views of the same process share one subscription. Usage:
+        self.bus = open_ingest_bus(0) or can.interface.Bus(channel='can0', interface='socketcan')
+    """
+    client = _shared_clients.get(path)
+    if client is None or client.closed:
+        if not ingest_available(path):
+            return None
+        try:
+            client = IngestClient(path)
+        except (OSError, ValueError, can.CanError):
+            return None
+        _shared_clients[path] = client
+    if bus_num >= len(client.channels):
+        return None
+    return IngestBus(client, bus_num)
+
+
+def _connect_bus(channel):
+    while True:
+        try:
+            return can.interface.Bus(channel=channel, interface='socketcan')
+        except OSError:
+            print(f"[ingest] {channel} not available, retrying in 5 sec...")
+            time.sleep(5)
+
+
+def run_daemon(channels, path=INGEST_SOCKET, payload_size=8, group=INGEST_GROUP):
+    """Own ``channels`` and serve their frames on ``path`` until interrupted"""
+    buses = [_connect_bus(channel) for channel in channels]
+    receiver = MultiBusReceiver(buses)
+    server = IngestServer(path, channels, payload_size, source_drops=lambda: receiver.drop_counts, group=group)
+    server.start()
+    capture = CaptureThread(receiver, server.publish, name="can-ingest")
+    capture.start()
+    print(f"[ingest] serving {', '.join(channels)} on {path}")
+    try:
+        while True:
+            time.sleep(1.0)
+            if capture.failed.is_set():
+                for bus_num, channel in enumerate(channels):
+                    old_bus = receiver.buses[bus_num]
+                    capture.replace_bus(bus_num, _connect_bus(channel))
+                    old_bus.shutdown()
+                print("[ingest] buses reconnected")
+    finally:
+        capture.stop()
+        server.close()
+        for bus in receiver.buses:
+            bus.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Share can0/can1 with every local program through one reader")
+    parser.add_argument('--channels', default='can0,can1', help="interfaces served as bus 0, 1, ...")
+    parser.add_argument('--socket', default=INGEST_SOCKET, help="Unix socket subscribers connect to")
+    parser.add_argument('--group', default=INGEST_GROUP,
+                        help="group allowed to subscribe ('' for the daemon's user only)")
+    parser.add_argument('--payload-size', type=int, choices=[8, 64], default=8,
+                        help="bytes of payload per frame (64 for CAN FD)")
+    args = parser.parse_args()
+    try:
+        run_daemon(args.channels.split(','), args.socket, args.payload_size, args.group or None)
+    except KeyboardInterrupt:
+        print("\n[ingest] stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,719 @@
+"""
+CAN 記錄檔格式模組
+Log file formats written by the CAN logger.
+
+Two formats are supported:
+
+* ``csv``  - the original 18-column text layout read by every replay tool
+* ``bin``  - fixed-size binary records (``.canlog``), roughly 3x smaller and
+  much cheaper to write on the Pi. ``log2csv.py`` converts them back to the
+  exact CSV layout.
+
+Either format can be gzip or zstd compressed on the fly (``.gz``/``.zst``
+suffix). ``open_log_csv()`` reads every variant, including segments cut off
+by a power loss.
+
+Binary layout (little-endian)::
+
+    header (32 bytes)
+        magic        8s   b'NTURCANL'
+        version      u16
+        header_size  u16
+        payload_size u16  8 (classic CAN) or 64 (CAN FD)
+        ts_source    u16  index into TIMESTAMP_SOURCES (version 2, reserved in 1)
+        start_time   u64  wall-clock time the segment was opened, in us
+        clock_offset i64  wall clock minus CLOCK_MONOTONIC when the segment was
+                          opened, in us (version 2, reserved in 1)
+
+    record (16 + payload_size bytes)
+        timestamp    u64  us since epoch
+        can_id       u32
+        flags        u8   FLAG_* bits below
+        bus          u8
+        dlc          u8
+        reserved     u8
+        data         payload_size bytes, zero padded
+
+    trailer (version 3, written when the segment is closed)
+        marker       one record with timestamp TRAILER_TIMESTAMP and can_id
+                     set to the length of the JSON that follows
+        info         UTF-8 JSON (segment health counters, longest write),
+                     space padded to a multiple of the record size
+
+A segment without a trailer was cut off before it was closed. CSV segments
+have no trailer row, every CSV reader would have to skip it; their trailer
+info is only stored in the sidecar (CanLogIndex).
+
+Closed segments can be compacted into a columnar archive (``.canarc``,
+written by CanRetention). Frames are stored in blocks; within a block every
+field is one column, compressed on its own (zstd if available, else zlib),
+so the slowly changing timestamps, IDs and flags shrink to almost nothing::
+
+    header (20 bytes)
+        magic        8s   b'NTURCANA'
+        version      u16
+        codec        u16  index into ARCHIVE_CODECS
+        payload_size u16  payload size of the source segment
+        reserved     u16
+        info_length  u32  length of the UTF-8 JSON that follows (source, health)
+
+    block
+        frames       u32  0 ends the archive
+        6 x column   u32 compressed length + compressed little-endian array:
+                     timestamp deltas (i64, the first relative to 0),
+                     can_id (u32), flags, bus, dlc, data length (u8 each)
+        data         u32 compressed length + the payloads back to back
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+from contextlib import contextmanager
+from itertools import accumulate
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CSV_HEADER = ["Time Stamp", "ID", "Extended", "Dir", "Bus", "LEN", "D1",
+              "D2", "D3", "D4", "D5", "D6", "D7", "D8", "D9", "D10",
+              "D11", "D12"]
+
+BINARY_MAGIC = b'NTURCANL'
+BINARY_VERSION = 3
+BINARY_EXTENSION = '.canlog'
+
+HEADER_STRUCT = struct.Struct('<8sHHHHQq')
+RECORD_HEAD_FORMAT = '<QIBBBx'
+# Timestamp of the record that starts the trailer, never a real receive time
+TRAILER_TIMESTAMP = 0xFFFFFFFFFFFFFFFF
+
+ARCHIVE_MAGIC = b'NTURCANA'
+ARCHIVE_VERSION = 1
+ARCHIVE_EXTENSION = '.canarc'
+ARCHIVE_HEADER_STRUCT = struct.Struct('<8sHHHHI')
+ARCHIVE_CODECS = ('zlib', 'zstd')
+# Frames per archive block, bounds the memory needed to write or read one
+ARCHIVE_BLOCK_FRAMES = 1 << 18
+# array typecodes of the block columns before the data column
+ARCHIVE_COLUMNS = ('q', 'I', 'B', 'B', 'B', 'B')
+
+FLAG_EXTENDED = 0x01
+FLAG_REMOTE = 0x02
+FLAG_TX = 0x04
+FLAG_ERROR = 0x08
+FLAG_FD = 0x10
+
+# host: wall clock when the frame was queued, kernel: socket receive time (msg.timestamp)
+TIMESTAMP_SOURCES = ('host', 'kernel')
+
+COMPRESSIONS = (None, 'gzip', 'zstd')
+COMPRESSED_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+
+# Two-digit upper-case hex strings for every byte value
+HEX_BYTES = [f"{i:02X}" for i in range(256)]
+
+_record_structs = {}
+
+
+def record_struct(payload_size):
+    """Return the cached struct.Struct for a record with the given payload size"""
+    if payload_size not in _record_structs:
+        _record_structs[payload_size] = struct.Struct(f'{RECORD_HEAD_FORMAT}{payload_size}s')
+    return _record_structs[payload_size]
+
+
+def message_flags(msg, direction=None):
+    """Pack the boolean attributes of a CAN message into FLAG_* bits"""
+    if direction is None:
+        direction = 'Rx' if not msg.is_remote_frame else 'Tx'
+    flags = 0
+    if msg.is_extended_id:
+        flags |= FLAG_EXTENDED
+    if msg.is_remote_frame:
+        flags |= FLAG_REMOTE
+    if direction == 'Tx':
+        flags |= FLAG_TX
+    if getattr(msg, 'is_error_frame', False):
+        flags |= FLAG_ERROR
+    if getattr(msg, 'is_fd', False):
+        flags |= FLAG_FD
+    return flags
+
+
+def csv_row(timestamp, can_id, flags, bus_num, dlc, data):
+    """Build one row of the CSV layout (data is padded to at least 8 bytes)"""
+    data_bytes = [HEX_BYTES[byte] for byte in data]
+    data_bytes += ['00'] * (8 - len(data_bytes))
+    return [timestamp, f"{can_id:08X}",
+            'true' if flags & FLAG_EXTENDED else 'false',
+            'Tx' if flags & FLAG_TX else 'Rx',
+            bus_num, dlc] + data_bytes
+
+
+class _CsvLines(list):
+    """csv.writer target that just collects the formatted lines"""
+    write = list.append
+
+
+class SegmentWriter:
+    """
+    Common part of the segment writers: the raw file, optional streaming
+    compression and periodic sync points.
+
+    ``flush()`` hands buffered data to the (compressing) stream. Every
+    ``sync_interval`` seconds ``sync()`` additionally ends a compressed block
+    (gzip full flush / zstd frame end) and fsyncs the file, so after a power
+    cut everything up to the last sync point can still be decompressed.
+
+    An optional ``index`` (CanLogIndex.SegmentIndex) sees every record and is
+    written as a sidecar once the segment is closed. An optional ``trailer``
+    callable returns a dict (e.g. CanHealth counters) that is stored at close
+    time together with the longest write, in the binary trailer and in the
+    sidecar. An optional ``tap`` (CanDecodedOutput.DecodedTap) gets every
+    record as well, each flush and the close.
+    """
+
+    def __init__(self, filename, compression=None, sync_interval=5.0, index=None, trailer=None, tap=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSIONS}")
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError("zstd compression needs the 'zstandard' package (pip install zstandard)")
+        self.filename = filename
+        self.index = index
+        self.trailer = trailer
+        self.tap = tap
+        self.max_write_time = 0.0  # longest write or sync, seconds
+        self.stream_bytes = 0  # uncompressed bytes handed to the stream
+        self.compression = compression
+        self.sync_interval = sync_interval
+        self.last_sync = time.monotonic()
+        self.raw = open(filename, 'wb')
+        if compression == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=3)
+        elif compression == 'zstd':
+            self.stream = zstandard.ZstdCompressor(level=3).stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+
+    def size(self):
+        """Bytes of the segment on disk so far (compressed size when compressing)"""
+        return self.raw.tell()
+
+    def _write(self, data):
+        start = time.monotonic()
+        self.stream.write(data)
+        self.stream_bytes += len(data)
+        self.max_write_time = max(self.max_write_time, time.monotonic() - start)
+        if time.monotonic() - self.last_sync >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """End the current compressed block and push the file to the storage device"""
+        if self.compression == 'gzip':
+            self.stream.flush(zlib.Z_FULL_FLUSH)
+        elif self.compression == 'zstd':
+            self.stream.flush(zstandard.FLUSH_FRAME)
+        start = time.monotonic()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.last_sync = time.monotonic()
+        self.max_write_time = max(self.max_write_time, self.last_sync - start)
+
+    def trailer_info(self):
+        """Segment summary stored when the segment is closed"""
+        info = dict(self.trailer()) if self.trailer is not None else {}
+        info['max_write_ms'] = round(self.max_write_time * 1000, 1)
+        return info
+
+    def _write_trailer(self, info):
+        """Formats that have a trailer write ``info`` here, before the stream is closed"""
+
+    def close(self):
+        self.flush()
+        info = self.trailer_info()
+        self._write_trailer(info)
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        self.raw.close()
+        if self.index is not None:
+            self.index.health = info
+            self.index.write(self.filename)
+        if self.tap is not None:
+            self.tap.close()
+
+
+class CsvLogWriter(SegmentWriter):
+    """Original text format, one csv.writer row per frame"""
+
+    def __init__(self, filename, compression=None, sync_interval=5.0, index=None, trailer=None, tap=None):
+        super().__init__(filename, compression, sync_interval, index, trailer, tap)
+        self.lines = _CsvLines()
+        self.writer = csv.writer(self.lines)
+        self.writer.writerow(CSV_HEADER)
+
+    def write_frame(self, msg, bus_num, direction=None, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time() * 1000000)
+        if self.index is not None:
+            self.index.add(timestamp, msg.arbitration_id, msg.data, self._offset)
+        flags = message_flags(msg, direction)
+        if self.tap is not None:
+            self.tap.add(timestamp, msg.arbitration_id, flags, bus_num, msg.dlc, msg.data)
+        self.writer.writerow(csv_row(timestamp, msg.arbitration_id, flags,
+                                     bus_num, msg.dlc, msg.data))
+
+    def _offset(self):
+        # The buffered lines are plain ASCII, one byte per character
+        return self.stream_bytes + sum(map(len, self.lines))
+
+    def flush(self):
+        if self.lines:
+            self._write(''.join(self.lines).encode())
+            self.lines.clear()
+        if self.stream is self.raw:
+            self.raw.flush()
+        if self.tap is not None:
+            self.tap.flush()
+
+
+class BinaryLogWriter(SegmentWriter):
+    """Fixed-size binary records, buffered and written in large blocks"""
+
+    def __init__(self, filename, payload_size=8, buffer_size=65536, compression=None, sync_interval=5.0,
+                 timestamp_source='host', index=None, trailer=None, tap=None):
+        if payload_size not in (8, 64):
+            raise ValueError(f"payload_size must be 8 or 64, got {payload_size}")
+        super().__init__(filename, compression, sync_interval, index, trailer, tap)
+        self.payload_size = payload_size
+        self.record = record_struct(payload_size)
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        # Both clocks read back to back, so replay tools can map the wall-clock
+        # timestamps onto the monotonic clock even if NTP stepped the clock later
+        wall_time = time.time()
+        clock_offset = wall_time - time.monotonic()
+        self.buffer += HEADER_STRUCT.pack(BINARY_MAGIC, BINARY_VERSION, HEADER_STRUCT.size,
+                                          payload_size, TIMESTAMP_SOURCES.index(timestamp_source),
+                                          int(wall_time * 1000000), int(clock_offset * 1000000))
+
+    def write_frame(self, msg, bus_num, direction=None, timestamp=None):
+        if timestamp is None:
+            timestamp = int(time.time() * 1000000)
+        if self.index is not None:
+            self.index.add(timestamp, msg.arbitration_id, msg.data, self._offset)
+        flags = message_flags(msg, direction)
+        if self.tap is not None:
+            self.tap.add(timestamp, msg.arbitration_id, flags, bus_num, msg.dlc, msg.data)
+        # struct pads short payloads with zeros and truncates long ones
+        self.buffer += self.record.pack(timestamp, msg.arbitration_id, flags, bus_num,
+                                        msg.dlc, bytes(msg.data))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def _offset(self):
+        return self.stream_bytes + len(self.buffer)
+
+    def _write_trailer(self, info):
+        text = json.dumps(info, separators=(',', ':')).encode()
+        self.buffer += self.record.pack(TRAILER_TIMESTAMP, len(text), 0, 0, 0, b'')
+        self.buffer += text + b' ' * (-len(text) % self.record.size)
+        self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self._write(self.buffer)
+            self.buffer.clear()
+        if self.stream is self.raw:
+            self.raw.flush()
+        if self.tap is not None:
+            self.tap.flush()
+
+
+def read_binary_header(f):
+    """Read and validate the header of a binary log, returns a dict"""
+    raw = f.read(HEADER_STRUCT.size)
+    if len(raw) < HEADER_STRUCT.size:
+        raise ValueError("File too short for a binary CAN log header")
+    magic, version, header_size, payload_size, ts_source, start_time, clock_offset = HEADER_STRUCT.unpack(raw)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary CAN log (bad magic)")
+    if version > BINARY_VERSION:
+        raise ValueError(f"Unsupported binary CAN log version {version}")
+    # Skip any header fields added by newer minor revisions
+    if header_size > HEADER_STRUCT.size:
+        f.read(header_size - HEADER_STRUCT.size)
+    if version < 2:
+        ts_source, clock_offset = 0, None
+    return {
+        'version': version,
+        'header_size': max(header_size, HEADER_STRUCT.size),
+        'payload_size': payload_size,
+        'start_time': start_time,
+        'timestamp_source': TIMESTAMP_SOURCES[ts_source] if ts_source < len(TIMESTAMP_SOURCES) else None,
+        'clock_offset': clock_offset,
+    }
+
+
+def iter_binary_records(f, chunk_records=4096):
+    """
+    Stream records from an open binary log.
+
+    Yields:
+        (timestamp, can_id, flags, bus, dlc, data) with data cut to the frame length
+    """
+    header = read_binary_header(f)
+    return iter_binary_body(f, header['payload_size'], chunk_records)
+
+
+def iter_binary_body(f, payload_size, chunk_records=4096):
+    """Stream records from a binary log positioned at a record boundary after the header, up to the trailer"""
+    record = record_struct(payload_size)
+    chunk_size = record.size * chunk_records
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        usable = len(chunk) - len(chunk) % record.size  # ignore a torn last record
+        for timestamp, can_id, flags, bus_num, dlc, data in record.iter_unpack(memoryview(chunk)[:usable]):
+            if timestamp == TRAILER_TIMESTAMP:
+                return
+            yield timestamp, can_id, flags, bus_num, dlc, data[:min(dlc, payload_size)]
+        if usable < len(chunk):
+            break
+
+
+def read_binary_trailer(f, chunk_records=4096):
+    """
+    Trailer info of an open binary log (reads through the whole segment).
+
+    Returns:
+        dict, or None if the segment was not closed cleanly or predates trailers
+    """
+    header = read_binary_header(f)
+    record = record_struct(header['payload_size'])
+    chunk_size = record.size * chunk_records
+    while True:
+        chunk = f.read(chunk_size)
+        if len(chunk) < record.size:
+            return None
+        usable = len(chunk) - len(chunk) % record.size
+        for n in range(0, usable, record.size):
+            timestamp, length = struct.unpack_from('<QI', chunk, n)
+            if timestamp == TRAILER_TIMESTAMP:
+                text = chunk[n + record.size:n + record.size + length]
+                if len(text) < length:
+                    text += f.read(length - len(text))
+                try:
+                    return json.loads(text)
+                except ValueError:
+                    return None
+        if usable < len(chunk):
+            return None
+
+
+def _column_bytes(column):
+    """Little-endian bytes of an array column"""
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _column_array(typecode, data):
+    column = array(typecode)
+    column.frombytes(data)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column
+
+
+def _archive_codec(codec):
+    """(compress, decompress) functions of an archive codec"""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("zstd archives need the 'zstandard' package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=10).compress, zstandard.ZstdDecompressor().decompress
+    if codec == 'zlib':
+        return (lambda data: zlib.compress(data, 9)), zlib.decompress
+    raise ValueError(f"Unknown archive codec '{codec}', expected one of {ARCHIVE_CODECS}")
+
+
+def _write_archive_block(f, compress, columns, data):
+    f.write(struct.pack('<I', len(columns[0])))
+    for part in [_column_bytes(column) for column in columns] + [bytes(data)]:
+        packed = compress(part)
+        f.write(struct.pack('<I', len(packed)))
+        f.write(packed)
+
+
+def write_archive(records, filename, payload_size=8, info=None, codec=None, block_frames=ARCHIVE_BLOCK_FRAMES):
+    """
+    Write records into a columnar archive, synced to disk before returning.
+
+    Args:
+        records: (timestamp, can_id, flags, bus, dlc, data) tuples, e.g. from iter_log_records()
+        info: JSON-serializable dict stored in the header
+        codec: 'zstd' or 'zlib', default zstd when the zstandard package is installed
+
+    Returns:
+        number of frames written
+    """
+    if codec is None:
+        codec = 'zstd' if zstandard is not None else 'zlib'
+    compress, _ = _archive_codec(codec)
+    text = json.dumps(info or {}, separators=(',', ':')).encode()
+    frames = 0
+    with open(filename, 'wb') as f:
+        f.write(ARCHIVE_HEADER_STRUCT.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, ARCHIVE_CODECS.index(codec),
+                                           payload_size, 0, len(text)))
+        f.write(text)
+        columns = [array(typecode) for typecode in ARCHIVE_COLUMNS]
+        deltas, can_ids, flag_column, buses, dlcs, lengths = columns
+        data = bytearray()
+        last = 0
+        for timestamp, can_id, flags, bus_num, dlc, payload in records:
+            deltas.append(timestamp - last)
+            last = timestamp
+            can_ids.append(can_id)
+            flag_column.append(flags)
+            buses.append(bus_num)
+            dlcs.append(dlc)
+            lengths.append(len(payload))
+            data += payload
+            if len(deltas) >= block_frames:
+                _write_archive_block(f, compress, columns, data)
+                frames += len(deltas)
+                columns = [array(typecode) for typecode in ARCHIVE_COLUMNS]
+                deltas, can_ids, flag_column, buses, dlcs, lengths = columns
+                data = bytearray()
+                last = 0
+        if deltas:
+            _write_archive_block(f, compress, columns, data)
+            frames += len(deltas)
+        f.write(struct.pack('<I', 0))
+        f.flush()
+        os.fsync(f.fileno())
+    return frames
+
+
+def read_archive_header(f):
+    """Read and validate the header of an archive, returns a dict"""
+    raw = f.read(ARCHIVE_HEADER_STRUCT.size)
+    if len(raw) < ARCHIVE_HEADER_STRUCT.size:
+        raise ValueError("File too short for a CAN log archive header")
+    magic, version, codec, payload_size, _, info_length = ARCHIVE_HEADER_STRUCT.unpack(raw)
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError("Not a CAN log archive (bad magic)")
+    if version > ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported CAN log archive version {version}")
+    if codec >= len(ARCHIVE_CODECS):
+        raise ValueError(f"Unknown CAN log archive codec {codec}")
+    return {
+        'version': version,
+        'codec': ARCHIVE_CODECS[codec],
+        'payload_size': payload_size,
+        'info': json.loads(f.read(info_length) or b'{}'),
+    }
+
+
+def iter_archive_blocks(f, codec):
+    """
+    Decompressed blocks of an archive positioned after its header.
+
+    Yields:
+        (frames, columns) with columns the 7 little-endian column buffers in block order.
+        Stops at the end marker, or quietly at a truncated block.
+    """
+    _, decompress = _archive_codec(codec)
+    while True:
+        raw = f.read(4)
+        if len(raw) < 4:
+            return
+        frames = struct.unpack('<I', raw)[0]
+        if frames == 0:
+            return
+        columns = []
+        for _ in range(len(ARCHIVE_COLUMNS) + 1):
+            raw = f.read(4)
+            if len(raw) < 4:
+                return
+            length = struct.unpack('<I', raw)[0]
+            packed = f.read(length)
+            if len(packed) < length:
+                return
+            columns.append(decompress(packed))
+        yield frames, columns
+
+
+def iter_archive_records(f):
+    """
+    Stream records from an open archive.
+
+    Yields:
+        (timestamp, can_id, flags, bus, dlc, data), the same tuples as iter_binary_records()
+    """
+    header = read_archive_header(f)
+    for _, columns in iter_archive_blocks(f, header['codec']):
+        deltas, can_ids, flag_column, buses, dlcs, lengths = (
+            _column_array(typecode, column) for typecode, column in zip(ARCHIVE_COLUMNS, columns))
+        data = columns[-1]
+        offset = 0
+        for timestamp, can_id, flags, bus_num, dlc, length in zip(accumulate(deltas), can_ids, flag_column,
+                                                                   buses, dlcs, lengths):
+            yield timestamp, can_id, flags, bus_num, dlc, data[offset:offset + length]
+            offset += length
+
+
+def log_extension(log_format='csv', compression=None):
+    """File extension for a segment, e.g. '.csv.gz' or '.canlog'"""
+    extension = BINARY_EXTENSION if log_format == 'bin' else '.csv'
+    return extension + COMPRESSED_EXTENSIONS.get(compression, '')
+
+
+def is_log_file(filename):
+    """True for every segment name the logger can produce, and for archives"""
+    if filename.endswith(ARCHIVE_EXTENSION):
+        return True
+    for extension in ('.csv', BINARY_EXTENSION):
+        for suffix in ('', '.gz', '.zst'):
+            if filename.endswith(extension + suffix):
+                return True
+    return False
+
+
+def open_log_writer(filename, log_format='csv', payload_size=8, compression=None, sync_interval=5.0,
+                    timestamp_source='host', index=None, trailer=None, tap=None):
+    """Open a log segment writer for the requested format"""
+    if log_format == 'bin':
+        return BinaryLogWriter(filename, payload_size=payload_size, compression=compression,
+                               sync_interval=sync_interval, timestamp_source=timestamp_source,
+                               index=index, trailer=trailer, tap=tap)
+    return CsvLogWriter(filename, compression=compression, sync_interval=sync_interval, index=index,
+                        trailer=trailer, tap=tap)
+
+
+class _DecompressingReader(io.RawIOBase):
+    """
+    Streaming decompression that stops cleanly at the last complete block.
+
+    A segment cut off by a power loss has no end-of-stream marker. The stock
+    gzip reader raises and drops its buffered data in that case, so the
+    stream is decompressed chunk by chunk here and a missing end marker is
+    treated as a normal end of file. Concatenated gzip members and zstd
+    frames are followed.
+    """
+
+    def __init__(self, raw, new_decompressor, chunk_size=65536):
+        self.raw = raw
+        self.new_decompressor = new_decompressor
+        self.decompressor = new_decompressor()
+        self.chunk_size = chunk_size
+        self.pending = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.pending:
+            chunk = self.raw.read(self.chunk_size)
+            if not chunk:
+                return 0
+            self.pending = self.decompressor.decompress(chunk)
+            while self.decompressor.eof and self.decompressor.unused_data:
+                rest = self.decompressor.unused_data
+                self.decompressor = self.new_decompressor()
+                self.pending += self.decompressor.decompress(rest)
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_log_binary(filename):
+    """Open any segment for reading as a binary stream, decompressing transparently"""
+    if filename.endswith('.gz'):
+        new_decompressor = lambda: zlib.decompressobj(wbits=31)
+    elif filename.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("Reading .zst logs needs the 'zstandard' package (pip install zstandard)")
+        dctx = zstandard.ZstdDecompressor()
+        new_decompressor = dctx.decompressobj
+    else:
+        return open(filename, 'rb')
+    return io.BufferedReader(_DecompressingReader(open(filename, 'rb'), new_decompressor),
+                             buffer_size=65536)
+
+
+def iter_csv_records(f, skip_header=True):
+    """Parse CSV rows back into binary record tuples, skipping a torn last line"""
+    reader = csv.reader(io.TextIOWrapper(f, encoding='utf-8', newline=''))
+    if skip_header:
+        next(reader, None)
+    for row in reader:
+        try:
+            dlc = int(row[5])
+            flags = (FLAG_EXTENDED if row[2] == 'true' else 0) | (FLAG_TX if row[3] == 'Tx' else 0)
+            data = bytes(int(byte, 16) for byte in row[6:6 + dlc] if byte)
+            yield int(row[0]), int(row[1], 16), flags, int(row[4]), dlc, data
+        except (ValueError, IndexError):
+            continue
+
+
+def iter_log_records(filename):
+    """
+    Stream the records of any segment (CSV or binary, plain or compressed) or archive.
+
+    Yields:
+        (timestamp, can_id, flags, bus, dlc, data), the same tuples as iter_binary_records()
+    """
+    with open_log_binary(filename) as f:
+        if filename.endswith(ARCHIVE_EXTENSION):
+            yield from iter_archive_records(f)
+        elif BINARY_EXTENSION in os.path.basename(filename):
+            yield from iter_binary_records(f)
+        else:
+            yield from iter_csv_records(f)
+
+
+def _record_csv_lines(records):
+    """CSV text lines (header first) for binary record tuples"""
+    yield ','.join(CSV_HEADER) + '\r\n'
+    for record in records:
+        yield ','.join(map(str, csv_row(*record))) + '\r\n'
+
+
+@contextmanager
+def open_log_csv(filename):
+    """
+    Open any segment (CSV or binary, plain or compressed) or archive as CSV text lines.
+
+    Usage:
+        with open_log_csv(path) as lines:
+            for row in csv.DictReader(lines):
+                ...
+    """
+    f = open_log_binary(filename)
+    try:
+        if filename.endswith(ARCHIVE_EXTENSION):
+            yield _record_csv_lines(iter_archive_records(f))
+        elif BINARY_EXTENSION in os.path.basename(filename):
+            yield _record_csv_lines(iter_binary_records(f))
+        else:
+            yield io.TextIOWrapper(f, encoding='utf-8', newline='')
+    finally:
+        f.close()
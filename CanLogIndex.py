@@ -0,0 +1,290 @@
+"""
+CAN 記錄檔索引模組
+Seek index sidecar written next to every log segment when it is closed.
+
+``<segment>.idx.json`` lets replay tools jump to a point in time and lets
+file listings show a summary without parsing the segment:
+
+    {
+      "version": 1,
+      "segment": "can_log_20250731_004455.csv",
+      "frames": 1234567,
+      "first_timestamp": 1753893895000000,      # us
+      "last_timestamp": 1753895095000000,
+      "checkpoint_interval_ms": 1000,
+      "checkpoints": [[timestamp, offset, frame], ...],
+      "id_counts": {"193": 120000, "281": 12000, ...},
+      "vcu_on": [[start_timestamp, end_timestamp], ...],
+      "health": {"frames": [n0, n1], "rx_overflow": [d0, d1],   # trailer info
+                 "drops_counted": true, "queue_dropped": 0, "reconnects": 0,
+                 "max_write_ms": 12.5}
+    }
+
+A checkpoint marks the first record at or after each interval boundary:
+``offset`` is its byte position in the uncompressed segment stream and
+``frame`` its record number. For plain segments the offset can be passed to
+``seek()`` directly; compressed segments are decompressed up to it.
+
+``LogReplay`` is the replay cursor built on top: with a sidecar it streams
+from the checkpoint before the position and parses nothing ahead of it.
+
+The sidecar only appears once the segment is complete, so its presence also
+means the segment is closed. Archives (``.canarc``) get a sidecar of their
+own with the same summary, ``"archived_from"`` naming the source segment and
+no checkpoints.
+"""
+
+import json
+import os
+from bisect import bisect_left
+
+from CanLogFormat import (ARCHIVE_EXTENSION, BINARY_EXTENSION, iter_archive_records, iter_binary_body,
+                          iter_csv_records, iter_log_records, open_log_binary, read_binary_header)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = '.idx.json'
+
+# VCU status frame and its run bit, as used by the logger's state machine
+VCU_STATUS_ID = 0x281
+VCU_RUN_BIT = 0x20
+
+
+def index_path(segment):
+    return segment + INDEX_SUFFIX
+
+
+class SegmentIndex:
+    """Built by the segment writers while frames are written"""
+
+    def __init__(self, checkpoint_interval_ms=1000):
+        self.interval = checkpoint_interval_ms * 1000
+        self.next_checkpoint = 0
+        self.checkpoints = []
+        self.id_counts = {}
+        self.frames = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.vcu_on = []
+        self.vcu_since = None
+        self.health = None  # trailer info, set by the writer when the segment is closed
+
+    def add(self, timestamp, can_id, data, offset):
+        """
+        Account for one record.
+
+        Args:
+            offset: callable returning the byte offset the record is about to be written at,
+                only called when a checkpoint is due
+        """
+        if timestamp >= self.next_checkpoint:
+            self.checkpoints.append([timestamp, offset(), self.frames])
+            self.next_checkpoint = timestamp - timestamp % self.interval + self.interval
+        self.frames += 1
+        self.id_counts[can_id] = self.id_counts.get(can_id, 0) + 1
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+
+        if can_id == VCU_STATUS_ID and len(data) > 0:
+            if data[0] & VCU_RUN_BIT:
+                if self.vcu_since is None:
+                    self.vcu_since = timestamp
+            elif self.vcu_since is not None:
+                self.vcu_on.append([self.vcu_since, timestamp])
+                self.vcu_since = None
+
+    def to_dict(self, segment):
+        vcu_on = list(self.vcu_on)
+        if self.vcu_since is not None:
+            vcu_on.append([self.vcu_since, self.last_timestamp])
+        return {
+            'version': INDEX_VERSION,
+            'segment': os.path.basename(segment),
+            'frames': self.frames,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'checkpoint_interval_ms': self.interval // 1000,
+            'checkpoints': self.checkpoints,
+            'id_counts': {f"{can_id:X}": count for can_id, count in sorted(self.id_counts.items())},
+            'vcu_on': vcu_on,
+            'health': self.health,
+        }
+
+    def write(self, segment):
+        """Write the sidecar atomically next to ``segment``"""
+        write_index(segment, self.to_dict(segment))
+
+
+def write_index(segment, index):
+    """Write a sidecar dict atomically next to ``segment``"""
+    path = index_path(segment)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_index(segment):
+    """The sidecar of a segment as a dict, None if it has none (yet) or it is unreadable"""
+    try:
+        with open(index_path(segment)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('version', 0) > INDEX_VERSION:
+        return None
+    return index
+
+
+def locate(index, timestamp):
+    """Last checkpoint at or before ``timestamp`` as (timestamp, offset, frame), None if before the first"""
+    checkpoints = index['checkpoints']
+    lo, hi = 0, len(checkpoints)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if checkpoints[mid][0] <= timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return tuple(checkpoints[lo - 1]) if lo > 0 else None
+
+
+def is_incomplete(health):
+    """True if the trailer info shows frames lost while the segment was written, or cannot rule it out"""
+    if not health:
+        return False
+    return (sum(health.get('rx_overflow', ())) > 0 or health.get('queue_dropped', 0) > 0
+            or health.get('reconnects', 0) > 0 or health.get('drops_counted') is False)
+
+
+def summarize(index):
+    """Short listing summary of a segment from its sidecar"""
+    duration = 0.0
+    if index['first_timestamp'] is not None:
+        duration = (index['last_timestamp'] - index['first_timestamp']) / 1000000
+    return {
+        'frames': index['frames'],
+        'start': index['first_timestamp'],
+        'duration_s': duration,
+        'vcu_on_s': sum(end - start for start, end in index['vcu_on']) / 1000000,
+        'ids': len(index['id_counts']),
+        'incomplete': is_incomplete(index.get('health')),
+    }
+
+
+def iter_records_from(segment, timestamp, index=None):
+    """
+    Stream records of a segment from ``timestamp`` on, without parsing what comes before.
+
+    Yields the same tuples as CanLogFormat.iter_log_records(). Reading starts at the last
+    checkpoint at or before ``timestamp``; records stamped earlier are skipped.
+    Archives have no checkpoints and are read from the start.
+    """
+    if segment.endswith(ARCHIVE_EXTENSION):
+        with open_log_binary(segment) as f:
+            for record in iter_archive_records(f):
+                if record[0] >= timestamp:
+                    yield record
+        return
+    if index is None:
+        index = load_index(segment)
+    checkpoint = locate(index, timestamp) if index else None
+    binary = BINARY_EXTENSION in os.path.basename(segment)
+    with open_log_binary(segment) as f:
+        if binary:
+            header = read_binary_header(f)
+            position = header['header_size']
+        else:
+            position = 0
+        if checkpoint is not None:
+            _skip(f, checkpoint[1] - position)
+        if binary:
+            records = iter_binary_body(f, header['payload_size'])
+        else:
+            records = iter_csv_records(f, skip_header=checkpoint is None)
+        for record in records:
+            if record[0] >= timestamp:
+                yield record
+
+
+def _skip(f, count):
+    """Advance ``count`` bytes; compressed streams cannot seek, so they are read and discarded"""
+    if f.seekable():
+        f.seek(count, os.SEEK_CUR)
+        return
+    while count > 0:
+        chunk = f.read(min(count, 1 << 20))
+        if not chunk:
+            break
+        count -= len(chunk)
+
+
+class LogReplay:
+    """
+    Forward cursor over a segment for replay that can jump to any point in time.
+
+    With a sidecar nothing is read up front: records stream from the checkpoint
+    before the position and a jump reopens the stream at the checkpoint before
+    the target. Segments without checkpoints (no sidecar yet, archives) are read
+    into memory once and jumps are a binary search.
+    """
+
+    def __init__(self, segment, index=None):
+        self.segment = segment
+        self.index = load_index(segment) if index is None else index
+        self.stream = None
+        self.next_record = None
+        if self.index is not None and self.index.get('checkpoints'):
+            self.records = None
+            self.frames = self.index['frames']
+            self.first_timestamp = self.index['first_timestamp']
+            self.last_timestamp = self.index['last_timestamp']
+        else:
+            self.records = list(iter_log_records(segment))
+            self.frames = len(self.records)
+            self.first_timestamp = self.records[0][0] if self.records else None
+            self.last_timestamp = self.records[-1][0] if self.records else None
+        self.position = 0  # next record of self.records
+        self.seek(0)
+
+    def seek(self, timestamp):
+        """Continue from the first record stamped at or after ``timestamp`` (us)"""
+        if self.records is not None:
+            self.position = bisect_left(self.records, (timestamp,))
+            return
+        self.close()
+        self.stream = iter_records_from(self.segment, timestamp, self.index)
+        self.next_record = next(self.stream, None)
+
+    @property
+    def current_timestamp(self):
+        """Timestamp of the next record, None at the end"""
+        if self.records is not None:
+            return self.records[self.position][0] if self.position < len(self.records) else None
+        return self.next_record[0] if self.next_record is not None else None
+
+    def take_until(self, timestamp):
+        """The records stamped up to ``timestamp``, the cursor moves past them"""
+        if self.records is not None:
+            records = self.records
+            end = self.position
+            while end < len(records) and records[end][0] <= timestamp:
+                end += 1
+            batch = records[self.position:end]
+            self.position = end
+            return batch
+        batch = []
+        record = self.next_record
+        while record is not None and record[0] <= timestamp:
+            batch.append(record)
+            record = next(self.stream, None)
+        self.next_record = record
+        return batch
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+            self.next_record = None
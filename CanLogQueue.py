@@ -0,0 +1,299 @@
+"""
+CAN 記錄背景寫入模組
+Background writer thread that decouples CAN reception from disk I/O.
+
+The receive loop only appends frames to a bounded in-memory queue. A single
+writer thread owns the open log segment, takes frames off the queue in large
+batches and writes them, so an SD-card stall no longer stops reception.
+
+Segment open/close requests travel through the same queue as the frames, so
+every frame lands in the segment that was current when it was received. A
+backlog (e.g. the pre-trigger history) is queued as one item and iterated
+on the writer thread, so the receive loop never touches its frames. The
+writer thread also rotates the segment by itself once it passes a size or age
+limit, reopening it with the factory of the last open request; the age limit
+is also checked while no frames arrive.
+
+Queue-full policies:
+    block        - the receive loop waits until the writer makes room
+    drop-oldest  - discard the oldest queued frame to make room
+    count-drops  - discard the new frame
+Dropped frames are always counted in ``stats()``.
+"""
+
+import threading
+import time
+from collections import deque
+
+QUEUE_POLICIES = ('block', 'drop-oldest', 'count-drops')
+
+_FRAME = 0
+_OPEN = 1
+_CLOSE = 2
+_BACKLOG = 3
+
+
+class LogWriterThread:
+    def __init__(self, capacity=65536, batch_size=2048, flush_interval=0.5, policy='count-drops',
+                 max_segment_bytes=None, max_segment_seconds=None):
+        """
+        Args:
+            capacity: max frames held in memory
+            batch_size: frames written per wake-up of the writer thread
+            flush_interval: max seconds a frame waits before the batch is written
+            policy: one of QUEUE_POLICIES
+            max_segment_bytes: rotate when the segment reaches this size on disk
+            max_segment_seconds: rotate when the segment is this old
+        """
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {QUEUE_POLICIES}")
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+
+        self.queue = deque()
+        self.frames_queued = 0  # frames currently in self.queue
+        self.cond = threading.Condition()
+        self.running = False
+        self.thread = None
+        # Only touched by the writer thread
+        self.writer = None
+        self.factory = None
+        self.segment_opened_at = None
+        # Wall-clock start of the open segment, None while no segment is open
+        self.segment_start_time = None
+        self.segment_frames = 0  # frames written to the open segment
+
+        # Counters
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.max_queue_depth = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.batches = 0
+        self.last_stall = 0.0  # seconds spent in the last batch write
+        self.max_stall = 0.0
+        self.recent_max_stall = 0.0  # since the last pop_recent_max_stall()
+        self.total_stall = 0.0
+        self.producer_wait = 0.0  # seconds the receive loop spent blocked ('block' policy)
+        self.segments_rotated = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="can-log-writer", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Write out everything still queued, close the segment and stop the thread"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout)
+
+    # Producer side (receive loop)
+    def put(self, msg, bus_num, direction=None, timestamp=None):
+        """Queue one frame for the current segment, returns False if it was dropped"""
+        with self.cond:
+            if self.frames_queued >= self.capacity:
+                if self.policy == 'block':
+                    start = time.monotonic()
+                    while self.frames_queued >= self.capacity and self.running:
+                        self.cond.wait(0.1)
+                    self.producer_wait += time.monotonic() - start
+                elif self.policy == 'drop-oldest':
+                    self._drop_oldest_frame()
+                else:
+                    self.frames_dropped += 1
+                    return False
+            self.queue.append((_FRAME, msg, bus_num, direction, timestamp))
+            self.frames_queued += 1
+            if self.frames_queued > self.max_queue_depth:
+                self.max_queue_depth = self.frames_queued
+            if self.frames_queued >= self.batch_size:
+                self.cond.notify_all()
+        return True
+
+    def open_segment(self, factory):
+        """Close the current segment and open a new one with ``factory()`` on the writer thread"""
+        self._put_control((_OPEN, factory))
+
+    def close_segment(self):
+        self._put_control((_CLOSE,))
+
+    def put_backlog(self, frames):
+        """
+        Queue an iterable of (bus_num, msg, direction, timestamp) for the current segment.
+        It is only iterated on the writer thread and never counts against capacity.
+        """
+        self._put_control((_BACKLOG, frames))
+
+    def _put_control(self, item):
+        # Control items never count against capacity and are never dropped
+        with self.cond:
+            self.queue.append(item)
+            self.cond.notify_all()
+
+    def _drop_oldest_frame(self):
+        for i, item in enumerate(self.queue):
+            if item[0] == _FRAME:
+                del self.queue[i]
+                self.frames_queued -= 1
+                self.frames_dropped += 1
+                return
+
+    def stats(self):
+        """Snapshot of the queue and writer counters"""
+        with self.cond:
+            return {
+                'queue_depth': self.frames_queued,
+                'max_queue_depth': self.max_queue_depth,
+                'frames_written': self.frames_written,
+                'frames_dropped': self.frames_dropped,
+                'last_batch_size': self.last_batch_size,
+                'max_batch_size': self.max_batch_size,
+                'batches': self.batches,
+                'last_stall_ms': self.last_stall * 1000,
+                'max_stall_ms': self.max_stall * 1000,
+                'total_stall_s': self.total_stall,
+                'producer_wait_s': self.producer_wait,
+                'segments_rotated': self.segments_rotated,
+            }
+
+    def pop_recent_max_stall(self):
+        """Longest batch write (seconds) since the previous call"""
+        with self.cond:
+            stall = self.recent_max_stall
+            self.recent_max_stall = 0.0
+            return stall
+
+    # Writer thread
+    def _take_batch(self):
+        with self.cond:
+            deadline = time.monotonic() + self.flush_interval
+            while self.running and self.frames_queued < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            batch = []
+            frames = 0
+            while self.queue and frames < self.batch_size:
+                item = self.queue.popleft()
+                if item[0] == _FRAME:
+                    frames += 1
+                batch.append(item)
+            self.frames_queued -= frames
+            if self.policy == 'block':
+                self.cond.notify_all()
+            return batch, frames
+
+    def _run(self):
+        while True:
+            batch, frames = self._take_batch()
+            if batch:
+                start = time.monotonic()
+                try:
+                    written = self._write_batch(batch)
+                except Exception as e:
+                    print(f"Failed to write log batch: {e}")
+                    written = 0
+                stall = time.monotonic() - start
+                with self.cond:
+                    self.frames_written += written
+                    self.frames_dropped += frames - written
+                    self.last_batch_size = frames
+                    self.max_batch_size = max(self.max_batch_size, frames)
+                    self.batches += 1
+                    self.last_stall = stall
+                    self.max_stall = max(self.max_stall, stall)
+                    self.recent_max_stall = max(self.recent_max_stall, stall)
+                    self.total_stall += stall
+            elif not self.running:
+                break
+            else:
+                # Idle bus: the age limit still ends the segment
+                self._rotate_if_full()
+        self._close_writer()
+
+    def _write_batch(self, batch):
+        """Apply one batch, returns the number of frames that reached a segment"""
+        written = 0
+        for item in batch:
+            kind = item[0]
+            if kind == _FRAME:
+                if self.writer is not None:
+                    _, msg, bus_num, direction, timestamp = item
+                    self.writer.write_frame(msg, bus_num, direction=direction, timestamp=timestamp)
+                    self.segment_frames += 1
+                    written += 1
+            elif kind == _BACKLOG:
+                self._write_backlog(item[1])
+            elif kind == _OPEN:
+                self.factory = item[1]
+                self._open_writer()
+            else:
+                self.factory = None
+                self._close_writer()
+        if self.writer is not None:
+            self.writer.flush()
+            self._rotate_if_full()
+        return written
+
+    def _write_backlog(self, frames):
+        """Write a queued backlog and count it; without an open segment its frames are dropped"""
+        written = 0
+        dropped = 0
+        for bus_num, msg, direction, timestamp in frames:
+            if self.writer is None:
+                dropped += 1
+                continue
+            self.writer.write_frame(msg, bus_num, direction=direction, timestamp=timestamp)
+            written += 1
+        self.segment_frames += written
+        with self.cond:
+            self.frames_written += written
+            self.frames_dropped += dropped
+
+    def _rotate_if_full(self):
+        if self.writer is not None and self._segment_full():
+            print("Rotating log file...")
+            self._open_writer()
+            self.segments_rotated += 1
+
+    def _segment_full(self):
+        """
+        Whichever limit is reached first, size or duration, ends the segment.
+        A segment nothing was written to yet (the one kept open while not
+        recording) never ages out, so an idle logger leaves no empty files.
+        """
+        if self.max_segment_bytes and self.writer.size() >= self.max_segment_bytes:
+            return True
+        if (self.max_segment_seconds and self.segment_frames
+                and time.monotonic() - self.segment_opened_at >= self.max_segment_seconds):
+            return True
+        return False
+
+    def _open_writer(self):
+        self._close_writer()
+        try:
+            self.writer = self.factory()
+            self.segment_opened_at = time.monotonic()
+            self.segment_start_time = time.time()
+        except Exception as e:
+            print(f"Failed to open log segment: {e}")
+            self.writer = None
+
+    def _close_writer(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                print(f"Failed to close log segment: {e}")
+            self.writer = None
+        self.segment_opened_at = None
+        self.segment_start_time = None
+        self.segment_frames = 0
@@ -0,0 +1,272 @@
+"""
+CAN 多行程接收模組
+Multi-process capture: one pinned reader process per bus, frames handed to
+the logger process through shared-memory rings.
+
+In a single process every ``recv()`` (socket read, python-can Message
+construction) competes for the GIL with the state machine and the writer
+thread. ``ProcessCapture`` moves reception into one process per bus, each
+pinned to its own core. A reader packs every frame into a
+``multiprocessing.shared_memory`` ring in the binary log record layout
+(CanLogFormat.record_struct) and the logger process, the single writer,
+drains all rings and hands the frames to the same ``on_frames`` callback a
+CaptureThread would call.
+
+Each ring has exactly one producer and one consumer. The producer only moves
+``head``, the consumer only moves ``tail``; both are published through
+lock-guarded ``multiprocessing.Value`` counters once per batch, which also
+orders the record stores against the index update on weakly ordered CPUs
+such as the Pi's Cortex-A cores. A full ring drops the new frames and counts
+them, the same as the 'count-drops' write queue policy; the same counter also
+takes the frames a reader's socket lost to a full receive queue.
+"""
+
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import can
+
+from CanLogFormat import FLAG_ERROR, FLAG_EXTENDED, FLAG_FD, FLAG_REMOTE, FLAG_TX, message_flags, record_struct
+from CanReception import SocketReader
+
+
+class RingFrame:
+    """A frame read back from a ring, with the Message attributes the log writers and the pre-trigger buffer use"""
+
+    __slots__ = ('timestamp', 'arbitration_id', 'is_extended_id', 'is_remote_frame', 'is_error_frame',
+                 'is_fd', 'is_rx', 'dlc', 'data')
+
+    def __init__(self, timestamp, can_id, flags, dlc, data):
+        self.timestamp = timestamp / 1000000
+        self.arbitration_id = can_id
+        self.is_extended_id = bool(flags & FLAG_EXTENDED)
+        self.is_remote_frame = bool(flags & FLAG_REMOTE)
+        self.is_error_frame = bool(flags & FLAG_ERROR)
+        self.is_fd = bool(flags & FLAG_FD)
+        self.is_rx = not flags & FLAG_TX
+        self.dlc = dlc
+        self.data = data
+
+
+class SharedFrameRing:
+    """Single-producer single-consumer frame ring in shared memory"""
+
+    def __init__(self, capacity=65536, payload_size=8):
+        self.capacity = capacity
+        self.payload_size = payload_size
+        self.record = record_struct(payload_size)
+        self.shm = shared_memory.SharedMemory(create=True, size=capacity * self.record.size)
+        self.head = multiprocessing.Value('Q', 0)  # frames written, moved by the producer
+        self.tail = multiprocessing.Value('Q', 0)  # frames read, moved by the consumer
+        self.dropped = multiprocessing.Value('Q', 0)
+        # Forked readers inherit this object, only the creating process unlinks the memory
+        self.owner_pid = os.getpid()
+
+    def __getstate__(self):
+        return {'name': self.shm.name, 'capacity': self.capacity, 'payload_size': self.payload_size,
+                'head': self.head, 'tail': self.tail, 'dropped': self.dropped}
+
+    def __setstate__(self, state):
+        self.capacity = state['capacity']
+        self.payload_size = state['payload_size']
+        self.record = record_struct(self.payload_size)
+        self.shm = shared_memory.SharedMemory(name=state['name'])
+        self.head = state['head']
+        self.tail = state['tail']
+        self.dropped = state['dropped']
+        self.owner_pid = None
+
+    def __len__(self):
+        return self.head.value - self.tail.value
+
+    # Producer
+    def put(self, bus_num, msgs):
+        """Append received messages, returns how many fit (the rest is counted as dropped)"""
+        head = self.head.value
+        count = min(len(msgs), self.capacity - (head - self.tail.value))
+        size = self.record.size
+        pack_into = self.record.pack_into
+        buf = self.shm.buf
+        for msg in msgs[:count]:
+            pack_into(buf, (head % self.capacity) * size, int(msg.timestamp * 1000000), msg.arbitration_id,
+                      message_flags(msg, None if msg.is_rx else 'Tx'), bus_num, msg.dlc, bytes(msg.data))
+            head += 1
+        self.head.value = head
+        if count < len(msgs):
+            with self.dropped.get_lock():
+                self.dropped.value += len(msgs) - count
+        return count
+
+    # Consumer
+    def read(self, frames, max_frames=4096):
+        """Append up to ``max_frames`` (bus_num, RingFrame) to ``frames``, returns the number read"""
+        tail = self.tail.value
+        count = min(self.head.value - tail, max_frames)
+        if count <= 0:
+            return 0
+        size = self.record.size
+        start = tail % self.capacity
+        first = min(count, self.capacity - start)
+        spans = [(start, first)]
+        if count > first:
+            spans.append((0, count - first))
+        for slot, length in spans:
+            chunk = self.shm.buf[slot * size:(slot + length) * size]
+            for timestamp, can_id, flags, bus_num, dlc, data in self.record.iter_unpack(chunk):
+                frames.append((bus_num, RingFrame(timestamp, can_id, flags, dlc,
+                                                  data[:min(dlc, self.payload_size)])))
+            chunk.release()
+        self.tail.value = tail + count
+        return count
+
+    def close(self):
+        self.shm.close()
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
+
+
+def _reader_main(channel, bus_num, ring, cpu, stop_event, max_batch):
+    """Reader process: receive from one bus into its ring until ``stop_event`` is set"""
+    # Ctrl-C goes to the whole process group; the logger process stops the readers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cpu is not None:
+        os.sched_setaffinity(0, {cpu})
+    bus = None
+    reader = None
+    reported = 0  # socket drops already added to ring.dropped
+    while not stop_event.is_set():
+        if bus is None:
+            try:
+                bus = can.interface.Bus(channel=channel, interface='socketcan')
+                reader = SocketReader(bus)
+                reported = 0
+            except OSError:
+                print(f"[{channel} reader] CAN not available, retrying in 5 sec...")
+                stop_event.wait(5)
+                continue
+        try:
+            msg = reader.recv(timeout=0.05)
+            if msg is None:
+                continue
+            batch = [msg]
+            while len(batch) < max_batch:
+                msg = reader.recv(timeout=0)
+                if msg is None:
+                    break
+                batch.append(msg)
+            ring.put(bus_num, batch)
+            if reader.drops != reported:
+                with ring.dropped.get_lock():
+                    ring.dropped.value += reader.drops - reported
+                reported = reader.drops
+        except (can.CanError, OSError) as e:
+            print(f"[{channel} reader] error: {e}, reconnecting")
+            try:
+                bus.shutdown()
+            except Exception:
+                pass
+            bus = None
+            stop_event.wait(1)
+    if bus is not None:
+        bus.shutdown()
+    ring.close()
+
+
+class ProcessCapture:
+    """
+    Drop-in for CanReception.CaptureThread backed by reader processes.
+
+    The readers open (and reopen) their own sockets, so ``replace_bus()`` only
+    restarts a reader process that died; ``failed`` is set when one has.
+    """
+
+    def __init__(self, channels, on_frames, cpus=None, capacity=65536, payload_size=8, poll_interval=0.001,
+                 max_batch=512, name="can-capture"):
+        """
+        Args:
+            channels: socketcan interface per bus number, e.g. ['can0', 'can1']
+            on_frames: called with a list of (bus_num, frame) on the drain thread
+            cpus: core per reader process (None: not pinned)
+            capacity: frames per ring
+            poll_interval: seconds the drain thread sleeps when every ring is empty
+        """
+        self.channels = list(channels)
+        self.on_frames = on_frames
+        self.cpus = list(cpus) if cpus else [None] * len(self.channels)
+        self.poll_interval = poll_interval
+        self.max_batch = max_batch
+        self.name = name
+        self.rings = [SharedFrameRing(capacity, payload_size) for _ in self.channels]
+        self.readers = [None] * len(self.channels)
+        self.stop_event = multiprocessing.Event()
+        self.failed = threading.Event()
+        self.running = False
+        self.thread = None
+        self.frames_captured = 0
+        self.frame_counts = [0] * len(self.channels)  # same meaning as MultiBusReceiver.frame_counts
+
+    @property
+    def drop_counts(self):
+        """Frames dropped per bus because its ring or its reader's socket queue was full"""
+        return [ring.dropped.value for ring in self.rings]
+
+    def _start_reader(self, bus_num):
+        reader = multiprocessing.Process(
+            target=_reader_main, name=f"{self.name}-{self.channels[bus_num]}", daemon=True,
+            args=(self.channels[bus_num], bus_num, self.rings[bus_num], self.cpus[bus_num],
+                  self.stop_event, self.max_batch))
+        reader.start()
+        self.readers[bus_num] = reader
+
+    def start(self):
+        for bus_num in range(len(self.channels)):
+            self._start_reader(bus_num)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        for reader in self.readers:
+            if reader is not None:
+                reader.join(timeout)
+                if reader.is_alive():
+                    reader.terminate()
+        # The drain thread empties the rings before it exits
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
+        for ring in self.rings:
+            ring.close()
+
+    def replace_bus(self, bus_num, bus=None):
+        """Restart the reader of ``bus_num`` if it died (``bus`` is ignored, readers own their sockets)"""
+        reader = self.readers[bus_num]
+        if reader is not None and not reader.is_alive():
+            print(f"Restarting {self.channels[bus_num]} reader process")
+            self._start_reader(bus_num)
+        if all(reader.is_alive() for reader in self.readers):
+            self.failed.clear()
+
+    def _drain(self):
+        frames = []
+        for bus_num, ring in enumerate(self.rings):
+            self.frame_counts[bus_num] += ring.read(frames)
+        if frames:
+            self.frames_captured += len(frames)
+            self.on_frames(frames)
+        return len(frames)
+
+    def _run(self):
+        while self.running:
+            if not self._drain():
+                if not self.failed.is_set() and not all(reader.is_alive() for reader in self.readers):
+                    print("Capture error: reader process exited")
+                    self.failed.set()
+                time.sleep(self.poll_interval)
+        while self._drain():
+            pass
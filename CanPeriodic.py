@@ -0,0 +1,84 @@
+"""
+CAN 週期傳送模組
+Cyclic transmit of the logger's heartbeat frames.
+
+Each frame is handed to ``bus.send_periodic()``, which on socketcan creates a
+broadcast manager (BCM) task: the kernel sends the frame on an exact period,
+independent of how busy or blocked the Python process is. On other python-can
+interfaces (e.g. 'virtual') the library falls back to a sender thread.
+
+The content of a frame comes from a payload callback. ``refresh()`` calls every
+callback and pushes a changed payload into the running task (BCM TX_SETUP
+update), so changing the data never restarts or shifts the period.
+"""
+
+import can
+
+
+class CyclicEntry:
+    """One periodic frame: where it is sent, how often, and where its payload comes from"""
+
+    def __init__(self, bus_num, arbitration_id, period, payload):
+        self.bus_num = bus_num
+        self.arbitration_id = arbitration_id
+        self.period = period
+        self.payload = payload
+        self.data = None
+        self.task = None
+
+    def message(self, data):
+        return can.Message(arbitration_id=self.arbitration_id, data=data, is_extended_id=False)
+
+
+class CyclicTransmitter:
+    def __init__(self, buses):
+        """
+        Args:
+            buses: python-can buses indexed by bus number
+        """
+        self.buses = list(buses)
+        self.entries = []
+
+    def add(self, bus_num, arbitration_id, period, payload):
+        """
+        Start sending a frame every ``period`` seconds.
+
+        Args:
+            payload: callable returning the current data bytes of the frame
+        """
+        entry = CyclicEntry(bus_num, arbitration_id, period, payload)
+        entry.data = bytes(payload())
+        self._start(entry)
+        self.entries.append(entry)
+        return entry
+
+    def _start(self, entry):
+        entry.task = self.buses[entry.bus_num].send_periodic(entry.message(entry.data), entry.period,
+                                                             store_task=False)
+
+    def refresh(self):
+        """Update every task whose payload callback returns new data"""
+        for entry in self.entries:
+            data = bytes(entry.payload())
+            if data != entry.data:
+                entry.task.modify_data(entry.message(data))
+                entry.data = data
+
+    def replace_bus(self, bus_num, bus):
+        """Move the tasks of one bus to a reconnected bus"""
+        self.buses[bus_num] = bus
+        for entry in self.entries:
+            if entry.bus_num == bus_num:
+                self._stop_task(entry)
+                self._start(entry)
+
+    def stop(self):
+        for entry in self.entries:
+            self._stop_task(entry)
+
+    @staticmethod
+    def _stop_task(entry):
+        try:
+            entry.task.stop()
+        except (can.CanError, OSError):
+            pass  # the socket of a failed bus is already gone
@@ -0,0 +1,153 @@
+"""
+CAN 觸發前緩衝模組
+Pre-trigger buffer: keep the last few seconds of traffic while not recording.
+
+When recording starts (VCU edge or 0x420 start command) the buffered frames
+are written into the new segment first, so a recording also shows what led
+up to the event. ``detach()`` hands the rings over as they are, in constant
+time; the messages are rebuilt by whoever iterates the backlog (the log
+writer thread), never on the capture thread.
+
+Frames are stored per bus in a fixed-size ring of parallel ``array`` columns
+(timestamp, ID, flags, DLC) plus one ``bytearray`` for the payloads, about
+22 bytes per classic CAN frame instead of a python-can Message object each.
+The ring is sized for ``seconds`` at ``max_fps``; on a busier bus it simply
+covers a shorter window.
+"""
+
+import heapq
+from array import array
+
+import can
+
+from CanLogFormat import (FLAG_ERROR, FLAG_EXTENDED, FLAG_FD, FLAG_REMOTE, FLAG_TX,
+                          message_flags)
+
+# 8-byte standard frame incl. stuffing ~ 125 bits -> ~8000 frames/s at 1 Mbit/s
+FULL_LOAD_FPS = 8000
+
+
+class FrameRing:
+    """Fixed-capacity ring of CAN frames, the oldest frame is overwritten when full"""
+
+    def __init__(self, capacity, payload_size=8):
+        self.capacity = capacity
+        self.payload_size = payload_size
+        self.timestamps = array('Q', bytes(8 * capacity))
+        self.can_ids = array('I', bytes(4 * capacity))
+        self.flags = array('B', bytes(capacity))
+        self.dlcs = array('B', bytes(capacity))
+        self.payloads = bytearray(payload_size * capacity)
+        self.zeros = bytes(payload_size)
+        self.next = 0  # slot the next frame goes into
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self, timestamp, msg, flags):
+        i = self.next
+        self.timestamps[i] = timestamp
+        self.can_ids[i] = msg.arbitration_id
+        self.flags[i] = flags
+        data = msg.data[:self.payload_size]
+        self.dlcs[i] = msg.dlc
+        start = i * self.payload_size
+        end = start + len(data)
+        self.payloads[start:end] = data
+        if len(data) < self.payload_size:
+            self.payloads[end:start + self.payload_size] = self.zeros[len(data):]
+        self.next = (i + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def clear(self):
+        self.next = 0
+        self.count = 0
+
+    def iter_since(self, since):
+        """Yield (timestamp, slot) oldest first for frames stamped at or after ``since``"""
+        first = (self.next - self.count) % self.capacity
+        for n in range(self.count):
+            i = (first + n) % self.capacity
+            if self.timestamps[i] >= since:
+                yield self.timestamps[i], i
+
+    def message(self, i):
+        """Rebuild a python-can Message from a slot, returns (msg, direction)"""
+        flags = self.flags[i]
+        start = i * self.payload_size
+        length = 0 if flags & FLAG_REMOTE else min(self.dlcs[i], self.payload_size)
+        msg = can.Message(
+            timestamp=self.timestamps[i] / 1000000,
+            arbitration_id=self.can_ids[i],
+            is_extended_id=bool(flags & FLAG_EXTENDED),
+            is_remote_frame=bool(flags & FLAG_REMOTE),
+            is_error_frame=bool(flags & FLAG_ERROR),
+            is_fd=bool(flags & FLAG_FD),
+            dlc=self.dlcs[i],
+            data=self.payloads[start:start + length],
+            check=False,
+        )
+        return msg, 'Tx' if flags & FLAG_TX else 'Rx'
+
+
+class PreTriggerBuffer:
+    def __init__(self, num_buses, seconds=5.0, max_fps=FULL_LOAD_FPS, payload_size=8):
+        """
+        Args:
+            num_buses: one ring per bus number
+            seconds: how much history to hand over when recording starts
+            max_fps: frame rate the rings are sized for
+            payload_size: bytes stored per frame (64 for CAN FD)
+        """
+        self.window = int(seconds * 1000000)
+        capacity = max(1, int(seconds * max_fps))
+        self.rings = [FrameRing(capacity, payload_size) for _ in range(num_buses)]
+
+    def __len__(self):
+        return sum(len(ring) for ring in self.rings)
+
+    def push(self, bus_num, msg, timestamp, direction=None):
+        """Buffer one frame, ``timestamp`` in us like the log records"""
+        self.rings[bus_num].push(timestamp, msg, message_flags(msg, direction))
+
+    def detach(self, now):
+        """
+        Take the frames of the last ``seconds`` before ``now`` (us) out of the buffer without
+        rebuilding them: the filled rings are swapped for empty ones.
+
+        Returns:
+            PreTriggerBacklog, iterate it on the thread that writes the frames
+        """
+        rings = self.rings
+        self.rings = [FrameRing(ring.capacity, ring.payload_size) for ring in rings]
+        return PreTriggerBacklog(rings, now - self.window)
+
+    def drain(self, now):
+        """
+        Hand over the frames of the last ``seconds`` before ``now`` (us) and empty the buffer.
+
+        Returns:
+            list of (bus_num, msg, direction, timestamp) in timestamp order across buses
+        """
+        return list(self.detach(now))
+
+
+class PreTriggerBacklog:
+    """Frames taken out of a PreTriggerBuffer, rebuilt as messages only while iterated"""
+
+    def __init__(self, rings, since):
+        self.rings = rings
+        self.since = since
+
+    def __iter__(self):
+        """Yield (bus_num, msg, direction, timestamp) in timestamp order across buses"""
+        per_bus = [self._keyed(bus_num) for bus_num in range(len(self.rings))]
+        for timestamp, bus_num, slot in heapq.merge(*per_bus):
+            msg, direction = self.rings[bus_num].message(slot)
+            yield bus_num, msg, direction, timestamp
+
+    def _keyed(self, bus_num):
+        for timestamp, slot in self.rings[bus_num].iter_since(self.since):
+            yield timestamp, bus_num, slot
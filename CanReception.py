@@ -0,0 +1,247 @@
+"""
+CAN 多匯流排接收模組
+Event-driven reception for several CAN buses at once.
+
+Instead of alternating short ``recv(timeout)`` polls on each bus, all SocketCAN
+sockets are registered with one selector. ``poll()`` sleeps until at least one
+socket is readable and then drains every ready socket, so a busy can0 never
+delays frames waiting on can1 and an idle bus costs nothing.
+
+``CaptureThread`` runs such a receiver on its own thread, so the bulk logging
+stream can be drained independently of a control loop that only listens on
+kernel-filtered sockets.
+
+SocketCAN buses are read through ``SocketReader``: when a socket's receive
+queue is full (the program did not read fast enough) the kernel drops the
+frame and counts it only on that socket, never in the interface statistics.
+``drop_counts`` reports those per-socket drops per bus.
+"""
+
+import select
+import selectors
+import socket
+import struct
+import threading
+import time
+
+import can
+
+# Not exported by the socket module: ancillary u32 with the socket's drop count
+SO_RXQ_OVFL = getattr(socket, 'SO_RXQ_OVFL', 40)
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)
+CAN_EFF_FLAG = 0x80000000
+CAN_RTR_FLAG = 0x40000000
+CAN_ERR_FLAG = 0x20000000
+CANFD_BRS = 0x01
+CANFD_ESI = 0x02
+CANFD_MTU = 72
+_FRAME_HEADER = struct.Struct('=IBB2x')
+_TIMESPEC = struct.Struct('@ll')
+_DROPS = struct.Struct('@I')
+_ANCILLARY_SIZE = (socket.CMSG_SPACE(_TIMESPEC.size) + socket.CMSG_SPACE(_DROPS.size)
+                   if hasattr(socket, 'CMSG_SPACE') else 0)
+
+
+class SocketReader:
+    """
+    Non-blocking reads from the raw socket of a python-can socketcan bus, with its drop counter.
+
+    python-can's socketcan backend accepts exactly one ancillary message per frame
+    (the SO_TIMESTAMPNS receive time), so SO_RXQ_OVFL cannot be enabled through it.
+    This reader enables both on the bus's socket and parses them itself: ``drops`` is
+    the kernel's count of frames this socket lost to a full receive queue.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.sock = bus.socket
+        self.channel = getattr(bus, 'channel', None) or None
+        self.sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        self.drops = 0
+
+    @staticmethod
+    def supports(bus):
+        """True for buses with a SocketCAN raw socket"""
+        sock = getattr(bus, 'socket', None)
+        return sock is not None and getattr(sock, 'family', None) == getattr(socket, 'AF_CAN', -1)
+
+    def recv(self, timeout=0):
+        """Next frame as a python-can Message, None if none arrives within ``timeout`` seconds"""
+        if timeout and not select.select([self.sock], [], [], timeout)[0]:
+            return None
+        try:
+            frame, ancillary, msg_flags, _ = self.sock.recvmsg(CANFD_MTU, _ANCILLARY_SIZE, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            raise can.CanOperationError(f"Error receiving: {e.strerror}", e.errno) from e
+        timestamp = None
+        for level, kind, data in ancillary:
+            if level != socket.SOL_SOCKET:
+                continue
+            if kind == SO_TIMESTAMPNS:
+                seconds, nanoseconds = _TIMESPEC.unpack_from(data)
+                timestamp = seconds + nanoseconds * 1e-9
+            elif kind == SO_RXQ_OVFL:
+                # Cumulative, only sent once the socket has dropped something
+                self.drops = _DROPS.unpack_from(data)[0]
+        can_id, length, flags = _FRAME_HEADER.unpack_from(frame)
+        extended = bool(can_id & CAN_EFF_FLAG)
+        remote = bool(can_id & CAN_RTR_FLAG)
+        return can.Message(
+            timestamp=time.time() if timestamp is None else timestamp,
+            channel=self.channel,
+            arbitration_id=can_id & (0x1FFFFFFF if extended else 0x7FF),
+            is_extended_id=extended,
+            is_remote_frame=remote,
+            is_error_frame=bool(can_id & CAN_ERR_FLAG),
+            is_fd=len(frame) == CANFD_MTU,
+            is_rx=not msg_flags & socket.MSG_DONTROUTE,
+            bitrate_switch=bool(flags & CANFD_BRS),
+            error_state_indicator=bool(flags & CANFD_ESI),
+            dlc=length,
+            data=b'' if remote else frame[8:8 + length],
+            check=False,
+        )
+
+
+class MultiBusReceiver:
+    def __init__(self, buses, max_batch=512):
+        """
+        Args:
+            buses: list of python-can buses, the list index is used as bus number
+            max_batch: max frames read from one bus per ready event, so a
+                saturated bus cannot starve the others
+        """
+        self.max_batch = max_batch
+        self.selector = selectors.DefaultSelector()
+        self.buses = []
+        self.readers = []  # SocketReader per bus number, None for buses without a raw socket
+        self.frame_counts = []  # frames received per bus number, kept across replace_bus()
+        self.replaced_drops = []  # socket drops of the buses replace_bus() swapped out
+        # Buses without a file descriptor (e.g. python-can 'virtual') are polled
+        self.polled = set()
+        for bus in buses:
+            self.buses.append(None)
+            self.readers.append(None)
+            self.frame_counts.append(0)
+            self.replaced_drops.append(0)
+            self.replace_bus(len(self.buses) - 1, bus)
+
+    def replace_bus(self, bus_num, bus):
+        """Swap in a (reconnected) bus object for the given bus number"""
+        old_bus = self.buses[bus_num]
+        if old_bus is not None and bus_num not in self.polled:
+            try:
+                self.selector.unregister(old_bus)
+            except (KeyError, ValueError):
+                pass
+        self.polled.discard(bus_num)
+        if self.readers[bus_num] is not None:
+            self.replaced_drops[bus_num] += self.readers[bus_num].drops
+        self.buses[bus_num] = bus
+        self.readers[bus_num] = SocketReader(bus) if SocketReader.supports(bus) else None
+
+        try:
+            bus.fileno()
+            self.selector.register(bus, selectors.EVENT_READ, bus_num)
+        except (NotImplementedError, AttributeError, OSError):
+            self.polled.add(bus_num)
+
+    @property
+    def drop_counts(self):
+        """Frames each bus's sockets dropped because their receive queue was full"""
+        return [base + (reader.drops if reader is not None else 0)
+                for base, reader in zip(self.replaced_drops, self.readers)]
+
+    @property
+    def drops_counted(self):
+        """True if every bus is read through a SocketReader, so drop_counts is complete"""
+        return all(reader is not None for reader in self.readers)
+
+    def drain(self, bus_num, frames):
+        """Read everything already queued on one bus without blocking"""
+        bus = self.readers[bus_num] or self.buses[bus_num]
+        before = len(frames)
+        for _ in range(self.max_batch):
+            msg = bus.recv(timeout=0)
+            if msg is None:
+                break
+            frames.append((bus_num, msg))
+        self.frame_counts[bus_num] += len(frames) - before
+
+    def poll(self, timeout=0.1):
+        """
+        Wait up to ``timeout`` seconds for frames on any bus.
+
+        Returns:
+            list of (bus_num, msg) in the order they were read
+        """
+        frames = []
+        if self.polled:
+            # Mixed setup: do not block on the selector while a polled bus waits
+            for bus_num in self.polled:
+                self.drain(bus_num, frames)
+            timeout = 0 if frames else min(timeout, 0.001)
+
+        if self.selector.get_map():
+            for key, _ in self.selector.select(timeout):
+                self.drain(key.data, frames)
+        elif not frames:
+            time.sleep(timeout)
+        return frames
+
+    def close(self):
+        self.selector.close()
+
+
+class CaptureThread:
+    """
+    Drains a MultiBusReceiver on a background thread.
+
+    Every non-empty poll result is handed to ``on_frames(frames)`` on the
+    capture thread. CAN errors are not retried here: the thread sets
+    ``failed`` and keeps polling, and the owner swaps in reconnected buses
+    with ``replace_bus()``.
+    """
+
+    def __init__(self, receiver, on_frames, poll_timeout=0.05, name="can-capture"):
+        self.receiver = receiver
+        self.on_frames = on_frames
+        self.poll_timeout = poll_timeout
+        self.name = name
+        self.lock = threading.Lock()  # guards the receiver's selector against replace_bus()
+        self.failed = threading.Event()
+        self.running = False
+        self.thread = None
+        self.frames_captured = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout)
+
+    def replace_bus(self, bus_num, bus):
+        with self.lock:
+            self.receiver.replace_bus(bus_num, bus)
+            self.failed.clear()
+
+    def _run(self):
+        while self.running:
+            try:
+                with self.lock:
+                    frames = self.receiver.poll(timeout=self.poll_timeout)
+            except (can.CanError, OSError) as e:
+                if not self.failed.is_set():
+                    print(f"Capture error: {e}")
+                    self.failed.set()
+                time.sleep(self.poll_timeout)
+                continue
+            if frames:
+                self.frames_captured += len(frames)
+                self.on_frames(frames)
@@ -0,0 +1,322 @@
+"""
+CAN 記錄檔保存管理模組
+Disk retention for the log directory: archive old segments, delete under pressure.
+
+A low-priority background process (idle CPU and I/O scheduling class, see
+``lower_priority()``) passes over the log directory every few minutes:
+
+1. closed segments older than ``archive_after`` are compacted into a
+   columnar archive (``.canarc``, see CanLogFormat) next to them; the
+   archive gets its own sidecar and replaces the segment
+2. while the directory is over ``budget_bytes`` or the file system has less
+   than ``min_free_bytes`` free, the oldest closed files (segments or
+   archives, by modification time) are deleted together with their sidecars
+
+Decoded-signal directories (``<segment>.signals``, CanDecodedOutput) count
+towards the budget, move to the archive's name and are deleted with it.
+
+A segment is never touched while any process holds it open (checked in
+``/proc/*/fd``). Otherwise it counts as closed once its sidecar exists, or
+when it has not been modified for ``stale_seconds`` (segments cut off by a
+power loss, or written without an index). Run the process as the same user
+as the logger, or the open files of the logger are not visible.
+
+The receive path is never involved: all work happens in this separate
+process, which only gets CPU time and disk bandwidth the logger leaves idle
+(the I/O idle class needs the BFQ scheduler; with others it is best effort).
+
+    python3 CanRetention.py /home/pi/Desktop/RPI_Desktop/LOGS --budget-gb 20 --once
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import time
+
+from CanDecodedOutput import signals_path
+from CanLogFormat import (ARCHIVE_EXTENSION, BINARY_EXTENSION, COMPRESSED_EXTENSIONS, is_log_file,
+                          iter_archive_blocks, iter_log_records, open_log_binary, read_archive_header,
+                          read_binary_header, read_binary_trailer, write_archive)
+from CanLogIndex import SegmentIndex, index_path, load_index, write_index
+
+ARCHIVE_AFTER_SECONDS = 24 * 3600
+STALE_SECONDS = 3600
+RETENTION_INTERVAL = 300.0
+
+
+def lower_priority():
+    """Move this process to the idle CPU and I/O scheduling classes"""
+    try:
+        os.sched_setscheduler(0, os.SCHED_IDLE, os.sched_param(0))
+    except (AttributeError, OSError):
+        os.nice(19)
+    try:
+        subprocess.run(["ionice", "-c", "3", "-p", str(os.getpid())], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        print("[retention] ionice not available, running with normal I/O priority")
+
+
+def open_files():
+    """Real paths of every file held open by a process this user can inspect"""
+    paths = set()
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        fd_dir = os.path.join('/proc', pid, 'fd')
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        for fd in fds:
+            try:
+                paths.add(os.readlink(os.path.join(fd_dir, fd)))
+            except OSError:
+                pass
+    return paths
+
+
+def archive_name(segment):
+    """Archive path for a segment: 'can_log_X.csv.gz' -> 'can_log_X.canarc'"""
+    name = segment
+    for suffix in COMPRESSED_EXTENSIONS.values():
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    for extension in ('.csv', BINARY_EXTENSION):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name + ARCHIVE_EXTENSION
+
+
+def count_archive_frames(archive):
+    """Frames in a complete archive, None if it has no end marker"""
+    with open(archive, 'rb') as f:
+        header = read_archive_header(f)
+        frames = sum(count for count, _ in iter_archive_blocks(f, header['codec']))
+        return frames if f.read(4) == b'' else None
+
+
+def archive_segment(segment, codec=None):
+    """
+    Compact one closed segment into an archive and remove the segment.
+
+    The archive is written under a temporary name, read back and only then
+    renamed; its sidecar is written last and marks the archive as complete.
+
+    Returns:
+        path of the archive
+    """
+    archive = archive_name(segment)
+    if load_index(archive) is not None:
+        raise FileExistsError(f"{os.path.basename(archive)} already holds another segment")
+    tmp_path = archive + '.tmp'
+    source_index = load_index(segment)
+    health = source_index.get('health') if source_index else None
+    payload_size = 8
+    if BINARY_EXTENSION in os.path.basename(segment):
+        with open_log_binary(segment) as f:
+            payload_size = read_binary_header(f)['payload_size']
+        if health is None:
+            with open_log_binary(segment) as f:
+                health = read_binary_trailer(f)
+
+    # The archive's sidecar is rebuilt from the records, so segments without one get it too
+    index = SegmentIndex()
+
+    def indexed(records):
+        for record in records:
+            index.add(record[0], record[1], record[5], lambda: 0)
+            yield record
+
+    try:
+        frames = write_archive(indexed(iter_log_records(segment)), tmp_path, payload_size,
+                               info={'source': os.path.basename(segment), 'health': health}, codec=codec)
+        if count_archive_frames(tmp_path) != frames:
+            raise ValueError(f"Archive of {os.path.basename(segment)} failed verification")
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, archive)
+    # Keep the age of the data, deletion under pressure goes by modification time
+    mtime = os.path.getmtime(segment)
+    os.utime(archive, (mtime, mtime))
+    if os.path.isdir(signals_path(segment)):
+        os.replace(signals_path(segment), signals_path(archive))
+    index.health = health
+    summary = index.to_dict(archive)
+    summary['checkpoints'] = []
+    summary['archived_from'] = os.path.basename(segment)
+    write_index(archive, summary)
+    _remove(segment)
+    return archive
+
+
+def _tree_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _remove(path):
+    """Delete a log file, its sidecar and its decoded signals, returns the bytes freed"""
+    freed = 0
+    for name in (path, index_path(path)):
+        try:
+            freed += os.path.getsize(name)
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+    if os.path.isdir(signals_path(path)):
+        freed += _tree_bytes(signals_path(path))
+        shutil.rmtree(signals_path(path), ignore_errors=True)
+    return freed
+
+
+class RetentionManager:
+    """One retention pass over a log directory per ``run_once()``"""
+
+    def __init__(self, log_dir, budget_bytes=None, min_free_bytes=None, archive_after=ARCHIVE_AFTER_SECONDS,
+                 stale_seconds=STALE_SECONDS, codec=None):
+        """
+        Args:
+            budget_bytes: most bytes the directory may hold, None for no limit
+            min_free_bytes: free space to keep on the file system, None for no limit
+            archive_after: seconds after its last write a closed segment is archived, None never
+        """
+        self.log_dir = log_dir
+        self.budget_bytes = budget_bytes
+        self.min_free_bytes = min_free_bytes
+        self.archive_after = archive_after
+        self.stale_seconds = stale_seconds
+        self.codec = codec
+
+    def log_files(self):
+        """Segments and archives in the directory, oldest (last modified) first"""
+        files = []
+        for name in os.listdir(self.log_dir):
+            path = os.path.join(self.log_dir, name)
+            if is_log_file(name) and os.path.isfile(path):
+                files.append((os.path.getmtime(path), path))
+        return [path for _, path in sorted(files)]
+
+    def is_closed(self, path, open_paths):
+        if os.path.realpath(path) in open_paths:
+            return False
+        if path.endswith(ARCHIVE_EXTENSION) or os.path.exists(index_path(path)):
+            return True
+        return time.time() - os.path.getmtime(path) > self.stale_seconds
+
+    def directory_bytes(self):
+        return _tree_bytes(self.log_dir)
+
+    def under_pressure(self):
+        if self.budget_bytes is not None and self.directory_bytes() > self.budget_bytes:
+            return True
+        return self.min_free_bytes is not None and shutil.disk_usage(self.log_dir).free < self.min_free_bytes
+
+    def _finish_interrupted(self):
+        """Clean up after a pass that was killed: temporary archives, sources of finished archives"""
+        for name in os.listdir(self.log_dir):
+            path = os.path.join(self.log_dir, name)
+            if name.endswith(ARCHIVE_EXTENSION + '.tmp'):
+                os.remove(path)
+            elif is_log_file(name) and not name.endswith(ARCHIVE_EXTENSION):
+                archived = load_index(archive_name(path))
+                if archived is not None and archived.get('archived_from') == name:
+                    _remove(path)
+
+    def run_once(self):
+        """
+        Archive what is due, then delete oldest-first while under pressure.
+
+        Returns:
+            dict with 'archived' and 'deleted' (file names), 'freed' (bytes) and 'errors' (messages)
+        """
+        result = {'archived': [], 'deleted': [], 'freed': 0, 'errors': []}
+        self._finish_interrupted()
+        open_paths = open_files()
+
+        if self.archive_after is not None:
+            now = time.time()
+            for path in self.log_files():
+                if (path.endswith(ARCHIVE_EXTENSION) or now - os.path.getmtime(path) < self.archive_after
+                        or not self.is_closed(path, open_paths)):
+                    continue
+                size = os.path.getsize(path) + (os.path.getsize(index_path(path))
+                                                if os.path.exists(index_path(path)) else 0)
+                try:
+                    archive = archive_segment(path, self.codec)
+                except Exception as e:  # a corrupt segment must not stop the retention process
+                    result['errors'].append(f"{os.path.basename(path)}: {e}")
+                    continue
+                result['archived'].append(os.path.basename(path))
+                result['freed'] += size - os.path.getsize(archive) - os.path.getsize(index_path(archive))
+
+        if self.under_pressure():
+            open_paths = open_files()
+            for path in self.log_files():
+                if not self.under_pressure():
+                    break
+                if self.is_closed(path, open_paths):
+                    result['freed'] += _remove(path)
+                    result['deleted'].append(os.path.basename(path))
+        return result
+
+
+def _report(result):
+    if result['archived'] or result['deleted']:
+        print(f"[retention] archived {len(result['archived'])}, deleted {len(result['deleted'])} "
+              f"({', '.join(result['deleted']) or '-'}), freed {result['freed'] / 1024 / 1024:.1f} MB")
+    for error in result['errors']:
+        print(f"[retention] error: {error}")
+
+
+def retention_main(log_dir, interval, settings):
+    """Body of the retention process: lower its priority, then one pass every ``interval`` seconds"""
+    # Ctrl-C is handled by the logger, which stops this process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    lower_priority()
+    manager = RetentionManager(log_dir, **settings)
+    while True:
+        try:
+            _report(manager.run_once())
+        except OSError as e:
+            print(f"[retention] error: {e}")
+        time.sleep(interval)
+
+
+def start_retention(log_dir, interval=RETENTION_INTERVAL, **settings):
+    """Start the retention process for ``log_dir`` (RetentionManager settings as keywords)"""
+    process = multiprocessing.Process(target=retention_main, args=(log_dir, interval, settings),
+                                      name="can-retention", daemon=True)
+    process.start()
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old CAN log segments and enforce a disk budget")
+    parser.add_argument('log_dir', help="log directory, e.g. /home/pi/Desktop/RPI_Desktop/LOGS")
+    parser.add_argument('--budget-gb', type=float, default=None, help="most GB the directory may hold")
+    parser.add_argument('--min-free-gb', type=float, default=None, help="free space to keep on the file system")
+    parser.add_argument('--archive-after-hours', type=float, default=ARCHIVE_AFTER_SECONDS / 3600,
+                        help="archive closed segments last written this long ago (0 disables)")
+    parser.add_argument('--interval', type=float, default=RETENTION_INTERVAL, help="seconds between passes")
+    parser.add_argument('--once', action='store_true', help="run a single pass and exit")
+    args = parser.parse_args()
+
+    settings = {
+        'budget_bytes': int(args.budget_gb * 1024 ** 3) if args.budget_gb else None,
+        'min_free_bytes': int(args.min_free_gb * 1024 ** 3) if args.min_free_gb else None,
+        'archive_after': args.archive_after_hours * 3600 if args.archive_after_hours else None,
+    }
+    if args.once:
+        lower_priority()
+        _report(RetentionManager(args.log_dir, **settings).run_once())
+    else:
+        retention_main(args.log_dir, args.interval, settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+訊號歷史模組
+Fixed-capacity time series of selected signals, kept on the server.
+
+A ``SignalStore`` only holds the latest value of each signal. Given a
+``SignalHistory``, it also appends every numeric write of the recorded
+signals to a per-signal circular buffer: two preallocated NumPy arrays
+(timestamp, value) and a write position. The capacity of each buffer is
+its update rate times the time budget, so a 100 Hz signal and a 1 Hz one
+both cover the same span of time.
+
+    history = SignalHistory(STORE_LAYOUT, {('inverters', 3, 'torque'): 100, ('vcu',): 100}, seconds=120)
+    store = SignalStore(STORE_LAYOUT, history=history)
+    ...
+    window = history.window(('inverters', 3, 'torque'), t0, t1)
+    window.timestamp, window.value      # float64 arrays, oldest first
+
+A path naming a group (``('vcu',)``) or a list records every numeric leaf
+under it. Object signals (names, tuples, datetimes) are not recorded.
+Timestamps are the ones the decoders write with (``time.time()``) and are
+assumed not to go backwards.
+
+``window()`` returns views into the buffer when the window does not wrap
+around its end, and copies only the window otherwise. The views are
+overwritten once the buffer wraps past them; copy them to keep them longer.
+
+Needs the ``numpy`` package.
+"""
+
+import math
+from typing import NamedTuple
+
+from CanSignalStore import OBJECT
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Signal history needs the 'numpy' package (pip install numpy)")
+
+
+class HistoryWindow(NamedTuple):
+    timestamp: 'np.ndarray'  # float64 s, oldest first
+    value: 'np.ndarray'      # float64
+
+
+class _Ring:
+    __slots__ = ('timestamp', 'value', 'capacity', 'head', 'full', '_timestamp_out', '_value_out')
+
+    def __init__(self, capacity):
+        self.timestamp = np.zeros(capacity, np.float64)
+        self.value = np.zeros(capacity, np.float64)
+        self.capacity = capacity
+        self.head = 0  # next write position
+        self.full = False
+        # Item writes through a memoryview are several times cheaper than ndarray.__setitem__
+        self._timestamp_out = memoryview(self.timestamp)
+        self._value_out = memoryview(self.value)
+
+    def append(self, value, timestamp):
+        head = self.head
+        self._value_out[head] = value
+        self._timestamp_out[head] = timestamp
+        head += 1
+        if head == self.capacity:
+            head = 0
+            self.full = True
+        self.head = head
+
+    def __len__(self):
+        return self.capacity if self.full else self.head
+
+    def window(self, t0, t1):
+        # Oldest samples first: [head, capacity) once the ring has wrapped, then [0, head)
+        segments = ((self.head, self.capacity), (0, self.head)) if self.full else ((0, self.head),)
+        parts = []
+        for start, end in segments:
+            timestamps = self.timestamp[start:end]
+            first = start if t0 is None else start + int(np.searchsorted(timestamps, t0, 'left'))
+            last = end if t1 is None else start + int(np.searchsorted(timestamps, t1, 'right'))
+            if first < last:
+                parts.append((first, last))
+        if len(parts) == 1:
+            first, last = parts[0]
+            return HistoryWindow(self.timestamp[first:last], self.value[first:last])
+        if not parts:
+            return HistoryWindow(np.empty(0, np.float64), np.empty(0, np.float64))
+        return HistoryWindow(np.concatenate([self.timestamp[first:last] for first, last in parts]),
+                             np.concatenate([self.value[first:last] for first, last in parts]))
+
+
+class SignalHistory:
+    def __init__(self, layout, rates, seconds=60.0):
+        """
+        Args:
+            layout: SignalLayout of the store that feeds this history
+            rates: {path: update rate in Hz, or (rate, seconds) to override the time budget};
+                a path may name a single signal, a list or a group
+            seconds: time budget every buffer covers at its rate
+        """
+        _require_numpy()
+        self.layout = layout
+        self.rings = [None] * len(layout)  # slot -> _Ring, None when not recorded
+        self.slots = {}                    # path -> slot of every recorded signal
+        for path, rate in rates.items():
+            rate, budget = rate if isinstance(rate, tuple) else (rate, seconds)
+            capacity = max(1, math.ceil(rate * budget))
+            for leaf_path, slot, kind in layout.leaves(*path):
+                if kind == OBJECT:
+                    continue
+                self.rings[slot] = _Ring(capacity)
+                self.slots[leaf_path] = slot
+        if not self.slots:
+            raise ValueError("No numeric signal to record")
+
+    def append(self, slot, value, timestamp):
+        ring = self.rings[slot]
+        if ring is not None:
+            ring.append(value, timestamp)
+
+    def clear(self):
+        """Drop every recorded sample (e.g. when a replay switches to another log)"""
+        for ring in self.rings:
+            if ring is not None:
+                ring.head = 0
+                ring.full = False
+
+    @property
+    def nbytes(self):
+        return sum(ring.timestamp.nbytes + ring.value.nbytes for ring in self.rings if ring is not None)
+
+    def capacity(self, path):
+        return self.rings[self.slots[path]].capacity
+
+    def window(self, path, t0=None, t1=None):
+        """
+        Samples of a recorded signal with t0 <= timestamp <= t1 (None for an open end).
+
+        Returns:
+            HistoryWindow, views into the buffer unless the window wraps around its end
+        """
+        return self.rings[self.slots[path]].window(t0, t1)
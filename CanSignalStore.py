@@ -0,0 +1,339 @@
+"""
+訊號儲存模組
+Slot-based storage of the decoded dashboard signals.
+
+The dashboards describe their state as a nested schema, the same shape as
+the JSON they send to the templates. ``SignalLayout`` assigns every leaf of
+the schema a fixed slot, once; ``SignalStore`` keeps the values in
+preallocated typed arrays indexed by slot:
+
+    values   array('d')  numeric signals, NaN while a signal has no value
+    updated  array('d')  time of the last write of each slot (0.0 never)
+    objects  list        the few non-numeric signals (names, tuples, datetimes)
+
+Schema leaves:
+
+    float / int / object   a signal without a value yet; int slots come back
+                           as int, object slots hold any Python value
+    [float] * 105          one slot per element, consecutive
+    LAST_UPDATE            the time of the newest write in the enclosing dict,
+                           derived from ``updated``, never written
+    any other value        a signal with that initial value (kind from its type)
+
+Decoders resolve their slots at import time and write through ``set()``,
+``set_many()`` (consecutive slots, e.g. one decoded frame) and
+``set_object()``: an array store per value instead of nested dict lookups,
+and no per-frame allocation. ``view()`` rebuilds the nested dict for the
+templates and the JSON broadcast; ``snapshot()`` copies the whole state as
+a few flat arrays. A store given a ``CanSignalHistory.SignalHistory`` also
+keeps the recent samples of the signals that history records.
+
+Writes that change a value are counted: ``generation`` goes up by one and
+the slot goes into a fixed-size change log. ``changes_since(generation)``
+returns the slots changed after an earlier generation by reading only the
+log entries since then, so a 20 Hz broadcaster rebuilds just what moved.
+Writes of an unchanged value only move the update time.
+
+    view = store.view()
+    generation = store.generation
+    ...
+    generation, slots = store.changes_since(generation)   # [] when nothing changed
+    store.refresh(view, slots)                            # rewrite only what changed
+
+    LAYOUT = SignalLayout({'vcu': {'steer': float, 'accel': int, 'last_update': LAST_UPDATE}})
+    VCU_SLOTS = LAYOUT.span(('vcu',), 'steer', 'accel')
+
+    store = SignalStore(LAYOUT)
+    store.set_many(VCU_SLOTS, (12.5, 40), time.time())
+    store.view()    # {'vcu': {'steer': 12.5, 'accel': 40, 'last_update': 1700000000.0}}
+"""
+
+from array import array
+
+FLOAT = 0
+INT = 1
+OBJECT = 2
+
+_NAN = float('nan')
+
+# Changes remembered by the log; a reader further behind gets every slot back
+CHANGE_LOG_SIZE = 4096
+_CHANGE_LOG_MASK = CHANGE_LOG_SIZE - 1
+
+
+class _LastUpdate:
+    def __repr__(self):
+        return 'LAST_UPDATE'
+
+
+LAST_UPDATE = _LastUpdate()
+
+
+def _leaf_kind(leaf):
+    """(kind, initial value) of a schema leaf"""
+    if leaf is float:
+        return FLOAT, _NAN
+    if leaf is int:
+        return INT, _NAN
+    if leaf is object:
+        return OBJECT, None
+    if type(leaf) is float:
+        return FLOAT, leaf
+    if type(leaf) is int:
+        return INT, float(leaf)
+    return OBJECT, leaf
+
+
+class SignalLayout:
+    def __init__(self, schema):
+        """
+        Args:
+            schema: nested dict of the state, see the module docstring for the leaves
+        """
+        self.slots = {}  # path tuple -> slot (first slot of a list)
+        self.paths = []  # slot -> path tuple, list elements end with their index
+        self.last_updates = []  # (dict path, key, first slot, end slot) of every LAST_UPDATE field
+        self.kinds = bytearray()
+        self.initial_values = array('d')
+        self.initial_objects = []
+        self.tree = self._compile(schema, ())
+
+    def _add(self, path, leaf):
+        kind, initial = _leaf_kind(leaf)
+        slot = len(self.kinds)
+        self.paths.append(path)
+        self.kinds.append(kind)
+        self.initial_values.append(_NAN if kind == OBJECT else initial)
+        self.initial_objects.append(initial if kind == OBJECT else None)
+        return slot
+
+    def _compile(self, node, path):
+        """View tree: ('dict', [(key, subtree)], first, end), ('list', first, end, kind) or ('slot', slot, kind)"""
+        if isinstance(node, dict):
+            first = len(self.kinds)
+            items = []
+            for key, value in node.items():
+                if value is LAST_UPDATE:
+                    items.append((key, None))
+                else:
+                    items.append((key, self._compile(value, path + (key,))))
+            end = len(self.kinds)
+            self.last_updates += [(path, key, first, end) for key, child in items if child is None]
+            return ('dict', items, first, end)
+        if isinstance(node, list):
+            first = len(self.kinds)
+            self.slots[path] = first
+            kinds = {_leaf_kind(leaf)[0] for leaf in node}
+            if len(kinds) > 1 or OBJECT in kinds:
+                raise ValueError(f"List {'/'.join(map(str, path))} must hold numbers of one kind")
+            for index, leaf in enumerate(node):
+                self._add(path + (index,), leaf)
+            return ('list', first, len(self.kinds), kinds.pop() if kinds else FLOAT)
+        slot = self._add(path, node)
+        self.slots[path] = slot
+        return ('slot', slot, self.kinds[slot])
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def slot(self, *path):
+        """Slot of the leaf at ``path`` (first slot of a list)"""
+        return self.slots[path]
+
+    def leaves(self, *path):
+        """(path, slot, kind) of every leaf at or under ``path``, list elements one by one"""
+        node = self.tree
+        for key in path:
+            node = dict(node[1])[key] if node[0] == 'dict' else None
+            if node is None:
+                raise KeyError(path)
+        return list(self._leaves(node, path))
+
+    def _leaves(self, node, path):
+        tag = node[0]
+        if tag == 'slot':
+            yield path, node[1], node[2]
+        elif tag == 'list':
+            _, first, end, kind = node
+            for index, slot in enumerate(range(first, end)):
+                yield path + (index,), slot, kind
+        else:
+            for key, child in node[1]:
+                if child is not None:
+                    yield from self._leaves(child, path + (key,))
+
+    def span(self, path, *names):
+        """First slot of the leaves ``names`` under ``path``, which must be consecutive numeric slots"""
+        first = self.slots[path + (names[0],)]
+        for offset, name in enumerate(names):
+            slot = self.slots[path + (name,)]
+            if slot != first + offset or self.kinds[slot] == OBJECT:
+                raise ValueError(f"{'/'.join(map(str, path + (name,)))} does not follow {names[0]} "
+                                 f"as a numeric slot")
+        return first
+
+
+class SignalStore:
+    def __init__(self, layout, history=None):
+        """
+        Args:
+            layout: SignalLayout of the state
+            history: optional CanSignalHistory.SignalHistory on the same layout; numeric
+                writes to the signals it records are appended to it
+        """
+        self.layout = layout
+        self.kinds = layout.kinds
+        self.values = array('d', layout.initial_values)
+        self.updated = array('d', bytes(8 * len(layout)))
+        self.objects = list(layout.initial_objects)
+        self.history = history
+        self.generation = 0
+        self.change_log = array('I', bytes(4 * CHANGE_LOG_SIZE))
+
+    def set(self, slot, value, timestamp):
+        if self.values[slot] != value:
+            self.values[slot] = value
+            # Log entry first: a reader on another thread never sees a generation without its slot
+            generation = self.generation
+            self.change_log[generation & _CHANGE_LOG_MASK] = slot
+            self.generation = generation + 1
+        self.updated[slot] = timestamp
+        if self.history is not None:
+            self.history.append(slot, value, timestamp)
+
+    def set_many(self, slot, values, timestamp):
+        """Write ``values`` to consecutive slots starting at ``slot``"""
+        store = self.values
+        updated = self.updated
+        history = self.history
+        change_log = self.change_log
+        generation = self.generation
+        for value in values:
+            if store[slot] != value:
+                store[slot] = value
+                change_log[generation & _CHANGE_LOG_MASK] = slot
+                generation += 1
+            updated[slot] = timestamp
+            if history is not None:
+                history.append(slot, value, timestamp)
+            slot += 1
+        self.generation = generation
+
+    def set_object(self, slot, value, timestamp):
+        if self.objects[slot] != value:
+            self.objects[slot] = value
+            generation = self.generation
+            self.change_log[generation & _CHANGE_LOG_MASK] = slot
+            self.generation = generation + 1
+        self.updated[slot] = timestamp
+
+    def reset(self):
+        """Back to the initial values with nothing written, e.g. before a replay restores another point in time"""
+        self.values[:] = self.layout.initial_values
+        self.updated[:] = array('d', bytes(8 * len(self.layout)))
+        self.objects[:] = self.layout.initial_objects
+        # Every slot may have changed: readers get all of them back from changes_since()
+        self.generation += CHANGE_LOG_SIZE
+
+    def changes_since(self, generation):
+        """
+        Slots whose value changed after ``generation`` (an earlier ``self.generation``).
+
+        Returns:
+            (current generation, sorted list of slots); every slot when
+            CHANGE_LOG_SIZE or more changes happened since ``generation``
+        """
+        current = self.generation
+        count = current - generation
+        if count <= 0:
+            return current, []
+        if count >= CHANGE_LOG_SIZE:
+            return current, list(range(len(self.kinds)))
+        start = generation & _CHANGE_LOG_MASK
+        end = current & _CHANGE_LOG_MASK
+        log = self.change_log
+        entries = log[start:end] if start < end else log[start:] + log[:end]
+        slots = sorted(set(entries))
+        if self.generation - generation >= CHANGE_LOG_SIZE:
+            # The writer may have overwritten the oldest entries while they were read
+            return current, list(range(len(self.kinds)))
+        return current, slots
+
+    def refresh(self, view, slots):
+        """
+        Bring ``view`` (an earlier full ``view()``) up to date in place after the changes
+        ``slots`` from changes_since(): rewrites those leaves, and every LAST_UPDATE field,
+        as those move on every write. Returns ``view``.
+        """
+        paths = self.layout.paths
+        get = self.get
+        for slot in slots:
+            path = paths[slot]
+            node = view
+            for key in path[:-1]:
+                node = node[key]
+            node[path[-1]] = get(slot)
+        for path, key, first, end in self.layout.last_updates:
+            node = view
+            for name in path:
+                node = node[name]
+            node[key] = self._newest(first, end)
+        return view
+
+    def last_update(self, *path):
+        """Time of the newest write under ``path`` (a group with a LAST_UPDATE field), None before any"""
+        node = self.layout.tree
+        for key in path:
+            node = dict(node[1])[key]
+        return self._newest(node[2], node[3])
+
+    def _newest(self, first, end):
+        newest = max(self.updated[first:end], default=0.0)
+        return newest if newest else None
+
+    def get(self, slot):
+        kind = self.kinds[slot]
+        if kind == OBJECT:
+            return self.objects[slot]
+        value = self.values[slot]
+        if value != value:
+            return None
+        return int(value) if kind == INT else value
+
+    def snapshot(self):
+        """Independent copy of the whole state (three flat copies, no per-signal objects), without history"""
+        copy = SignalStore.__new__(SignalStore)
+        copy.layout = self.layout
+        copy.kinds = self.kinds
+        copy.values = array('d', self.values)
+        copy.updated = array('d', self.updated)
+        copy.objects = list(self.objects)
+        copy.history = None
+        copy.generation = self.generation
+        copy.change_log = array('I', self.change_log)
+        return copy
+
+    def view(self, *path):
+        """The state (or the subtree at ``path``) as nested dicts and lists, the schema's shape"""
+        node = self.layout.tree
+        for key in path:
+            node = dict(node[1])[key]
+        return self._build(node)
+
+    def _build(self, node):
+        tag = node[0]
+        if tag == 'slot':
+            return self.get(node[1])
+        if tag == 'list':
+            _, first, end, kind = node
+            if kind == INT:
+                return [None if value != value else int(value) for value in self.values[first:end]]
+            return [None if value != value else value for value in self.values[first:end]]
+        _, items, first, end = node
+        result = {}
+        for key, child in items:
+            if child is None:
+                result[key] = self._newest(first, end)
+            else:
+                result[key] = self._build(child)
+        return result
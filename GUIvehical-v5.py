@@ -1,5 +1,4 @@
 import can
-import struct
 import asyncio
 from fastapi import FastAPI, WebSocket, Request
 from fastapi.responses import HTMLResponse, FileResponse
@@ -14,6 +13,12 @@ import threading
 from typing import List
 import csv
 import os
+from CanDashboardDecoder import DATA_SCHEMA, DashboardDecoder
+from CanSignalStore import SignalLayout, SignalStore
+
+# 與 v6 相同的 data_store 結構，不含 Xsens (can1)
+STORE_LAYOUT = SignalLayout({group: fields for group, fields in DATA_SCHEMA.items() if group != 'xsens'})
+
 # 0112 update distance
 
 app = FastAPI()
@@ -90,90 +95,20 @@ class CanReceiverWebApp:
                 print(f"Warning: Could not initialize CAN1 bus: {e}")
                 self.bus1 = None
         
-        # Data storage
-        self.data_store = {
-            'timestamp': {'time': None, 'last_update': None},
-            'gps': {
-                'lat': None, 'lon': None, 'alt': None, 'status': None,
-                'last_update': None
-            },
-            'covariance': {
-                'values': [0.0] * 9, 'type': 0, 'type_name': 'UNKNOWN',
-                'last_update': None
-            },
-            'velocity': {
-                'linear_x': None, 'linear_y': None, 'linear_z': None,
-                'angular_x': None, 'angular_y': None, 'angular_z': None,
-                'magnitude': None, 'speed_kmh': None,
-                'last_update': None
-            },
-            'accumulator': {
-                'soc': None, 'voltage': None, 'current': None, 'temperature': None,
-                'status': None, 'heartbeat': None, 'capacity': None,
-                'cell_voltages': [None] * 105, 'cell_temperatures': [None] * 224,
-                'last_update': None
-            },
-            'inverters': {
-                1: {'name': 'FL', 'status': None, 'torque': None, 'speed': None,
-                    'control_word': None, 'target_torque': None,
-                    'dc_voltage': None, 'dc_current': None,
-                    'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                    'heartbeat': None, 'last_update': None},
-                2: {'name': 'FR', 'status': None, 'torque': None, 'speed': None,
-                    'control_word': None, 'target_torque': None,
-                    'dc_voltage': None, 'dc_current': None,
-                    'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                    'heartbeat': None, 'last_update': None},
-                3: {'name': 'RL', 'status': None, 'torque': None, 'speed': None,
-                    'control_word': None, 'target_torque': None,
-                    'dc_voltage': None, 'dc_current': None,
-                    'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                    'heartbeat': None, 'last_update': None},
-                4: {'name': 'RR', 'status': None, 'torque': None, 'speed': None,
-                    'control_word': None, 'target_torque': None,
-                    'dc_voltage': None, 'dc_current': None,
-                    'mos_temp': None, 'mcu_temp': None, 'motor_temp': None,
-                    'heartbeat': None, 'last_update': None}
-            },
-            'vcu': {
-                'steer': None, 'accel': None, 'apps1': None,    
-                'apps2': None, 'brake': None, 'bse1': None, 'bse2': None,
-                'suspF': None, 'suspR': None,
-                'last_update': None},
-            'imu': {
-                'accel_km6': {'x': None, 'y': None, 'z': None},
-                'accel_km308': {'x': None, 'y': None, 'z': None},
-                'gyro': {'x': None, 'y': None, 'z': None},
-                'euler': {'roll': None, 'pitch': None, 'yaw': None},
-                'mag': {'x': None, 'y': None, 'z': None},
-                'last_update': None
-            },
-            'imu2': {
-                'accel': {'x': None, 'y': None, 'z': None},
-                'gyro': {'x': None, 'y': None, 'z': None},
-                'quaternion': {'w': None, 'x': None, 'y': None, 'z': None},
-                'last_update': None
-            },
-            'distance': {
-                'trip_distance_km': None,
-                'last_update': None
-            }
-        }
+        # 所有訊號存放在預先配置的陣列中 (見 CanSignalStore)，data_store 為其 dict 檢視
+        self.store = SignalStore(STORE_LAYOUT)
+        self.decoder = DashboardDecoder(self.store)
         
         self.message_count = 0
         self.running = True
         
-        # Legacy GPS數據暫存
-        self.gps_lat = None
-        self.gps_lon = None
-        self.gps_alt = None
-        
-        # Position covariance 暫存
-        self.position_covariance = [0.0] * 9
-        self.position_covariance_type = 0
-        
         print("CAN Receiver Web App Started")
 
+    @property
+    def data_store(self):
+        """目前狀態的巢狀 dict（每次呼叫重新產生，寫入請經由 self.store）"""
+        return self.store.view()
+
     async def start_can_receiver(self):
         """啟動CAN接收循環和廣播循環"""
         # 建立兩個並行的任務
@@ -495,16 +430,17 @@ class CanReceiverWebApp:
         """廣播數據到所有連接的客戶端"""
         if not connections:
             return
+        data_store = self.data_store
         broadcast_data = {
-            'timestamp': self.data_store['timestamp']['time'].isoformat() if self.data_store['timestamp']['time'] else None,
-            'gps': self.data_store['gps'],
-            'velocity': self.data_store['velocity'],
-            'distance': self.data_store['distance'],
-            'accumulator': self.data_store['accumulator'],
-            'inverters': self.data_store['inverters'],
-            'vcu': self.data_store['vcu'],
-            'imu': self.data_store['imu'],
-            'imu2': self.data_store['imu2'],
+            'timestamp': data_store['timestamp']['time'].isoformat() if data_store['timestamp']['time'] else None,
+            'gps': data_store['gps'],
+            'velocity': data_store['velocity'],
+            'distance': data_store['distance'],
+            'accumulator': data_store['accumulator'],
+            'inverters': data_store['inverters'],
+            'vcu': data_store['vcu'],
+            'imu': data_store['imu'],
+            'imu2': data_store['imu2'],
             'message_count': self.message_count,
             'update_time': datetime.now().isoformat(),
             'playback_control': self.get_playback_status() 
@@ -593,610 +529,13 @@ class CanReceiverWebApp:
         return MockCanMessage(can_id, data)
 
     def process_can_message(self, msg: can.Message):
-        can_id = msg.arbitration_id
-        data = msg.data
-        
         try:
-            # Timestamp 解碼
-            if can_id == 0x100:
-                self.decode_timestamp(data)
-            
-            elif can_id == 0x181:
-                self.decode_vcu_cockpit(data)
-            elif can_id == 0x381:
-                self.decode_vcu_suspension(data)
-            # GPS 解碼
-            elif can_id == 0x400:
-                self.decode_gps_basic(data)
-            elif can_id == 0x401:
-                self.decode_gps_extended(data)
-            elif 0x410 <= can_id <= 0x418:
-                self.decode_position_covariance(data, can_id - 0x410)
-            elif can_id == 0x419:
-                self.decode_position_covariance_type(data)
-                
-            # 速度資料解碼
-            elif can_id == 0x402:
-                self.decode_velocity_x(data)
-            elif can_id == 0x403:
-                self.decode_velocity_y(data)
-            elif can_id == 0x404:
-                self.decode_velocity_z(data)
-            elif can_id == 0x405:
-                self.decode_angular_x(data)
-            elif can_id == 0x406:
-                self.decode_angular_y(data)
-            elif can_id == 0x407:
-                self.decode_angular_z(data)
-            elif can_id == 0x408:
-                self.decode_velocity_magnitude(data)
-            elif can_id == 0x440:
-                print(f"[DEBUG] Received CAN ID 0x440, data: {data.hex()}")
-                self.decode_distance(data)
-            
-            # Accumulator 解碼
-            elif can_id == 0x601:
-                self.decode_cell_voltage(data)
-            elif can_id == 0x651:
-                self.decode_accumulator_temperature(data)
-            elif can_id == 0x710:
-                self.decode_accumulator_heartbeat(data)
-            elif can_id == 0x501:
-                self.decode_accumulator_status(data)
-            elif can_id == 0x511:
-                self.decode_accumulator_state(data)
-            
-            # Inverter 解碼
-            elif 0x191 <= can_id <= 0x194:
-                inv_num = can_id - 0x190
-                self.decode_inverter_status(data, inv_num)
-            elif 0x291 <= can_id <= 0x294:
-                inv_num = can_id - 0x290
-                self.decode_inverter_state(data, inv_num)
-            elif 0x391 <= can_id <= 0x394:
-                inv_num = can_id - 0x390
-                self.decode_inverter_temperature(data, inv_num)
-            elif 0x711 <= can_id <= 0x714:
-                inv_num = can_id - 0x710
-                self.decode_inverter_heartbeat(data, inv_num)
-            elif 0x210 <= can_id <= 0x214:
-                inv_num = can_id - 0x210
-                self.decode_inverter_control(data, inv_num)
-            
-            # IMU 解碼
-            elif can_id == 0x185:
-                self.decode_imu_accel_km6(data)
-            elif can_id == 0x426:
-                self.decode_imu_accel_km308(data)
-            elif can_id == 0x285:
-                self.decode_imu_gyro(data)
-            elif can_id == 0x385:
-                self.decode_imu_euler(data)
-            elif can_id == 0x429:
-                self.decode_imu_mag(data)
-            
-            # IMU2 解碼
-            elif can_id == 0x188:
-                self.decode_imu2_accel(data)
-            elif can_id == 0x288:
-                self.decode_imu2_gyro(data)
-            elif can_id == 0x488:
-                self.decode_imu2_quaternion(data)
-
+            if msg.arbitration_id == 0x440:
+                print(f"[DEBUG] Received CAN ID 0x440, data: {msg.data.hex()}")
+            self.decoder.process(msg.arbitration_id, msg.data)
         except Exception as e:
-            print(f"Failed to decode CAN message ID 0x{can_id:03X}: {e}")
-
-
-
-# define all decode functions
-    def decode_timestamp(self, data):
-        if len(data) >= 6:
-            ms_since_midnight = struct.unpack('<I', data[0:4])[0]
-            days_since_1984 = struct.unpack('<H', data[4:6])[0]
-            
-            base_timestamp = 441763200
-            total_seconds = base_timestamp + (days_since_1984 * 86400) + (ms_since_midnight / 1000.0)
-            decoded_time = datetime.fromtimestamp(total_seconds)
-            
-            current_time = time.time()
-            self.data_store['timestamp']['time'] = decoded_time
-            self.data_store['timestamp']['last_update'] = current_time
-
-    def decode_vcu_cockpit(self, data):
-        if len(data) >= 8:
-            stear_raw = struct.unpack('<h', data[0:2])[0]
-            accel_raw = data[2] 
-            apps1_raw = data[3]
-            apps2_raw = data[4]
-            brake_raw = data[5]
-            bse1_raw = data[6]
-            bse2_raw = data[7]
-            stear_data = stear_raw *100
-            # 更新 VCU 數據
-            current_time = time.time()
-            self.data_store['vcu']['steer'] = stear_data
-            self.data_store['vcu']['accel'] = accel_raw
-            self.data_store['vcu']['apps1'] = apps1_raw
-            self.data_store['vcu']['apps2'] = apps2_raw
-            self.data_store['vcu']['brake'] = brake_raw
-            self.data_store['vcu']['bse1'] = bse1_raw
-            self.data_store['vcu']['bse2'] = bse2_raw
-            self.data_store['vcu']['last_update'] = current_time
-
-    def decode_vcu_suspension(self, data):
-        """解碼前後懸吊數據 (0x381)
-        SuspF: bytes 0-1, 公式: 值 * 0.0001 + 0.3 (m)
-        SuspR: bytes 2-3, 公式: 值 * 0.0001 + 0.3 (m)
-        """
-        if len(data) >= 4:
-            # 前懸吊 (bytes 0-1)
-            suspF_raw = struct.unpack('<H', data[0:2])[0]
-            suspF = suspF_raw * 0.0001 + 0.3
-            
-            # 後懸吊 (bytes 2-3)
-            suspR_raw = struct.unpack('<H', data[2:4])[0]
-            suspR = suspR_raw * 0.0001 + 0.3
-            
-            # 更新 VCU 數據
-            current_time = time.time()
-            self.data_store['vcu']['suspF'] = suspF
-            self.data_store['vcu']['suspR'] = suspR
-            self.data_store['vcu']['last_update'] = current_time
-
-    def decode_gps_basic(self, data):
-        if len(data) >= 8:
-            lat_raw = struct.unpack('<i', data[0:4])[0]
-            self.gps_lat = lat_raw / 10**7
-            
-            lon_raw = struct.unpack('<i', data[4:8])[0]
-            self.gps_lon = lon_raw / 10**7
-            
-            current_time = time.time()
-            self.data_store['gps']['lat'] = self.gps_lat
-            self.data_store['gps']['lon'] = self.gps_lon
-            self.data_store['gps']['last_update'] = current_time
-
-    def decode_gps_extended(self, data):
-        if len(data) >= 2:
-            alt_raw = struct.unpack('<h', data[0:2])[0]
-            status_byte = data[2] if len(data) > 2 else 0
-            self.gps_alt = float(alt_raw)
-            
-            current_time = time.time()
-            self.data_store['gps']['alt'] = self.gps_alt
-            self.data_store['gps']['status'] = status_byte
-            self.data_store['gps']['last_update'] = current_time
-
-    def decode_position_covariance(self, data, index):
-        if len(data) >= 8 and 0 <= index < 9:
-            covariance_value = struct.unpack('<d', data[0:8])[0]
-            self.position_covariance[index] = covariance_value
-
-    def decode_position_covariance_type(self, data):
-        if len(data) >= 1:
-            self.position_covariance_type = struct.unpack('<B', data[0:1])[0]
-            
-            covariance_types = {
-                0: "UNKNOWN",
-                1: "APPROXIMATED", 
-                2: "DIAGONAL_KNOWN",
-                3: "KNOWN"
-            }
-            type_name = covariance_types.get(self.position_covariance_type, "UNKNOWN")
-            
-            current_time = time.time()
-            self.data_store['covariance']['type'] = self.position_covariance_type
-            self.data_store['covariance']['type_name'] = type_name
-            self.data_store['covariance']['last_update'] = current_time
-
-    def decode_velocity_x(self, data):
-        if len(data) >= 4:
-            vx_raw = struct.unpack('<i', data[0:4])[0]
-            vx = vx_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['linear_x'] = vx
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_velocity_y(self, data):
-        if len(data) >= 4:
-            vy_raw = struct.unpack('<i', data[0:4])[0]
-            vy = vy_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['linear_y'] = vy
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_velocity_z(self, data):
-        if len(data) >= 4:
-            vz_raw = struct.unpack('<i', data[0:4])[0]
-            vz = vz_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['linear_z'] = vz
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_angular_x(self, data):
-        if len(data) >= 4:
-            wx_raw = struct.unpack('<i', data[0:4])[0]
-            wx = wx_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['angular_x'] = wx
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_angular_y(self, data):
-        if len(data) >= 4:
-            wy_raw = struct.unpack('<i', data[0:4])[0]
-            wy = wy_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['angular_y'] = wy
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_angular_z(self, data):
-        if len(data) >= 4:
-            wz_raw = struct.unpack('<i', data[0:4])[0]
-            wz = wz_raw / 1000.0
-            
-            current_time = time.time()
-            self.data_store['velocity']['angular_z'] = wz
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_velocity_magnitude(self, data):
-        if len(data) >= 4:
-            vmag_raw = struct.unpack('<i', data[0:4])[0]
-            vmag = vmag_raw / 1000.0
-            speed_kmh = vmag * 3.6
-            
-            current_time = time.time()
-            self.data_store['velocity']['magnitude'] = vmag
-            self.data_store['velocity']['speed_kmh'] = speed_kmh
-            self.data_store['velocity']['last_update'] = current_time
-
-    def decode_distance(self, data):
-        """解碼 CAN ID 0x440 的里程數據 (來自 can1)"""
-        if len(data) >= 4:
-            # 解包32位無符號整數 (little-endian)，單位為毫米 (mm)
-            distance_mm = struct.unpack('<I', data[0:4])[0]
-            # 轉換為公里 (km)
-            distance_km = distance_mm / 1000000.0
-            
-            current_time = time.time()
-            self.data_store['distance']['trip_distance_km'] = distance_km
-            self.data_store['distance']['last_update'] = current_time
-            print(f"[DISTANCE] Received: {distance_mm} mm = {distance_km:.3f} km")
-
-    def decode_cell_voltage(self, data):
-        if len(data) >= 8:
-            # 第一個位元組是 index (0, 7, 14, 21, ..., 98)
-            index = data[0]
-            
-            # 驗證 index 是否有效 (應該是 7 的倍數且 <= 98)
-            if index % 7 != 0 or index > 98:
-                print(f"[ACCUMULATOR] Invalid cell voltage index: {index}")
-                return
-            
-            # 接下來 7 個位元組是電壓數值
-            voltages = []
-            for i in range(1, min(8, len(data))):
-                voltage = data[i] * 0.02  # 20mV/LSB
-                voltages.append(voltage)
-            
-            # 更新一維陣列中對應位置的數值
-            current_time = time.time()
-            for i, voltage in enumerate(voltages):
-                array_index = index + i
-                if array_index < 105:  # 確保不超出陣列範圍
-                    self.data_store['accumulator']['cell_voltages'][array_index] = voltage
-            
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_temperature(self, data):
-        if len(data) >= 8:
-            # 第一個位元組是 index (0, 7, 14, 21, ..., 98)
-            index = data[0]
-            
-            # 驗證 index 是否有效 (應該是 7 的倍數且 <= 98)
-            if index % 7 != 0 or index > 217:
-                print(f"[ACCUMULATOR] Invalid temperature index: {index}")
-                return
-            
-            # 接下來 7 個位元組是溫度數值
-            temperatures = []
-            for i in range(1, min(8, len(data))):
-                temp = data[i] - 32  
-                temperatures.append(temp)
-            
-            current_time = time.time()
-            for i, temp in enumerate(temperatures):
-                array_index = index + i
-                if array_index < 224: 
-                    self.data_store['accumulator']['cell_temperatures'][array_index] = temp
-
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_heartbeat(self, data):
-        if len(data) >= 1:
-            heartbeat = data[0] == 0x7F
-            
-            current_time = time.time()
-            self.data_store['accumulator']['heartbeat'] = heartbeat
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_status(self, data):
-        if len(data) >= 7:
-            status = data[0]
-            temp_raw = struct.unpack('<h', data[1:3])[0]
-            voltage_raw = struct.unpack('<I', data[3:7])[0] if len(data) >= 7 else 0
-            
-            temperature = temp_raw * 0.125
-            voltage = voltage_raw / 1024.0
-            
-            current_time = time.time()
-            self.data_store['accumulator']['status'] = status
-            self.data_store['accumulator']['temperature'] = temperature
-            self.data_store['accumulator']['voltage'] = voltage
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_accumulator_state(self, data):
-        if len(data) >= 5:
-            soc = data[0]
-            current_raw = struct.unpack('<h', data[1:3])[0]
-            capacity_raw = struct.unpack('<h', data[3:5])[0] if len(data) >= 5 else 0
-            
-            current = current_raw * 0.01
-            capacity = capacity_raw * 0.01
-            
-            current_time = time.time()
-            self.data_store['accumulator']['soc'] = soc
-            self.data_store['accumulator']['current'] = current
-            self.data_store['accumulator']['capacity'] = capacity
-            self.data_store['accumulator']['last_update'] = current_time
-
-    def decode_inverter_status(self, data, inv_num):
-        if len(data) >= 6:
-            status_word1 = data[0]
-            status_word2 = data[1]
-            feedback_torque_raw = struct.unpack('<h', data[2:4])[0]
-            speed_raw = struct.unpack('<h', data[4:6])[0]
-            feedback_torque = feedback_torque_raw / 1000.0 * 20
-            speed = speed_raw
-            if inv_num == (0x213-0x210):
-                feedback_torque *= -1
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['status'] = (status_word1, status_word2) 
-                self.data_store['inverters'][inv_num]['torque'] = feedback_torque
-                self.data_store['inverters'][inv_num]['speed'] = speed
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_state(self, data, inv_num):
-        if len(data) >= 4:
-            dc_voltage_raw = struct.unpack('<H', data[0:2])[0]
-            dc_current_raw = struct.unpack('<H', data[2:4])[0]
-            
-            dc_voltage = dc_voltage_raw / 100.0
-            dc_current = dc_current_raw / 100.0
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['dc_voltage'] = dc_voltage
-                self.data_store['inverters'][inv_num]['dc_current'] = dc_current
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_temperature(self, data, inv_num):
-        if len(data) >= 6:
-            inv_mos_temp_raw = struct.unpack('<h', data[0:2])[0]
-            mcu_temp_raw = struct.unpack('<h', data[2:4])[0]
-            motor_temp_raw = struct.unpack('<h', data[4:6])[0]
-            
-            inv_mos_temp = inv_mos_temp_raw * 0.1
-            mcu_temp = mcu_temp_raw * 0.1
-            motor_temp = motor_temp_raw * 0.1
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['mos_temp'] = inv_mos_temp
-                self.data_store['inverters'][inv_num]['mcu_temp'] = mcu_temp
-                self.data_store['inverters'][inv_num]['motor_temp'] = motor_temp
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    def decode_inverter_heartbeat(self, data, inv_num):
-        if len(data) >= 1:
-            heartbeat = data[0] == 0x05
-            
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['heartbeat'] = heartbeat
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
+            print(f"Failed to decode CAN message ID 0x{msg.arbitration_id:03X}: {e}")
 
-    def decode_inverter_control(self, data, inv_num):
-        if len(data) >= 4:
-            control_word = struct.unpack('<H', data[0:2])[0]
-            target_torque_raw = struct.unpack('<h', data[2:4])[0]
-            target_torque = target_torque_raw / 1000.0 * 20
-            if inv_num == (0x213-0x210):
-                target_torque *= -1
-            if inv_num in self.data_store['inverters']:
-                current_time = time.time()
-                self.data_store['inverters'][inv_num]['control_word'] = control_word
-                self.data_store['inverters'][inv_num]['target_torque'] = target_torque
-                self.data_store['inverters'][inv_num]['last_update'] = current_time
-
-    # IMU 解碼函數
-    def decode_imu_accel_km6(self, data):
-        """解碼IMU加速度數據km6 (0x185)
-        X: bytes 0-1, Y: bytes 2-3, Z: bytes 4-5
-        格式: 0.001 m/s^2 /LSB (signed)
-        """
-        if len(data) >= 6:
-            x_raw = struct.unpack('<h', data[0:2])[0]
-            y_raw = struct.unpack('<h', data[2:4])[0]
-            z_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 m/s^2
-            x = x_raw * 0.001
-            y = y_raw * 0.001
-            z = z_raw * 0.001
-            
-            current_time = time.time()
-            self.data_store['imu']['accel_km6']['x'] = x
-            self.data_store['imu']['accel_km6']['y'] = y
-            self.data_store['imu']['accel_km6']['z'] = z
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_imu_accel_km308(self, data):
-        """解碼IMU加速度數據km308 (0x426)
-        X: bytes 0-1, Y: bytes 2-3, Z: bytes 4-5
-        格式: 0.001 m/s^2 /LSB (signed)
-        """
-        if len(data) >= 6:
-            x_raw = struct.unpack('<h', data[0:2])[0]
-            y_raw = struct.unpack('<h', data[2:4])[0]
-            z_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 m/s^2
-            x = x_raw * 0.001
-            y = y_raw * 0.001
-            z = z_raw * 0.001
-            
-            current_time = time.time()
-            self.data_store['imu']['accel_km308']['x'] = x
-            self.data_store['imu']['accel_km308']['y'] = y
-            self.data_store['imu']['accel_km308']['z'] = z
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_imu_gyro(self, data):
-        """解碼IMU陀螺儀數據 (0x285)
-        X: bytes 0-1, Y: bytes 2-3, Z: bytes 4-5
-        格式: 0.1 deg/s /LSB (signed)
-        """
-        if len(data) >= 6:
-            x_raw = struct.unpack('<h', data[0:2])[0]
-            y_raw = struct.unpack('<h', data[2:4])[0]
-            z_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 deg/s
-            x = x_raw * 0.1
-            y = y_raw * 0.1
-            z = z_raw * 0.1
-            
-            current_time = time.time()
-            self.data_store['imu']['gyro']['x'] = x
-            self.data_store['imu']['gyro']['y'] = y
-            self.data_store['imu']['gyro']['z'] = z
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_imu_euler(self, data):
-        """解碼IMU歐拉角數據 (0x385)
-        Roll: bytes 0-1, Pitch: bytes 2-3, Yaw: bytes 4-5
-        格式: 0.01 degree /LSB (signed)
-        """
-        if len(data) >= 6:
-            roll_raw = struct.unpack('<h', data[0:2])[0]
-            pitch_raw = struct.unpack('<h', data[2:4])[0]
-            yaw_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 degree
-            roll = roll_raw * 0.01
-            pitch = pitch_raw * 0.01
-            yaw = yaw_raw * 0.01
-            
-            current_time = time.time()
-            self.data_store['imu']['euler']['roll'] = roll
-            self.data_store['imu']['euler']['pitch'] = pitch
-            self.data_store['imu']['euler']['yaw'] = yaw
-            self.data_store['imu']['last_update'] = current_time
-
-    def decode_imu_mag(self, data):
-        """解碼IMU磁力計數據 (0x429)
-        X: bytes 0-1, Y: bytes 2-3, Z: bytes 4-5
-        格式: 0.1 uT /LSB (signed)
-        """
-        if len(data) >= 6:
-            x_raw = struct.unpack('<h', data[0:2])[0]
-            y_raw = struct.unpack('<h', data[2:4])[0]
-            z_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 uT (微特斯拉)
-            x = x_raw * 0.1
-            y = y_raw * 0.1
-            z = z_raw * 0.1
-            
-            current_time = time.time()
-            self.data_store['imu']['mag']['x'] = x
-            self.data_store['imu']['mag']['y'] = y
-            self.data_store['imu']['mag']['z'] = z
-            self.data_store['imu']['last_update'] = current_time
-
-    # IMU2 解碼函數
-    def decode_imu2_accel(self, data):
-        """解碼IMU2加速度數據 (0x188)
-        X: bytes 0-1, Y: bytes 2-3, Z: bytes 4-5
-        格式: 0.001 g/LSB (signed)
-        """
-        if len(data) >= 6:
-            x_raw = struct.unpack('<h', data[0:2])[0]
-            y_raw = struct.unpack('<h', data[2:4])[0]
-            z_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 g
-            x = x_raw * 0.001
-            y = y_raw * 0.001
-            z = z_raw * 0.001
-            
-            current_time = time.time()
-            self.data_store['imu2']['accel']['x'] = x
-            self.data_store['imu2']['accel']['y'] = y
-            self.data_store['imu2']['accel']['z'] = z
-            self.data_store['imu2']['last_update'] = current_time
-
-    def decode_imu2_gyro(self, data):
-        """解碼IMU2陀螺儀數據 (0x288)
-        X: bytes 0-1, Y: bytes 2-3, Z: bytes 4-5
-        格式: 0.1 deg/s /LSB (signed)
-        """
-        if len(data) >= 6:
-            x_raw = struct.unpack('<h', data[0:2])[0]
-            y_raw = struct.unpack('<h', data[2:4])[0]
-            z_raw = struct.unpack('<h', data[4:6])[0]
-            
-            # 轉換為 deg/s
-            x = x_raw * 0.1
-            y = y_raw * 0.1
-            z = z_raw * 0.1
-            
-            current_time = time.time()
-            self.data_store['imu2']['gyro']['x'] = x
-            self.data_store['imu2']['gyro']['y'] = y
-            self.data_store['imu2']['gyro']['z'] = z
-            self.data_store['imu2']['last_update'] = current_time
-
-    def decode_imu2_quaternion(self, data):
-        """解碼IMU2四元數數據 (0x488)
-        W: bytes 0-1, X: bytes 2-3, Y: bytes 4-5, Z: bytes 6-7
-        格式: 0.0001 /LSB (signed)
-        """
-        if len(data) >= 8:
-            w_raw = struct.unpack('<h', data[0:2])[0]
-            x_raw = struct.unpack('<h', data[2:4])[0]
-            y_raw = struct.unpack('<h', data[4:6])[0]
-            z_raw = struct.unpack('<h', data[6:8])[0]
-            
-            # 轉換為單位四元數
-            w = w_raw * 0.0001
-            x = x_raw * 0.0001
-            y = y_raw * 0.0001
-            z = z_raw * 0.0001
-            
-            current_time = time.time()
-            self.data_store['imu2']['quaternion']['w'] = w
-            self.data_store['imu2']['quaternion']['x'] = x
-            self.data_store['imu2']['quaternion']['y'] = y
-            self.data_store['imu2']['quaternion']['z'] = z
-            self.data_store['imu2']['last_update'] = current_time
 
 # global CAN receiver instance
 can_receiver = None
@@ -1235,16 +574,17 @@ async def dashboard(request: Request):
 @app.get('/api/data')
 async def get_data():
     if can_receiver:
+        data_store = can_receiver.data_store
         return {
-            'timestamp': can_receiver.data_store['timestamp']['time'].isoformat() if can_receiver.data_store['timestamp']['time'] else None,
-            'gps': can_receiver.data_store['gps'],
-            'velocity': can_receiver.data_store['velocity'],
-            'distance': can_receiver.data_store['distance'],
-            'accumulator': can_receiver.data_store['accumulator'],
-            'inverters': can_receiver.data_store['inverters'],
-            'vcu': can_receiver.data_store['vcu'],
-            'imu': can_receiver.data_store['imu'],
-            'imu2': can_receiver.data_store['imu2'],
+            'timestamp': data_store['timestamp']['time'].isoformat() if data_store['timestamp']['time'] else None,
+            'gps': data_store['gps'],
+            'velocity': data_store['velocity'],
+            'distance': data_store['distance'],
+            'accumulator': data_store['accumulator'],
+            'inverters': data_store['inverters'],
+            'vcu': data_store['vcu'],
+            'imu': data_store['imu'],
+            'imu2': data_store['imu2'],
             'message_count': can_receiver.message_count,
             'update_time': datetime.now().isoformat()
         }
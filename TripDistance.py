@@ -0,0 +1,178 @@
+"""
+累積里程日誌模組
+Crash-safe storage for the cumulative trip distance.
+
+Every save appends one fixed-size, CRC-protected record to an append-only
+journal and fsyncs it; nothing already on disk is ever rewritten in place.
+Loading reads the last valid record from the end of the journal, so it takes
+constant time however long the history is. Once the journal reaches
+``compact_records`` entries its latest value is written to a snapshot file
+(temp file + fsync + atomic rename) and the journal is emptied.
+
+A crash at any point leaves either the old or the new value readable:
+
+* a torn append fails its CRC and the previous record is used (the torn
+  bytes are cut off before the next append)
+* a crash during compaction leaves the old snapshot, or the new snapshot
+  next to a journal that still holds the same value
+
+Files in ``base_dir``::
+
+    trip_distance.journal    records appended on every save
+    trip_distance.snapshot   one record, the value at the last compaction
+
+Record (little-endian, 28 bytes)::
+
+    seq          u64  increases by one per save
+    timestamp    u64  wall-clock time of the save, in us
+    distance     f64  cumulative distance in km
+    crc32        u32  over the 24 bytes above
+
+The old ``trip_distance_cumulative.csv`` is imported once if neither file
+exists yet.
+"""
+
+import csv
+import os
+import struct
+import time
+import zlib
+
+JOURNAL_NAME = "trip_distance.journal"
+SNAPSHOT_NAME = "trip_distance.snapshot"
+LEGACY_NAME = "trip_distance_cumulative.csv"
+
+RECORD_STRUCT = struct.Struct('<QQd')
+CRC_STRUCT = struct.Struct('<I')
+RECORD_SIZE = RECORD_STRUCT.size + CRC_STRUCT.size
+
+
+def pack_record(seq, timestamp, distance):
+    body = RECORD_STRUCT.pack(seq, timestamp, distance)
+    return body + CRC_STRUCT.pack(zlib.crc32(body))
+
+
+def unpack_record(raw):
+    """(seq, timestamp, distance) or None if the record is torn or corrupt"""
+    if len(raw) != RECORD_SIZE:
+        return None
+    body = raw[:RECORD_STRUCT.size]
+    if CRC_STRUCT.unpack(raw[RECORD_STRUCT.size:])[0] != zlib.crc32(body):
+        return None
+    return RECORD_STRUCT.unpack(body)
+
+
+def fsync_dir(path):
+    """Persist a rename or file creation in ``path``"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TripDistanceJournal:
+    def __init__(self, base_dir, compact_records=1000):
+        """
+        Args:
+            base_dir: directory holding the journal and snapshot
+            compact_records: journal entries kept before compacting into the snapshot
+        """
+        self.base_dir = base_dir
+        self.compact_records = compact_records
+        self.journal_path = os.path.join(base_dir, JOURNAL_NAME)
+        self.snapshot_path = os.path.join(base_dir, SNAPSHOT_NAME)
+        os.makedirs(base_dir, exist_ok=True)
+
+        self.seq = -1
+        self.distance = 0.0
+        self.journal_end = 0  # byte offset after the last valid journal record
+        self._recover()
+
+    def _recover(self):
+        snapshot = self._read_snapshot()
+        if snapshot is not None:
+            self.seq, _, self.distance = snapshot
+
+        latest = self._read_journal_tail()
+        if latest is not None and latest[0] > self.seq:
+            self.seq, _, self.distance = latest
+
+        if self.seq < 0 and not os.path.exists(self.journal_path):
+            legacy = self._read_legacy_csv()
+            if legacy is not None:
+                self.distance = legacy
+                self.compact()
+
+    def _read_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                return unpack_record(f.read(RECORD_SIZE + 1))
+        except FileNotFoundError:
+            return None
+
+    def _read_journal_tail(self):
+        """Last valid journal record, scanning backwards past torn or zeroed bytes"""
+        try:
+            f = open(self.journal_path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            end = size - size % RECORD_SIZE
+            while end > 0:
+                f.seek(end - RECORD_SIZE)
+                record = unpack_record(f.read(RECORD_SIZE))
+                if record is not None:
+                    self.journal_end = end
+                    return record
+                end -= RECORD_SIZE
+        self.journal_end = 0
+        return None
+
+    def _read_legacy_csv(self):
+        legacy_path = os.path.join(self.base_dir, LEGACY_NAME)
+        try:
+            with open(legacy_path, 'r') as f:
+                last_row = None
+                for row in csv.reader(f):
+                    last_row = row
+            return float(last_row[1])
+        except (OSError, TypeError, IndexError, ValueError):
+            return None
+
+    def append(self, distance):
+        """Durably record a new cumulative distance (km)"""
+        created = not os.path.exists(self.journal_path)
+        with open(self.journal_path, 'ab') as f:
+            # Cut off a torn record left by a crash so records stay aligned
+            if f.tell() != self.journal_end:
+                f.truncate(self.journal_end)
+            f.write(pack_record(self.seq + 1, int(time.time() * 1000000), distance))
+            f.flush()
+            os.fsync(f.fileno())
+            self.journal_end = f.tell()
+        if created:
+            fsync_dir(self.base_dir)
+        self.seq += 1
+        self.distance = distance
+
+        if self.journal_end >= self.compact_records * RECORD_SIZE:
+            self.compact()
+
+    def compact(self):
+        """Move the latest value into the snapshot and empty the journal"""
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(pack_record(max(self.seq, 0), int(time.time() * 1000000), self.distance))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        fsync_dir(self.base_dir)
+        self.seq = max(self.seq, 0)
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(0)
+                os.fsync(f.fileno())
+        self.journal_end = 0
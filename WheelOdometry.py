@@ -0,0 +1,217 @@
+"""
+輪速里程計模組
+Trip distance from the wheel speed frames, integrated over frame timestamps.
+
+0x193 (left, inverter 3) and 0x194 (right, inverter 4) carry the motor speed
+in RPM as int16 in bytes 4-5. Each wheel is integrated on its own with the
+trapezoid rule between consecutive frames of that wheel, using the frame
+timestamps (kernel receive time), so loop latency does not enter the result
+and no interval is counted twice. The trip distance is the mean of the two
+wheel distances.
+
+An interval longer than ``max_gap`` (lost frames, bus off, logger restart) is
+not integrated; it is counted in ``gaps``/``gap_seconds`` instead. Frames
+that do not advance a wheel's time are skipped the same way.
+
+``WheelOdometry`` is the live integrator used by the logger (pure Python).
+``recompute_log()`` applies exactly the same rules with NumPy to a recorded
+segment, so the live value can be cross-checked and the history of the
+cumulative distance regenerated from old logs (see trip_recompute.py).
+"""
+
+import os
+
+from CanLogFormat import (ARCHIVE_EXTENSION, BINARY_EXTENSION, TRAILER_TIMESTAMP, iter_archive_blocks,
+                          iter_csv_records, open_log_binary, read_archive_header, read_binary_header)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Wheel speed frames on can0 and the wheel each one belongs to
+WHEEL_SPEED_IDS = {0x193: 0, 0x194: 1}
+WHEEL_SPEED_BUS = 0
+# Vehicle speed in km/h per motor RPM (gear ratio and tyre circumference)
+KMH_PER_RPM = 0.00709
+# Longest interval between two frames of one wheel that is still integrated
+MAX_GAP = 0.5
+
+
+def wheel_rpm(data):
+    """Motor speed in RPM from a 0x193/0x194 payload, None if the frame is too short"""
+    if len(data) < 6:
+        return None
+    return int.from_bytes(bytes(data[4:6]), 'little', signed=True)
+
+
+class WheelOdometry:
+    def __init__(self, max_gap=MAX_GAP):
+        self.max_gap = max_gap
+        self.last = [None, None]  # (timestamp s, speed km/s) of the previous frame per wheel
+        self.wheel_distance = [0.0, 0.0]  # km
+        self.gaps = 0
+        self.gap_seconds = 0.0
+
+    @property
+    def distance(self):
+        """Trip distance in km since this integrator was created"""
+        return sum(self.wheel_distance) / 2
+
+    def update(self, wheel, timestamp, rpm):
+        """
+        Integrate one wheel speed frame.
+
+        Args:
+            wheel: 0 left (0x193), 1 right (0x194)
+            timestamp: frame timestamp in seconds
+            rpm: motor speed, the sign (direction) is ignored
+
+        Returns:
+            increase of the trip distance in km
+        """
+        speed = abs(rpm) * KMH_PER_RPM / 3600  # km/s
+        last = self.last[wheel]
+        self.last[wheel] = (timestamp, speed)
+        if last is None:
+            return 0.0
+        dt = timestamp - last[0]
+        if dt <= 0 or dt > self.max_gap:
+            self.gaps += 1
+            self.gap_seconds += max(dt, 0.0)
+            return 0.0
+        increment = (last[1] + speed) / 2 * dt
+        self.wheel_distance[wheel] += increment
+        return increment / 2
+
+    def reset_wheels(self):
+        """Forget the previous frames, e.g. after a reconnect, so the outage is not integrated"""
+        self.last = [None, None]
+
+
+def integrate_wheel(timestamps, rpm, max_gap=MAX_GAP):
+    """
+    Trapezoid integration of one wheel with NumPy, same rules as WheelOdometry.update().
+
+    Args:
+        timestamps: frame timestamps in us, in log order
+        rpm: motor speed per frame
+
+    Returns:
+        (distance km, number of gaps, gap seconds)
+    """
+    if len(timestamps) < 2:
+        return 0.0, 0, 0.0
+    t = np.asarray(timestamps, dtype=np.float64) / 1000000
+    speed = np.abs(np.asarray(rpm, dtype=np.float64)) * (KMH_PER_RPM / 3600)
+    dt = np.diff(t)
+    valid = (dt > 0) & (dt <= max_gap)
+    distance = float(np.sum((speed[1:] + speed[:-1])[valid] / 2 * dt[valid]))
+    return distance, int(np.count_nonzero(~valid)), float(np.sum(np.maximum(dt[~valid], 0.0)))
+
+
+def _select_binary(f, wanted, bus, chunk_records):
+    header = read_binary_header(f)
+    payload_size = header['payload_size']
+    dtype = np.dtype([('timestamp', '<u8'), ('can_id', '<u4'), ('flags', 'u1'), ('bus', 'u1'),
+                      ('dlc', 'u1'), ('reserved', 'u1'), ('data', 'u1', (payload_size,))])
+    parts = []
+    while True:
+        chunk = f.read(dtype.itemsize * chunk_records)
+        records = np.frombuffer(chunk, dtype, count=len(chunk) // dtype.itemsize)  # a torn last record is dropped
+        trailer = np.flatnonzero(records['timestamp'] == TRAILER_TIMESTAMP)
+        if trailer.size:
+            records = records[:trailer[0]]
+        selected = np.isin(records['can_id'], wanted)
+        if bus is not None:
+            selected &= records['bus'] == bus
+        parts.append(records[selected])
+        if trailer.size or len(chunk) < dtype.itemsize * chunk_records:
+            break
+    selected = np.concatenate(parts)
+    return selected['timestamp'], selected['can_id'], selected['dlc'], np.ascontiguousarray(selected['data'][:, :8])
+
+
+def _select_archive(f, wanted, bus):
+    header = read_archive_header(f)
+    parts = []
+    for _, (deltas, can_ids, _, buses, dlcs, lengths, data) in iter_archive_blocks(f, header['codec']):
+        can_ids = np.frombuffer(can_ids, '<u4')
+        lengths = np.frombuffer(lengths, 'u1')
+        selected = np.isin(can_ids, wanted)
+        if bus is not None:
+            selected &= np.frombuffer(buses, 'u1') == bus
+        selected = np.flatnonzero(selected)
+        # Gather the first 8 payload bytes of each selected frame, zero past its length
+        starts = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)[:-1]))[selected]
+        payload = np.frombuffer(data + bytes(8), 'u1')
+        columns = np.arange(8)
+        frame_data = np.where(columns < lengths[selected, None], payload[starts[:, None] + columns], 0)
+        timestamps = np.cumsum(np.frombuffer(deltas, '<i8')).astype(np.uint64)
+        parts.append((timestamps[selected], can_ids[selected], np.frombuffer(dlcs, 'u1')[selected],
+                      frame_data.astype(np.uint8)))
+    if not parts:
+        return (np.zeros(0, np.uint64), np.zeros(0, np.uint32), np.zeros(0, np.uint8),
+                np.zeros((0, 8), np.uint8))
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def _select_csv(f, wanted, bus):
+    timestamps, can_ids, dlcs, data = [], [], [], []
+    for timestamp, can_id, _, bus_num, dlc, payload in iter_csv_records(f):
+        if can_id in wanted and (bus is None or bus_num == bus):
+            timestamps.append(timestamp)
+            can_ids.append(can_id)
+            dlcs.append(dlc)
+            data.append(bytes(payload[:8]).ljust(8, b'\0'))
+    return (np.array(timestamps, dtype=np.uint64), np.array(can_ids, dtype=np.uint32),
+            np.array(dlcs, dtype=np.uint8),
+            np.frombuffer(b''.join(data), dtype=np.uint8).reshape(len(data), 8))
+
+
+def select_frames(filename, can_ids, bus, chunk_records=1 << 16):
+    """
+    The frames with the given IDs on one bus (any bus if None) of a recorded segment, as NumPy arrays.
+
+    Binary segments are filtered chunk by chunk and archives block by block,
+    without a Python loop per record.
+
+    Returns:
+        (timestamps us, can_ids, dlcs, data) with data an N x 8 uint8 array (first 8 payload bytes)
+    """
+    if np is None:
+        raise RuntimeError("The offline recompute needs the 'numpy' package (pip install numpy)")
+    with open_log_binary(filename) as f:
+        if filename.endswith(ARCHIVE_EXTENSION):
+            return _select_archive(f, np.array(list(can_ids), dtype='<u4'), bus)
+        if BINARY_EXTENSION in os.path.basename(filename):
+            return _select_binary(f, np.array(list(can_ids), dtype='<u4'), bus, chunk_records)
+        return _select_csv(f, set(can_ids), bus)
+
+
+def recompute_log(filename, max_gap=MAX_GAP):
+    """
+    Trip distance driven during a recorded segment (any format the logger writes, or its archive).
+
+    Returns:
+        dict with 'distance_km', 'wheel_km' [left, right], 'frames', 'gaps', 'gap_seconds'
+    """
+    timestamps, can_ids, dlcs, data = select_frames(filename, WHEEL_SPEED_IDS, WHEEL_SPEED_BUS)
+    usable = dlcs >= 6
+    timestamps, can_ids = timestamps[usable], can_ids[usable]
+    rpm = np.ascontiguousarray(data[usable, 4:6]).view('<i2').ravel()
+    wheel_km = [0.0, 0.0]
+    gaps = 0
+    gap_seconds = 0.0
+    for can_id, wheel in WHEEL_SPEED_IDS.items():
+        mask = can_ids == can_id
+        wheel_km[wheel], wheel_gaps, wheel_gap_seconds = integrate_wheel(timestamps[mask], rpm[mask], max_gap)
+        gaps += wheel_gaps
+        gap_seconds += wheel_gap_seconds
+    return {
+        'distance_km': sum(wheel_km) / 2,
+        'wheel_km': wheel_km,
+        'frames': len(timestamps),
+        'gaps': gaps,
+        'gap_seconds': gap_seconds,
+    }
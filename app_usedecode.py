@@ -395,15 +395,16 @@ class CanReceiverWebApp:
         """廣播數據到所有連接的客戶端"""
         if not connections:
             return
+        data_store = self.decoder.data_store
         broadcast_data = {
-            'timestamp': self.decoder.data_store['timestamp']['time'].isoformat() if self.decoder.data_store['timestamp']['time'] else None,
-            'gps': self.decoder.data_store['gps'],
-            'velocity': self.decoder.data_store['velocity'],
-            'accumulator': self.decoder.data_store['accumulator'],
-            'inverters': self.decoder.data_store['inverters'],
-            'vcu': self.decoder.data_store['vcu'],
-            'canlogging': self.decoder.data_store['canlogging'],
-            'imu2': self.decoder.data_store['imu2'],
+            'timestamp': data_store['timestamp']['time'].isoformat() if data_store['timestamp']['time'] else None,
+            'gps': data_store['gps'],
+            'velocity': data_store['velocity'],
+            'accumulator': data_store['accumulator'],
+            'inverters': data_store['inverters'],
+            'vcu': data_store['vcu'],
+            'canlogging': data_store['canlogging'],
+            'imu2': data_store['imu2'],
             'message_count': self.message_count,
             'update_time': datetime.now().isoformat(),
             'playback_control': self.get_playback_status() 
@@ -501,15 +502,16 @@ async def dashboard(request: Request):
 @app.get('/api/data')
 async def get_data():
     if can_receiver:
+        data_store = can_receiver.decoder.data_store
         return {
-            'timestamp': can_receiver.decoder.data_store['timestamp']['time'].isoformat() if can_receiver.decoder.data_store['timestamp']['time'] else None,
-            'gps': can_receiver.decoder.data_store['gps'],
-            'velocity': can_receiver.decoder.data_store['velocity'],
-            'accumulator': can_receiver.decoder.data_store['accumulator'],
-            'inverters': can_receiver.decoder.data_store['inverters'],
-            'vcu': can_receiver.decoder.data_store['vcu'],
-            'canlogging': can_receiver.decoder.data_store['canlogging'],
-            'imu2': can_receiver.decoder.data_store['imu2'],
+            'timestamp': data_store['timestamp']['time'].isoformat() if data_store['timestamp']['time'] else None,
+            'gps': data_store['gps'],
+            'velocity': data_store['velocity'],
+            'accumulator': data_store['accumulator'],
+            'inverters': data_store['inverters'],
+            'vcu': data_store['vcu'],
+            'canlogging': data_store['canlogging'],
+            'imu2': data_store['imu2'],
             'message_count': can_receiver.message_count,
             'update_time': datetime.now().isoformat()
         }
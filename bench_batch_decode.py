@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+批次解碼效能測試
+Per-frame DBC decoding versus CanBatchDecode over a whole log.
+
+Per frame is what a replay does today: every record becomes a message object
+and goes through ``CanDecoderDBC.decode_message``. The batch path loads the
+segment into one NumPy array and decodes it with ``BatchDecoder``. Both
+report seconds for the whole log and µs per log frame; loading the log is
+timed separately.
+
+Without --log a synthetic binary log with the car's message mix is generated
+(see bench_decode_log.py), ``--seconds`` long.
+
+    python3 bench_batch_decode.py --log LOGS/can_log_20250731_004455.canlog
+    python3 bench_batch_decode.py --seconds 1200
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from CanBatchDecode import BatchDecoder
+from CanLogFormat import iter_log_records
+from bench_decode_log import write_synthetic
+
+
+def per_frame(decoder, path):
+    """Load and decode the log one record at a time, (load s, decode s, frames)"""
+    start = time.perf_counter()
+    records = [(can_id, data) for _, can_id, _, _, _, data in iter_log_records(path)]
+    loaded = time.perf_counter()
+    decoders = decoder.decoders
+    with contextlib.redirect_stdout(io.StringIO()):
+        for can_id, data in records:
+            for dbc in decoders:
+                if dbc.decode_message(can_id, data) is not None:
+                    break
+    return loaded - start, time.perf_counter() - loaded, len(records)
+
+
+def batch(decoder, path):
+    """Load the log into one array and decode it, (load s, decode s, frames, signals)"""
+    start = time.perf_counter()
+    frames = decoder.load_frames(path)
+    loaded = time.perf_counter()
+    decoded = decoder.decode(frames)
+    return loaded - start, time.perf_counter() - loaded, len(frames), sum(map(len, decoded.values()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame versus batch decoding of a log")
+    parser.add_argument('--log', default=None, help="segment to decode (any format); default synthetic traffic")
+    parser.add_argument('--seconds', type=int, default=60, help="length of the synthetic log")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.log
+        if path is None:
+            path = os.path.join(tmp_dir, 'synthetic.canlog')
+            write_synthetic(path, args.seconds)
+        with contextlib.redirect_stdout(io.StringIO()):
+            decoder = BatchDecoder()
+
+        per_load, per_decode, frames = per_frame(decoder, path)
+        load, decode, decoded_frames, signals = batch(decoder, path)
+        print(f"{frames} frames in the log, {decoded_frames} with a DBC message, {signals} signal series")
+        print(f"batch:     load {load:7.3f} s  decode {decode:7.3f} s  ({(load + decode) / frames * 1e6:6.2f} µs/frame)")
+        print(f"per frame: load {per_load:7.3f} s  decode {per_decode:7.3f} s  "
+              f"({(per_load + per_decode) / frames * 1e6:6.2f} µs/frame)")
+
+if __name__ == "__main__":
+    main()
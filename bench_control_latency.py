@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+控制訊息延遲效能測試
+VCU-edge-to-file-open latency benchmark on vcan0.
+
+A sender thread loads vcan0 at the frame rate of a fully loaded 1 Mbit/s bus
+while a second sender toggles the VCU run bit (0x281, bit 0x20). The time
+from sending a rising edge until the writer thread opens the new segment is
+measured for two logger layouts:
+
+    inline    - one unfiltered socket, every frame goes through the state
+                machine before it is queued (the previous canlogging-v6 loop)
+    filtered  - bulk frames drained by a CaptureThread, the state machine
+                reads a second socket with kernel filters (can_filters)
+
+    sudo modprobe vcan
+    sudo ip link add dev vcan0 type vcan && sudo ip link set vcan0 up
+    python3 bench_control_latency.py --seconds 10
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import can
+
+from CanLogFormat import CsvLogWriter
+from CanLogQueue import LogWriterThread
+from CanPreTrigger import FULL_LOAD_FPS
+from CanReception import CaptureThread, MultiBusReceiver
+from vcan_load import load_sender
+
+VCU_FILTER = [{"can_id": 0x281, "can_mask": 0x7FF, "extended": False}]
+
+
+def edge_sender(edge_period, seconds, edges_sent):
+    """Toggle the VCU run bit, recording the send time of every rising edge"""
+    bus = can.interface.Bus(channel='vcan0', interface='socketcan')
+    end = time.perf_counter() + seconds
+    running = False
+    while time.perf_counter() < end:
+        time.sleep(edge_period)
+        running = not running
+        msg = can.Message(arbitration_id=0x281, data=[0x20 if running else 0x00],
+                          is_extended_id=False)
+        sent_at = time.perf_counter()
+        bus.send(msg)
+        if running:
+            edges_sent.append(sent_at)
+    bus.shutdown()
+
+
+class VcuStateMachine:
+    """The logger's VCU edge handling, reduced to segment open/close"""
+
+    def __init__(self, log_queue, tmp_dir):
+        self.log_queue = log_queue
+        self.tmp_dir = tmp_dir
+        self.recording = threading.Event()
+        self.vcu_last = False
+        self.segments_opened = []  # perf_counter when the writer thread opened each segment
+
+    def new_segment(self):
+        self.segments_opened.append(time.perf_counter())
+        path = os.path.join(self.tmp_dir, f"seg_{len(self.segments_opened)}.csv")
+        return CsvLogWriter(path)
+
+    def handle(self, msg):
+        if msg.arbitration_id != 0x281:
+            return
+        vcu_running = bool(msg.data[0] & 0x20)
+        if vcu_running and not self.vcu_last:
+            self.log_queue.open_segment(self.new_segment)
+            self.recording.set()
+        elif not vcu_running and self.vcu_last:
+            self.log_queue.close_segment()
+            self.recording.clear()
+        self.vcu_last = vcu_running
+
+
+def run_inline(machine, log_queue, stop_event):
+    bus = can.interface.Bus(channel='vcan0', interface='socketcan')
+    receiver = MultiBusReceiver([bus])
+    while not stop_event.is_set():
+        for bus_num, msg in receiver.poll(timeout=0.05):
+            machine.handle(msg)
+            if machine.recording.is_set():
+                log_queue.put(msg, bus_num, timestamp=int(time.time() * 1000000))
+    receiver.close()
+    bus.shutdown()
+
+
+def run_filtered(machine, log_queue, stop_event):
+    bulk = can.interface.Bus(channel='vcan0', interface='socketcan')
+    control = can.interface.Bus(channel='vcan0', interface='socketcan', can_filters=VCU_FILTER)
+
+    def record_frames(frames):
+        if machine.recording.is_set():
+            for bus_num, msg in frames:
+                log_queue.put(msg, bus_num, timestamp=int(time.time() * 1000000))
+
+    capture = CaptureThread(MultiBusReceiver([bulk]), record_frames)
+    capture.start()
+    receiver = MultiBusReceiver([control])
+    while not stop_event.is_set():
+        for _, msg in receiver.poll(timeout=0.05):
+            machine.handle(msg)
+    capture.stop()
+    receiver.close()
+    bulk.shutdown()
+    control.shutdown()
+
+
+def run(mode, seconds, fps, edge_period):
+    stop_event = threading.Event()
+    edges_sent = []
+    log_queue = LogWriterThread()
+    log_queue.start()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        machine = VcuStateMachine(log_queue, tmp_dir)
+        target = run_filtered if mode == 'filtered' else run_inline
+        logger = threading.Thread(target=target, args=(machine, log_queue, stop_event))
+        logger.start()
+        loader = threading.Thread(target=load_sender, args=(fps, stop_event))
+        loader.start()
+        time.sleep(0.5)  # let the load settle
+        edge_sender(edge_period, seconds, edges_sent)
+        time.sleep(0.5)
+        stop_event.set()
+        loader.join()
+        logger.join()
+        log_queue.stop()
+
+    latencies = [(opened - sent) * 1000
+                 for sent, opened in zip(edges_sent, machine.segments_opened)]
+    stats = log_queue.stats()
+    print(f"\n=== {mode} ===")
+    print(f"  rising edges {len(edges_sent)}, segments opened {len(machine.segments_opened)}")
+    if latencies:
+        latencies.sort()
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"  edge -> file open: median {statistics.median(latencies):.2f} ms, "
+              f"p95 {p95:.2f} ms, max {latencies[-1]:.2f} ms")
+    print(f"  frames written {stats['frames_written']}, dropped {stats['frames_dropped']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="VCU-edge-to-file-open latency benchmark (vcan0)")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fps', type=int, default=FULL_LOAD_FPS,
+                        help="background frames/s (default: full 1 Mbit/s load)")
+    parser.add_argument('--edge-period', type=float, default=0.25,
+                        help="seconds between VCU run bit toggles")
+    parser.add_argument('--mode', choices=['inline', 'filtered', 'both'], default='both')
+    args = parser.parse_args()
+
+    modes = ['inline', 'filtered'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run(mode, args.seconds, args.fps, args.edge_period)
+
+
+if __name__ == "__main__":
+    main()
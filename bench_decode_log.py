@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+記錄檔解碼效能測試
+Decode cost per frame of CanDecoder / GUIvehical-v6_dev over a recorded log.
+
+Every frame of the log (any format CanLogFormat reads) goes through
+process_can_message, as the dashboards do live. Prints the mean µs per
+frame over the whole log and per CAN ID, weighted by how often each ID
+occurs. Decoders print on some payloads; stdout is discarded while timing.
+
+Without --log a synthetic log with the car's message mix is generated.
+GUIvehical-v6_dev.py is only measured when its web dependencies (fastapi,
+uvicorn, jinja2) are installed.
+
+    python3 bench_decode_log.py --log LOGS/can_log_20250731_004455.canlog
+    python3 bench_decode_log.py --repeat 5
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import struct
+import tempfile
+import time
+from collections import defaultdict
+
+import can
+
+from CanDecoder import CanDecoder
+from CanLogFormat import FLAG_EXTENDED, iter_log_records, open_log_writer
+from bench_decoder_dispatch import load_gui
+
+# (CAN ID, frames per second) of a typical drive, used without --log
+SYNTHETIC_RATES = [(0x021, 100), (0x031, 100), (0x032, 100), (0x033, 100), (0x034, 100), (0x041, 100),
+                   (0x076, 100), (0x071, 10), (0x072, 10), (0x185, 100), (0x188, 100), (0x285, 100),
+                   (0x288, 100), (0x385, 100), (0x488, 100), (0x181, 100), (0x381, 100),
+                   (0x191, 100), (0x192, 100), (0x193, 100), (0x194, 100), (0x291, 50), (0x292, 50),
+                   (0x293, 50), (0x294, 50), (0x211, 100), (0x212, 100), (0x213, 100), (0x214, 100),
+                   (0x400, 10), (0x401, 10), (0x402, 50), (0x408, 50), (0x601, 50), (0x651, 50),
+                   (0x501, 10), (0x511, 10), (0x7FF, 200)]
+
+
+def write_synthetic(path, seconds=10):
+    rng = random.Random(0)
+    writer = open_log_writer(path, 'bin')
+    start = 1700000000000000
+    frames = []
+    for can_id, rate in SYNTHETIC_RATES:
+        frames += [(start + int((i + rng.random()) * 1000000 / rate), can_id) for i in range(seconds * rate)]
+    for timestamp, can_id in sorted(frames):
+        if can_id in (0x601, 0x651):
+            data = bytes([rng.randrange(15) * 7]) + bytes(rng.randrange(256) for _ in range(7))
+        else:
+            data = struct.pack('<Q', rng.getrandbits(64))
+        writer.write_frame(can.Message(arbitration_id=can_id, data=data, is_extended_id=False), 0,
+                           timestamp=timestamp)
+    writer.close()
+
+
+def load_frames(path):
+    return [can.Message(arbitration_id=can_id, data=data, is_extended_id=bool(flags & FLAG_EXTENDED))
+            for _, can_id, flags, _, _, data in iter_log_records(path)]
+
+
+def measure(name, decoder, frames, repeat):
+    """Best of ``repeat`` passes over the log, overall and per ID"""
+    by_id = defaultdict(list)
+    for msg in frames:
+        by_id[msg.arbitration_id].append(msg)
+    process = decoder.process_can_message
+    with contextlib.redirect_stdout(io.StringIO()):
+        total = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for msg in frames:
+                process(msg)
+            total = min(total, time.perf_counter() - start)
+        per_id = {}
+        for can_id, messages in by_id.items():
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for msg in messages:
+                    process(msg)
+                best = min(best, time.perf_counter() - start)
+            per_id[can_id] = best / len(messages)
+
+    print(f"\n=== {name}: {len(frames)} frames, {total / len(frames) * 1e6:.2f} µs per frame ===")
+    print(f"  {'ID':>5} {'frames':>8} {'µs/frame':>9} {'share':>6}")
+    for can_id in sorted(per_id, key=lambda can_id: -per_id[can_id] * len(by_id[can_id])):
+        share = per_id[can_id] * len(by_id[can_id]) / total
+        print(f"  0x{can_id:03X} {len(by_id[can_id]):8d} {per_id[can_id] * 1e6:9.2f} {share * 100:5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode µs per frame over a recorded log")
+    parser.add_argument('--log', default=None, help="segment to decode (any format); default synthetic traffic")
+    parser.add_argument('--repeat', type=int, default=3, help="passes over the log, the best one counts")
+    args = parser.parse_args()
+
+    if args.log:
+        frames = load_frames(args.log)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'synthetic.canlog')
+            write_synthetic(path)
+            frames = load_frames(path)
+
+    measure("CanDecoder", CanDecoder(), frames, args.repeat)
+    try:
+        gui = load_gui()
+    except ImportError as e:
+        print(f"\nGUIvehical-v6_dev.py skipped: {e}")
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        app = gui.CanReceiverWebApp(use_csv=True, csv_file=os.devnull)
+    measure("GUIvehical-v6_dev", app, frames, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+解碼分派效能測試
+Per-frame cost of CanDecoder.process_can_message by CAN ID.
+
+CanDecoder decodes through CanDashboardDecoder, with handlers generated from
+dbc/NTUR_legacy.dbc, so the if/elif chain it started from is gone; that
+the output did not change is checked by test_dashboard_decoder.py against
+testdata/dashboard_legacy_golden.jsonl. Every ID with a handler plus one
+ID without is timed. Decoders print on some payloads; stdout is discarded
+while timing.
+
+GUIvehical-v6_dev.py decodes through CanDashboardDecoder too;
+bench_decode_log.py measures it (load_gui() is shared).
+
+    python3 bench_decoder_dispatch.py
+    python3 bench_decoder_dispatch.py --frames 200000
+"""
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import struct
+import timeit
+
+import can
+
+from CanDecoder import CanDecoder
+
+GUI_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GUIvehical-v6_dev.py')
+# Not decoded by CanDecoder: the cost every unrelated frame on the bus pays
+UNHANDLED_ID = 0x7FF
+
+
+def payload(can_id):
+    """Fixed, decodable 8-byte payload (index bytes kept small for the cell voltage/temperature frames)"""
+    return bytes([0, 1]) + struct.pack('<hhh', 1200, -300, 4500)
+
+
+def measure(name, target, frames):
+    can_ids = sorted(target.handlers) + [UNHANDLED_ID]
+    print(f"\n=== {name}: {len(target.handlers)} IDs in the dispatch table ===")
+    print(f"  {'ID':>5} {'ns':>9}")
+    total = 0.0
+    for can_id in can_ids:
+        msg = can.Message(arbitration_id=can_id, data=payload(can_id), is_extended_id=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cost = min(timeit.repeat(lambda: target.process_can_message(msg), number=frames, repeat=3)) / frames
+        total += cost
+        print(f"  0x{can_id:03X} {cost * 1e9:9.0f}")
+    print(f"  mean over IDs: {total / len(can_ids) * 1e9:.0f} ns")
+
+
+def load_gui():
+    spec = importlib.util.spec_from_file_location('GUIvehical_v6_dev', GUI_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-ID decode cost of the dispatch table")
+    parser.add_argument('--frames', type=int, default=50000, help="frames timed per ID")
+    args = parser.parse_args()
+
+    measure("CanDecoder", CanDecoder(), args.frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+記錄器重播壓力測試
+Replay harness and throughput benchmark for canlogging-v6.py on vcan0/vcan1.
+
+The logger runs unmodified as a child process (``--channels vcan0,vcan1
+--log-dir <tmp>``). One sender process per bus puts traffic on the virtual
+buses, either a recorded segment replayed with its original timing at 1x..Nx
+speed, or synthetic traffic at a fixed frame rate (default: full 1 Mbit/s
+load on both buses). Recording is started with the 0x420 start command and
+stopped afterwards, then the segments are read back:
+
+* frames sent vs frames logged per bus (the logger's own Tx heartbeats and
+  the 0x420 commands are not counted)
+* CPU % (sum over the logger and its child processes, 100% = one core) and
+  peak RSS, sampled from /proc
+* bytes written to the log directory per second
+* the drop counters stored in the segment sidecars
+
+Replayed logs skip Tx frames, 0x420 commands and the 0x281 VCU status, which
+would start and stop recording on their own.
+
+    sudo modprobe vcan
+    sudo ip link add dev vcan0 type vcan && sudo ip link set vcan0 up
+    sudo ip link add dev vcan1 type vcan && sudo ip link set vcan1 up
+    python3 bench_logger_replay.py --seconds 30                        # synthetic full load
+    python3 bench_logger_replay.py --log LOGS/can_log_X.canlog --speeds 1,2,4
+    python3 bench_logger_replay.py --seconds 30 -- --format bin --capture process
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import can
+
+from CanLogFormat import FLAG_EXTENDED, FLAG_TX, is_log_file, iter_log_records
+from CanLogIndex import load_index
+from CanPreTrigger import FULL_LOAD_FPS
+
+CHANNELS = ('vcan0', 'vcan1')
+CONTROL_ID = 0x420
+# Never replayed: they drive the logger's recording state machine
+SKIPPED_IDS = (CONTROL_ID, 0x281)
+LOGGER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'canlogging-v6.py')
+
+
+def setup_vcan():
+    """Create and bring up vcan0/vcan1 if they do not exist yet"""
+    for channel in CHANNELS:
+        if os.path.exists(f"/sys/class/net/{channel}"):
+            continue
+        subprocess.run(["sudo", "modprobe", "vcan"], check=True)
+        subprocess.run(["sudo", "ip", "link", "add", "dev", channel, "type", "vcan"], check=True)
+        subprocess.run(["sudo", "ip", "link", "set", channel, "up"], check=True)
+        print(f"{channel} created")
+
+
+def pace(next_send):
+    delay = next_send - time.perf_counter()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def replay_sender(channel, bus_num, source, speed, seconds, fps, sent):
+    """Sender process: replay ``source`` (bus ``bus_num`` only) at ``speed``, or synthetic traffic at ``fps``"""
+    bus = can.interface.Bus(channel=channel, interface='socketcan')
+    count = 0
+    start = time.perf_counter()
+    if source is None:
+        rng = random.Random(bus_num)
+        period = 1.0 / fps
+        next_send = start
+        while next_send < start + seconds:
+            msg = can.Message(arbitration_id=rng.choice((0x181, 0x182, 0x193, 0x194, 0x311, 0x3A0)),
+                              data=count.to_bytes(4, 'little') + bytes(4), is_extended_id=False)
+            try:
+                bus.send(msg, timeout=0.1)
+                count += 1
+            except can.CanError:
+                pass  # TX queue full, keep pacing
+            next_send += period
+            pace(next_send)
+    else:
+        first = None
+        for timestamp, can_id, flags, record_bus, _, data in iter_log_records(source):
+            if record_bus != bus_num or flags & FLAG_TX or can_id in SKIPPED_IDS:
+                continue
+            if first is None:
+                first = timestamp
+            offset = (timestamp - first) / 1000000 / speed
+            if offset > seconds:
+                break
+            pace(start + offset)
+            msg = can.Message(arbitration_id=can_id, data=data, is_extended_id=bool(flags & FLAG_EXTENDED))
+            try:
+                bus.send(msg, timeout=0.1)
+                count += 1
+            except can.CanError:
+                pass
+    sent.value = count
+    bus.shutdown()
+
+
+def process_tree(pid):
+    """``pid`` and all its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree += children.get(parent, [])
+    return tree
+
+
+def sample(pid):
+    """(CPU seconds of each process in the tree, total RSS bytes)"""
+    cpu = {}
+    rss = 0
+    ticks = os.sysconf('SC_CLK_TCK')
+    for child in process_tree(pid):
+        try:
+            with open(f"/proc/{child}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu[child] = (int(fields[11]) + int(fields[12])) / ticks  # utime + stime
+            with open(f"/proc/{child}/status") as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss += int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            continue
+    return cpu, rss
+
+
+def directory_bytes(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def send_control(command):
+    with can.interface.Bus(channel=CHANNELS[0], interface='socketcan') as bus:
+        bus.send(can.Message(arbitration_id=CONTROL_ID, data=[command], is_extended_id=False))
+
+
+def wait_for_segment(log_dir, logger, timeout=15.0):
+    """Wait until the logger opened its first segment (it is ready for commands then)"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if logger.poll() is not None:
+            sys.exit(f"canlogging-v6.py exited with code {logger.returncode}")
+        if os.path.isdir(log_dir) and any(is_log_file(name) for name in os.listdir(log_dir)):
+            return
+        time.sleep(0.1)
+    sys.exit("canlogging-v6.py did not open a segment")
+
+
+def run(source, speed, seconds, fps, logger_args):
+    label = f"replay {os.path.basename(source)} at {speed:g}x" if source else f"synthetic {fps} frames/s per bus"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_dir = os.path.join(tmp_dir, 'LOGS')
+        with open(os.path.join(tmp_dir, 'logger.out'), 'w') as output:
+            logger = subprocess.Popen(
+                [sys.executable, LOGGER, '--channels', ','.join(CHANNELS), '--log-dir', log_dir,
+                 '--archive-after-hours', '0', '--min-free-gb', '0'] + logger_args,
+                stdout=output, stderr=subprocess.STDOUT)
+            try:
+                wait_for_segment(log_dir, logger)
+                send_control(0x01)
+                time.sleep(1.0)
+
+                sent = [multiprocessing.Value('Q', 0) for _ in CHANNELS]
+                senders = [multiprocessing.Process(target=replay_sender,
+                                                   args=(channel, i, source, speed, seconds, fps, sent[i]))
+                           for i, channel in enumerate(CHANNELS)]
+                cpu_start, _ = sample(logger.pid)
+                bytes_start = directory_bytes(log_dir)
+                wall_start = time.perf_counter()
+                for process in senders:
+                    process.start()
+
+                # CPU per sampling interval over the whole tree, children may come and go
+                peak_rss = 0
+                peak_cpu = 0.0
+                last_cpu, last_time = cpu_start, wall_start
+                cpu_total = 0.0
+                while any(process.is_alive() for process in senders):
+                    time.sleep(0.5)
+                    cpu, rss = sample(logger.pid)
+                    now = time.perf_counter()
+                    used = sum(cpu[pid] - last_cpu.get(pid, 0.0) for pid in cpu)
+                    cpu_total += used
+                    peak_cpu = max(peak_cpu, used / (now - last_time))
+                    peak_rss = max(peak_rss, rss)
+                    last_cpu, last_time = cpu, now
+                wall = time.perf_counter() - wall_start
+                for process in senders:
+                    process.join()
+                time.sleep(2.0)  # let the write queue drain
+                written = directory_bytes(log_dir) - bytes_start
+
+                send_control(0x02)  # closes the recording segment, writing its sidecar
+                time.sleep(1.0)
+            finally:
+                logger.send_signal(signal.SIGINT)
+                try:
+                    logger.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    logger.kill()
+
+        logged = [0] * len(CHANNELS)
+        rx_overflow = [0] * len(CHANNELS)
+        queue_dropped = 0
+        for name in sorted(os.listdir(log_dir)):
+            if not is_log_file(name):
+                continue
+            path = os.path.join(log_dir, name)
+            for _, can_id, flags, bus_num, _, _ in iter_log_records(path):
+                if not flags & FLAG_TX and can_id != CONTROL_ID and bus_num < len(CHANNELS):
+                    logged[bus_num] += 1
+            health = (load_index(path) or {}).get('health') or {}
+            for bus_num, count in enumerate(health.get('rx_overflow', [])[:len(CHANNELS)]):
+                rx_overflow[bus_num] += count
+            queue_dropped += health.get('queue_dropped', 0)
+
+    print(f"\n=== {label} ===")
+    for i, channel in enumerate(CHANNELS):
+        lost = sent[i].value - logged[i]
+        print(f"  {channel}: sent {sent[i].value:8d}  logged {logged[i]:8d}  lost {lost:6d}  "
+              f"{logged[i] / wall:8.0f} frames/s  rx overflow {rx_overflow[i]}")
+    print(f"  logger CPU {cpu_total / wall * 100:.1f}% mean, {peak_cpu * 100:.1f}% peak (100% = one core), "
+          f"RSS peak {peak_rss / 1024 / 1024:.1f} MB")
+    print(f"  written {written / 1024 / 1024:.1f} MB, {written / wall / 1024 / 1024:.2f} MB/s, "
+          f"write queue drops {queue_dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay traffic on vcan0/vcan1 through canlogging-v6.py",
+                                     epilog="arguments after '--' are passed to canlogging-v6.py")
+    parser.add_argument('--log', default=None, help="segment to replay (any format); default synthetic load")
+    parser.add_argument('--speeds', default='1', help="replay speed factors, e.g. 1,2,4 (one run each)")
+    parser.add_argument('--seconds', type=float, default=30.0, help="length of each run")
+    parser.add_argument('--fps', type=int, default=FULL_LOAD_FPS,
+                        help="synthetic frames/s per bus (default: full 1 Mbit/s load)")
+    parser.add_argument('--no-setup', action='store_true', help="do not create vcan0/vcan1")
+    parser.add_argument('logger_args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if not args.no_setup:
+        setup_vcan()
+    logger_args = args.logger_args[1:] if args.logger_args[:1] == ['--'] else args.logger_args
+    if args.log is None:
+        run(None, 1.0, args.seconds, args.fps, logger_args)
+    else:
+        for speed in args.speeds.split(','):
+            run(args.log, float(speed), args.seconds, args.fps, logger_args)
+
+
+if __name__ == "__main__":
+    main()
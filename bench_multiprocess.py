@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+多行程記錄效能測試
+Logging throughput benchmark on vcan0/vcan1: capture thread vs reader processes.
+
+Two sender processes load both virtual buses (each payload carries a
+sequence number), and the logger pipeline under test writes every frame to a
+binary segment through the LogWriterThread:
+
+    thread   - CaptureThread + MultiBusReceiver in the logger process
+               (canlogging-v6.py --capture thread)
+    process  - one pinned reader process per bus + shared-memory rings
+               (canlogging-v6.py --capture process)
+
+The segment is read back afterwards and lost frames are counted exactly.
+
+    sudo modprobe vcan
+    sudo ip link add dev vcan0 type vcan && sudo ip link set vcan0 up
+    sudo ip link add dev vcan1 type vcan && sudo ip link set vcan1 up
+    python3 bench_multiprocess.py --seconds 10 --fps 8000
+"""
+import argparse
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+
+import can
+
+from CanLogFormat import BinaryLogWriter, iter_log_records
+from CanLogQueue import LogWriterThread
+from CanMultiProcess import ProcessCapture
+from CanPreTrigger import FULL_LOAD_FPS
+from CanReception import CaptureThread, MultiBusReceiver
+
+CHANNELS = ('vcan0', 'vcan1')
+
+
+def sender(channel, index, fps, seconds, sent):
+    bus = can.interface.Bus(channel=channel, interface='socketcan')
+    period = 1.0 / fps
+    seq = 0
+    next_send = time.perf_counter()
+    end = next_send + seconds
+    while time.perf_counter() < end:
+        msg = can.Message(arbitration_id=0x100 + index, data=struct.pack('<IHH', seq, index, 0),
+                          is_extended_id=False)
+        try:
+            bus.send(msg, timeout=0.1)
+            seq += 1
+        except can.CanError:
+            pass  # TX queue full, keep pacing
+        next_send += period
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    sent.value = seq
+    bus.shutdown()
+
+
+def run(mode, seconds, fps, cpus):
+    log_queue = LogWriterThread()
+    log_queue.start()
+
+    def record_frames(frames):
+        for bus_num, msg in frames:
+            log_queue.put(msg, bus_num, timestamp=int(msg.timestamp * 1000000))
+
+    buses = []
+    if mode == 'process':
+        capture = ProcessCapture(CHANNELS, record_frames, cpus=cpus)
+    else:
+        buses = [can.interface.Bus(channel=channel, interface='socketcan') for channel in CHANNELS]
+        capture = CaptureThread(MultiBusReceiver(buses), record_frames)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bench.canlog')
+        log_queue.open_segment(lambda: BinaryLogWriter(path))
+        capture.start()
+        time.sleep(0.5)  # readers up before the load starts
+
+        sent = [multiprocessing.Value('Q', 0) for _ in CHANNELS]
+        senders = [multiprocessing.Process(target=sender, args=(channel, i, fps, seconds, sent[i]))
+                   for i, channel in enumerate(CHANNELS)]
+        cpu_start = os.times()
+        wall_start = time.perf_counter()
+        for process in senders:
+            process.start()
+        for process in senders:
+            process.join()
+        time.sleep(0.5)  # let the pipeline drain
+        wall = time.perf_counter() - wall_start
+        times = os.times()
+        capture.stop()
+        log_queue.stop()
+        times_after = os.times()  # reader processes are only counted once they were joined
+        for bus in buses:
+            bus.shutdown()
+
+        logger_cpu = (times.user - cpu_start.user) + (times.system - cpu_start.system)
+        child_cpu = (times_after.children_user - cpu_start.children_user
+                     + times_after.children_system - cpu_start.children_system)
+        received = [0] * len(CHANNELS)
+        gaps = [0] * len(CHANNELS)
+        next_seq = [0] * len(CHANNELS)
+        for _, can_id, _, _, _, data in iter_log_records(path):
+            index = can_id - 0x100
+            if not 0 <= index < len(CHANNELS):
+                continue
+            seq = struct.unpack_from('<I', data)[0]
+            received[index] += 1
+            if seq > next_seq[index]:
+                gaps[index] += seq - next_seq[index]
+            next_seq[index] = seq + 1
+
+    stats = log_queue.stats()
+    print(f"\n=== {mode} ===")
+    for i, channel in enumerate(CHANNELS):
+        lost = sent[i].value - received[i]
+        print(f"  {channel}: sent {sent[i].value:8d}  logged {received[i]:8d}  "
+              f"lost {lost:6d} (sequence gaps {gaps[i]})  {received[i] / seconds:8.0f} frames/s")
+    if mode == 'process':
+        print(f"  ring drops {capture.drop_counts}")
+    print(f"  write queue drops {stats['frames_dropped']}, max stall {stats['max_stall_ms']:.1f} ms")
+    print(f"  logger process CPU {logger_cpu / wall * 100:.1f}% of one core, "
+          f"child processes {child_cpu / wall * 100:.1f}% (senders + readers)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging throughput: capture thread vs reader processes")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--fps', type=int, default=FULL_LOAD_FPS,
+                        help="frames/s per bus (default: full 1 Mbit/s load)")
+    parser.add_argument('--reader-cpus', default='1,2',
+                        help="cores for the vcan0,vcan1 reader processes ('' disables pinning)")
+    parser.add_argument('--mode', choices=['thread', 'process', 'both'], default='both')
+    args = parser.parse_args()
+
+    cpus = [int(cpu) for cpu in args.reader_cpus.split(',')] if args.reader_cpus else None
+    modes = ['thread', 'process'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run(mode, args.seconds, args.fps, cpus)
+
+
+if __name__ == "__main__":
+    main()
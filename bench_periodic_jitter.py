@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+週期訊息抖動效能測試
+Heartbeat period jitter benchmark on vcan0.
+
+A logger-like loop reads a fully loaded vcan0 and now and then blocks for a
+while (``--stall-ms`` every ``--stall-every`` seconds, like an fsync, a slow
+terminal or a reconnect in the real loop). Its heartbeat is sent either
+
+    loop  - by the loop itself: ``time.time() - last_send >= period`` checks
+            between receives (the previous canlogging-v6 code)
+    bcm   - by a kernel broadcast manager task (CanPeriodic), the loop only
+            refreshes the payload
+
+A separate socket records the kernel receive time of every heartbeat and the
+intervals between them are compared with the nominal period.
+
+    sudo modprobe vcan
+    sudo ip link add dev vcan0 type vcan && sudo ip link set vcan0 up
+    python3 bench_periodic_jitter.py --seconds 20 --period 0.1
+"""
+import argparse
+import threading
+import time
+
+import can
+
+from CanPeriodic import CyclicTransmitter
+from CanPreTrigger import FULL_LOAD_FPS
+from CanReception import MultiBusReceiver
+from log_jitter import jitter_stats
+from vcan_load import load_sender
+
+HEARTBEAT_ID = 0x421
+
+
+def heartbeat_monitor(stop_event, timestamps):
+    """Kernel receive time (us) of every heartbeat"""
+    bus = can.interface.Bus(channel='vcan0', interface='socketcan',
+                            can_filters=[{"can_id": HEARTBEAT_ID, "can_mask": 0x7FF, "extended": False}])
+    while not stop_event.is_set():
+        msg = bus.recv(timeout=0.1)
+        if msg is not None:
+            timestamps.append(int(msg.timestamp * 1000000))
+    bus.shutdown()
+
+
+def logger_loop(mode, period, stall_every, stall_ms, stop_event):
+    bus = can.interface.Bus(channel='vcan0', interface='socketcan')
+    receiver = MultiBusReceiver([bus])
+    counter = [0]
+
+    def payload():
+        return bytes([0x01, counter[0] & 0xFF]) + bytes(6)
+
+    transmitter = None
+    if mode == 'bcm':
+        transmitter = CyclicTransmitter([bus])
+        transmitter.add(0, HEARTBEAT_ID, period, payload)
+    last_send = 0
+    next_stall = time.time() + stall_every
+    while not stop_event.is_set():
+        frames = receiver.poll(timeout=0.05)
+        counter[0] += len(frames)
+        current_time = time.time()
+        if transmitter is not None:
+            transmitter.refresh()
+        elif current_time - last_send >= period:
+            bus.send(can.Message(arbitration_id=HEARTBEAT_ID, data=payload(), is_extended_id=False))
+            last_send = current_time
+        if stall_ms and current_time >= next_stall:
+            time.sleep(stall_ms / 1000)
+            next_stall = current_time + stall_every
+    if transmitter is not None:
+        transmitter.stop()
+    receiver.close()
+    bus.shutdown()
+
+
+def run(mode, seconds, fps, period, stall_every, stall_ms):
+    stop_event = threading.Event()
+    timestamps = []
+    threads = [
+        threading.Thread(target=load_sender, args=(fps, stop_event)),
+        threading.Thread(target=heartbeat_monitor, args=(stop_event, timestamps)),
+        threading.Thread(target=logger_loop, args=(mode, period, stall_every, stall_ms, stop_event)),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for thread in threads:
+        thread.join()
+
+    intervals = [b - a for a, b in zip(timestamps, timestamps[1:])]
+    stats = jitter_stats(intervals)
+    print(f"\n=== {mode} ===")
+    if stats is None:
+        print("  fewer than three heartbeats received")
+        return
+    expected = int(seconds / period)
+    print(f"  heartbeats {stats['count']} (expected ~{expected}), nominal {period * 1000:.1f} ms")
+    print(f"  median {stats['period_ms']:.2f} ms, stdev {stats['jitter_ms']:.2f} ms, "
+          f"early {stats['early_ms']:.2f} ms, late {stats['late_ms']:.2f} ms, "
+          f"max {max(intervals) / 1000:.2f} ms")
+    mean_error = sum(abs(interval / 1000 - period * 1000) for interval in intervals) / len(intervals)
+    print(f"  mean |interval - period| {mean_error:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Heartbeat jitter: loop polling vs kernel BCM (vcan0)")
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--fps', type=int, default=FULL_LOAD_FPS,
+                        help="background frames/s (default: full 1 Mbit/s load)")
+    parser.add_argument('--period', type=float, default=1.0, help="heartbeat period in seconds")
+    parser.add_argument('--stall-every', type=float, default=3.0,
+                        help="seconds between simulated blocking calls in the loop")
+    parser.add_argument('--stall-ms', type=float, default=200.0,
+                        help="duration of each simulated blocking call (0 disables)")
+    parser.add_argument('--mode', choices=['loop', 'bcm', 'both'], default='both')
+    args = parser.parse_args()
+
+    modes = ['loop', 'bcm'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        run(mode, args.seconds, args.fps, args.period, args.stall_every, args.stall_ms)
+
+
+if __name__ == "__main__":
+    main()
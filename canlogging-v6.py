@@ -1,15 +1,47 @@
+import argparse
 import can
-import csv
 import os
 import time
 import struct
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import partial
 
 import subprocess
+import threading
+
+from CanReception import CaptureThread, MultiBusReceiver
+from CanIngest import INGEST_SOCKET, IngestClient
+from CanMultiProcess import ProcessCapture
+from CanDecodedOutput import DBC_DIR, DecodedOutput
+from CanHealth import HEALTH_STATUS_ID, HealthMonitor
+from CanPeriodic import CyclicTransmitter
+from CanPreTrigger import PreTriggerBuffer
+from CanLogFormat import TIMESTAMP_SOURCES, log_extension, open_log_writer
+from CanLogIndex import SegmentIndex
+from CanLogQueue import LogWriterThread, QUEUE_POLICIES
+from CanRetention import start_retention
+from TripDistance import TripDistanceJournal
+from WheelOdometry import WHEEL_SPEED_IDS, WheelOdometry, wheel_rpm
 
 vcu_instruction = False
 trip_distance = 0.0
 base_dir_d = "/home/pi/Desktop/RPI_Desktop/LOGS_distance"
+trip_journals = {}
+# A running car checkpoints its distance this often, so a crash loses at most this window
+TRIP_CHECKPOINT_INTERVAL = 10.0
+
+# Frames the control state machine reacts to, filtered in the kernel so the
+# control sockets never see the bulk traffic:
+#   0x281 VCU status (run bit), 0x420 start/stop command, 0x193/0x194 wheel speed (can0 only)
+CONTROL_FILTERS = {
+    'can0': [{"can_id": can_id, "can_mask": 0x7FF, "extended": False}
+             for can_id in (0x281, 0x420, 0x193, 0x194)],
+    'can1': [{"can_id": can_id, "can_mask": 0x7FF, "extended": False}
+             for can_id in (0x281, 0x420)],
+}
+# Matches nothing (a standard ID with bit 11 set): sockets that only send
+# while reader processes do the capture
+SEND_ONLY_FILTER = [{"can_id": 0x800, "can_mask": 0x800, "extended": False}]
 
 def check_vcu_running():
     return vcu_instruction
@@ -33,133 +65,168 @@ def start_can_interface():
     except subprocess.CalledProcessError:
         print("Failed to start CAN1 interface.")
 
-def connect_can(bus_channel='can0'):
+def connect_can(bus_channel='can0', can_filters=None):
     while True:
         try:
-            return can.interface.Bus(channel=bus_channel, bustype='socketcan')
+            return can.interface.Bus(channel=bus_channel, bustype='socketcan', can_filters=can_filters)
         except OSError:
             print("CAN not available, retrying in 5 sec...")
             time.sleep(5)
 
-def new_csv_writer(base_dir, base_name):
+def new_log_writer(base_dir, base_name, log_format='csv', payload_size=8, compression=None, sync_interval=5.0,
+                   timestamp_source='kernel', index_interval_ms=1000, health=None, decoded=None):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(base_dir, f"{base_name}_{timestamp}.csv")
-    f = open(filename, 'w', newline='')
-    writer = csv.writer(f)
-    writer.writerow(["Time Stamp", "ID", "Extended", "Dir", "Bus", "LEN", "D1",
-                     "D2", "D3", "D4", "D5", "D6", "D7", "D8", "D9", "D10",
-                     "D11", "D12"])
-    return f, writer
+    extension = log_extension(log_format, compression)
+    filename = os.path.join(base_dir, f"{base_name}_{timestamp}{extension}")
+    # Size-based rotation can open two segments within the same second
+    counter = 1
+    while os.path.exists(filename):
+        filename = os.path.join(base_dir, f"{base_name}_{timestamp}_{counter}{extension}")
+        counter += 1
+    print(f"New log file created: {filename}")
+    # Seek index sidecar, written when the segment is closed
+    index = SegmentIndex(index_interval_ms) if index_interval_ms else None
+    # Drop/reconnect counters of this segment, stored in its trailer and sidecar
+    trailer = health.segment_trailer() if health is not None else None
+    # DBC-decoded columns of this segment, written by the decoder process
+    tap = decoded.tap(filename) if decoded is not None else None
+    return open_log_writer(filename, log_format, payload_size, compression, sync_interval,
+                           timestamp_source, index, trailer, tap)
 
-def load_trip_distance(base_dir):
-    """Load cumulative trip distance from file"""
-    distance_file = os.path.join(base_dir, "trip_distance_cumulative.csv")
-    print(f"Loading trip distance from: {distance_file}")
-    if os.path.exists(distance_file):
-        try:
-            with open(distance_file, 'r') as f:
-                reader = csv.reader(f)
-                header = next(reader, None)
-                print(f"File header: {header}")
-                last_row = None
-                for row in reader:
-                    print(f"Reading row: {row}")
-                    last_row = row
-                if last_row and len(last_row) >= 2:
-                    distance = float(last_row[1])
-                    print(f"Loaded distance: {distance} km")
-                    return distance
-        except Exception as e:
-            print(f"Failed to load trip distance: {e}")
-    else:
-        print(f"Distance file does not exist, creating new file with 0.0 km")
-        # Create new file with initial 0.0 km
-        try:
-            with open(distance_file, 'w', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["Timestamp", "Distance_km"])
-                writer.writerow([datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "0.000000"])
-            print(f"Created new distance file: {distance_file}")
-        except Exception as e:
-            print(f"Failed to create distance file: {e}")
-    return 0.0
+def trip_journal(base_dir):
+    """One journal instance per directory, so sequence numbers stay consistent"""
+    if base_dir not in trip_journals:
+        trip_journals[base_dir] = TripDistanceJournal(base_dir)
+    return trip_journals[base_dir]
 
-def save_trip_distance(base_dir, distance):
-    """Save cumulative trip distance to file"""
-    # Ensure directory exists with proper permissions
+def load_trip_distance(base_dir):
+    """Load cumulative trip distance from the journal (reads only its last record)"""
+    print(f"Loading trip distance from: {base_dir}")
     try:
-        os.makedirs(base_dir, exist_ok=True)
-        print(f"Directory ensured: {base_dir}")
+        distance = trip_journal(base_dir).distance
+        print(f"Loaded distance: {distance} km")
+        return distance
     except Exception as e:
-        print(f"Failed to create directory {base_dir}: {e}")
-        return
-    
-    distance_file = os.path.join(base_dir, "trip_distance_cumulative.csv")
-    print(f"\n=== Saving trip distance ===")
-    print(f"File: {distance_file}")
-    print(f"Distance: {distance:.6f} km")
+        print(f"Failed to load trip distance: {e}")
+    return 0.0
+
+def save_trip_distance(base_dir, distance, verbose=True):
+    """Append cumulative trip distance to the journal (fsynced before returning)"""
     try:
-        # Create file and write header if it doesn't exist
-        file_exists = os.path.exists(distance_file)
-        
-        # If file exists, rewrite it completely to avoid append issues
-        if file_exists:
-            # Read existing data first
-            existing_data = []
-            try:
-                with open(distance_file, 'r') as f:
-                    reader = csv.reader(f)
-                    existing_data = list(reader)
-                print(f"Read {len(existing_data)} existing rows")
-            except:
-                existing_data = [["Timestamp", "Distance_km"]]
-                print("Failed to read existing data, starting fresh")
-        else:
-            existing_data = [["Timestamp", "Distance_km"]]
-            print("File doesn't exist, creating new file")
-        
-        # Write all data including new entry
-        with open(distance_file, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerows(existing_data)
-            new_row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), f"{distance:.6f}"]
-            writer.writerow(new_row)
-            print(f"Wrote new row: {new_row}")
-        
-        print(f"✓ Successfully saved trip distance to {distance_file}")
-        print(f"=========================\n")
+        trip_journal(base_dir).append(distance)
+        if verbose:
+            print(f"✓ Saved trip distance {distance:.6f} km to {base_dir}")
     except PermissionError as e:
         print(f"✗ Permission denied saving trip distance.")
         print(f"Error: {e}")
         print(f"Try running: sudo chmod -R 755 {base_dir}")
-        print(f"=========================\n")
     except Exception as e:
         print(f"✗ Failed to save trip distance: {e}")
-        print(f"=========================\n")
 
-def main():
-    base_dir = "/home/pi/Desktop/RPI_Desktop/LOGS"
-    base_dir_d = "/home/pi/Desktop/RPI_Desktop/LOGS_distance"
+def main(log_format='csv', payload_size=8, queue_size=65536, queue_policy='count-drops',
+         compression=None, max_segment_mb=None, max_segment_minutes=20, sync_interval=5.0,
+         timestamp_source='kernel', pretrigger_seconds=5.0, index_interval_ms=1000, capture_mode='thread',
+         reader_cpus=(1, 2), disk_budget_gb=None, min_free_gb=1.0, archive_after_hours=24.0,
+         channels=('can0', 'can1'), log_dir=None, decoded_format=None, dbc_dir=DBC_DIR,
+         ingest_socket=INGEST_SOCKET):
+    base_dir = log_dir or "/home/pi/Desktop/RPI_Desktop/LOGS"
+    base_dir_d = base_dir + "_distance"
+    # Logical buses: CONTROL_FILTERS and the frame layout refer to can0/can1,
+    # the interfaces may be others (vcan0/vcan1 in bench_logger_replay.py)
+    channel0, channel1 = channels
     os.makedirs(base_dir, exist_ok=True)
     os.makedirs(base_dir_d, exist_ok=True)
 
-    bus0 = connect_can('can0')
-    bus1 = connect_can('can1')
+    # Archiving and deleting old segments runs in an idle-priority process,
+    # started before any socket or segment is opened
+    retention = None
+    if disk_budget_gb or min_free_gb or archive_after_hours:
+        retention = start_retention(
+            base_dir,
+            budget_bytes=int(disk_budget_gb * 1024 ** 3) if disk_budget_gb else None,
+            min_free_bytes=int(min_free_gb * 1024 ** 3) if min_free_gb else None,
+            archive_after=archive_after_hours * 3600 if archive_after_hours else None)
+    
+    # Optional decoder process writing per-message Parquet/Arrow next to each segment
+    decoded = None
+    if decoded_format:
+        decoded = DecodedOutput(dbc_dir, decoded_format)
+        decoded.start()
     
+    # Unfiltered sockets carry the bulk logging stream and the periodic sends,
+    # filtered sockets feed the control state machine. With reader processes
+    # or the ingest daemon the bulk stream is read there and these sockets only send.
+    send_filters = SEND_ONLY_FILTER if capture_mode in ('process', 'ingest') else None
+    bus0 = connect_can(channel0, send_filters)
+    bus1 = connect_can(channel1, send_filters)
+    ctrl0 = connect_can(channel0, CONTROL_FILTERS['can0'])
+    ctrl1 = connect_can(channel1, CONTROL_FILTERS['can1'])
     
-    recording = False
+    # Disk writes run on a background thread behind a bounded queue, which also
+    # rotates the segment on size or age
+    log_queue = LogWriterThread(
+        capacity=queue_size, policy=queue_policy,
+        max_segment_bytes=int(max_segment_mb * 1024 * 1024) if max_segment_mb else None,
+        max_segment_seconds=max_segment_minutes * 60 if max_segment_minutes else None)
+    log_queue.start()
+
+    # Set/cleared by the control loop, read by the capture thread
+    recording = threading.Event()
+
+    # Last few seconds of traffic while not recording, only touched by the capture thread
+    pretrigger = None
+    if pretrigger_seconds:
+        pretrigger = PreTriggerBuffer(2, pretrigger_seconds, payload_size=payload_size)
+
+    # Frames sent by the logger's own periodic tasks are looped back to the capture
+    # sockets (is_rx False) and logged as Tx
+    def record_frames(frames):
+        if recording.is_set():
+            if pretrigger is not None and len(pretrigger):
+                # Recording just started: the new segment begins with the buffered history,
+                # handed over as raw rings and rebuilt on the writer thread
+                log_queue.put_backlog(pretrigger.detach(int(time.time() * 1000000)))
+            if timestamp_source == 'kernel':
+                # Receive time stamped by the kernel (SO_TIMESTAMPNS), unaffected by queueing
+                for bus_num, msg in frames:
+                    log_queue.put(msg, bus_num, direction=None if msg.is_rx else 'Tx',
+                                  timestamp=int(msg.timestamp * 1000000))
+            else:
+                for bus_num, msg in frames:
+                    log_queue.put(msg, bus_num, direction=None if msg.is_rx else 'Tx',
+                                  timestamp=int(time.time() * 1000000))
+        elif pretrigger is not None:
+            for bus_num, msg in frames:
+                timestamp = msg.timestamp if timestamp_source == 'kernel' else time.time()
+                pretrigger.push(bus_num, msg, int(timestamp * 1000000), None if msg.is_rx else 'Tx')
+
+    # Bulk capture runs apart from the state machine: a thread draining the
+    # unfiltered sockets, one pinned reader process per bus, or a subscription
+    # to the ingest daemon (CanIngest.py) shared with the dashboards
+    if capture_mode == 'process':
+        capture = ProcessCapture([channel0, channel1], record_frames, cpus=reader_cpus, payload_size=payload_size)
+        capture_receiver = capture
+    elif capture_mode == 'ingest':
+        capture_receiver = IngestClient(ingest_socket)
+        capture = CaptureThread(capture_receiver, record_frames)
+    else:
+        capture_receiver = MultiBusReceiver([bus0, bus1])
+        capture = CaptureThread(capture_receiver, record_frames)
+    health = HealthMonitor([channel0, channel1], capture_receiver, log_queue)
+    segment_args = (log_format, payload_size, compression, sync_interval, timestamp_source, index_interval_ms,
+                    health, decoded)
+
     recording_start_time = datetime.now()
-    file, writer = new_csv_writer(base_dir, "can_log")
-    rotate_at = recording_start_time + timedelta(minutes=20)
-    last_status_send = 0
+    log_queue.open_segment(partial(new_log_writer, base_dir, "can_log", *segment_args))
+    last_queue_report = time.time()
     
     # Trip distance tracking variables
     global trip_distance
     trip_distance = load_trip_distance(base_dir_d)  # Cumulative trip distance (km)
-    last_distance_send = time.time()
-    left_wheel_speed = None  # inv_num 3 (ID 0x193)
-    right_wheel_speed = None  # inv_num 4 (ID 0x194)
-    last_speed_update_time = None
+    last_trip_checkpoint = time.time()
+    saved_trip_distance = trip_distance
+    # Per-wheel trapezoid integration over the frame timestamps (0x193 left, 0x194 right)
+    odometry = WheelOdometry()
     
     print(f"Loaded cumulative trip distance: {trip_distance:.3f} km")
     
@@ -170,241 +237,237 @@ def main():
 
     global vcu_instruction
     vcu_last = check_vcu_running()
-    while True:
-        # Receive messages from both CAN buses
-        msg0 = bus0.recv(timeout=0.001)  # Use shorter timeout
-        msg1 = bus1.recv(timeout=0.001)
         
-        # Check VCU instruction (from can0)
-        if msg0 is not None and hasattr(msg0, 'arbitration_id') and msg0.arbitration_id == 0x281 and len(msg0.data) > 0:
-            vcu_instruction = msg0.data[0] & 0x20
-        # Also check VCU instruction from can1
-        if msg1 is not None and hasattr(msg1, 'arbitration_id') and msg1.arbitration_id == 0x281 and len(msg1.data) > 0:
-            vcu_instruction = msg1.data[0] & 0x20
-
-        vcu_running = check_vcu_running()
-        # VCU state edge: False -> True, force start new recording file
-        if vcu_running and not vcu_last:
-            print("VCU state changed from False to True, forcing new recording file!")
-            if file:
-                file.close()
-            recording_start_time = datetime.now()
-            file, writer = new_csv_writer(base_dir, "can_log_vcu")
-            rotate_at = recording_start_time + timedelta(minutes=20)
-            recording = True
-            print(f"Recording started at {recording_start_time}")
-        # VCU state edge: True -> False, automatically stop recording
-        elif not vcu_running and vcu_last:
-            print("VCU state changed from True to False, automatically stopping recording!")
-            # Save trip distance when VCU stops
-            save_trip_distance(base_dir_d, trip_distance)
-            print(f"Trip distance saved: {trip_distance:.3f} km")
-            if recording and file:
-                file.close()
-                file = None
-                writer = None
-            recording = False
-            recording_start_time = None
-            print(f"Recording stopped at {datetime.now()}")
-            print("Waiting for VCU or manual start...")
-        vcu_last = vcu_running
-
-        # VCU True: auto recording only, cannot be interrupted by 0x420
-        if vcu_running:
-            if not recording:
-                print("VCU running, auto start recording!")
-                recording_start_time = datetime.now()
-                file, writer = new_csv_writer(base_dir, "can_log")
-                rotate_at = recording_start_time + timedelta(minutes=20)
-                recording = True
-                print(f"Recording started at {recording_start_time}")
-        else:
-            # VCU False: recording can be controlled by 0x420 (check both CAN buses)
-            for msg in [msg0, msg1]:
-                if msg is not None and hasattr(msg, 'arbitration_id') and msg.arbitration_id == 0x420:
-                    data_bytes = list(msg.data)
-                    if len(data_bytes) > 0:
-                        first_byte = data_bytes[0]
+    # 0x421 recording status: 01 + segment start time (u32 seconds), or all zero when idle
+    def recording_status_payload():
+        if recording.is_set() and recording_start_time:
+            # Start of the current segment, which the writer thread rotates
+            segment_start = log_queue.segment_start_time or recording_start_time.timestamp()
+            return bytes([0x01]) + struct.pack('<I', int(segment_start) & 0xFFFFFFFF) + bytes(3)
+        return bytes(8)
+
+    # 0x440 trip distance in mm (u32)
+    def trip_distance_payload():
+        return struct.pack('<I', int(trip_distance * 1000000) & 0xFFFFFFFF) + bytes(4)
+
+    # Heartbeats are timed by the kernel (BCM), the loop below only updates their payload
+    transmitter = CyclicTransmitter([bus0, bus1])
+    transmitter.add(0, 0x421, 1.0, recording_status_payload)
+    transmitter.add(0, HEALTH_STATUS_ID, 1.0, health.status_payload)
+    transmitter.add(1, 0x440, 1.0, trip_distance_payload)
+
+    # Bulk logging never waits for the state machine
+    capture.start()
+    receiver = MultiBusReceiver([ctrl0, ctrl1])
+    try:
+        while True:
+            try:
+                # Only control frames arrive here, so edges are handled as soon as they are received
+                frames = receiver.poll(timeout=0.05)
+
+                for bus_num, msg in frames:
+                    # Check VCU instruction (from either bus)
+                    if msg.arbitration_id == 0x281 and len(msg.data) > 0:
+                        vcu_instruction = msg.data[0] & 0x20
+
+                    vcu_running = check_vcu_running()
+                    # VCU state edge: False -> True, force start new recording file
+                    if vcu_running and not vcu_last:
+                        print("VCU state changed from False to True, forcing new recording file!")
+                        recording_start_time = datetime.now()
+                        log_queue.open_segment(partial(new_log_writer, base_dir, "can_log_vcu", *segment_args))
+                        recording.set()
+                        print(f"Recording started at {recording_start_time}")
+                    # VCU state edge: True -> False, automatically stop recording
+                    elif not vcu_running and vcu_last:
+                        print("VCU state changed from True to False, automatically stopping recording!")
+                        # Save trip distance when VCU stops
+                        save_trip_distance(base_dir_d, trip_distance)
+                        print(f"Trip distance saved: {trip_distance:.3f} km")
+                        if recording.is_set():
+                            log_queue.close_segment()
+                        recording.clear()
+                        recording_start_time = None
+                        print(f"Recording stopped at {datetime.now()}")
+                        print("Waiting for VCU or manual start...")
+                    vcu_last = vcu_running
+
+                    # VCU True: auto recording only, cannot be interrupted by 0x420
+                    if vcu_running:
+                        if not recording.is_set():
+                            print("VCU running, auto start recording!")
+                            recording_start_time = datetime.now()
+                            log_queue.open_segment(partial(new_log_writer, base_dir, "can_log", *segment_args))
+                            recording.set()
+                            print(f"Recording started at {recording_start_time}")
+                    # VCU False: recording can be controlled by 0x420 (from either bus)
+                    elif msg.arbitration_id == 0x420 and len(msg.data) > 0:
+                        first_byte = msg.data[0]
                         if first_byte == 0x01:
-                            if not recording:
+                            if not recording.is_set():
                                 print("Start recording command received!")
                                 recording_start_time = datetime.now()
-                                file, writer = new_csv_writer(base_dir, "can_log")
-                                rotate_at = recording_start_time + timedelta(minutes=20)
-                                recording = True
+                                log_queue.open_segment(partial(new_log_writer, base_dir, "can_log", *segment_args))
+                                recording.set()
                                 print(f"Recording started at {recording_start_time}")
                             else:
                                 print("Already recording, ignoring start command")
                         elif first_byte == 0x02:
-                            if recording:
+                            if recording.is_set():
                                 print("Stop recording command received!")
-                                if file:
-                                    file.close()
-                                    file = None
-                                    writer = None
-                                recording = False
+                                log_queue.close_segment()
+                                recording.clear()
                                 recording_start_time = None
                                 print(f"Recording stopped at {datetime.now()}")
                                 print("Waiting for next start command...")
                             else:
                                 print("Not recording, ignoring stop command")
-                    break  # Only process control command once
 
-        try:
-            # 2. Keep original CAN command control (already handled in main logic, here only handle file writing and status messages)
-            current_time = time.time()
-            if current_time - last_status_send >= 1.0:
+                    # Process speed data for trip distance calculation (can0)
+                    if bus_num == 0 and msg.arbitration_id in WHEEL_SPEED_IDS:
+                        speed_rpm = wheel_rpm(msg.data)
+                        if speed_rpm is not None:
+                            if msg.arbitration_id == 0x193:  # Left wheel (inv_num 3)
+                                print(f"[0x193] Left wheel speed: {speed_rpm} RPM")
+                            else:  # Right wheel (inv_num 4)
+                                print(f"[0x194] Right wheel speed: {speed_rpm} RPM")
+                            # Kernel receive time of the frame, independent of loop latency
+                            distance_increment = odometry.update(WHEEL_SPEED_IDS[msg.arbitration_id],
+                                                                 msg.timestamp, speed_rpm)
+                            if distance_increment:
+                                trip_distance += distance_increment
+                                print(f"Distance updated: +{distance_increment*1000:.3f}m, Total: {trip_distance:.6f}km")
+
+                if capture.failed.is_set():
+                    raise can.CanError("capture socket failed")
+
+                # New payloads for the periodic status frames (0x421, 0x422, 0x440)
+                current_time = time.time()
                 try:
-                    if recording and recording_start_time:
-                        timestamp = int(recording_start_time.timestamp())
-                        data = [0x01]
-                        data.extend([
-                            (timestamp >> 0) & 0xFF,
-                            (timestamp >> 8) & 0xFF,
-                            (timestamp >> 16) & 0xFF,
-                            (timestamp >> 24) & 0xFF,
-                            0x00, 0x00, 0x00
-                        ])
-                        status_msg = can.Message(arbitration_id=0x421, data=data, is_extended_id=False)
-                        bus0.send(status_msg)  # Send status from can0
-                    else:
-                        data = [0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00]
-                        status_msg = can.Message(arbitration_id=0x421, data=data, is_extended_id=False)
-                        bus0.send(status_msg)  # Send status from can0
-                    last_status_send = current_time
+                    transmitter.refresh()
                 except Exception as e:
-                    print(f"Failed to send status message: {e}")
-
-            # Process speed data for trip distance calculation (can0)
-            if msg0 is not None and hasattr(msg0, 'arbitration_id'):
-                if msg0.arbitration_id == 0x193 and len(msg0.data) >= 6:  # Left wheel (inv_num 3)
-                    speed_raw = struct.unpack('<h', bytes(msg0.data[4:6]))[0]
-                    left_wheel_speed = speed_raw
-                    current_time = time.time()
-                    print(f"[0x193] Left wheel speed: {left_wheel_speed} RPM")
-                    
-                    # When both wheel speeds are updated, calculate trip distance
-                    if right_wheel_speed is not None and last_speed_update_time is not None:
-                        avg_rpm = (abs(left_wheel_speed) + abs(right_wheel_speed)) / 2
-                        speed_kmps = avg_rpm * 0.00709 / 3600  # km/s
-                        time_delta = current_time - last_speed_update_time
-                        distance_increment = speed_kmps * time_delta
-                        trip_distance += distance_increment
-                        print(f"Distance updated: +{distance_increment*1000:.3f}m, Total: {trip_distance:.6f}km")
-                    
-                    last_speed_update_time = current_time
-                    
-                elif msg0.arbitration_id == 0x194 and len(msg0.data) >= 6:  # Right wheel (inv_num 4)
-                    speed_raw = struct.unpack('<h', bytes(msg0.data[4:6]))[0]
-                    right_wheel_speed = speed_raw
-                    current_time = time.time()
-                    print(f"[0x194] Right wheel speed: {right_wheel_speed} RPM")
+                    print(f"Failed to update periodic messages: {e}")
+
+                # Checkpoint the trip distance while driving (one journal record, no rewrite)
+                if (current_time - last_trip_checkpoint >= TRIP_CHECKPOINT_INTERVAL
+                        and trip_distance != saved_trip_distance):
+                    save_trip_distance(base_dir_d, trip_distance, verbose=False)
+                    saved_trip_distance = trip_distance
+                    last_trip_checkpoint = current_time
                     
-                    # When both wheel speeds are updated, calculate trip distance
-                    if left_wheel_speed is not None and last_speed_update_time is not None:
-                        avg_rpm = (abs(left_wheel_speed) + abs(right_wheel_speed)) / 2
-                        speed_kmps = avg_rpm * 0.00709 / 3600  # km/s
-                        time_delta = current_time - last_speed_update_time
-                        distance_increment = speed_kmps * time_delta
-                        trip_distance += distance_increment
-                        print(f"Distance updated: +{distance_increment*1000:.3f}m, Total: {trip_distance:.6f}km")
+                # Writer thread counters
+                if current_time - last_queue_report >= 60.0:
+                    stats = log_queue.stats()
+                    print(f"[Writer] queue {stats['queue_depth']} (max {stats['max_queue_depth']}), "
+                          f"batch {stats['last_batch_size']} (max {stats['max_batch_size']}), "
+                          f"stall {stats['last_stall_ms']:.1f} ms (max {stats['max_stall_ms']:.1f} ms), "
+                          f"dropped {stats['frames_dropped']}, rotated {stats['segments_rotated']}")
+                    counters = health.snapshot()
+                    print(f"[Health] rx overflow {counters['rx_overflow']}, reconnects {counters['reconnects']}")
+                    last_queue_report = current_time
                     
-                    last_speed_update_time = current_time
-            
-            # Record can0 messages
-            if recording and writer and msg0 is not None and hasattr(msg0, 'arbitration_id'):
-                timestamp = int(time.time() * 1000000)
-                can_id = f"{msg0.arbitration_id:08X}"
-                extended = 'true' if msg0.is_extended_id else 'false'
-                direction = 'Rx' if not msg0.is_remote_frame else 'Tx'
-                bus_num = 0  # can0
-                dlc = msg0.dlc
-                data_bytes = [f"{byte:02X}" for byte in msg0.data]
-                data_bytes += ['00'] * (8 - len(data_bytes))
-                writer.writerow([timestamp, can_id, extended, direction, bus_num, dlc] + data_bytes)
-
-            # Record can1 messages
-            if recording and writer and msg1 is not None and hasattr(msg1, 'arbitration_id'):
-                timestamp = int(time.time() * 1000000)
-                can_id = f"{msg1.arbitration_id:08X}"
-                extended = 'true' if msg1.is_extended_id else 'false'
-                direction = 'Rx' if not msg1.is_remote_frame else 'Tx'
-                bus_num = 1  # can1
-                dlc = msg1.dlc
-                data_bytes = [f"{byte:02X}" for byte in msg1.data]
-                data_bytes += ['00'] * (8 - len(data_bytes))
-                writer.writerow([timestamp, can_id, extended, direction, bus_num, dlc] + data_bytes)
-            
-            # Send trip distance to CAN1 every 1 second (ID 0x440)
-            if current_time - last_distance_send >= 1.0:
+            except can.CanError as e:
+                print(f"CAN Error: {e}")
+                health.reconnects += 1
+                odometry.reset_wheels()
+                if recording.is_set():
+                    log_queue.close_segment()
+                    recording.clear()
+                    recording_start_time = None
+                # Reconnect both CAN buses, bulk and control sockets
                 try:
-                    # Convert trip distance to millimeters (mm) and pack as 32-bit integer
-                    distance_mm = int(trip_distance * 1000000)  # km -> mm
-                    data = list(struct.pack('<I', distance_mm & 0xFFFFFFFF))  # 4 bytes, little-endian
-                    data += [0x00] * (8 - len(data))  # Pad to 8 bytes
-                    
-                    distance_msg = can.Message(
-                        arbitration_id=0x440,
-                        data=data,
-                        is_extended_id=False
-                    )
-                    bus1.send(distance_msg)
-                    
-                    # Also record this message to CSV
-                    if recording and writer:
-                        timestamp = int(time.time() * 1000000)
-                        can_id = f"{distance_msg.arbitration_id:08X}"
-                        extended = 'false'
-                        direction = 'Tx'
-                        bus_num = 1  # can1
-                        dlc = len(distance_msg.data)
-                        data_bytes = [f"{byte:02X}" for byte in distance_msg.data]
-                        writer.writerow([timestamp, can_id, extended, direction, bus_num, dlc] + data_bytes)
-                    
-                    last_distance_send = current_time
-                except Exception as e:
-                    print(f"Failed to send distance message: {e}")
-
-            # Check if log file rotation is needed
-            if recording and writer and datetime.now() >= rotate_at:
-                print("Rotating log file...")
-                file.close()
-                recording_start_time = datetime.now()
-                file, writer = new_csv_writer(base_dir, "can_log")
-                rotate_at = recording_start_time + timedelta(minutes=20)
-                print(f"New log file created at {recording_start_time}")
-
-        except can.CanError as e:
-            print(f"CAN Error: {e}")
-            if recording and file:
-                file.close()
-                file = None
-                writer = None
-                recording = False
-                recording_start_time = None
-            # Reconnect both CAN buses
-            try:
-                bus0 = connect_can('can0')
-                print("CAN0 connection restored")
-            except:
-                print("Failed to restore CAN0")
-            try:
-                bus1 = connect_can('can1')
-                print("CAN1 connection restored")
-            except:
-                print("Failed to restore CAN1")
-        except Exception as e:
-            print(f"Unexpected error: {e}")
-            if recording and file:
-                file.close()
-                file = None
-                writer = None
-                recording = False
-                recording_start_time = None
+                    bus0 = connect_can(channel0, send_filters)
+                    capture.replace_bus(0, bus0)
+                    transmitter.replace_bus(0, bus0)
+                    receiver.replace_bus(0, connect_can(channel0, CONTROL_FILTERS['can0']))
+                    print("CAN0 connection restored")
+                except:
+                    print("Failed to restore CAN0")
+                try:
+                    bus1 = connect_can(channel1, send_filters)
+                    capture.replace_bus(1, bus1)
+                    transmitter.replace_bus(1, bus1)
+                    receiver.replace_bus(1, connect_can(channel1, CONTROL_FILTERS['can1']))
+                    print("CAN1 connection restored")
+                except:
+                    print("Failed to restore CAN1")
+            except Exception as e:
+                print(f"Unexpected error: {e}")
+                if recording.is_set():
+                    log_queue.close_segment()
+                    recording.clear()
+                    recording_start_time = None
+    finally:
+        # Write out queued frames and close the open segment
+        transmitter.stop()
+        capture.stop()
+        log_queue.stop()
+        if decoded is not None:
+            decoded.stop()
+        if retention is not None:
+            retention.terminate()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CAN logger for can0/can1")
+    parser.add_argument('--format', choices=['csv', 'bin'], default='csv',
+                        help="log file format; convert 'bin' logs with log2csv.py")
+    parser.add_argument('--payload-size', type=int, choices=[8, 64], default=8,
+                        help="bytes of payload per binary record (64 for CAN FD)")
+    parser.add_argument('--queue-size', type=int, default=65536,
+                        help="frames buffered in memory between reception and disk")
+    parser.add_argument('--queue-policy', choices=QUEUE_POLICIES, default='count-drops',
+                        help="what to do when the write queue is full")
+    parser.add_argument('--compression', choices=['none', 'gzip', 'zstd'], default='none',
+                        help="compress segments while writing")
+    parser.add_argument('--max-segment-mb', type=float, default=None,
+                        help="start a new segment once the file reaches this size")
+    parser.add_argument('--max-segment-minutes', type=float, default=20,
+                        help="start a new segment after this many minutes (0 disables)")
+    parser.add_argument('--sync-interval', type=float, default=5.0,
+                        help="seconds between flush + fsync of the open segment")
+    parser.add_argument('--timestamps', choices=TIMESTAMP_SOURCES, default='kernel',
+                        help="'kernel': socket receive time of each frame, 'host': time it was queued")
+    parser.add_argument('--pretrigger-seconds', type=float, default=5.0,
+                        help="seconds of traffic before a recording start written into the new segment (0 disables)")
+    parser.add_argument('--index-interval-ms', type=int, default=1000,
+                        help="spacing of the seek checkpoints in each segment's .idx.json sidecar (0 disables)")
+    parser.add_argument('--capture', choices=['thread', 'process', 'ingest'], default='thread',
+                        help="'process': one reader process per bus feeding shared-memory rings, "
+                             "'ingest': frames from a running CanIngest.py daemon")
+    parser.add_argument('--ingest-socket', default=INGEST_SOCKET, help="socket of the ingest daemon")
+    parser.add_argument('--reader-cpus', default='1,2',
+                        help="cores the can0,can1 reader processes are pinned to ('' disables pinning)")
+    parser.add_argument('--disk-budget-gb', type=float, default=None,
+                        help="delete the oldest closed segments/archives while LOGS holds more than this")
+    parser.add_argument('--min-free-gb', type=float, default=1.0,
+                        help="delete the oldest closed segments/archives while less is free (0 disables)")
+    parser.add_argument('--archive-after-hours', type=float, default=24.0,
+                        help="compact closed segments into .canarc archives after this many hours (0 disables)")
+    parser.add_argument('--channels', default='can0,can1',
+                        help="interfaces used as can0,can1, e.g. vcan0,vcan1 for bench_logger_replay.py")
+    parser.add_argument('--log-dir', default=None,
+                        help="segment directory (default /home/pi/Desktop/RPI_Desktop/LOGS); "
+                             "the trip distance goes to <log-dir>_distance")
+    parser.add_argument('--decoded', choices=['none', 'parquet', 'arrow'], default='none',
+                        help="also write DBC-decoded signals per message next to each segment (needs pyarrow)")
+    parser.add_argument('--dbc-dir', default=DBC_DIR, help="DBC files used by --decoded")
+    args = parser.parse_args()
+    if args.log_dir:
+        base_dir_d = args.log_dir + "_distance"
     try: 
-        main()
+        main(log_format=args.format, payload_size=args.payload_size,
+             queue_size=args.queue_size, queue_policy=args.queue_policy,
+             compression=None if args.compression == 'none' else args.compression,
+             max_segment_mb=args.max_segment_mb, max_segment_minutes=args.max_segment_minutes,
+             sync_interval=args.sync_interval, timestamp_source=args.timestamps,
+             pretrigger_seconds=args.pretrigger_seconds, index_interval_ms=args.index_interval_ms,
+             capture_mode=args.capture,
+             reader_cpus=[int(cpu) for cpu in args.reader_cpus.split(',')] if args.reader_cpus else None,
+             disk_budget_gb=args.disk_budget_gb, min_free_gb=args.min_free_gb,
+             archive_after_hours=args.archive_after_hours,
+             channels=args.channels.split(','), log_dir=args.log_dir,
+             decoded_format=None if args.decoded == 'none' else args.decoded, dbc_dir=args.dbc_dir,
+             ingest_socket=args.ingest_socket)
     except KeyboardInterrupt:
         print("\nProgram interrupted by user")
         # Save trip distance on exit
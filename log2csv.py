@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+二進位 CAN 記錄檔轉 CSV
+Stream a binary CAN log (.canlog) or an archive (.canarc) into the logger's CSV layout.
+
+    python3 log2csv.py can_log_20250731_004455.canlog            # -> .csv next to it
+    python3 log2csv.py can_log_20250731_004455.canlog out.csv
+    python3 log2csv.py can_log_20250731_004455.canlog - | head   # to stdout
+    python3 log2csv.py can_log_20250731_004455.canlog.zst        # compressed segments too
+    python3 log2csv.py can_log_20250731_004455.canarc            # archived segments too
+
+The output is byte-for-byte the layout canlogging writes in CSV mode, so
+GUIvehical, CMD_dashboard and the analysis scripts read it unchanged.
+"""
+import argparse
+import csv
+import sys
+
+from CanLogFormat import (ARCHIVE_EXTENSION, BINARY_EXTENSION, CSV_HEADER, csv_row, iter_archive_records,
+                          iter_binary_records, open_log_binary)
+
+
+def convert(in_file, out_file, archive=False):
+    """Convert an open binary log (or archive) to CSV, returns the number of frames written"""
+    writer = csv.writer(out_file)
+    writer.writerow(CSV_HEADER)
+    count = 0
+    batch = []
+    for record in iter_archive_records(in_file) if archive else iter_binary_records(in_file):
+        batch.append(csv_row(*record))
+        if len(batch) >= 4096:
+            writer.writerows(batch)
+            count += len(batch)
+            batch.clear()
+    writer.writerows(batch)
+    return count + len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a binary CAN log to the CSV layout")
+    parser.add_argument('input', help=f"binary log file ({BINARY_EXTENSION}, optionally .gz/.zst) "
+                                      f"or archive ({ARCHIVE_EXTENSION})")
+    parser.add_argument('output', nargs='?',
+                        help="output CSV path, '-' for stdout (default: input with .csv)")
+    args = parser.parse_args()
+
+    archive = args.input.endswith(ARCHIVE_EXTENSION)
+    output = args.output
+    if output is None:
+        output = args.input.rsplit(ARCHIVE_EXTENSION if archive else BINARY_EXTENSION, 1)[0] + '.csv'
+
+    with open_log_binary(args.input) as in_file:
+        if output == '-':
+            count = convert(in_file, sys.stdout, archive)
+        else:
+            with open(output, 'w', newline='') as out_file:
+                count = convert(in_file, out_file, archive)
+            print(f"Wrote {count} frames to {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+CAN 記錄檔時間抖動分析
+Report timestamp jitter per CAN ID from an existing log segment.
+
+    python3 log_jitter.py can_log_20250731_004455.canlog
+    python3 log_jitter.py can_log_20250731_004455.csv.gz --bus 0 --min-count 50
+
+For every (bus, ID) the inter-frame intervals are summarised: the median is
+taken as the nominal period, jitter is the standard deviation of the
+intervals, and the worst early/late deviation from the nominal period is
+shown. Logs written with host timestamps show the queueing delay here;
+kernel timestamps should only show the sender's own jitter.
+"""
+import argparse
+import statistics
+import sys
+
+from CanLogFormat import BINARY_EXTENSION, iter_log_records, open_log_binary, read_binary_header
+
+
+def intervals_by_id(records, bus=None):
+    """Collect inter-frame intervals (us) per (bus, can_id)"""
+    last_seen = {}
+    intervals = {}
+    for timestamp, can_id, _, bus_num, _, _ in records:
+        if bus is not None and bus_num != bus:
+            continue
+        key = (bus_num, can_id)
+        previous = last_seen.get(key)
+        if previous is None:
+            intervals[key] = []
+        else:
+            intervals[key].append(timestamp - previous)
+        last_seen[key] = timestamp
+    return intervals
+
+
+def jitter_stats(intervals):
+    """Summary of one ID's intervals in ms, None if there are fewer than two"""
+    if len(intervals) < 2:
+        return None
+    values = sorted(intervals)
+    nominal = statistics.median(values)
+    return {
+        'count': len(values) + 1,
+        'period_ms': nominal / 1000,
+        'jitter_ms': statistics.pstdev(values) / 1000,
+        'early_ms': (nominal - values[0]) / 1000,
+        'late_ms': (values[-1] - nominal) / 1000,
+        'p99_ms': values[min(len(values) - 1, int(len(values) * 0.99))] / 1000,
+    }
+
+
+def print_header_info(filename):
+    if BINARY_EXTENSION not in filename:
+        return
+    with open_log_binary(filename) as f:
+        header = read_binary_header(f)
+    print(f"Timestamp source: {header['timestamp_source'] or 'unknown'}")
+    if header['clock_offset'] is not None:
+        print(f"Wall clock - monotonic at segment start: {header['clock_offset'] / 1000000:.6f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-ID timestamp jitter of a CAN log")
+    parser.add_argument('input', help="log segment (CSV or binary, optionally .gz/.zst)")
+    parser.add_argument('--bus', type=int, default=None, help="only this bus")
+    parser.add_argument('--min-count', type=int, default=10,
+                        help="skip IDs seen fewer times than this")
+    args = parser.parse_args()
+
+    print_header_info(args.input)
+    intervals = intervals_by_id(iter_log_records(args.input), args.bus)
+
+    print(f"{'Bus':>3} {'ID':>8} {'Count':>7} {'Period ms':>10} {'Jitter ms':>10} "
+          f"{'Early ms':>9} {'Late ms':>9} {'P99 ms':>9}")
+    for (bus_num, can_id), values in sorted(intervals.items()):
+        stats = jitter_stats(values)
+        if stats is None or stats['count'] < args.min_count:
+            continue
+        print(f"{bus_num:>3} {can_id:>8X} {stats['count']:>7} {stats['period_ms']:>10.3f} "
+              f"{stats['jitter_ms']:>10.3f} {stats['early_ms']:>9.3f} {stats['late_ms']:>9.3f} "
+              f"{stats['p99_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except BrokenPipeError:
+        sys.exit(0)
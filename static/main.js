@@ -1172,7 +1172,8 @@ class NTURTDashboard {
         if (statusIndicator && statusText) {
             if (canloggingData.is_recording) {
                 statusIndicator.className = 'status-indicator recording';
-                statusText.textContent = 'RECORDING';
+                // 記錄器回報丟包 (0x422)，目前記錄檔不完整
+                statusText.textContent = canloggingData.incomplete ? 'RECORDING (FRAMES LOST)' : 'RECORDING';
             } else {
                 statusIndicator.className = 'status-indicator idle';
                 statusText.textContent = 'IDLE';
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+測試 CanBatchDecode 的向量化批次解碼與逐筆 cantools 解碼結果一致
+"""
+import os
+import random
+import tempfile
+from collections import defaultdict
+
+import can
+
+from CanBatchDecode import BatchDecoder, frames_from_records, values_at
+from CanDecoderDBC import CanDecoderDBC
+from CanLogFormat import open_log_writer
+
+_decoder = None
+
+
+def batch_decoder():
+    global _decoder
+    if _decoder is None:
+        _decoder = BatchDecoder()
+    return _decoder
+
+
+def random_records(decoder, count=6000, seed=0):
+    """所有 DBC 訊息與未知 ID 的隨機資料，長度 0-8 bytes，0x190 含無效的 mux 值"""
+    rng = random.Random(seed)
+    can_ids = list(decoder.plans) + [0x7FF]
+    records = []
+    for i in range(count):
+        can_id = rng.choice(can_ids)
+        data = bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 8)))
+        if can_id == 0x190 and data and rng.random() < 0.7:
+            data = b'\x00' + data[1:]
+        records.append((1700000000000000 + i * 100, can_id, data))
+    return records
+
+
+def expected_series(decoder, records):
+    """逐筆以 cantools 解碼（與 CanDecoderDBC 相同補零），choices 取數值"""
+    expected = defaultdict(lambda: defaultdict(list))
+    for timestamp, can_id, data in records:
+        message = decoder.messages.get(can_id)
+        if message is None:
+            continue
+        try:
+            values = message.decode(bytes(data).ljust(message.length, b'\0'), decode_choices=False)
+        except Exception:
+            continue
+        for name, value in values.items():
+            expected[can_id][name].append((timestamp, value))
+    return expected
+
+
+def assert_series_equal(decoded, expected):
+    assert set(decoded) == set(expected)
+    for can_id, signals in expected.items():
+        assert set(decoded[can_id]) == set(signals)
+        for name, points in signals.items():
+            series = decoded[can_id][name]
+            assert series.timestamp.tolist() == [timestamp for timestamp, _ in points], (hex(can_id), name)
+            actual = series.value.tolist()
+            wanted = [value for _, value in points]
+            # repr 比較浮點數每一位與 int / float 型別
+            assert repr(actual) == repr(wanted), (hex(can_id), name, actual[:5], wanted[:5])
+
+
+def test_matches_cantools():
+    """每個訊息、每個信號的時間序列與逐筆解碼完全相同"""
+    print("\n=== 測試批次解碼與 cantools 一致 ===")
+    decoder = batch_decoder()
+    records = random_records(decoder)
+    decoded = decoder.decode(frames_from_records(records))
+    assert_series_equal(decoded, expected_series(decoder, records))
+    assert 0x7FF not in decoded
+    assert len(decoded[0x190]['Cell_voltage1'].value) < sum(1 for record in records if record[1] == 0x190)
+    print(f"✓ 批次解碼測試通過（{len(decoded)} 個訊息）")
+
+
+def test_log_files_and_values_at():
+    """由記錄檔（二進位與 CSV）載入，values_at 給出快轉後的狀態"""
+    print("\n=== 測試記錄檔載入與 values_at ===")
+    decoder = batch_decoder()
+    records = random_records(decoder, count=2000, seed=1)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for extension, log_format in (('.canlog', 'bin'), ('.csv', 'csv')):
+            path = os.path.join(tmp_dir, 'can_log' + extension)
+            writer = open_log_writer(path, log_format)
+            for timestamp, can_id, data in records:
+                writer.write_frame(can.Message(arbitration_id=can_id, data=data, is_extended_id=False),
+                                   timestamp % 2, timestamp=timestamp)
+            writer.close()
+            frames = decoder.load_frames(path)
+            assert 0x7FF not in set(frames['can_id'].tolist())
+            assert_series_equal(decoder.decode(frames), expected_series(decoder, records))
+
+            bus0 = decoder.load_frames(path, bus=0)
+            assert set(bus0['timestamp'].tolist()) == {timestamp for timestamp, can_id, _ in records
+                                                       if timestamp % 2 == 0 and can_id in decoder.plans}
+
+    decoded = decoder.decode(frames_from_records(records))
+    middle = records[len(records) // 2][0]
+    state = values_at(decoded, middle)
+    expected = {}
+    for can_id, signals in expected_series(decoder, [record for record in records if record[0] <= middle]).items():
+        expected[can_id] = {name: points[-1][1] for name, points in signals.items()}
+    assert state == expected
+    assert values_at(decoded, records[0][0] - 1) == {}
+
+    # keys：每個索引值的最後一筆，依索引排序
+    can_id = next(can_id for can_id, plan in decoder.plans.items() if plan.multiplexer is None)
+    key = decoder.plans[can_id].signals[0].name
+    signals = expected_series(decoder, [record for record in records if record[0] <= middle])[can_id]
+    rows = {}
+    for row, (timestamp, value) in enumerate(signals[key]):
+        rows[value] = row
+    expected = [{name: points[rows[value]][1] for name, points in signals.items()} for value in sorted(rows)]
+    assert values_at(decoded, middle, keys={can_id: key})[can_id] == expected
+    print("✓ 記錄檔載入與 values_at 測試通過")
+
+
+# 兩層多工與縮放的多工器無法向量化，其他訊息照常解碼
+UNSUPPORTED_DBC = '''VERSION ""
+
+BU_: Node
+
+BO_ 100 Plain: 2 Node
+ SG_ Level : 0|16@1+ (0.5,0) [0|0] "" Node
+
+BO_ 104 Nested: 4 Node
+ SG_ Outer M : 0|8@1+ (1,0) [0|0] "" Node
+ SG_ Inner m1M : 8|8@1+ (1,0) [0|0] "" Node
+ SG_ Leaf m2 : 16|16@1+ (1,0) [0|0] "" Node
+
+BO_ 105 Scaled: 2 Node
+ SG_ Page M : 0|8@1+ (2,0) [0|0] "" Node
+ SG_ Value m2 : 8|8@1+ (1,0) [0|0] "" Node
+'''
+
+
+def test_unsupported_messages_left_out():
+    """不支援的多工器訊息不建立解碼計畫，不影響同一 DBC 的其他訊息"""
+    print("\n=== 測試不支援的多工器 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'unsupported.dbc')
+        with open(path, 'w') as f:
+            f.write(UNSUPPORTED_DBC)
+        decoder = BatchDecoder([CanDecoderDBC(path)])
+    assert set(decoder.plans) == {100}
+    records = [(1000, 100, b'\x10\x00'), (1100, 104, b'\x01\x02\x03\x04'), (1200, 105, b'\x01\x07')]
+    decoded = decoder.decode(frames_from_records(records))
+    assert set(decoded) == {100} and decoded[100]['Level'].value.tolist() == [8.0]
+    print("✓ 不支援的多工器測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("批次解碼測試")
+    print("=" * 50)
+    test_matches_cantools()
+    test_log_files_and_values_at()
+    test_unsupported_messages_left_out()
+    print("\n✓ 所有測試通過！")
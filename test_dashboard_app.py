@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+測試 GUIvehical-v6_dev 的接收 / 廣播循環 (fastapi、uvicorn 以替身模組取代)
+"""
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import types
+
+import can
+
+from CanDashboardDecoder import DashboardDecoder
+from CanLogFormat import open_log_writer
+from CanSignalStore import SignalStore
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+GUI_PATH = os.path.join(REPO_DIR, 'GUIvehical-v6_dev.py')
+START = 1700000000000000
+
+
+class _App:
+    """FastAPI 替身：路由裝飾器原樣傳回函數"""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def add_middleware(self, *args, **kwargs):
+        pass
+
+    def mount(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: (lambda function: function)
+
+
+class _Any:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+def web_stubs():
+    """GUI 匯入的 fastapi / uvicorn 名稱，只需能建立 app"""
+    modules = {name: types.ModuleType(name) for name in (
+        'fastapi', 'fastapi.responses', 'fastapi.staticfiles', 'fastapi.templating',
+        'fastapi.middleware', 'fastapi.middleware.cors', 'uvicorn')}
+    modules['fastapi'].FastAPI = _App
+    modules['fastapi'].WebSocket = modules['fastapi'].Request = _Any
+    modules['fastapi.responses'].HTMLResponse = modules['fastapi.responses'].FileResponse = _Any
+    modules['fastapi.staticfiles'].StaticFiles = _Any
+    modules['fastapi.templating'].Jinja2Templates = _Any
+    modules['fastapi.middleware.cors'].CORSMiddleware = _Any
+    modules['uvicorn'].run = lambda *args, **kwargs: None
+    return modules
+
+
+def load_gui():
+    # 只還原 web 模組：GUI 匯入的其他模組 (numpy) 留在 sys.modules，numpy 不能載入第二次
+    stubs = web_stubs()
+    saved = {name: sys.modules[name] for name in stubs if name in sys.modules}
+    sys.modules.update(stubs)
+    try:
+        spec = importlib.util.spec_from_file_location('GUIvehical_v6_dev_smoke', GUI_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        for name in stubs:
+            sys.modules.pop(name)
+        sys.modules.update(saved)
+    return module
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def test_receive_and_broadcast():
+    """start_can_receiver 重播記錄檔並廣播解碼後的數值給連線的客戶端"""
+    print("\n=== 測試 v6 接收 / 廣播循環 ===")
+    gui = load_gui()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'seg.csv')
+        writer = open_log_writer(path, 'csv')
+        cockpit = struct.pack('<h6B', -200, 10, 20, 30, 40, 50, 60)
+        writer.write_frame(can.Message(arbitration_id=0x181, data=cockpit, is_extended_id=False),
+                           0, timestamp=START)
+        writer.write_frame(can.Message(arbitration_id=0x7FF, data=bytes(8), is_extended_id=False),
+                           0, timestamp=START + 1000)
+        writer.close()
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = gui.CanReceiverWebApp(use_csv=True, csv_file=path)
+        websocket = FakeWebSocket()
+        gui.connections.append(websocket)
+
+        async def run_once():
+            task = asyncio.create_task(app.start_can_receiver())
+            await asyncio.sleep(0.2)
+            app.running = False
+            await asyncio.wait_for(task, 1.0)
+
+        try:
+            asyncio.run(run_once())
+        finally:
+            gui.connections.remove(websocket)
+            app.replay.close()
+
+    assert app.message_count == 2
+    assert websocket.sent, "broadcaster_loop must push the decoded state"
+    # 0.2 秒內有 4 次 20 Hz 的廣播時機，狀態不變時不重送
+    assert len(websocket.sent) < 4, len(websocket.sent)
+    vcu = websocket.sent[-1]['vcu']
+    assert (vcu['steer'], vcu['accel'], vcu['bse2']) == (-20000, 10, 60)
+    print(f"✓ 接收 / 廣播循環測試通過 ({len(websocket.sent)} 次廣播)")
+
+
+def without_updates(node):
+    """view() 去掉 last_update (重建時間不同)，NaN 以外的數值原樣比較"""
+    if isinstance(node, dict):
+        return {key: without_updates(value) for key, value in node.items() if key != 'last_update'}
+    if isinstance(node, float) and math.isnan(node):
+        return 'nan'
+    return node
+
+
+def random_records(can_ids, count=3000, seed=1):
+    """儀表板路由 ID 的隨機 frame，含過短的 frame；電池陣列的索引多為有效值"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        can_id = rng.choice(can_ids)
+        data = bytearray(rng.getrandbits(8) for _ in range(rng.choice((1, 2, 8, 8, 8))))
+        if can_id in (0x601, 0x651) and rng.random() < 0.9:
+            data[0] = rng.randrange(0, 98, 7)
+        records.append((START + i * 1000, can_id, bytes(data)))
+    return records
+
+
+def test_jump_restores_state():
+    """跳轉 (含往回跳) 後的狀態與逐筆解碼到目標時間相同，不留跳轉前的數值"""
+    print("\n=== 測試跳轉後重建狀態 ===")
+    gui = load_gui()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'seg.csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            app = gui.CanReceiverWebApp(use_csv=True, csv_file=path + '.missing')
+            records = random_records(sorted(app.decoder.handlers) + [0x7FF])
+            writer = open_log_writer(path, 'csv')
+            for timestamp, can_id, data in records:
+                writer.write_frame(can.Message(arbitration_id=can_id, data=data, is_extended_id=False),
+                                   0, timestamp=timestamp)
+            writer.close()
+            app.csv_file = path
+            app.load_csv_file()
+            try:
+                # 先播完整個記錄檔，再往回跳到一半
+                for timestamp, can_id, flags, bus, dlc, data in app.replay.take_until(records[-1][0]):
+                    app.process_can_message(app.create_mock_can_message(can_id, data))
+                played = without_updates(app.data_store)
+                assert app.jump_to_percentage(50)
+                target = app.replay.current_timestamp
+
+                expected = DashboardDecoder(SignalStore(gui.STORE_LAYOUT))
+                for timestamp, can_id, data in records:
+                    if timestamp < target:
+                        expected.process(can_id, data)
+            finally:
+                app.replay.close()
+
+    assert app.seek_series is not None
+    assert without_updates(app.data_store) == without_updates(expected.store.view())
+    # 播完後的數值 (目標之後的 frame) 不留在狀態中
+    assert without_updates(app.data_store) != played
+    print("✓ 跳轉後重建狀態測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("GUIvehical-v6_dev 循環測試")
+    print("=" * 50)
+    test_receive_and_broadcast()
+    test_jump_restores_state()
+    print("\n✓ 所有測試通過！")
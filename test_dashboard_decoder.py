@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+測試 CanDashboardDecoder：以 v6 與上一代 (CanDecoder) 解碼器錄下的黃金日誌比對輸出
+"""
+import contextlib
+import datetime
+import io
+import json
+import math
+import os
+
+from CanDashboardDecoder import DATA_SCHEMA, INVERTERS, DashboardDecoder, Route
+from CanDecoder import CanDecoder
+from CanSignalStore import LAST_UPDATE, SignalLayout, SignalStore
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每行: ["0xID", 資料 hex, 處理該 frame 後改變的欄位 {"group/key": 值}]；
+# 由 GUIvehical-v6_dev.py 原本的手寫解碼器錄製，第 n 個 frame 的時間為 1000.0 + n，
+# datetime 記為 timestamp()，tuple 記為 list
+GOLDEN_LOG = os.path.join(REPO_DIR, 'testdata', 'dashboard_v6_golden.jsonl')
+# 同上，由 CanDecoder.py 原本的手寫解碼器錄製；position_covariance 不在 data_store，
+# 記為 "position_covariance/i"，0x421 第一次寫入的欄位也算改變
+LEGACY_GOLDEN_LOG = os.path.join(REPO_DIR, 'testdata', 'dashboard_legacy_golden.jsonl')
+
+
+def flatten(node, path=(), out=None):
+    """data_store 轉為 {"group/key": 值}，與黃金日誌相同的表示法"""
+    out = {} if out is None else out
+    if isinstance(node, dict):
+        for key, value in node.items():
+            flatten(value, path + (str(key),), out)
+    elif isinstance(node, list):
+        for index, value in enumerate(node):
+            out['/'.join(path + (str(index),))] = value
+    else:
+        if isinstance(node, datetime.datetime):
+            node = node.timestamp()
+        elif isinstance(node, tuple):
+            node = list(node)
+        out['/'.join(path)] = node
+    return out
+
+
+def assert_changes(number, can_id, changes, expected):
+    """frame 改變的欄位、數值與型態與黃金日誌相同"""
+    assert changes.keys() == expected.keys(), (number, can_id, changes, expected)
+    for key, value in expected.items():
+        actual = changes[key]
+        assert type(actual) is type(value), (can_id, key, actual, value)
+        if isinstance(value, float):
+            assert math.isclose(actual, value, rel_tol=1e-12), (can_id, key, actual, value)
+        else:
+            assert actual == value, (can_id, key, actual, value)
+
+
+def test_golden_log_parity():
+    """重播黃金日誌，每個 frame 改變的欄位、數值與型態都與 v6 解碼器相同"""
+    print("\n=== 測試 v6 黃金日誌一致性 ===")
+    store = SignalStore(SignalLayout(DATA_SCHEMA))
+    decoder = DashboardDecoder(store)
+    previous = flatten(store.view())
+    frames = 0
+    with open(GOLDEN_LOG) as f:
+        for number, line in enumerate(f):
+            can_id, data, expected = json.loads(line)
+            with contextlib.redirect_stdout(io.StringIO()):
+                decoder.process(int(can_id, 16), bytearray.fromhex(data), 1000.0 + number)
+            current = flatten(store.view())
+            changes = {key: value for key, value in current.items()
+                       if value != previous[key] or type(value) is not type(previous[key])}
+            previous = current
+            # DBC 以乘法縮放 (x * 0.001)，v6 以除法 (x / 1000.0)，浮點數僅最後幾位元不同
+            assert_changes(number, can_id, changes, expected)
+            frames += 1
+    assert frames == 370
+    print(f"✓ {frames} 個 frame 與 v6 解碼器輸出一致")
+
+
+def test_legacy_golden_parity():
+    """重播上一代的黃金日誌，CanDecoder 改用 dbc/NTUR_legacy.dbc 後輸出不變"""
+    print("\n=== 測試上一代黃金日誌一致性 ===")
+    decoder = CanDecoder()
+
+    def state():
+        return flatten(decoder.position_covariance, ('position_covariance',), flatten(decoder.data_store))
+
+    previous = state()
+    frames = 0
+    with open(LEGACY_GOLDEN_LOG) as f:
+        for number, line in enumerate(f):
+            can_id, data, expected = json.loads(line)
+            with contextlib.redirect_stdout(io.StringIO()):
+                decoder.process(int(can_id, 16), bytearray.fromhex(data), 1000.0 + number)
+            current = state()
+            changes = {key: value for key, value in current.items()
+                       if key not in previous or value != previous[key] or type(value) is not type(previous[key])}
+            previous = current
+            assert_changes(number, can_id, changes, expected)
+            frames += 1
+    assert frames == 313
+    print(f"✓ {frames} 個 frame 與上一代解碼器輸出一致")
+
+
+def test_partial_schema():
+    """layout 沒有的群組不建立 handler，該 ID 回傳 False 且不寫入"""
+    print("\n=== 測試部分 schema ===")
+    schema = {key: value for key, value in DATA_SCHEMA.items() if key != 'xsens'}
+    schema['inverters'] = {n: DATA_SCHEMA['inverters'][n] for n in (3, 4)}
+    store = SignalStore(SignalLayout(schema))
+    decoder = DashboardDecoder(store)
+
+    assert 0x191 not in decoder.handlers and 0x711 not in decoder.handlers
+    assert 0x021 not in decoder.handlers
+    assert decoder.process(0x191, bytes(6), 5.0) is False
+    assert decoder.process(0x021, bytes(8), 5.0) is False
+    assert store.generation == 0
+
+    # 反向安裝的 RL (3) 回授扭矩變號
+    assert decoder.process(0x193, bytes([1, 2, 0x64, 0x00, 0x10, 0x00]), 5.0) is True
+    view = store.view('inverters', 3)
+    assert view['status'] == (1, 2)
+    assert view['torque'] == -2.0
+    assert view['speed'] == 16
+    assert view['last_update'] == 5.0
+    assert INVERTERS[3] == 'RL'
+    print("✓ 部分 schema 測試通過")
+
+
+def test_route_mismatch():
+    """路由與 DBC 不符時建立解碼器即失敗"""
+    print("\n=== 測試路由錯誤 ===")
+    schema = {'vcu': {'a': float, 'b': float, 'last_update': LAST_UPDATE}}
+    cases = [
+        [Route(0x381, ('vcu',), ('a',))],      # 0x381 有兩個訊號
+        [Route(0x7AB, ('vcu',), ('a', 'b'))],  # DBC 沒有的 ID
+    ]
+    for routes in cases:
+        try:
+            DashboardDecoder(SignalStore(SignalLayout(schema)), routes=routes)
+            assert False, f"{routes} must raise"
+        except ValueError:
+            pass
+
+    store = SignalStore(SignalLayout(schema))
+    decoder = DashboardDecoder(store, routes=[Route(0x381, ('vcu',), ('b', 'a'))])
+    decoder.process(0x381, bytes([0x10, 0x27, 0x20, 0x4E]), 1.0)
+    assert store.view('vcu') == {'a': 2.3, 'b': 1.3, 'last_update': 1.0}
+    print("✓ 路由錯誤測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("儀表板解碼測試")
+    print("=" * 50)
+    test_golden_log_parity()
+    test_legacy_golden_parity()
+    test_partial_schema()
+    test_route_mismatch()
+    print("\n✓ 所有測試通過！")
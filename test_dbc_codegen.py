@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+測試 CanDbcCodegen 產生的解碼函數與 cantools 結果一致
+"""
+import os
+import random
+import tempfile
+
+import cantools
+from cantools.database.errors import DecodeError
+
+from CanDbcCodegen import DBC_FILES, generate_source, load_decoders
+from CanDecoderDBC import CanDecoderDBC
+
+# 涵蓋車上 DBC 沒有的情況：float、奇數起始位的 Motorola 有號數、整數比例、兩個 mux 值
+EXTRA_DBC = '''VERSION ""
+
+BU_: Node
+
+BO_ 100 Mixed: 8 Node
+ SG_ Temp : 0|32@1- (1,0) [0|0] "" Node
+ SG_ Speed : 35|13@0- (0.5,-10) [0|0] "" Node
+ SG_ Count : 54|4@0+ (2,3) [0|0] "" Node
+ SG_ Mode : 56|7@1+ (1,0) [0|0] "" Node
+
+BO_ 101 Muxed: 6 Node
+ SG_ Page M : 7|4@0+ (1,0) [0|0] "" Node
+ SG_ Common : 42|5@1+ (1,0) [0|0] "" Node
+ SG_ Alpha m1 : 8|16@1- (0.01,0) [0|0] "" Node
+ SG_ Beta m2 : 23|16@0+ (1,0) [0|0] "" Node
+
+BO_ 102 Wide: 8 Node
+ SG_ Value : 7|64@0+ (1,0) [0|0] "" Node
+
+BO_ 103 Aligned: 8 Node
+ SG_ Level : 0|32@1- (1,0) [0|0] "" Node
+ SG_ Gain : 32|16@1- (0.5,1) [0|0] "" Node
+ SG_ Flag : 56|8@1+ (1,0) [0|0] "" Node
+
+SIG_VALTYPE_ 100 Temp : 1;
+SIG_VALTYPE_ 102 Value : 2;
+SIG_VALTYPE_ 103 Level : 1;
+VAL_ 100 Mode 0 "Off" 1 "On" 100 "Boost" ;
+VAL_ 103 Flag 0 "Idle" 2 "Run" ;
+'''
+
+# 兩層多工 (Nested) 與縮放的多工器 (Scaled，原始值 1 即 mux 2)：產生器不支援，留給 cantools
+UNSUPPORTED_MESSAGES = '''BO_ 104 Nested: 4 Node
+ SG_ Outer M : 0|8@1+ (1,0) [0|0] "" Node
+ SG_ Inner m1M : 8|8@1+ (1,0) [0|0] "" Node
+ SG_ Leaf m2 : 16|16@1+ (1,0) [0|0] "" Node
+
+BO_ 105 Scaled: 2 Node
+ SG_ Page M : 0|8@1+ (2,0) [0|0] "" Node
+ SG_ Value m2 : 8|8@1+ (1,0) [0|0] "" Node
+'''
+
+
+def random_payloads(message, rng, count):
+    payloads = [bytes(message.length), b'\xff' * message.length]
+    payloads += [rng.getrandbits(message.length * 8).to_bytes(message.length, 'little') for _ in range(count)]
+    return payloads
+
+
+def assert_equivalent(dbc_paths, cache_dir, count=200):
+    """每個訊息以隨機資料比較產生的解碼函數與 cantools 的結果，回傳比較次數"""
+    rng = random.Random(0)
+    module = load_decoders(dbc_paths, cache_dir)
+    decoders = module.DECODERS
+    compared = 0
+    for path in dbc_paths:
+        for message in cantools.database.load_file(path).messages:
+            if message.frame_id in module.UNSUPPORTED:
+                continue  # 留給 cantools 解碼
+            name, length, decode = decoders[message.frame_id]
+            if name != message.name:
+                continue  # 第一個 DBC 的定義優先
+            assert length == message.length
+            for data in random_payloads(message, rng, count):
+                try:
+                    expected = message.decode(data)
+                except Exception as e:
+                    expected = e
+                try:
+                    actual = decode(data)
+                except Exception as e:
+                    assert isinstance(expected, Exception), f"{name} {data.hex()}: {e}"
+                    assert str(e) == str(expected)
+                    continue
+                assert not isinstance(expected, Exception), f"{name} {data.hex()}: expected {expected}"
+                # repr 比較浮點數的每一位（含 nan、-0.0）與 choice 名稱
+                assert repr(actual) == repr(expected), f"{name} {data.hex()}: {actual} != {expected}"
+                assert [type(value) for value in actual.values()] == [type(value) for value in expected.values()]
+                # 沒有 mux 的訊息另有 tuple 版本，依訊號順序回傳相同數值
+                if message.frame_id in module.VALUES:
+                    names, _, values = module.VALUES[message.frame_id]
+                    assert names == tuple(actual)
+                    assert repr(values(data)) == repr(tuple(actual.values()))
+                compared += 1
+    return compared
+
+
+def test_vehicle_dbc():
+    """NTUR 與 Xsens DBC 所有訊息的解碼結果與 cantools 完全相同（含型別與 mux 錯誤）"""
+    print("\n=== 測試車上 DBC ===")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        compared = assert_equivalent(DBC_FILES, cache_dir)
+    assert compared > 72 * 200 * 0.9
+    print(f"✓ 車上 DBC 測試通過（{compared} 筆）")
+
+
+def test_extra_signal_types():
+    """float、Motorola 有號數、整數比例、choices、多個 mux 值"""
+    print("\n=== 測試其他信號型態 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'extra.dbc')
+        with open(path, 'w') as f:
+            f.write(EXTRA_DBC)
+        assert_equivalent([path], os.path.join(tmp_dir, 'cache'), count=2000)
+
+        decode = load_decoders([path], os.path.join(tmp_dir, 'cache')).DECODERS[101][2]
+        try:
+            decode(bytes([0x30, 0, 0, 0, 0, 0]))
+            assert False, "unknown mux id must raise"
+        except DecodeError as e:
+            assert str(e) == 'expected multiplexer id 1 or 2, but got 3'
+    print("✓ 其他信號型態測試通過")
+
+
+def test_unsupported_multiplexers():
+    """產生器不支援的多工器訊息被略過，不影響同一 DBC 的其他訊息；CanDecoderDBC 改用 cantools"""
+    print("\n=== 測試不支援的多工器 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'unsupported.dbc')
+        with open(path, 'w') as f:
+            f.write(EXTRA_DBC.replace('BO_ 102 Wide:', UNSUPPORTED_MESSAGES + '\nBO_ 102 Wide:'))
+        module = load_decoders([path], os.path.join(tmp_dir, 'cache'))
+        assert sorted(module.UNSUPPORTED) == [104, 105]
+        assert module.UNSUPPORTED[105] == ('Scaled', 'scaled multiplexer Page')
+        assert {100, 101, 102, 103} <= module.DECODERS.keys()
+        assert_equivalent([path], os.path.join(tmp_dir, 'cache'), count=50)
+
+        reference = CanDecoderDBC(path)
+        generated = CanDecoderDBC(path, decoder='generated')
+        for can_id, data in ((104, bytes([0x11, 0x22, 0x33, 0x44])), (105, bytes([0x01, 0x7F])),
+                             (100, bytes(range(8)))):
+            assert generated.decode_message(can_id, data) == reference.decode_message(can_id, data)
+        assert generated.decode_message(105, bytes([0x01, 0x7F]))['signals']['Value'] == 127
+    print("✓ 不支援的多工器測試通過")
+
+
+def test_cache_and_decoder_selection():
+    """快取依 DBC 內容命名並重複使用；CanDecoderDBC 兩種解碼方式輸出相同"""
+    print("\n=== 測試快取與 CanDecoderDBC ===")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        first = load_decoders(DBC_FILES[:1], cache_dir)
+        assert os.listdir(cache_dir) == [os.path.basename(first.__file__)]
+        with open(first.__file__) as f:
+            assert f.read() == generate_source(DBC_FILES[:1])
+        mtime = os.path.getmtime(first.__file__)
+        assert load_decoders(DBC_FILES[:1], cache_dir).__file__ == first.__file__
+        assert os.path.getmtime(first.__file__) == mtime
+
+    reference = CanDecoderDBC(DBC_FILES[0])
+    generated = CanDecoderDBC(DBC_FILES[0], decoder='generated')
+    for can_id, data in ((0x400, bytes(range(8))), (0x193, b'\x02\x00\x10'), (0x190, b'\x00\x10\x20'),
+                         (0x190, b'\x07' + bytes(7)), (0x7FF, bytes(8))):
+        assert generated.decode_message(can_id, data) == reference.decode_message(can_id, data)
+    assert generated.decode_message(0x7FF, bytes(8)) is None
+    assert generated.decode_message(0x193, b'\x04')['signals']['INV_STATUS'] == 'STATUS_ENABLED'
+    print("✓ 快取與 CanDecoderDBC 測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("DBC 解碼程式碼產生器測試")
+    print("=" * 50)
+    test_vehicle_dbc()
+    test_extra_signal_types()
+    test_unsupported_multiplexers()
+    test_cache_and_decoder_selection()
+    print("\n✓ 所有測試通過！")
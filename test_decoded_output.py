@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+測試 DBC 訊號解碼欄式輸出
+"""
+import json
+import os
+import struct
+import tempfile
+import time
+
+import can
+
+from CanDecodedOutput import (MANIFEST_NAME, DecodedOutput, decode_segment, load_messages, read_signals,
+                              signals_path)
+from CanLogFormat import open_log_writer
+
+START = 1700000000000000
+
+
+def inverter_frame(i):
+    # 0x193 Status1 (INV3): status bytes, torque, speed
+    return can.Message(arbitration_id=0x193, data=struct.pack('<BBhh', 1, 0, i % 200 - 100, i * 3),
+                       is_extended_id=False)
+
+
+def rtk_frame(i):
+    # 0x400 RTK_Basic: latitude / longitude in 1e-7 degrees
+    return can.Message(arbitration_id=0x400, data=struct.pack('<ii', 250148000 + i, 1215345000 - i),
+                       is_extended_id=False)
+
+
+def write_frames(writer, count):
+    for i in range(count):
+        writer.write_frame(inverter_frame(i), 0, timestamp=START + i * 1000)
+        writer.write_frame(rtk_frame(i), 1, timestamp=START + i * 1000 + 500)
+        writer.write_frame(can.Message(arbitration_id=0x7EE, data=b'\x01'), 0, timestamp=START + i * 1000 + 700)
+        if i % 1000 == 999:
+            writer.flush()
+
+
+def test_decoder_process_follows_segments():
+    """解碼行程的輸出與原始段同時開啟、輪替與關閉，數值與 cantools 一致"""
+    print("\n=== 測試解碼行程 ===")
+    messages = load_messages()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        decoded = DecodedOutput(output_format='parquet', chunk_rows=1500)
+        decoded.start()
+        segments = [os.path.join(tmp_dir, f'can_log_{n}.canlog') for n in range(2)]
+        for n, segment in enumerate(segments):
+            writer = open_log_writer(segment, 'bin', tap=decoded.tap(segment))
+            write_frames(writer, 4000 + n * 1000)
+            writer.close()
+        decoded.stop()
+
+        for n, segment in enumerate(segments):
+            count = 4000 + n * 1000
+            with open(os.path.join(signals_path(segment), MANIFEST_NAME)) as f:
+                manifest = json.load(f)
+            assert manifest['frames'] == 3 * count and manifest['dropped_frames'] == 0
+            assert manifest['rows'] == {'193_Status1': count, '400_RTK_Basic': count}
+
+            status = read_signals(segment, 0x193)
+            assert status.num_rows == count and status.column('bus').to_pylist() == [0] * count
+            expected = messages[0x193].decode(inverter_frame(count - 1).data, decode_choices=False)
+            row = {name: column[-1].as_py() for name, column in zip(status.column_names, status.columns)}
+            assert row['timestamp'] == START + (count - 1) * 1000
+            assert all(row[name] == value for name, value in expected.items())
+
+            rtk = read_signals(segment, 'RTK_Basic')
+            assert abs(rtk.column('Latitude')[0].as_py() - 25.0148) < 1e-9
+    print("✓ 解碼行程測試通過")
+
+
+def test_offline_arrow_and_power_loss():
+    """離線解碼輸出 Arrow IPC；截斷的 stream 仍可讀到最後完整的 chunk"""
+    print("\n=== 測試離線 Arrow 輸出 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        segment = os.path.join(tmp_dir, 'can_log_0.csv.gz')
+        writer = open_log_writer(segment, 'csv', compression='gzip')
+        write_frames(writer, 2500)
+        writer.close()
+        rows = decode_segment(segment, output_format='arrow', chunk_rows=1000)
+        assert rows == {'193_Status1': 2500, '400_RTK_Basic': 2500}
+        assert read_signals(segment, 'Status1').column('Speed').to_pylist() == [i * 3 for i in range(2500)]
+
+        path = os.path.join(signals_path(segment), '193_Status1.arrows')
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 100)  # last chunk torn
+        assert read_signals(segment, 0x193).num_rows == 2000
+    print("✓ 離線 Arrow 輸出測試通過")
+
+
+def test_close_never_waits_on_full_queue():
+    """佇列已滿時段落關閉不等待，計數後隨下一批資料補送，輸出仍會完成"""
+    print("\n=== 測試佇列滿時關閉段落 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        decoded = DecodedOutput(output_format='parquet', queue_batches=1)
+        segments = [os.path.join(tmp_dir, f'can_log_{n}.canlog') for n in range(2)]
+
+        # 解碼行程尚未啟動：資料批次佔滿佇列，關閉訊息無處可放
+        writer = open_log_writer(segments[0], 'bin', tap=decoded.tap(segments[0]))
+        write_frames(writer, 10)
+        started = time.monotonic()
+        writer.close()
+        assert time.monotonic() - started < 0.5
+        assert decoded.closes_dropped == 1 and len(decoded.pending_closes) == 1
+
+        decoded.start()
+        deadline = time.monotonic() + 10
+        while not decoded.work.empty() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        writer = open_log_writer(segments[1], 'bin', tap=decoded.tap(segments[1]))
+        write_frames(writer, 10)
+        writer.close()
+        assert decoded.pending_closes == []
+        decoded.stop()
+
+        manifests = []
+        for segment in segments:
+            with open(os.path.join(signals_path(segment), MANIFEST_NAME)) as f:
+                manifests.append(json.load(f))
+        assert manifests[0]['frames'] == 30 and manifests[0]['dropped_frames'] == 0
+        # 補送的關閉訊息可能佔走第二段資料批次的位置，該批次計為丟失
+        assert manifests[1]['frames'] + manifests[1]['dropped_frames'] == 30
+    print("✓ 佇列滿時關閉測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("訊號解碼輸出測試")
+    print("=" * 50)
+    test_decoder_process_follows_segments()
+    test_offline_arrow_and_power_loss()
+    test_close_never_waits_on_full_queue()
+    print("\n✓ 所有測試通過！")
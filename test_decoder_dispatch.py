@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+測試 CanDecoder 的 CAN ID 分派表
+"""
+import struct
+
+import can
+
+from CanDecoder import CanDecoder
+
+
+def message(can_id, data):
+    return can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
+
+
+def test_ranges_expanded():
+    """ID 範圍展開後每個 ID 都有解碼函數，未接的 inverter (1 FL / 2 FR) 沒有"""
+    print("\n=== 測試分派表 ===")
+    decoder = CanDecoder()
+    for first, last in ((0x410, 0x418), (0x193, 0x194), (0x293, 0x294), (0x393, 0x394), (0x713, 0x714),
+                        (0x213, 0x214)):
+        assert all(can_id in decoder.handlers for can_id in range(first, last + 1))
+    assert not any(can_id in decoder.handlers for can_id in (0x191, 0x192, 0x210, 0x211, 0x292, 0x712))
+    assert len(decoder.handlers) == 46
+
+    decoder.process_can_message(message(0x413, struct.pack('<d', 2.5)))
+    assert decoder.position_covariance == [0.0, 0.0, 0.0, 2.5, 0.0, 0.0, 0.0, 0.0, 0.0]
+
+    decoder.process_can_message(message(0x394, struct.pack('<hhh', 450, 300, 600)))
+    inverter = decoder.data_store['inverters'][4]
+    assert (inverter['mos_temp'], inverter['mcu_temp'], inverter['motor_temp']) == (45.0, 30.0, 60.0)
+    assert decoder.data_store['inverters'][3]['mos_temp'] is None
+    print("✓ 分派表測試通過")
+
+
+def test_unhandled_ids():
+    """未處理的 ID 不改變 data_store，不存在的 inverter 略過"""
+    print("\n=== 測試未處理 ID ===")
+    decoder = CanDecoder()
+    before = repr(decoder.data_store)
+    decoder.process_can_message(message(0x7FF, bytes(8)))
+    decoder.process_can_message(message(0x192, bytes(8)))  # inverter 2 不在 data_store，沒有解碼函數
+    assert repr(decoder.data_store) == before
+    assert decoder.process(0x192, bytes(8), 5.0) is False
+    assert decoder.store.generation == 0
+    print("✓ 未處理 ID 測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CAN ID 分派表測試")
+    print("=" * 50)
+    test_ranges_expanded()
+    test_unhandled_ids()
+    print("\n✓ 所有測試通過！")
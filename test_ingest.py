@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+測試共用接收服務：分送、旗標、慢速訂閱者的丟失計數與 recv() 介面
+"""
+import os
+import socket
+import stat
+import tempfile
+import time
+
+import can
+
+from CanIngest import IngestClient, IngestServer, open_ingest_bus
+
+
+def frame(i, bus_num, is_rx=True):
+    msg = can.Message(arbitration_id=0x100 + i % 0x600, data=i.to_bytes(4, 'little'), is_extended_id=False,
+                      timestamp=1700000000 + i / 1000, is_rx=is_rx)
+    return bus_num, msg
+
+
+def receive(client, count, timeout=5.0):
+    frames = []
+    deadline = time.time() + timeout
+    while len(frames) < count and time.time() < deadline:
+        frames += client.poll(timeout=0.1)
+    return frames
+
+
+def test_fan_out():
+    """每個訂閱者依原順序收到相同的 frame，Tx 旗標與時間戳保留"""
+    print("\n=== 測試分送 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'ingest.sock')
+        server = IngestServer(path, ['vcan0', 'vcan1'])
+        server.start()
+        clients = [IngestClient(path) for _ in range(2)]
+        time.sleep(0.2)  # accept thread registers the subscribers
+        assert clients[0].channels == ['vcan0', 'vcan1']
+
+        sent = [frame(i, i % 2, is_rx=i % 5 != 0) for i in range(2000)]
+        server.publish(sent)
+        for client in clients:
+            frames = receive(client, len(sent))
+            assert len(frames) == len(sent)
+            for (bus_num, msg), (got_bus, got) in zip(sent, frames):
+                assert got_bus == bus_num and got.arbitration_id == msg.arbitration_id
+                assert bytes(got.data) == bytes(msg.data) and got.is_rx == msg.is_rx
+                assert abs(got.timestamp - msg.timestamp) < 1e-6
+            assert client.frame_counts == [1000, 1000] and client.drop_counts == [0, 0]
+
+        # recv() 介面：bus 0 與 bus 1 各自排隊
+        clients[1].close()
+        bus0 = open_ingest_bus(0, path)
+        bus1 = open_ingest_bus(1, path)
+        time.sleep(0.2)
+        server.publish([frame(1, 1), frame(2, 0)])
+        assert bus0.recv(timeout=1.0).arbitration_id == 0x102
+        assert bus1.recv(timeout=1.0).arbitration_id == 0x101
+        assert bus0.recv(timeout=0) is None
+        bus0.shutdown()
+        bus1.shutdown()
+        clients[0].close()
+        server.close()
+        assert open_ingest_bus(0, path) is None  # 服務未執行
+    print("✓ 分送測試通過")
+
+
+def test_slow_subscriber():
+    """跟不上的訂閱者只丟失自己的 frame 並收到丟失計數，其他訂閱者不受影響"""
+    print("\n=== 測試慢速訂閱者 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'ingest.sock')
+        server = IngestServer(path, ['vcan0', 'vcan1'])
+        server.start()
+        slow = IngestClient(path)
+        fast = IngestClient(path)
+        time.sleep(0.2)
+
+        total = 0
+        received = 0
+        for _ in range(200):  # the slow client never reads while the socket buffer fills up
+            batch = [frame(i, i % 2) for i in range(2048)]
+            server.publish(batch)
+            total += len(batch)
+            received += len(fast.poll(timeout=0))
+        received += len(receive(fast, total - received))
+        assert received == total and fast.drop_counts == [0, 0]
+
+        frames = receive(slow, total, timeout=1.0)
+        server.publish([frame(0, 0)])  # 緩衝區已清空，這個封包帶著丟失計數送達
+        frames += receive(slow, 1)
+        dropped = sum(slow.drop_counts)
+        assert dropped > 0 and len(frames) + dropped == total + 1
+        slow.close()
+        fast.close()
+        server.close()
+    print("✓ 慢速訂閱者測試通過")
+
+
+def test_socket_ownership():
+    """殘留的 socket 會被取代，仍在服務的不會；socket 與目錄只開放給使用者(與群組)"""
+    print("\n=== 測試 socket 權限與殘留 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'run', 'ingest.sock')
+        server = IngestServer(path, ['vcan0'], group=None)
+        server.start()
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        assert stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode) == 0o700
+
+        # 另一個服務不可搶走仍在服務的 socket
+        try:
+            IngestServer(path, ['vcan0'], group=None).start()
+            assert False, "must refuse a socket that is still served"
+        except RuntimeError:
+            pass
+        client = IngestClient(path)
+        assert client.channels == ['vcan0']
+        client.close()
+        server.close()
+
+        # 被強制結束的服務留下的 socket：無人監聽，直接取代
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        stale.bind(path)
+        stale.close()
+        server = IngestServer(path, ['vcan1'], group=None)
+        server.start()
+        client = IngestClient(path)
+        assert client.channels == ['vcan1']
+        client.close()
+        server.close()
+        assert not os.path.exists(path)
+    print("✓ socket 權限與殘留測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("共用接收服務測試")
+    print("=" * 50)
+    test_fan_out()
+    test_slow_subscriber()
+    test_socket_ownership()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+測試二進位記錄檔格式與 log2csv 轉換
+"""
+import csv
+import io
+import os
+import tempfile
+import time
+
+from CanHealth import pack_status, unpack_status
+from CanLogFormat import (HEADER_STRUCT, BinaryLogWriter, CsvLogWriter, iter_binary_records, iter_log_records,
+                          log_extension, open_log_binary, open_log_csv, open_log_writer, read_binary_header,
+                          read_binary_trailer, record_struct, zstandard)
+from CanLogIndex import SegmentIndex, is_incomplete, load_index
+from log2csv import convert
+from log_jitter import intervals_by_id, jitter_stats
+
+
+class MockCanMessage:
+    def __init__(self, arbitration_id, data, is_extended_id=False, is_remote_frame=False):
+        self.arbitration_id = arbitration_id
+        self.data = bytearray(data)
+        self.dlc = len(data)
+        self.is_extended_id = is_extended_id
+        self.is_remote_frame = is_remote_frame
+
+
+FRAMES = [
+    (1700000000000000, MockCanMessage(0x281, [0x20]), 0, None),
+    (1700000000000100, MockCanMessage(0x193, [1, 2, 3, 4, 0xE8, 0x03, 0, 0]), 0, None),
+    (1700000000000200, MockCanMessage(0x18FF50E5, [0xAA, 0xBB, 0xCC], is_extended_id=True), 1, None),
+    (1700000000000300, MockCanMessage(0x440, [0x10, 0x27, 0, 0, 0, 0, 0, 0]), 1, 'Tx'),
+]
+
+
+def write_both(tmp_dir):
+    csv_path = os.path.join(tmp_dir, 'log.csv')
+    bin_path = os.path.join(tmp_dir, 'log.canlog')
+    csv_writer = CsvLogWriter(csv_path)
+    bin_writer = BinaryLogWriter(bin_path)
+    for timestamp, msg, bus_num, direction in FRAMES:
+        csv_writer.write_frame(msg, bus_num, direction=direction, timestamp=timestamp)
+        bin_writer.write_frame(msg, bus_num, direction=direction, timestamp=timestamp)
+    csv_writer.close()
+    bin_writer.close()
+    return csv_path, bin_path
+
+
+def test_binary_round_trip():
+    """二進位記錄可完整讀回"""
+    print("\n=== 測試 binary record round trip ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, bin_path = write_both(tmp_dir)
+        with open(bin_path, 'rb') as f:
+            records = list(iter_binary_records(f))
+    assert len(records) == len(FRAMES)
+    for record, (timestamp, msg, bus_num, _) in zip(records, FRAMES):
+        assert record[0] == timestamp
+        assert record[1] == msg.arbitration_id
+        assert record[3] == bus_num
+        assert record[5] == bytes(msg.data)
+    print("✓ binary round trip 測試通過")
+
+
+def test_log2csv_matches_csv_writer():
+    """log2csv 輸出需與 CSV 模式完全一致"""
+    print("\n=== 測試 log2csv 與 CSV 格式一致 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path, bin_path = write_both(tmp_dir)
+        with open(csv_path, newline='') as f:
+            expected = f.read()
+        out = io.StringIO(newline='')
+        with open(bin_path, 'rb') as f:
+            count = convert(f, out)
+    assert count == len(FRAMES)
+    assert out.getvalue() == expected, "log2csv output differs from CSV writer"
+    print("✓ log2csv 測試通過")
+
+
+def test_torn_last_record_ignored():
+    """斷電造成的不完整最後一筆記錄應被忽略"""
+    print("\n=== 測試 torn record ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, bin_path = write_both(tmp_dir)
+        # Cut inside the last record, as a power loss leaves it (no trailer either)
+        with open(bin_path, 'rb+') as f:
+            f.truncate(HEADER_STRUCT.size + len(FRAMES) * record_struct(8).size - 5)
+        with open(bin_path, 'rb') as f:
+            records = list(iter_binary_records(f))
+    assert len(records) == len(FRAMES) - 1
+    print("✓ torn record 測試通過")
+
+
+def test_segment_trailer_health():
+    """關閉時寫入 trailer 與 sidecar 的健康資訊，讀取記錄時略過 trailer"""
+    print("\n=== 測試記錄檔 trailer ===")
+    health = {'frames': [3, 1], 'rx_overflow': [0, 2], 'queue_dropped': 0, 'reconnects': 0}
+    compressions = [None, 'gzip'] + (['zstd'] if zstandard is not None else [])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for log_format in ('csv', 'bin'):
+            for compression in compressions:
+                path = os.path.join(tmp_dir, 'seg' + log_extension(log_format, compression))
+                writer = open_log_writer(path, log_format, compression=compression, index=SegmentIndex(),
+                                         trailer=lambda: health)
+                for timestamp, msg, bus_num, direction in FRAMES:
+                    writer.write_frame(msg, bus_num, direction=direction, timestamp=timestamp)
+                writer.close()
+                assert [record[0] for record in iter_log_records(path)] == [frame[0] for frame in FRAMES]
+                sidecar = load_index(path)['health']
+                assert sidecar['rx_overflow'] == [0, 2] and 'max_write_ms' in sidecar
+                assert is_incomplete(sidecar)
+                if log_format == 'bin':
+                    with open_log_binary(path) as f:
+                        assert read_binary_trailer(f) == sidecar
+    assert not is_incomplete(dict(health, rx_overflow=[0, 0]))
+    # 沒有 socket 丟失計數的接收端無法排除遺失
+    assert is_incomplete(dict(health, rx_overflow=[0, 0], drops_counted=False))
+
+    status = unpack_status(pack_status([2500, 70000], 300, 4, 123.4, 1))
+    assert status == {'fps_can0': 2500, 'fps_can1': 0xFFFF, 'rx_overflow': 255, 'queue_dropped': 4,
+                      'write_latency_ms': 120, 'reconnects': 1}
+    print("✓ trailer 測試通過")
+
+
+def read_rows(path):
+    with open_log_csv(path) as lines:
+        return [row['Time Stamp'] for row in csv.DictReader(lines)]
+
+
+def test_compressed_segments_survive_power_loss():
+    """壓縮記錄檔在最後一個同步點之前的資料，截斷後仍可讀回"""
+    print("\n=== 測試壓縮記錄檔截斷讀取 ===")
+    compressions = ['gzip', 'zstd'] if zstandard is not None else ['gzip']
+    msg = FRAMES[1][1]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for log_format in ('csv', 'bin'):
+            for compression in compressions:
+                path = os.path.join(tmp_dir, 'seg' + log_extension(log_format, compression))
+                writer = open_log_writer(path, log_format, compression=compression, sync_interval=3600)
+                for i in range(1000):
+                    writer.write_frame(msg, 0, timestamp=i)
+                writer.flush()
+                writer.sync()
+                synced_size = os.path.getsize(path)
+                for i in range(1000, 1100):
+                    writer.write_frame(msg, 0, timestamp=i)
+                writer.flush()
+                # Simulate the power cut: only the bytes up to the sync point hit the disk
+                with open(path, 'rb') as f:
+                    synced = f.read(synced_size)
+                writer.close()
+                assert read_rows(path) == [str(i) for i in range(1100)]
+                with open(path, 'wb') as f:
+                    f.write(synced)
+                assert read_rows(path) == [str(i) for i in range(1000)], (log_format, compression)
+    print("✓ 壓縮記錄檔測試通過")
+
+
+def test_header_clock_info_and_csv_records():
+    """標頭記錄時間來源與時鐘偏移，CSV 與二進位可讀回相同記錄"""
+    print("\n=== 測試標頭時鐘資訊 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path, bin_path = write_both(tmp_dir)
+        kernel_path = os.path.join(tmp_dir, 'kernel.canlog')
+        open_log_writer(kernel_path, 'bin', timestamp_source='kernel').close()
+        with open(kernel_path, 'rb') as f:
+            header = read_binary_header(f)
+        assert header['timestamp_source'] == 'kernel'
+        assert abs(header['clock_offset'] / 1000000 - (time.time() - time.monotonic())) < 1.0
+        assert list(iter_log_records(csv_path)) == list(iter_log_records(bin_path))
+    print("✓ 標頭時鐘資訊測試通過")
+
+
+def test_jitter_stats():
+    """每個 ID 的週期與抖動統計"""
+    print("\n=== 測試 jitter 統計 ===")
+    records = []
+    for i in range(100):
+        offset = 300 if i == 50 else 0  # one frame 0.3 ms late
+        records.append((i * 10000 + offset, 0x193, 0, 0, 8, b''))
+        records.append((i * 20000, 0x281, 0, 1, 1, b''))
+    intervals = intervals_by_id(sorted(records))
+    stats = jitter_stats(intervals[(0, 0x193)])
+    assert stats['count'] == 100
+    assert stats['period_ms'] == 10.0
+    assert abs(stats['late_ms'] - 0.3) < 1e-9 and abs(stats['early_ms'] - 0.3) < 1e-9
+    assert jitter_stats(intervals[(1, 0x281)])['jitter_ms'] == 0
+    assert list(intervals_by_id(sorted(records), bus=1)) == [(1, 0x281)]
+    print("✓ jitter 統計測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CAN 記錄檔格式測試")
+    print("=" * 50)
+    test_binary_round_trip()
+    test_log2csv_matches_csv_writer()
+    test_torn_last_record_ignored()
+    test_segment_trailer_health()
+    test_compressed_segments_survive_power_loss()
+    test_header_clock_info_and_csv_records()
+    test_jitter_stats()
+    print("\n✓ 所有測試通過！")
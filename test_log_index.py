@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+測試記錄檔索引 sidecar
+"""
+import os
+import tempfile
+
+import can
+
+from CanLogFormat import iter_log_records, log_extension, open_log_writer
+from CanLogIndex import LogReplay, SegmentIndex, index_path, iter_records_from, load_index, summarize
+
+START = 1700000000000000
+
+
+def write_segment(tmp_dir, log_format, compression=None):
+    """5 s of traffic: 0x193 every 10 ms, VCU status every 100 ms with the run bit set from 1 s to 3 s"""
+    path = os.path.join(tmp_dir, 'seg' + log_extension(log_format, compression))
+    writer = open_log_writer(path, log_format, compression=compression,
+                             index=SegmentIndex(checkpoint_interval_ms=500))
+    for i in range(500):
+        timestamp = START + i * 10000
+        writer.write_frame(can.Message(arbitration_id=0x193, data=[i & 0xFF] * 8, is_extended_id=False),
+                           0, timestamp=timestamp)
+        if i % 10 == 0:
+            vcu_on = 100 <= i < 300
+            writer.write_frame(can.Message(arbitration_id=0x281, data=[0x20 if vcu_on else 0],
+                                           is_extended_id=False), 1, timestamp=timestamp)
+        if i % 100 == 99:
+            writer.flush()
+    assert not os.path.exists(index_path(path)), "sidecar must only appear once the segment is closed"
+    writer.close()
+    return path
+
+
+def test_sidecar_summary():
+    """索引包含檢查點、各 ID 筆數、起訖時間與 VCU 開啟區間"""
+    print("\n=== 測試 sidecar 內容 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_segment(tmp_dir, 'csv')
+        index = load_index(path)
+        with open(path, 'rb') as f:
+            raw = f.read()
+    # Every checkpoint offset points at the start of its row
+    for timestamp, offset, _ in index['checkpoints']:
+        assert raw[offset:].startswith(str(timestamp).encode())
+    assert index['frames'] == 550
+    assert index['id_counts'] == {'193': 500, '281': 50}
+    assert index['first_timestamp'] == START
+    assert index['last_timestamp'] == START + 499 * 10000
+    assert index['vcu_on'] == [[START + 1000000, START + 3000000]]
+    assert [checkpoint[0] - START for checkpoint in index['checkpoints']] == [i * 500000 for i in range(10)]
+    summary = summarize(index)
+    assert summary['vcu_on_s'] == 2.0 and abs(summary['duration_s'] - 4.99) < 1e-9
+    print("✓ sidecar 內容測試通過")
+
+
+def test_seek_matches_full_scan():
+    """由檢查點跳讀的結果與完整讀取後過濾相同"""
+    print("\n=== 測試依索引跳讀 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for log_format, compression in (('csv', None), ('bin', None), ('bin', 'gzip'), ('csv', 'gzip')):
+            path = write_segment(tmp_dir, log_format, compression)
+            for seconds in (0, 1.234, 2.5, 4.995, 6):
+                target = START + int(seconds * 1000000)
+                expected = [record for record in iter_log_records(path) if record[0] >= target]
+                assert list(iter_records_from(path, target)) == expected, (log_format, compression, seconds)
+    print("✓ 依索引跳讀測試通過")
+
+
+def test_replay_cursor():
+    """有索引時不預先讀取，跳轉後的紀錄與完整讀取相同；沒有索引時結果一致"""
+    print("\n=== 測試重播游標 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = write_segment(tmp_dir, 'bin', 'gzip')
+        records = list(iter_log_records(path))
+        indexed = LogReplay(path)
+        assert indexed.records is None and indexed.frames == 550
+        os.remove(index_path(path))
+        loaded = LogReplay(path)
+        assert loaded.records == records
+
+        for replay in (indexed, loaded):
+            assert replay.first_timestamp == START and replay.last_timestamp == START + 4990000
+            assert replay.current_timestamp == START
+            assert replay.take_until(START + 15000) == records[:3]
+            # 往後、往前跳轉
+            for seconds in (3.2, 0.7, 4.99, 6):
+                target = START + int(seconds * 1000000)
+                replay.seek(target)
+                expected = [record for record in records if record[0] >= target]
+                assert replay.current_timestamp == (expected[0][0] if expected else None)
+                assert replay.take_until(target + 50000) == [r for r in expected if r[0] <= target + 50000]
+            replay.close()
+    print("✓ 重播游標測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("記錄檔索引測試")
+    print("=" * 50)
+    test_sidecar_summary()
+    test_seek_matches_full_scan()
+    test_replay_cursor()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+測試背景寫入執行緒與佇列滿載策略
+"""
+import threading
+import time
+
+from CanLogQueue import LogWriterThread
+
+
+class MockCanMessage:
+    def __init__(self, arbitration_id, data):
+        self.arbitration_id = arbitration_id
+        self.data = data
+        self.dlc = len(data)
+
+
+class ListWriter:
+    """Collects written frames in memory, optionally stalling like a slow SD card"""
+
+    def __init__(self, name, segments, gate=None):
+        self.frames = []
+        self.closed = False
+        self.gate = gate
+        segments.append((name, self))
+
+    def write_frame(self, msg, bus_num, direction=None, timestamp=None):
+        if self.gate is not None:
+            self.gate.wait()
+        self.frames.append(msg.arbitration_id)
+
+    def flush(self):
+        pass
+
+    def size(self):
+        return len(self.frames) * 100
+
+    def close(self):
+        self.closed = True
+
+
+def test_frames_follow_segments():
+    """每個 frame 應寫入收到當下的 segment"""
+    print("\n=== 測試 segment 切換順序 ===")
+    segments = []
+    log_queue = LogWriterThread(capacity=100, batch_size=4, flush_interval=0.01)
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter('a', segments))
+    for i in range(5):
+        log_queue.put(MockCanMessage(i, b'\x00'), 0)
+    log_queue.open_segment(lambda: ListWriter('b', segments))
+    for i in range(5, 8):
+        log_queue.put(MockCanMessage(i, b'\x00'), 1)
+    log_queue.close_segment()
+    log_queue.stop()
+
+    assert [name for name, _ in segments] == ['a', 'b']
+    assert segments[0][1].frames == [0, 1, 2, 3, 4]
+    assert segments[1][1].frames == [5, 6, 7]
+    assert all(writer.closed for _, writer in segments)
+    assert log_queue.stats()['frames_written'] == 8
+    print("✓ segment 切換測試通過")
+
+
+def test_backlog_written_in_order():
+    """backlog 在寫入執行緒上展開，順序位於前後 frame 之間"""
+    print("\n=== 測試 backlog 寫入 ===")
+    segments = []
+    log_queue = LogWriterThread(capacity=100, batch_size=4, flush_interval=0.01)
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter('a', segments))
+    log_queue.put(MockCanMessage(1, b'\x00'), 0)
+    threads = []
+
+    def backlog():
+        for can_id in (2, 3, 4):
+            threads.append(threading.current_thread())
+            yield 0, MockCanMessage(can_id, b'\x00'), 'Rx', can_id
+    log_queue.put_backlog(backlog())
+    log_queue.put(MockCanMessage(5, b'\x00'), 0)
+    log_queue.stop()
+
+    assert segments[0][1].frames == [1, 2, 3, 4, 5]
+    assert all(thread is log_queue.thread for thread in threads)
+    assert log_queue.stats()['frames_written'] == 5
+    assert log_queue.stats()['frames_dropped'] == 0
+    print("✓ backlog 寫入測試通過")
+
+
+def run_stalled(policy):
+    """Fill a queue of 4 frames while the writer is stalled, then release it"""
+    segments = []
+    gate = threading.Event()
+    log_queue = LogWriterThread(capacity=4, batch_size=1, flush_interval=0.01, policy=policy)
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter('a', segments, gate))
+    log_queue.put(MockCanMessage(0, b'\x00'), 0)
+    # Wait until the writer thread is stuck inside the first write
+    while log_queue.stats()['queue_depth'] != 0:
+        pass
+    for i in range(1, 10):
+        log_queue.put(MockCanMessage(i, b'\x00'), 0)
+    gate.set()
+    log_queue.stop()
+    return segments[0][1].frames, log_queue.stats()
+
+
+def test_count_drops_policy():
+    """count-drops: 佇列滿時丟棄新的 frame"""
+    print("\n=== 測試 count-drops ===")
+    frames, stats = run_stalled('count-drops')
+    assert frames == [0, 1, 2, 3, 4]
+    assert stats['frames_dropped'] == 5
+    assert stats['max_queue_depth'] == 4
+    print("✓ count-drops 測試通過")
+
+
+def test_drop_oldest_policy():
+    """drop-oldest: 佇列滿時丟棄最舊的 frame"""
+    print("\n=== 測試 drop-oldest ===")
+    frames, stats = run_stalled('drop-oldest')
+    assert frames == [0, 6, 7, 8, 9]
+    assert stats['frames_dropped'] == 5
+    print("✓ drop-oldest 測試通過")
+
+
+def test_block_policy():
+    """block: 佇列滿時接收端等待，寫入端放行後所有 frame 都寫入"""
+    print("\n=== 測試 block ===")
+    segments = []
+    gate = threading.Event()
+    log_queue = LogWriterThread(capacity=4, batch_size=1, flush_interval=0.01, policy='block')
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter('a', segments, gate))
+
+    def produce():
+        for i in range(10):
+            log_queue.put(MockCanMessage(i, b'\x00'), 0)
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    # 寫入端卡在第一個 frame，接收端填滿 4 個 frame 後等待
+    while log_queue.stats()['queue_depth'] != 4:
+        time.sleep(0.001)
+    producer.join(0.2)
+    assert producer.is_alive()
+    gate.set()
+    producer.join(5.0)
+    assert not producer.is_alive()
+    log_queue.stop()
+
+    stats = log_queue.stats()
+    assert segments[0][1].frames == list(range(10))
+    assert stats['frames_dropped'] == 0
+    assert stats['producer_wait_s'] > 0.1
+    print("✓ block 測試通過")
+
+
+def test_age_rotation_when_idle():
+    """沒有新 frame 時，segment 超過時間上限也會換檔"""
+    print("\n=== 測試閒置時依時間換檔 ===")
+    segments = []
+    names = iter('abcdef')
+    log_queue = LogWriterThread(capacity=100, batch_size=8, flush_interval=0.01,
+                                max_segment_seconds=0.05)
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter(next(names), segments))
+    log_queue.put(MockCanMessage(1, b'\x00'), 0)
+    deadline = time.monotonic() + 2.0
+    while log_queue.stats()['segments_rotated'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    log_queue.stop()
+
+    assert log_queue.stats()['segments_rotated'] >= 1
+    assert segments[0][1].frames == [1] and segments[0][1].closed
+    print("✓ 閒置時依時間換檔測試通過")
+
+
+def test_empty_segment_not_rotated():
+    """還沒寫入任何 frame 的 segment (未記錄時開著的檔) 不因時間上限換檔；關閉後沒有開始時間"""
+    print("\n=== 測試空 segment 不換檔 ===")
+    segments = []
+    names = iter('abcdef')
+    log_queue = LogWriterThread(capacity=100, batch_size=8, flush_interval=0.01,
+                                max_segment_seconds=0.05)
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter(next(names), segments))
+    time.sleep(0.3)
+    assert log_queue.stats()['segments_rotated'] == 0
+    assert [name for name, _ in segments] == ['a']
+    assert log_queue.segment_start_time is not None
+    log_queue.close_segment()
+    log_queue.stop()
+
+    assert segments[0][1].closed
+    assert log_queue.segment_start_time is None
+    print("✓ 空 segment 不換檔測試通過")
+
+
+def test_size_rotation():
+    """segment 超過大小上限時由寫入執行緒自動換檔"""
+    print("\n=== 測試依大小換檔 ===")
+    segments = []
+    names = iter('abcdef')
+    log_queue = LogWriterThread(capacity=100, batch_size=3, flush_interval=0.01,
+                                max_segment_bytes=300)
+    log_queue.start()
+    log_queue.open_segment(lambda: ListWriter(next(names), segments))
+    for i in range(7):
+        log_queue.put(MockCanMessage(i, b'\x00'), 0)
+    log_queue.stop()
+
+    assert [name for name, _ in segments] == ['a', 'b', 'c']
+    assert segments[0][1].frames == [0, 1, 2]
+    assert segments[1][1].frames == [3, 4, 5]
+    assert segments[2][1].frames == [6]
+    assert log_queue.stats()['segments_rotated'] == 2
+    print("✓ 依大小換檔測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("背景寫入執行緒測試")
+    print("=" * 50)
+    test_frames_follow_segments()
+    test_backlog_written_in_order()
+    test_count_drops_policy()
+    test_drop_oldest_policy()
+    test_block_policy()
+    test_size_rotation()
+    test_age_rotation_when_idle()
+    test_empty_segment_not_rotated()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+測試輪速里程積分與離線重算
+"""
+import os
+import random
+import struct
+import tempfile
+
+import can
+
+from CanLogFormat import iter_log_records, log_extension, open_log_writer
+from WheelOdometry import KMH_PER_RPM, WHEEL_SPEED_IDS, WheelOdometry, recompute_log, wheel_rpm
+from CanLogIndex import SegmentIndex
+from trip_recompute import live_distance, segment_files
+
+START = 1700000000000000
+
+
+def speed_frame(can_id, rpm):
+    return can.Message(arbitration_id=can_id, data=bytes(4) + struct.pack('<h', rpm) + bytes(2),
+                       is_extended_id=False)
+
+
+def test_trapezoid_and_gaps():
+    """等加速時梯形積分為精確值；超過 max_gap 的區間不積分並計數"""
+    print("\n=== 測試梯形積分與斷訊 ===")
+    rng = random.Random(3)
+    odometry = WheelOdometry(max_gap=0.5)
+    t = 0.0
+    while t < 10.0:
+        for wheel in (0, 1):
+            odometry.update(wheel, t + rng.uniform(0, 0.002), 0)
+        t += 0.01
+    assert odometry.distance == 0.0
+
+    # Speed ramps linearly from 0 to 6000 RPM over 10 s: distance = mean speed * time
+    odometry = WheelOdometry(max_gap=0.5)
+    times = sorted(rng.uniform(0, 10) for _ in range(3000)) + [10.0]
+    times[0] = 0.0
+    for wheel in (0, 1):
+        for t in times:
+            odometry.update(wheel, t, 600 * t)
+    expected = 3000 * KMH_PER_RPM / 3600 * 10
+    assert abs(odometry.distance - expected) < 1e-9 * expected
+
+    # A 2 s outage of the left wheel is skipped, not bridged
+    odometry = WheelOdometry(max_gap=0.5)
+    for t in (0.0, 0.5, 2.5, 3.0):
+        odometry.update(0, t, 1000)
+    assert odometry.gaps == 1 and odometry.gap_seconds == 2.0
+    assert abs(odometry.wheel_distance[0] - 1000 * KMH_PER_RPM / 3600 * 1.0) < 1e-12
+    print("✓ 梯形積分與斷訊測試通過")
+
+
+def write_drive(path, log_format, compression):
+    """30 s drive: wheel speeds every ~10 ms with jitter, a dropout, background traffic and the live 0x440"""
+    rng = random.Random(11)
+    writer = open_log_writer(path, log_format, compression=compression)
+    odometry = WheelOdometry()
+    wheel_frames = 0
+    timestamp = START
+    while timestamp < START + 30000000:
+        for can_id in (0x193, 0x194):
+            if 12000000 < timestamp - START < 13500000 and can_id == 0x194:
+                continue  # right inverter silent for 1.5 s
+            rpm = int(4000 + 2000 * ((timestamp - START) / 30000000) + rng.randint(-50, 50))
+            frame_time = timestamp + rng.randint(0, 3000)
+            writer.write_frame(speed_frame(can_id, rpm), 0, timestamp=frame_time)
+            odometry.update(WHEEL_SPEED_IDS[can_id], frame_time / 1000000, rpm)
+            wheel_frames += 1
+        writer.write_frame(can.Message(arbitration_id=0x185, data=bytes(8), is_extended_id=False), 0,
+                           timestamp=timestamp + 500)
+        if (timestamp - START) % 1000000 == 0:
+            distance_mm = int(odometry.distance * 1000000)
+            writer.write_frame(can.Message(arbitration_id=0x440, data=struct.pack('<I', distance_mm) + bytes(4),
+                                           is_extended_id=False), 1, direction='Tx', timestamp=timestamp)
+        timestamp += 10000
+    writer.close()
+    return wheel_frames
+
+
+def test_offline_matches_live():
+    """NumPy 離線重算與逐 frame 即時積分結果一致"""
+    print("\n=== 測試離線重算 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for log_format, compression in (('bin', None), ('bin', 'gzip'), ('csv', None)):
+            path = os.path.join(tmp_dir, 'drive' + log_extension(log_format, compression))
+            wheel_frames = write_drive(path, log_format, compression)
+
+            odometry = WheelOdometry()
+            for timestamp, can_id, _, bus_num, _, data in iter_log_records(path):
+                if bus_num == 0 and can_id in WHEEL_SPEED_IDS:
+                    odometry.update(WHEEL_SPEED_IDS[can_id], timestamp / 1000000, wheel_rpm(data))
+            result = recompute_log(path)
+            assert abs(result['distance_km'] - odometry.distance) < 1e-12, (log_format, compression)
+            assert result['gaps'] == odometry.gaps == 1
+            assert result['frames'] == wheel_frames
+            live = live_distance(path)
+            assert abs(live - result['distance_km']) < 0.02  # 0x440 only updates once per second
+    print(f"✓ 離線重算測試通過 ({result['distance_km']:.3f} km)")
+
+
+def test_segment_order():
+    """目錄中的 segment 依開始時間排序：can_log_ 與 can_log_vcu_ 交錯，索引的第一個 frame 優先於檔名"""
+    print("\n=== 測試 segment 排序 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ('can_log_20250731_120000.csv', 'can_log_vcu_20250731_110000.csv',
+                     'can_log_20250731_100000.csv', 'can_log_20250731_100000_1.csv', 'notes.csv'):
+            open(os.path.join(tmp_dir, name), 'w').close()
+        # 檔名時間晚，但索引記錄的第一個 frame (2023) 最早
+        indexed = os.path.join(tmp_dir, 'can_log_vcu_20990101_000000.csv')
+        writer = open_log_writer(indexed, 'csv', index=SegmentIndex())
+        writer.write_frame(speed_frame(0x193, 100), 0, timestamp=START)
+        writer.close()
+
+        order = [os.path.basename(path) for path in segment_files([tmp_dir])]
+    assert order == ['can_log_vcu_20990101_000000.csv', 'can_log_20250731_100000.csv',
+                     'can_log_20250731_100000_1.csv', 'can_log_vcu_20250731_110000.csv',
+                     'can_log_20250731_120000.csv', 'notes.csv'], order
+    print("✓ segment 排序測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("里程積分測試")
+    print("=" * 50)
+    test_trapezoid_and_gaps()
+    test_offline_matches_live()
+    test_segment_order()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+測試週期傳送 (virtual bus 上為 python-can 的 thread 版本，socketcan 上為 BCM)
+"""
+import time
+
+import can
+
+from CanPeriodic import CyclicTransmitter
+
+
+def collect(bus, seconds):
+    frames = []
+    end = time.time() + seconds
+    while time.time() < end:
+        msg = bus.recv(timeout=0.01)
+        if msg is not None:
+            frames.append(msg)
+    return frames
+
+
+def test_payload_refresh_and_reconnect():
+    """payload 變更後送出新資料，換 bus 後繼續週期傳送"""
+    print("\n=== 測試週期傳送 ===")
+    sender = can.interface.Bus(channel='periodic', interface='virtual')
+    listener = can.interface.Bus(channel='periodic', interface='virtual')
+    value = [1]
+    transmitter = CyclicTransmitter([sender])
+    transmitter.add(0, 0x440, 0.02, lambda: bytes([value[0]]) + bytes(7))
+    try:
+        frames = collect(listener, 0.2)
+        assert len(frames) >= 5
+        assert all(msg.arbitration_id == 0x440 and msg.data[0] == 1 for msg in frames)
+
+        value[0] = 2
+        transmitter.refresh()
+        collect(listener, 0.05)
+        assert all(msg.data[0] == 2 for msg in collect(listener, 0.1))
+
+        replacement = can.interface.Bus(channel='periodic', interface='virtual')
+        transmitter.replace_bus(0, replacement)
+        sender.shutdown()
+        frames = collect(listener, 0.2)
+        assert len(frames) >= 5 and frames[-1].data[0] == 2
+    finally:
+        transmitter.stop()
+    time.sleep(0.05)
+    collect(listener, 0.05)
+    assert collect(listener, 0.1) == []
+    replacement.shutdown()
+    listener.shutdown()
+    print("✓ 週期傳送測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("週期傳送測試")
+    print("=" * 50)
+    test_payload_refresh_and_reconnect()
+    print("\n✓ 所有測試通過！")
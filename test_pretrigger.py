@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+測試觸發前環形緩衝區
+"""
+import can
+
+from CanPreTrigger import FrameRing, PreTriggerBuffer
+
+
+def frame(can_id, data, **kwargs):
+    return can.Message(arbitration_id=can_id, data=data, is_extended_id=False, **kwargs)
+
+
+def test_ring_keeps_newest_frames():
+    """環形緩衝區滿時覆蓋最舊的 frame"""
+    print("\n=== 測試環形緩衝覆蓋 ===")
+    ring = FrameRing(capacity=4)
+    for i in range(10):
+        ring.push(i * 1000, frame(0x100 + i, [i] * (8 - i % 3)), 0)
+    slots = list(ring.iter_since(0))
+    assert [timestamp for timestamp, _ in slots] == [6000, 7000, 8000, 9000]
+    msg, direction = ring.message(slots[0][1])
+    assert msg.arbitration_id == 0x106 and msg.data == bytearray([6] * 8)
+    assert direction == 'Rx'
+    # A shorter frame must not pick up bytes of the frame it overwrote
+    msg, _ = ring.message(slots[1][1])
+    assert msg.dlc == 7 and msg.data == bytearray([7] * 7)
+    print("✓ 環形緩衝覆蓋測試通過")
+
+
+def test_drain_window_and_order():
+    """只交出最近 N 秒，並依時間合併兩條匯流排"""
+    print("\n=== 測試 pre-trigger 視窗與排序 ===")
+    buffer = PreTriggerBuffer(2, seconds=1.0, max_fps=100)
+    for i in range(30):
+        timestamp = i * 100000  # 10 frames/s per bus
+        buffer.push(0, frame(0x193, [i]), timestamp)
+        buffer.push(1, frame(0x281, [i]), timestamp + 50000)
+    buffer.push(1, can.Message(arbitration_id=0x18FF50E5, is_extended_id=True, is_remote_frame=True, dlc=4),
+                2950000)
+
+    frames = buffer.drain(now=3000000)
+    timestamps = [timestamp for _, _, _, timestamp in frames]
+    assert timestamps == sorted(timestamps)
+    assert timestamps[0] >= 2000000
+    assert [bus_num for bus_num, _, _, _ in frames[:4]] == [0, 1, 0, 1]
+    remote_msg = frames[-1][1]
+    assert remote_msg.is_remote_frame and remote_msg.is_extended_id and remote_msg.dlc == 4
+    assert len(buffer) == 0
+    print("✓ pre-trigger 視窗測試通過")
+
+
+def test_detach_defers_messages():
+    """detach 只交出環形緩衝區，迭代時才重建 Message"""
+    print("\n=== 測試 pre-trigger detach ===")
+    buffer = PreTriggerBuffer(2, seconds=1.0, max_fps=100)
+    for i in range(5):
+        buffer.push(i % 2, frame(0x100 + i, [i]), i * 1000)
+    rings = buffer.rings
+    backlog = buffer.detach(now=10000)
+    assert len(buffer) == 0 and buffer.rings[0] is not rings[0]
+    # 新的 frame 不影響已交出的 backlog
+    buffer.push(0, frame(0x7FF, [9]), 9000)
+    frames = list(backlog)
+    assert [msg.arbitration_id for _, msg, _, _ in frames] == [0x100, 0x101, 0x102, 0x103, 0x104]
+    assert [bus_num for bus_num, _, _, _ in frames] == [0, 1, 0, 1, 0]
+    assert len(buffer) == 1
+    print("✓ pre-trigger detach 測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("觸發前緩衝區測試")
+    print("=" * 50)
+    test_ring_keeps_newest_frames()
+    test_drain_window_and_order()
+    test_detach_defers_messages()
+    print("\n✓ 所有測試通過！")
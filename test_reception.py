@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+測試 SocketReader：解析 SO_TIMESTAMPNS / SO_RXQ_OVFL 附屬資料，及 MultiBusReceiver 的 socket 丟失計數
+"""
+import socket
+import struct
+
+from CanReception import SO_RXQ_OVFL, SO_TIMESTAMPNS, MultiBusReceiver, SocketReader
+
+
+def can_frame(can_id, data, flags=0):
+    return struct.pack('=IBB2x', can_id, len(data), flags) + bytes(data).ljust(8, b'\0')
+
+
+class FakeSocket:
+    """以佇列模擬 SocketCAN raw socket 的 recvmsg()"""
+    family = socket.AF_CAN
+
+    def __init__(self, packets):
+        self.packets = list(packets)
+        self.options = {}
+
+    def setsockopt(self, level, option, value):
+        self.options[(level, option)] = value
+
+    def recvmsg(self, bufsize, ancbufsize, flags):
+        assert flags & socket.MSG_DONTWAIT
+        if not self.packets:
+            raise BlockingIOError
+        return self.packets.pop(0)
+
+
+class FakeBus:
+    def __init__(self, packets, channel='vcan0'):
+        self.socket = FakeSocket(packets)
+        self.channel = channel
+
+
+def packet(frame, seconds, nanoseconds, drops=None, msg_flags=0):
+    ancillary = [(socket.SOL_SOCKET, SO_TIMESTAMPNS, struct.pack('@ll', seconds, nanoseconds))]
+    if drops is not None:
+        ancillary.append((socket.SOL_SOCKET, SO_RXQ_OVFL, struct.pack('@I', drops)))
+    return frame, ancillary, msg_flags, None
+
+
+def test_ancillary_parsing():
+    """時間戳、ID 旗標與 Tx 方向正確，drops 沿用最後一次收到的累計值"""
+    print("\n=== 測試附屬資料解析 ===")
+    bus = FakeBus([
+        packet(can_frame(0x193, [1, 2, 3]), 1700000000, 500000000),
+        packet(can_frame(0x18FF50E5 | 0x80000000, [0xAA] * 8), 1700000001, 0, drops=7),
+        packet(can_frame(0x440, [0x10, 0x27]), 1700000002, 250000000, msg_flags=socket.MSG_DONTROUTE),
+    ])
+    reader = SocketReader(bus)
+    assert bus.socket.options[(socket.SOL_SOCKET, SO_RXQ_OVFL)] == 1
+
+    msg = reader.recv()
+    assert msg.arbitration_id == 0x193 and not msg.is_extended_id and msg.is_rx
+    assert bytes(msg.data) == bytes([1, 2, 3]) and msg.dlc == 3 and msg.channel == 'vcan0'
+    assert msg.timestamp == 1700000000.5
+    assert reader.drops == 0
+
+    msg = reader.recv()
+    assert msg.arbitration_id == 0x18FF50E5 and msg.is_extended_id
+    assert reader.drops == 7
+
+    # 核心只在 drops 非零時附上計數；沒有附上時保留先前的值
+    msg = reader.recv()
+    assert msg.arbitration_id == 0x440 and not msg.is_rx
+    assert reader.drops == 7
+    assert reader.recv() is None
+    print("✓ 附屬資料解析測試通過")
+
+
+def test_receiver_drop_counts():
+    """drop_counts 依 bus 回報 socket 丟失數，replace_bus() 後仍累計"""
+    print("\n=== 測試 socket 丟失計數 ===")
+    receiver = MultiBusReceiver([FakeBus([packet(can_frame(0x100, [1]), 1, 0, drops=3)]),
+                                 FakeBus([packet(can_frame(0x200, [2]), 1, 0)])])
+    assert receiver.drops_counted
+    frames = receiver.poll(timeout=0)
+    assert sorted(msg.arbitration_id for _, msg in frames) == [0x100, 0x200]
+    assert receiver.drop_counts == [3, 0]
+
+    # 重新連線後新 socket 從 0 起算，總數不倒退
+    receiver.replace_bus(0, FakeBus([packet(can_frame(0x100, [1]), 2, 0, drops=2)]))
+    assert receiver.drop_counts == [3, 0]
+    receiver.poll(timeout=0)
+    assert receiver.drop_counts == [5, 0]
+    print("✓ socket 丟失計數測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("CAN 接收測試")
+    print("=" * 50)
+    test_ancillary_parsing()
+    test_receiver_drop_counts()
+    print("\n✓ 所有測試通過！")
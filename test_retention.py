@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+測試記錄檔保存管理：欄式封存與磁碟預算
+"""
+import os
+import random
+import tempfile
+import time
+
+import can
+
+from CanLogFormat import iter_log_records, log_extension, open_log_csv, open_log_writer
+from CanLogIndex import SegmentIndex, iter_records_from, load_index
+from CanRetention import RetentionManager, archive_name, archive_segment
+from WheelOdometry import recompute_log
+
+START = 1700000000000000
+HOUR = 3600
+
+
+def write_segment(path, log_format, compression, frames=5000, seed=1, close=True):
+    rng = random.Random(seed)
+    writer = open_log_writer(path, log_format, compression=compression, index=SegmentIndex(),
+                             trailer=lambda: {'queue_dropped': 0})
+    for i in range(frames):
+        can_id = rng.choice([0x193, 0x194, 0x185, 0x281, 0x1ABCDE])
+        data = bytes(rng.randrange(256) for _ in range(rng.randint(0, 8)))
+        writer.write_frame(can.Message(arbitration_id=can_id, data=data, is_extended_id=can_id > 0x7FF),
+                           i % 2, direction='Tx' if i % 7 == 0 else None, timestamp=START + i * 1000)
+    if close:
+        writer.close()
+    return writer
+
+
+def age(path, hours):
+    mtime = time.time() - hours * HOUR
+    os.utime(path, (mtime, mtime))
+
+
+def test_archive_roundtrip():
+    """封存後逐筆內容、CSV 輸出、索引與離線重算皆與原始記錄相同"""
+    print("\n=== 測試封存往返 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for log_format, compression in (('bin', None), ('bin', 'zstd'), ('csv', 'gzip')):
+            segment = os.path.join(tmp_dir, 'can_log_1' + log_extension(log_format, compression))
+            write_segment(segment, log_format, compression)
+            records = list(iter_log_records(segment))
+            with open_log_csv(segment) as lines:
+                csv_text = ''.join(lines)
+            distance = recompute_log(segment)['distance_km']
+
+            archive = archive_segment(segment)
+            assert archive == archive_name(segment) and not os.path.exists(segment)
+            assert list(iter_log_records(archive)) == records, (log_format, compression)
+            with open_log_csv(archive) as lines:
+                assert ''.join(lines).replace('\r\n', '\n') == csv_text.replace('\r\n', '\n')
+            assert recompute_log(archive)['distance_km'] == distance
+            index = load_index(archive)
+            assert index['frames'] == len(records) and index['archived_from'] == os.path.basename(segment)
+            assert index['health']['queue_dropped'] == 0
+            assert list(iter_records_from(archive, START + 4000000)) == records[4000:]
+            os.remove(archive)
+            os.remove(archive + '.idx.json')
+    print("✓ 封存往返測試通過")
+
+
+def test_retention_pass():
+    """舊段封存、開啟中的段不動、超出預算時由最舊者刪除"""
+    print("\n=== 測試保存管理 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        old = [os.path.join(tmp_dir, f'can_log_{n}.canlog') for n in range(3)]
+        for n, path in enumerate(old):
+            write_segment(path, 'bin', None, seed=n)
+            age(path, 48 - n)
+        recent = os.path.join(tmp_dir, 'can_log_3.canlog')
+        write_segment(recent, 'bin', None, seed=3)
+        active = write_segment(os.path.join(tmp_dir, 'can_log_4.canlog'), 'bin', None, seed=4, close=False)
+        active.flush()
+        age(active.filename, 72)  # idle but still open: never touched
+        open(os.path.join(tmp_dir, 'can_log_0.canarc.tmp'), 'wb').close()  # left by a killed pass
+
+        manager = RetentionManager(tmp_dir, archive_after=24 * HOUR)
+        result = manager.run_once()
+        assert sorted(result['archived']) == ['can_log_0.canlog', 'can_log_1.canlog', 'can_log_2.canlog']
+        assert result['deleted'] == [] and result['errors'] == [] and result['freed'] > 0
+        names = sorted(os.listdir(tmp_dir))
+        assert 'can_log_0.canarc.tmp' not in names and 'can_log_3.canlog' in names
+        assert 'can_log_4.canlog' in names and 'can_log_4.canarc' not in names
+        assert os.path.getmtime(os.path.join(tmp_dir, 'can_log_0.canarc')) < os.path.getmtime(recent)
+
+        # Budget for the recent segment plus the open one: the archives go, oldest first
+        manager.budget_bytes = os.path.getsize(recent) + os.path.getsize(recent + '.idx.json') + active.size()
+        result = manager.run_once()
+        assert result['deleted'] == ['can_log_0.canarc', 'can_log_1.canarc', 'can_log_2.canarc']
+        assert os.path.exists(recent) and os.path.exists(active.filename)
+
+        # Nothing closed is left to delete: the open segment survives any budget
+        manager.budget_bytes = 1
+        result = manager.run_once()
+        assert result['deleted'] == ['can_log_3.canlog'] and os.path.exists(active.filename)
+        active.close()
+    print("✓ 保存管理測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("記錄檔保存管理測試")
+    print("=" * 50)
+    test_archive_roundtrip()
+    test_retention_pass()
+    print("\n✓ 所有測試通過！")
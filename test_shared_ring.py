@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+測試多行程接收用的共享記憶體環形緩衝區
+"""
+import multiprocessing
+import time
+
+import can
+
+from CanMultiProcess import SharedFrameRing
+
+TOTAL = 20000
+
+
+def frame(i):
+    return can.Message(timestamp=1700000000 + i / 1000, arbitration_id=0x100 + i % 0x80,
+                       data=i.to_bytes(4, 'little')[:1 + i % 4], is_extended_id=bool(i % 5 == 0))
+
+
+def producer(ring):
+    """子行程：分批寫入，環滿時等待（測試不可掉 frame）"""
+    i = 0
+    while i < TOTAL:
+        batch = [frame(n) for n in range(i, min(i + 100, TOTAL))]
+        while ring.capacity - len(ring) < len(batch):
+            time.sleep(0.0005)
+        assert ring.put(1, batch) == len(batch)
+        i += 100
+    ring.close()
+
+
+def test_ring_across_processes():
+    """跨行程傳遞：環容量遠小於總數，資料須完整且依序"""
+    print("\n=== 測試跨行程環形緩衝 ===")
+    ring = SharedFrameRing(capacity=1000)
+    child = multiprocessing.Process(target=producer, args=(ring,))
+    child.start()
+    frames = []
+    deadline = time.time() + 30
+    while len(frames) < TOTAL and time.time() < deadline:
+        if not ring.read(frames, 700):
+            time.sleep(0.0005)
+    child.join()
+    try:
+        assert len(frames) == TOTAL
+        for i, (bus_num, received) in enumerate(frames):
+            expected = frame(i)
+            assert bus_num == 1
+            assert received.arbitration_id == expected.arbitration_id
+            assert received.data == bytes(expected.data) and received.dlc == expected.dlc
+            assert received.is_extended_id == expected.is_extended_id and received.is_rx
+            assert int(received.timestamp * 1000000) == int(expected.timestamp * 1000000)
+        assert ring.dropped.value == 0 and len(ring) == 0
+    finally:
+        ring.close()
+    print("✓ 跨行程環形緩衝測試通過")
+
+
+def test_full_ring_counts_drops():
+    """環滿時新 frame 被丟棄並計數"""
+    print("\n=== 測試環滿丟棄 ===")
+    ring = SharedFrameRing(capacity=8)
+    try:
+        assert ring.put(0, [frame(i) for i in range(5)]) == 5
+        assert ring.put(0, [frame(i) for i in range(5, 10)]) == 3
+        assert ring.dropped.value == 2
+        frames = []
+        assert ring.read(frames) == 8
+        assert [received.arbitration_id for _, received in frames] == [0x100 + i for i in range(8)]
+        assert ring.put(0, [frame(20)]) == 1  # wraps around to slot 0
+    finally:
+        ring.close()
+    print("✓ 環滿丟棄測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("共享記憶體環形緩衝測試")
+    print("=" * 50)
+    test_ring_across_processes()
+    test_full_ring_counts_drops()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+測試 CanSignalHistory 的環形緩衝區與時間窗查詢
+"""
+import struct
+
+import can
+import numpy as np
+
+from CanDecoder import STORE_LAYOUT, CanDecoder
+from CanSignalHistory import SignalHistory
+from CanSignalStore import LAST_UPDATE, SignalLayout, SignalStore
+
+LAYOUT = SignalLayout({
+    'vcu': {'steer': float, 'accel': int, 'name': 'VCU', 'last_update': LAST_UPDATE},
+    'cells': {'volts': [float] * 3, 'last_update': LAST_UPDATE},
+})
+
+
+def message(can_id, data):
+    return can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
+
+
+def test_capacity_and_paths():
+    """容量 = 頻率 × 時間預算；群組與陣列路徑展開為每個數值訊號，object 訊號不記錄"""
+    print("\n=== 測試容量與路徑 ===")
+    history = SignalHistory(LAYOUT, {('vcu',): 10, ('cells', 'volts'): (2, 1.5)}, seconds=3)
+    assert sorted(history.slots) == [('cells', 'volts', 0), ('cells', 'volts', 1), ('cells', 'volts', 2),
+                                     ('vcu', 'accel'), ('vcu', 'steer')]
+    assert history.capacity(('vcu', 'steer')) == 30
+    assert history.capacity(('cells', 'volts', 2)) == 3
+    assert history.nbytes == (2 * 30 + 3 * 3) * 16
+    print("✓ 容量與路徑測試通過")
+
+
+def test_window_and_wrap():
+    """store 寫入進入歷史；時間窗含兩端，環形緩衝區繞回後仍依時間排序"""
+    print("\n=== 測試時間窗查詢 ===")
+    history = SignalHistory(LAYOUT, {('vcu', 'steer'): 1}, seconds=5)
+    store = SignalStore(LAYOUT, history=history)
+    path = ('vcu', 'steer')
+    assert len(history.window(path).timestamp) == 0
+
+    for second in range(3):
+        store.set_many(LAYOUT.span(('vcu',), 'steer', 'accel'), (second * 10.0, second), float(second))
+    window = history.window(path, 1.0, 2.0)
+    assert window.timestamp.tolist() == [1.0, 2.0] and window.value.tolist() == [10.0, 20.0]
+    assert np.shares_memory(window.value, history.rings[history.slots[path]].value)
+
+    for second in range(3, 8):
+        store.set(LAYOUT.slot('vcu', 'steer'), second * 10.0, float(second))
+    window = history.window(path)
+    assert window.timestamp.tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert window.value.tolist() == [30.0, 40.0, 50.0, 60.0, 70.0]
+    assert history.window(path, 4.5, 6.0).timestamp.tolist() == [5.0, 6.0]
+    assert history.window(path, None, 3.5).value.tolist() == [30.0]
+    assert len(history.window(path, 8.0).timestamp) == 0
+
+    history.clear()
+    assert len(history.window(path).timestamp) == 0
+    assert store.snapshot().history is None
+    print("✓ 時間窗查詢測試通過")
+
+
+def test_decoder_fills_history():
+    """CanDecoder 解碼時把數值寫入歷史"""
+    print("\n=== 測試 CanDecoder 歷史 ===")
+    history = SignalHistory(STORE_LAYOUT, {('inverters', 3): 100}, seconds=10)
+    decoder = CanDecoder(history=history)
+    for speed in (100, 200, 300):
+        decoder.process_can_message(message(0x193, struct.pack('<BBhh', 1, 2, 40, speed)))
+    window = history.window(('inverters', 3, 'speed'))
+    assert window.value.tolist() == [100.0, 200.0, 300.0]
+    assert list(window.timestamp) == sorted(window.timestamp)
+    assert ('inverters', 3, 'status') not in history.slots
+    print("✓ CanDecoder 歷史測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("訊號歷史測試")
+    print("=" * 50)
+    test_capacity_and_paths()
+    test_window_and_wrap()
+    test_decoder_fills_history()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+測試 CanSignalStore 的 slot 配置、寫入與 dict 檢視
+"""
+import copy
+import struct
+
+import can
+
+from CanDecoder import CanDecoder
+from CanSignalStore import CHANGE_LOG_SIZE, LAST_UPDATE, SignalLayout, SignalStore
+
+SCHEMA = {
+    'vcu': {'steer': float, 'accel': int, 'name': 'VCU', 'last_update': LAST_UPDATE},
+    'cells': {'volts': [float] * 4, 'temps': [int] * 3, 'last_update': LAST_UPDATE},
+    'inverters': {3: {'status': object, 'torque': 0.0, 'last_update': LAST_UPDATE}},
+}
+
+
+def message(can_id, data):
+    return can.Message(arbitration_id=can_id, data=data, is_extended_id=False)
+
+
+def test_layout_and_view():
+    """view 產生與 schema 相同的結構：未寫入為 None，int slot 回傳 int，LAST_UPDATE 取該組最新時間"""
+    print("\n=== 測試 slot 配置與檢視 ===")
+    layout = SignalLayout(SCHEMA)
+    assert len(layout) == 2 + 1 + 4 + 3 + 2
+    store = SignalStore(layout)
+    assert store.view() == {
+        'vcu': {'steer': None, 'accel': None, 'name': 'VCU', 'last_update': None},
+        'cells': {'volts': [None] * 4, 'temps': [None] * 3, 'last_update': None},
+        'inverters': {3: {'status': None, 'torque': 0.0, 'last_update': None}},
+    }
+
+    store.set_many(layout.span(('vcu',), 'steer', 'accel'), (12.5, 40), 100.0)
+    store.set_many(layout.slot('cells', 'temps') + 1, (25, 26), 101.0)
+    store.set(layout.slot('cells', 'volts') + 3, 3.7, 102.0)
+    store.set_object(layout.slot('inverters', 3, 'status'), (1, 2), 103.0)
+    view = store.view()
+    assert view['vcu'] == {'steer': 12.5, 'accel': 40, 'name': 'VCU', 'last_update': 100.0}
+    assert type(view['vcu']['accel']) is int
+    assert view['cells'] == {'volts': [None, None, None, 3.7], 'temps': [None, 25, 26], 'last_update': 102.0}
+    assert all(type(value) is int for value in view['cells']['temps'][1:])
+    assert store.view('inverters', 3) == {'status': (1, 2), 'torque': 0.0, 'last_update': 103.0}
+    assert store.get(layout.slot('vcu', 'steer')) == 12.5
+
+    try:
+        layout.span(('vcu',), 'steer', 'name')
+        assert False, "object slot must not be part of a span"
+    except ValueError:
+        pass
+    try:
+        layout.span(('vcu',), 'accel', 'steer')
+        assert False, "span must follow the schema order"
+    except ValueError:
+        pass
+    print("✓ slot 配置與檢視測試通過")
+
+
+def test_snapshot():
+    """snapshot 為獨立複本，之後的寫入不影響它"""
+    print("\n=== 測試 snapshot ===")
+    layout = SignalLayout(SCHEMA)
+    store = SignalStore(layout)
+    store.set(layout.slot('vcu', 'steer'), 1.0, 10.0)
+    snapshot = store.snapshot()
+    store.set(layout.slot('vcu', 'steer'), 2.0, 11.0)
+    store.set_object(layout.slot('inverters', 3, 'status'), (0, 0), 11.0)
+    assert snapshot.view('vcu') == {'steer': 1.0, 'accel': None, 'name': 'VCU', 'last_update': 10.0}
+    assert snapshot.view('inverters', 3)['status'] is None
+    assert store.view('vcu')['steer'] == 2.0
+    print("✓ snapshot 測試通過")
+
+
+def test_changes_since():
+    """只有數值改變的寫入進入變動記錄；refresh 只重建變動的群組並更新 last_update"""
+    print("\n=== 測試變動追蹤 ===")
+    layout = SignalLayout(SCHEMA)
+    store = SignalStore(layout)
+    view = store.view()
+    steer, accel = layout.slot('vcu', 'steer'), layout.slot('vcu', 'accel')
+    volts = layout.slot('cells', 'volts')
+    assert store.changes_since(0) == (0, [])
+
+    store.set_many(steer, (1.5, 3), 10.0)
+    store.set(volts + 2, 3.7, 11.0)
+    generation, slots = store.changes_since(0)
+    assert (generation, slots) == (3, [steer, accel, volts + 2])
+    assert layout.paths[volts + 2] == ('cells', 'volts', 2)
+
+    # 相同數值只更新時間，不算變動
+    store.set_many(steer, (1.5, 3), 12.0)
+    store.set_object(layout.slot('vcu', 'name'), 'VCU', 12.0)
+    assert store.changes_since(generation) == (3, [])
+    store.refresh(view, [])
+    assert view['vcu']['last_update'] == 12.0 and view['vcu']['steer'] is None
+
+    store.refresh(view, slots)
+    assert view == store.view()
+    store.set(steer, 2.5, 13.0)
+    store.set(steer, 1.5, 14.0)
+    assert store.changes_since(generation) == (5, [steer])
+    assert store.refresh(view, [steer]) == store.view()
+
+    # 落後超過記錄長度時回傳所有 slot
+    for value in range(CHANGE_LOG_SIZE):
+        store.set(volts, float(value), 15.0)
+    assert store.changes_since(generation)[1] == list(range(len(layout)))
+    assert store.changes_since(store.generation - 2)[1] == [volts]
+    print("✓ 變動追蹤測試通過")
+
+
+def test_decoder_data_store():
+    """CanDecoder 的 data_store 保持原本的結構與數值"""
+    print("\n=== 測試 CanDecoder data_store ===")
+    decoder = CanDecoder()
+    initial = decoder.data_store
+    assert initial['covariance'] == {'values': [0.0] * 9, 'type': 0, 'type_name': 'UNKNOWN', 'last_update': None}
+    assert initial['canlogging']['is_recording'] is False
+    assert initial['accumulator']['cell_temperatures'] == [None] * 224
+    assert sorted(initial['inverters']) == [3, 4]
+
+    decoder.process_can_message(message(0x181, struct.pack('<h6B', -200, 1, 2, 3, 4, 5, 6) + b'\0'))
+    decoder.process_can_message(message(0x390, bytes([14, 32, 33, 34, 35, 36, 37, 38])))
+    decoder.process_can_message(message(0x193, struct.pack('<BBhh', 1, 2, 40, -300)))
+    data_store = decoder.data_store
+    assert data_store['vcu']['steer'] == -2.0 and data_store['vcu']['bse2'] == 6
+    assert data_store['vcu']['last_update'] is not None
+    assert data_store['accumulator']['cell_temperatures'][14:21] == [0, 1, 2, 3, 4, 5, 6]
+    assert data_store['accumulator']['cell_temperatures'][13] is None
+    assert data_store['inverters'][3]['status'] == (1, 2)
+    assert data_store['inverters'][3]['speed'] == -300
+    assert data_store['inverters'][4]['last_update'] is None
+
+    # 檢視是複本，修改它不影響解碼器狀態
+    before = copy.deepcopy(data_store)
+    data_store['vcu']['steer'] = 99
+    assert decoder.data_store == before
+    print("✓ CanDecoder data_store 測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("訊號儲存測試")
+    print("=" * 50)
+    test_layout_and_view()
+    test_snapshot()
+    test_changes_since()
+    test_decoder_data_store()
+    print("\n✓ 所有測試通過！")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+測試累積里程日誌的斷電/強制結束安全性
+"""
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+from TripDistance import JOURNAL_NAME, RECORD_SIZE, TripDistanceJournal
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+STEP = 0.001
+
+# Child process: keeps saving an increasing distance and acknowledges every
+# value on stdout only after append() returned. A tiny compaction threshold
+# makes sure kills also land inside compaction.
+WRITER = f"""
+import sys
+sys.path.insert(0, {REPO_DIR!r})
+from TripDistance import TripDistanceJournal
+journal = TripDistanceJournal(sys.argv[1], compact_records=7)
+distance = journal.distance
+while True:
+    distance = round(distance + {STEP}, 6)
+    journal.append(distance)
+    sys.stdout.write(f"{{distance:.6f}}\\n")
+    sys.stdout.flush()
+"""
+
+
+def test_survives_kill_9():
+    """寫入中途 kill -9，重新載入的值不得小於最後確認寫入的值"""
+    print("\n=== 測試 kill -9 故障注入 ===")
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        previous = 0.0
+        for round_num in range(15):
+            child = subprocess.Popen([sys.executable, '-c', WRITER, tmp_dir],
+                                     stdout=subprocess.PIPE, text=True)
+            # Wait for the first acknowledgement so the kill lands mid-run
+            acked = [child.stdout.readline()]
+            time.sleep(rng.uniform(0, 0.05))
+            os.kill(child.pid, signal.SIGKILL)
+            child.wait()
+            acked += child.stdout.read().splitlines()
+            child.stdout.close()
+            last_acked = float([line for line in acked if line.strip()][-1])
+
+            loaded = TripDistanceJournal(tmp_dir).distance
+            # Either the last acknowledged value or the one in flight when killed
+            assert last_acked - 1e-9 <= loaded <= last_acked + STEP + 1e-9, (round_num, last_acked, loaded)
+            assert loaded >= previous
+            previous = loaded
+    print(f"✓ kill -9 測試通過 (final {previous:.3f} km)")
+
+
+def test_torn_and_zeroed_tail():
+    """日誌尾端不完整或被補零時，回到最後一筆有效記錄"""
+    print("\n=== 測試日誌尾端損毀 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        journal = TripDistanceJournal(tmp_dir)
+        for i in range(1, 6):
+            journal.append(i * 1.5)
+        path = os.path.join(tmp_dir, JOURNAL_NAME)
+
+        with open(path, 'ab') as f:
+            f.write(b'\x00' * (RECORD_SIZE * 2))  # zero-filled blocks after a power cut
+        assert TripDistanceJournal(tmp_dir).distance == 7.5
+
+        with open(path, 'r+b') as f:
+            f.truncate(RECORD_SIZE * 4 + 10)  # torn fifth record
+        journal = TripDistanceJournal(tmp_dir)
+        assert journal.distance == 6.0
+        journal.append(9.0)
+        assert os.path.getsize(path) == RECORD_SIZE * 5
+        assert TripDistanceJournal(tmp_dir).distance == 9.0
+    print("✓ 尾端損毀測試通過")
+
+
+def test_compaction_and_legacy_import():
+    """壓縮後日誌清空，舊 CSV 只在第一次匯入"""
+    print("\n=== 測試壓縮與舊檔匯入 ===")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(tmp_dir, 'trip_distance_cumulative.csv'), 'w') as f:
+            f.write("Timestamp,Distance_km\n2025-01-01 10:00:00,1.000000\n2025-01-02 10:00:00,12.345000\n")
+        journal = TripDistanceJournal(tmp_dir, compact_records=3)
+        assert journal.distance == 12.345
+        for i in range(4):
+            journal.append(20.0 + i)
+        assert os.path.getsize(os.path.join(tmp_dir, JOURNAL_NAME)) == RECORD_SIZE
+        assert TripDistanceJournal(tmp_dir).distance == 23.0
+    print("✓ 壓縮與匯入測試通過")
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("累積里程日誌測試")
+    print("=" * 50)
+    test_survives_kill_9()
+    test_torn_and_zeroed_tail()
+    test_compaction_and_legacy_import()
+    print("\n✓ 所有測試通過！")
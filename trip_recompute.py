@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+由記錄檔重算里程
+Recompute the trip distance of recorded segments from their wheel speed frames.
+
+    python3 trip_recompute.py LOGS/can_log_20250731_*.canlog
+    python3 trip_recompute.py LOGS/                       # every segment in a directory, in time order
+    python3 trip_recompute.py LOGS/ --start-km 1234.5     # regenerate the cumulative distance
+
+For each segment the distance is integrated offline (WheelOdometry, NumPy)
+and compared with what the logger broadcast live: the change of the 0x440
+trip distance frames (can1, Tx) recorded in the same segment.
+"""
+import argparse
+import os
+import re
+import sys
+from datetime import datetime
+
+from CanLogFormat import is_log_file
+from CanLogIndex import load_index
+from WheelOdometry import MAX_GAP, np, recompute_log, select_frames
+
+TRIP_DISTANCE_ID = 0x440
+TRIP_DISTANCE_BUS = 1
+# can_log_20250731_004450.csv, can_log_vcu_20250731_004450_1.canlog, ...
+SEGMENT_TIME = re.compile(r'_(\d{8}_\d{6})(?:_\d+)?\.')
+
+
+def live_distance(filename):
+    """Distance in km the logger counted live during a segment (from its 0x440 frames), None without them"""
+    _, _, dlcs, data = select_frames(filename, [TRIP_DISTANCE_ID], TRIP_DISTANCE_BUS)
+    distance_mm = np.ascontiguousarray(data[dlcs >= 4, :4]).view('<u4').ravel()
+    if len(distance_mm) < 2:
+        return None
+    return (int(distance_mm[-1]) - int(distance_mm[0])) / 1000000
+
+
+def segment_start(filename):
+    """
+    Start of a segment in Unix seconds, for putting segments in time order:
+    the first frame from the index sidecar, else the local time in the name
+    (the logger names segments can_log_ / can_log_vcu_ + open time), else None.
+    """
+    index = load_index(filename)
+    if index is not None and index.get('first_timestamp') is not None:
+        return index['first_timestamp'] / 1e6
+    match = SEGMENT_TIME.search(os.path.basename(filename))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+    return None
+
+
+def segment_files(paths):
+    """
+    Log segments named on the command line; directories are expanded in time
+    order (segment_start(), segments without a known start last, by name)
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = [os.path.join(path, name) for name in os.listdir(path) if is_log_file(name)]
+            starts = {name: segment_start(name) for name in names}
+            files += sorted(names, key=lambda name: (starts[name] is None, starts[name] or 0.0, name))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute trip distance from recorded CAN logs")
+    parser.add_argument('inputs', nargs='+', help="log segments or directories")
+    parser.add_argument('--max-gap', type=float, default=MAX_GAP,
+                        help="longest interval between two frames of a wheel that is integrated (s)")
+    parser.add_argument('--start-km', type=float, default=None,
+                        help="cumulative distance before the first segment; prints the running total")
+    args = parser.parse_args()
+
+    if np is None:
+        sys.exit("trip_recompute.py needs the 'numpy' package (pip install numpy)")
+
+    total = 0.0
+    print(f"{'segment':<44} {'frames':>9} {'offline km':>11} {'live km':>9} {'diff m':>8} {'gaps':>5}"
+          + (f" {'cumulative':>11}" if args.start_km is not None else ""))
+    for filename in segment_files(args.inputs):
+        try:
+            result = recompute_log(filename, args.max_gap)
+            live = live_distance(filename)
+        except (OSError, ValueError) as e:
+            print(f"{os.path.basename(filename):<44} unreadable: {e}")
+            continue
+        total += result['distance_km']
+        live_text = f"{live:9.3f}" if live is not None else f"{'-':>9}"
+        diff_text = f"{(result['distance_km'] - live) * 1000:8.1f}" if live is not None else f"{'-':>8}"
+        line = (f"{os.path.basename(filename):<44} {result['frames']:9d} {result['distance_km']:11.3f} "
+                f"{live_text} {diff_text} {result['gaps']:5d}")
+        if args.start_km is not None:
+            line += f" {args.start_km + total:11.3f}"
+        print(line)
+    print(f"Total recomputed distance: {total:.3f} km")
+
+
+if __name__ == "__main__":
+    main()
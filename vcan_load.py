@@ -0,0 +1,35 @@
+"""
+虛擬匯流排負載
+Background load for the vcan benchmarks.
+
+``load_sender`` keeps a virtual bus at a fixed frame rate, by default the
+rate of a fully loaded 1 Mbit/s bus (CanPreTrigger.FULL_LOAD_FPS), until
+``stop_event`` is set:
+
+    stop_event = threading.Event()
+    threading.Thread(target=load_sender, args=(FULL_LOAD_FPS, stop_event)).start()
+"""
+import time
+
+import can
+
+from CanPreTrigger import FULL_LOAD_FPS
+
+LOAD_ID = 0x185
+
+
+def load_sender(fps, stop_event, channel='vcan0'):
+    bus = can.interface.Bus(channel=channel, interface='socketcan')
+    period = 1.0 / fps
+    msg = can.Message(arbitration_id=LOAD_ID, data=bytes(8), is_extended_id=False)
+    next_send = time.perf_counter()
+    while not stop_event.is_set():
+        try:
+            bus.send(msg, timeout=0.1)
+        except can.CanError:
+            pass  # TX queue full, keep pacing
+        next_send += period
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    bus.shutdown()